@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Runs the benchmark harnesses kept next to the unit tests.
+
+Usage: benchmark.py <benchmark> [args ...]
+
+Each benchmark runs inside the fixtures of a unit test case, so that it
+gets the same configuration, database and stubs as the tests of the code
+it measures, and prints its reports.
+
+For this script to work please run:
+python setup.py develop
+pip install -r requirements.txt
+pip install -r test-requirements.txt
+export EVENTLET_NO_GREENDNS='yes'
+"""
+
+import inspect
+import logging
+import sys
+import unittest
+
+from oslo.config import cfg
+
+from nova import test
+from nova.tests import limits_benchmark
+from nova.tests import policy_benchmark
+from nova.tests import quota_benchmark
+from nova.tests.scheduler import benchmark as scheduler_benchmark
+from nova.tests import test_iptables_network
+
+BENCHMARKS = {}
+
+
+def benchmark(case_class):
+    """Register the decorated function as the benchmark of its name.
+
+    The function is called with a set up instance of case_class and the
+    command line arguments following the name of the benchmark.
+    """
+    def decorator(func):
+        BENCHMARKS[func.__name__] = (case_class, func)
+        return func
+    return decorator
+
+
+@benchmark(test.NoDBTestCase)
+def scheduler(case, args):
+    """scheduler [number of hosts ...]
+
+    Runs the FilterScheduler against synthetic fleets of compute nodes and
+    reports the p50/p99 latency of select_destinations, the time spent in
+    each filter and weigher, and the memory used.
+    """
+    case.flags(scheduler_driver='nova.scheduler.filter_scheduler.'
+                                'FilterScheduler')
+    for num_hosts in [int(arg) for arg in args] or [100, 1000, 10000,
+                                                    50000]:
+        compute_nodes = scheduler_benchmark.generate_compute_nodes(num_hosts)
+        aggregates = scheduler_benchmark.generate_aggregates(compute_nodes)
+        harness = scheduler_benchmark.SchedulerBenchmark(compute_nodes,
+                                                         aggregates)
+        report = harness.run(200)
+        print('\n'.join(scheduler_benchmark.format_report(report)))
+
+
+@benchmark(test_iptables_network.IptablesManagerTestCase)
+def iptables(case, args):
+    """iptables [number of rules]
+
+    Reports the time IptablesManager takes to merge its rules into the
+    iptables-save output of a large table, as done by each apply().
+    """
+    num_rules = int(args[0]) if args else 50000
+    elapsed = case._test_modify_rules_large_table(num_rules)
+    print('Merged %d iptables rules in %.3f seconds' % (num_rules, elapsed))
+
+
+@benchmark(test.TestCase)
+def quota(case, args):
+    """quota [--connection <database url>] [workers ...]
+
+    Runs concurrent quota reservations through DbQuotaDriver and
+    CasQuotaDriver and reports the throughput, the p50/p99 latency, the
+    over-quota failures and whether the usages end up consistent.
+
+    Without --connection the benchmark runs against an in-memory sqlite
+    database, which serializes the transactions.  Pass the url of a MySQL
+    or PostgreSQL database holding a synced nova schema to see the row
+    locks at work.
+    """
+    all_workers = [int(arg) for arg in args] or [1, 10, 50]
+    # Leave room for one instance per worker
+    case.flags(quota_instances=max(all_workers),
+               quota_cores=2 * max(all_workers),
+               quota_ram=2048 * max(all_workers))
+    for num_workers in all_workers:
+        for driver_name in sorted(quota_benchmark.DRIVERS):
+            harness = quota_benchmark.QuotaBenchmark(
+                    driver_name,
+                    project_id='%s-%d' % (driver_name, num_workers))
+            report = harness.run(num_workers, 50)
+            print(quota_benchmark.format_report(report))
+
+
+@benchmark(test.NoDBTestCase)
+def limits(case, args):
+    """limits [users ...]
+
+    Replays API requests against the Limiter and SharedLimiter rate limiters
+    and reports the p50/p99 time spent checking each request.  Set
+    memcached_servers in nova.conf to benchmark the SharedLimiter against
+    memcached.
+    """
+    for num_users in [int(arg) for arg in args] or [1, 100, 1000]:
+        for limiter_name in sorted(limits_benchmark.LIMITERS):
+            harness = limits_benchmark.LimitsBenchmark(limiter_name,
+                                                       num_users=num_users)
+            report = harness.run(100000)
+            print(limits_benchmark.format_report(report))
+
+
+@benchmark(test.NoDBTestCase)
+def policy(case, args):
+    """policy [checks]
+
+    Checks the rules of etc/nova/policy.json through the Enforcer and
+    CompiledEnforcer and reports the number of checks per second.
+    """
+    num_checks = int(args[0]) if args else 100000
+    for enforcer_name in sorted(policy_benchmark.ENFORCERS):
+        harness = policy_benchmark.PolicyBenchmark(enforcer_name)
+        report = harness.run(num_checks)
+        print(policy_benchmark.format_report(report))
+
+
+def run(name, args):
+    case_class, func = BENCHMARKS[name]
+    uses_db = case_class.USES_DB
+    if args[:1] == ['--connection']:
+        # NOTE: the workers of a benchmark only run concurrently against a
+        # real database when going through the thread pool.
+        cfg.CONF.set_override('connection', args[1], group='database')
+        cfg.CONF.set_override('use_tpool', True, group='database')
+        uses_db = False
+        args = args[2:]
+
+    class BenchmarkTestCase(case_class):
+        USES_DB = uses_db
+
+        def runTest(self):
+            # NOTE: test cases format debug logs, which would dominate the
+            # time spent in the benchmarked code.
+            logging.getLogger().setLevel(logging.INFO)
+            func(self, args)
+
+    result = unittest.TextTestRunner().run(BenchmarkTestCase())
+    return 0 if result.wasSuccessful() else 1
+
+
+def usage():
+    print(__doc__)
+    for name in sorted(BENCHMARKS):
+        print(inspect.getdoc(BENCHMARKS[name][1]))
+        print('')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] and sys.argv[1] in BENCHMARKS:
+        sys.exit(run(sys.argv[1], sys.argv[2:]))
+    usage()
+    sys.exit(2)
@@ -125,6 +125,7 @@ class InstanceMetadata():
 
         # The default value of mimeType is set to MIME_TYPE_TEXT_PLAIN
         self.set_mimetype(MIME_TYPE_TEXT_PLAIN)
+        self.md_volatile = False
         self.instance = instance
         self.extra_md = extra_md
 
@@ -197,6 +198,9 @@ class InstanceMetadata():
 
         self.route_configuration = None
 
+        # { path : (body, mime type) } of the responses rendered so far
+        self.rendered = {}
+
     def _route_configuration(self):
         if self.route_configuration:
             return self.route_configuration
@@ -214,6 +218,10 @@ class InstanceMetadata():
     def set_mimetype(self, mime_type):
         self.md_mimetype = mime_type
 
+    def set_volatile(self):
+        """Mark the data being looked up as different for every request."""
+        self.md_volatile = True
+
     def get_mimetype(self):
         return self.md_mimetype
 
@@ -326,6 +334,7 @@ class InstanceMetadata():
 
         if self._check_os_version(GRIZZLY, version):
             metadata['random_seed'] = base64.b64encode(os.urandom(512))
+            self.set_volatile()
 
         self.set_mimetype(MIME_TYPE_APPLICATION_JSON)
         return json.dumps(metadata)
@@ -403,6 +412,7 @@ class InstanceMetadata():
                 # NOTE(vish): don't show versions that are in the future
                 today = timeutils.utcnow().strftime("%Y-%m-%d")
                 versions = [v for v in OPENSTACK_VERSIONS if v <= today]
+                self.set_volatile()
                 if OPENSTACK_VERSIONS != versions:
                     LOG.debug("future versions %s hidden in version list",
                               [v for v in OPENSTACK_VERSIONS
@@ -422,6 +432,26 @@ class InstanceMetadata():
 
         return data
 
+    def render(self, path):
+        """Return the response to a request for path.
+
+        The response is a (body, mime type) tuple, or a handler to call
+        with the request for paths which need it. Responses which are the
+        same for every request are kept and served as they are afterwards.
+        """
+        response = self.rendered.get(path)
+        if response is not None:
+            return response
+
+        self.md_volatile = False
+        data = self.lookup(path)
+        if callable(data):
+            return data
+        response = (ec2_md_print(data), self.get_mimetype())
+        if not self.md_volatile:
+            self.rendered[path] = response
+        return response
+
     def metadata_for_config_drive(self):
         """Yields (path, value) tuples for metadata elements."""
         # EC2 style metadata
@@ -28,15 +28,22 @@ from nova.api.metadata import base
 from nova import conductor
 from nova import exception
 from nova.openstack.common.gettextutils import _
+from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import memorycache
 from nova import wsgi
 
-CACHE_EXPIRATION = 15  # in seconds
-
 CONF = cfg.CONF
 CONF.import_opt('use_forwarded_for', 'nova.api.auth')
 
+metadata_opts = [
+    cfg.IntOpt('metadata_cache_expiration',
+               default=15,
+               help='Time in seconds to cache the metadata of an instance, '
+                    '0 to disable metadata caching entirely. The responses '
+                    'rendered from the metadata are cached along with it'),
+]
+
 metadata_proxy_opts = [
     cfg.BoolOpt(
         'service_neutron_metadata_proxy',
@@ -49,6 +56,7 @@ metadata_proxy_opts = [
          help='Shared secret to validate proxies Neutron metadata requests')
 ]
 
+CONF.register_opts(metadata_opts)
 CONF.register_opts(metadata_proxy_opts)
 
 LOG = logging.getLogger(__name__)
@@ -61,39 +69,41 @@ class MetadataRequestHandler(wsgi.Application):
         self._cache = memorycache.get_client()
         self.conductor_api = conductor.API()
 
-    def get_metadata_by_remote_address(self, address):
-        if not address:
-            raise exception.FixedIpNotFoundForAddress(address=address)
-
-        cache_key = 'metadata-%s' % address
+    def _get_metadata(self, cache_key, get_metadata, *args):
         data = self._cache.get(cache_key)
         if data:
             return data
 
-        try:
-            data = base.get_metadata_by_address(self.conductor_api, address)
-        except exception.NotFound:
-            return None
+        # NOTE: concurrent misses for the same instance, typically a guest
+        # fetching many paths at boot, wait for the first one to build the
+        # metadata instead of building it again.
+        with lockutils.lock(cache_key):
+            data = self._cache.get(cache_key)
+            if data:
+                return data
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+            try:
+                data = get_metadata(self.conductor_api, *args)
+            except exception.NotFound:
+                return None
 
-        return data
+            if CONF.metadata_cache_expiration > 0:
+                self._cache.set(cache_key, data,
+                                CONF.metadata_cache_expiration)
 
-    def get_metadata_by_instance_id(self, instance_id, address):
-        cache_key = 'metadata-%s' % instance_id
-        data = self._cache.get(cache_key)
-        if data:
-            return data
+        return data
 
-        try:
-            data = base.get_metadata_by_instance_id(self.conductor_api,
-                                                    instance_id, address)
-        except exception.NotFound:
-            return None
+    def get_metadata_by_remote_address(self, address):
+        if not address:
+            raise exception.FixedIpNotFoundForAddress(address=address)
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        return self._get_metadata('metadata-%s' % address,
+                                  base.get_metadata_by_address, address)
 
-        return data
+    def get_metadata_by_instance_id(self, instance_id, address):
+        return self._get_metadata('metadata-%s' % instance_id,
+                                  base.get_metadata_by_instance_id,
+                                  instance_id, address)
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
@@ -117,16 +127,14 @@ class MetadataRequestHandler(wsgi.Application):
             raise webob.exc.HTTPNotFound()
 
         try:
-            data = meta_data.lookup(req.path_info)
+            data = meta_data.render(req.path_info)
         except base.InvalidMetadataPath:
             raise webob.exc.HTTPNotFound()
 
         if callable(data):
             return data(req, meta_data)
 
-        resp = base.ec2_md_print(data)
-        req.response.body = resp
-        req.response.content_type = meta_data.get_mimetype()
+        req.response.body, req.response.content_type = data
         return req.response
 
     def _handle_remote_ip_request(self, req):
@@ -28,16 +28,20 @@ in your environment to assess your capabilities and multiply out to get
 figures.
 
 NOTE: As the rate-limiting here is done in memory, this only works per
-process (each process will have its own rate limiting counter).
+process (each process will have its own rate limiting counter).  Use the
+`SharedLimiter` with memcached_servers set to share the counters between
+the API workers.
 """
 
 import collections
 import copy
+import hashlib
 import httplib
 import math
 import re
 import time
 
+from oslo.config import cfg
 import webob.dec
 import webob.exc
 
@@ -47,13 +51,23 @@ from nova.api.openstack import xmlutil
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import quota
 from nova import utils
 from nova import wsgi as base_wsgi
 
 
+CONF = cfg.CONF
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
 QUOTAS = quota.QUOTAS
 LIMITS_PREFIX = "limits."
+# NOTE: backreferences and named groups would refer to the groups of a
+# combined regex and inline flags would apply to all of it, so regexes with
+# any of them are not combined.
+UNCOMBINABLE_RE = re.compile(r'\\[1-9]|\(\?[^:]')
+# Python 2 only compiles regexes with up to 100 groups, including group 0.
+MAX_COMBINED_GROUPS = 99
 
 
 limits_nsmap = {None: xmlutil.XMLNS_COMMON_V10, 'atom': xmlutil.XMLNS_ATOM}
@@ -171,6 +185,13 @@ class Limit(object):
         if self.verb != verb or not re.match(self.regex, url):
             return
 
+        return self.record()
+
+    def record(self):
+        """Record a request matching this limit.
+
+        @return: delay (in seconds) before the request is allowed, or None
+        """
         now = self._get_time()
 
         if self.last_request is None:
@@ -232,6 +253,59 @@ DEFAULT_LIMITS = [
 ]
 
 
+class LimitMatcher(object):
+    """Matches requests against a list of limits at once.
+
+    The regexes of the limits of each verb are compiled into a single
+    regex, where each limit is an optional lookahead setting an empty group
+    when its regex matches.  The regexes of a verb are matched one by one
+    when they can't be combined.
+    """
+
+    def __init__(self, limits):
+        """Initialize the new `LimitMatcher`.
+
+        @param limits: List of `Limit` objects
+        """
+        indexes = collections.defaultdict(list)
+        for index, limit in enumerate(limits):
+            indexes[limit.verb].append(index)
+
+        self._matchers = {}
+        for verb, verb_indexes in indexes.items():
+            regexes = [(index, re.compile(limits[index].regex))
+                       for index in verb_indexes]
+            num_groups = sum(regex.groups + 1 for index, regex in regexes)
+            if (num_groups > MAX_COMBINED_GROUPS or
+                    any(UNCOMBINABLE_RE.search(limits[index].regex)
+                        for index in verb_indexes)):
+                self._matchers[verb] = regexes
+                continue
+            pattern = ''.join('(?:(?=(?:%s)(?P<limit%d>)))?' %
+                              (limits[index].regex, index)
+                              for index in verb_indexes)
+            try:
+                regex = re.compile(pattern)
+            except (re.error, AssertionError):
+                self._matchers[verb] = regexes
+                continue
+            groups = [(regex.groupindex['limit%d' % index] - 1, index)
+                      for index in verb_indexes]
+            self._matchers[verb] = (regex, groups)
+
+    def match(self, verb, url):
+        """Return the indexes of the limits matching the verb and url."""
+        matcher = self._matchers.get(verb)
+        if matcher is None:
+            return []
+        if isinstance(matcher, list):
+            return [index for index, regex in matcher if regex.match(url)]
+        regex, groups = matcher
+        matched = regex.match(url).groups()
+        return [index for group, index in groups
+                if matched[group] is not None]
+
+
 class RateLimitingMiddleware(base_wsgi.Middleware):
     """Rate-limits requests passing through this middleware. All limit
     information is stored in memory for this implementation.
@@ -303,6 +377,7 @@ class Limiter(object):
         """
         self.limits = copy.deepcopy(limits)
         self.levels = collections.defaultdict(lambda: copy.deepcopy(limits))
+        self._matchers = {}
 
         # Pick up any per-user limit information
         for key, value in kwargs.items():
@@ -321,8 +396,10 @@ class Limiter(object):
         """
         delays = []
 
-        for limit in self.levels[username]:
-            delay = limit(verb, url)
+        limits = self.levels[username]
+        for index in self._get_matcher(limits).match(verb, url):
+            limit = limits[index]
+            delay = self._record(limit, username)
             if delay:
                 delays.append((delay, limit.error_message))
 
@@ -332,6 +409,23 @@ class Limiter(object):
 
         return None, None
 
+    def _get_matcher(self, limits):
+        """Return the `LimitMatcher` for a list of limits, shared by the
+        users having the same limits.
+        """
+        key = tuple((limit.verb, limit.regex) for limit in limits)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = self._matchers[key] = LimitMatcher(limits)
+        return matcher
+
+    def _record(self, limit, username):
+        """Record a request of the user matching the limit.
+
+        @return: delay (in seconds) before the request is allowed, or None
+        """
+        return limit.record()
+
     # Note: This method gets called before the class is instantiated,
     # so this must be either a static method or a class method.  It is
     # used to develop a list of limits to feed to the constructor.  We
@@ -392,6 +486,76 @@ class Limiter(object):
         return result
 
 
+class SharedLimiter(Limiter):
+    """Rate-limit checking class which keeps the limit levels in memcached,
+    so that the API workers using the same memcached servers share them.
+
+    Without memcached_servers the levels are kept in memory, like
+    `Limiter` does.
+    """
+
+    # Number of attempts at updating a level changed concurrently
+    RETRIES = 3
+
+    def __init__(self, limits, **kwargs):
+        """Initialize the new `SharedLimiter`.
+
+        @param limits: List of `Limit` objects
+        """
+        super(SharedLimiter, self).__init__(limits, **kwargs)
+        self._cache = None
+        self._cas = False
+        if CONF.memcached_servers:
+            self._cache = memorycache.get_client()
+            # NOTE: python-memcached only remembers the cas ids from gets()
+            # when asked to.
+            self._cas = hasattr(self._cache, 'cas')
+            if self._cas:
+                self._cache.cache_cas = True
+
+    @staticmethod
+    def _key(limit, username):
+        definition = '%s %s %s %s' % (limit.verb, limit.regex, limit.value,
+                                      limit.unit)
+        key = '%s %s' % (username, definition)
+        return 'limits-%s' % hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def _record(self, limit, username):
+        if self._cache is None:
+            return limit.record()
+
+        key = self._key(limit, username)
+        for attempt in range(self.RETRIES):
+            if self._cas:
+                level = self._cache.gets(key)
+            else:
+                level = self._cache.get(key)
+            if level is None:
+                limit.water_level, limit.last_request = 0, None
+            else:
+                water_level, last_request = level.split()
+                limit.water_level = float(water_level)
+                limit.last_request = float(last_request)
+
+            delay = limit.record()
+            if delay:
+                # A rejected request leaves the level unchanged
+                return delay
+
+            new_level = '%r %r' % (limit.water_level, limit.last_request)
+            # The level is empty again after a whole unit of time
+            if level is None:
+                stored = self._cache.add(key, new_level, time=limit.unit)
+            elif self._cas:
+                stored = self._cache.cas(key, new_level, time=limit.unit)
+            else:
+                stored = self._cache.set(key, new_level, time=limit.unit)
+            if stored:
+                return
+        # NOTE: let the request through rather than fail it when the level
+        # keeps changing under us.
+
+
 class WsgiLimiter(object):
     """Rate-limit checking from a WSGI application. Uses an in-memory
     `Limiter`.
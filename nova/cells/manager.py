@@ -16,9 +16,12 @@
 """
 Cells Service Manager
 """
+import collections
+import copy
 import datetime
 import time
 
+from eventlet import greenthread
 from oslo.config import cfg
 from oslo import messaging as oslo_messaging
 
@@ -45,7 +48,15 @@ cell_manager_opts = [
                         "or deleted to continue to update cells"),
         cfg.IntOpt("instance_update_num_instances",
                 default=1,
-                help="Number of instances to update per periodic task run")
+                help="Number of instances to update per periodic task run"),
+        cfg.FloatOpt("instance_update_sync_delay",
+                default=0,
+                help="Number of seconds to collect instance updates for "
+                        "before sending them to parent cells in a single "
+                        "message. Updates to the same instance are merged "
+                        "and only fields changed since the last update sent "
+                        "are included. 0 sends every update on its own. "
+                        "Parent cells must be upgraded before enabling this.")
 ]
 
 
@@ -55,6 +66,10 @@ CONF.register_opts(cell_manager_opts, group='cells')
 
 LOG = logging.getLogger(__name__)
 
+# Number of instances to remember the last update sent to parent cells for,
+# so that the next update of one of them only needs to carry the changes.
+_MAX_SENT_INSTANCE_UPDATES = 1000
+
 
 class CellsManager(manager.Manager):
     """The nova-cells manager class.  This class defines RPC
@@ -93,6 +108,8 @@ class CellsManager(manager.Manager):
                 CONF.cells.driver)
         self.driver = cells_driver_cls()
         self.instances_to_heal = iter([])
+        self._pending_instance_updates = {}
+        self._sent_instance_updates = collections.OrderedDict()
 
     def post_start_hook(self):
         """Have the driver start its servers for inter-cell communication.
@@ -127,9 +144,9 @@ class CellsManager(manager.Manager):
 
         On every run of the periodic task, we will attempt to sync
         'CONF.cells.instance_update_num_instances' number of instances.
-        When we get the list of instances, we shuffle them so that multiple
-        nova-cells services aren't attempting to sync the same instances
-        in lockstep.
+        The instances are loaded in batches, and we shuffle each batch so
+        that multiple nova-cells services aren't attempting to sync the
+        same instances in lockstep.
 
         If CONF.cells.instance_update_at_threshold is set, only attempt
         to sync instances that have been updated recently.  The CONF
@@ -189,7 +206,10 @@ class CellsManager(manager.Manager):
         if instance['deleted']:
             self.instance_destroy_at_top(ctxt, instance)
         else:
-            self.instance_update_at_top(ctxt, instance)
+            # Always send the full instance so that healing corrects any
+            # update the parent cells missed.
+            self._sent_instance_updates.pop(instance['uuid'], None)
+            self.msg_runner.instance_update_at_top(ctxt, instance)
 
     def build_instances(self, ctxt, build_inst_kwargs):
         """Pick a cell (possibly ourselves) to build new instance(s) and
@@ -213,11 +233,70 @@ class CellsManager(manager.Manager):
             return response.value_or_raise()
 
     def instance_update_at_top(self, ctxt, instance):
-        """Update an instance at the top level cell."""
-        self.msg_runner.instance_update_at_top(ctxt, instance)
+        """Update an instance at the top level cell.
+
+        If CONF.cells.instance_update_sync_delay is set, the update is sent
+        later along with the other updates made in the meantime.
+        """
+        delay = CONF.cells.instance_update_sync_delay
+        if delay <= 0:
+            self.msg_runner.instance_update_at_top(ctxt, instance)
+            return
+        scheduled = bool(self._pending_instance_updates)
+        self._pending_instance_updates[instance['uuid']] = instance
+        if not scheduled:
+            greenthread.spawn_after(delay, self._send_instance_updates)
+
+    def _get_instance_changes(self, instance):
+        """Return the fields of instance that changed since the last
+        update sent for it, or the whole instance if none was sent.
+        """
+        last = self._sent_instance_updates.get(instance['uuid'])
+        if last is None:
+            return copy.deepcopy(instance)
+        changes = dict((key, copy.deepcopy(value))
+                       for key, value in instance.iteritems()
+                       if key not in last or last[key] != value)
+        if changes:
+            changes['uuid'] = instance['uuid']
+        return changes
+
+    def _send_instance_updates(self):
+        """Send the pending instance updates to parent cells in one
+        message.
+        """
+        pending = self._pending_instance_updates
+        self._pending_instance_updates = {}
+        instances = []
+        for instance in pending.itervalues():
+            changes = self._get_instance_changes(instance)
+            if changes:
+                instances.append(changes)
+        if not instances:
+            return
+        ctxt = context.get_admin_context()
+        try:
+            failed = self.msg_runner.instance_update_many_at_top(ctxt,
+                                                                 instances)
+        except Exception:
+            LOG.exception(_("Failed to send %d instance updates to parent "
+                            "cells"), len(instances))
+            failed = pending
+        # NOTE: The changes sent for an instance are only relative to the
+        # last update the top level cell applied, so the next update of an
+        # instance which failed is sent in full.
+        for instance_uuid, instance in pending.iteritems():
+            self._sent_instance_updates.pop(instance_uuid, None)
+            if instance_uuid not in failed:
+                self._sent_instance_updates[instance_uuid] = instance
+        while len(self._sent_instance_updates) > _MAX_SENT_INSTANCE_UPDATES:
+            self._sent_instance_updates.popitem(last=False)
 
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
+        # Don't let a pending update recreate the instance at the top.
+        self._pending_instance_updates.pop(instance['uuid'], None)
+        self._sent_instance_updates.pop(instance['uuid'], None)
         self.msg_runner.instance_destroy_at_top(ctxt, instance)
 
     def instance_delete_everywhere(self, ctxt, instance, delete_type):
@@ -1000,12 +1000,11 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             if expected is not None:
                 instance_info['expected_task_state'] = expected
 
-    def instance_update_at_top(self, message, instance, **kwargs):
-        """Update an instance in the DB if we're a top level cell."""
-        if not self._at_the_top():
-            return
-        instance_uuid = instance['uuid']
-
+    def _prepare_instance_update_at_top(self, message, instance):
+        """Turn an instance update from a child cell into values for
+        instance_update().  Returns the info_cache to update separately,
+        if any.
+        """
         # Remove things that we can't update in the top level cells.
         # 'metadata' is only updated in the API cell, so don't overwrite
         # it based on what child cells say.  Make sure to update
@@ -1028,11 +1027,34 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             # instance_update.
             instance['system_metadata'] = utils.instance_sys_meta(instance)
 
+        self._apply_expected_states(instance)
+        return info_cache
+
+    def _update_info_cache_at_top(self, ctxt, instance_uuid, info_cache):
+        network_info = info_cache.get('network_info')
+        if isinstance(network_info, list):
+            if not isinstance(network_info, network_model.NetworkInfo):
+                network_info = network_model.NetworkInfo.hydrate(
+                        network_info)
+            info_cache['network_info'] = network_info.json()
+        try:
+            self.db.instance_info_cache_update(
+                    ctxt, instance_uuid, info_cache)
+        except exception.InstanceInfoCacheNotFound:
+            # Can happen if we try to update a deleted instance's
+            # network information.
+            pass
+
+    def instance_update_at_top(self, message, instance, **kwargs):
+        """Update an instance in the DB if we're a top level cell."""
+        if not self._at_the_top():
+            return
+        instance_uuid = instance['uuid']
+        info_cache = self._prepare_instance_update_at_top(message, instance)
+
         LOG.debug("Got update for instance: %(instance)s",
                   {'instance': instance}, instance_uuid=instance_uuid)
 
-        self._apply_expected_states(instance)
-
         # It's possible due to some weird condition that the instance
         # was already set as deleted... so we'll attempt to update
         # it with permissions that allows us to read deleted.
@@ -1045,19 +1067,51 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
                 # if we actually want this code to remain..
                 self.db.instance_create(message.ctxt, instance)
         if info_cache:
-            network_info = info_cache.get('network_info')
-            if isinstance(network_info, list):
-                if not isinstance(network_info, network_model.NetworkInfo):
-                    network_info = network_model.NetworkInfo.hydrate(
-                            network_info)
-                info_cache['network_info'] = network_info.json()
-            try:
-                self.db.instance_info_cache_update(
-                        message.ctxt, instance_uuid, info_cache)
-            except exception.InstanceInfoCacheNotFound:
-                # Can happen if we try to update a deleted instance's
-                # network information.
-                pass
+            self._update_info_cache_at_top(message.ctxt, instance_uuid,
+                                           info_cache)
+
+    def instance_update_many_at_top(self, message, instances, **kwargs):
+        """Update several instances in the DB if we're a top level cell.
+
+        Each instance is either a full instance or only the fields that
+        changed since the last update sent for it.  Returns the uuids of
+        the instances which could not be updated.
+        """
+        if not self._at_the_top():
+            return []
+        updates = {}
+        info_caches = {}
+        for instance in instances:
+            instance_uuid = instance.pop('uuid')
+            info_cache = self._prepare_instance_update_at_top(message,
+                                                              instance)
+            if info_cache:
+                info_caches[instance_uuid] = info_cache
+            updates[instance_uuid] = instance
+
+        LOG.debug("Got update for %d instances", len(updates))
+
+        failed = []
+        with utils.temporary_mutation(message.ctxt, read_deleted="yes"):
+            failures = self.db.instance_update_many(message.ctxt, updates)
+            for instance_uuid, exc in failures.iteritems():
+                values = updates[instance_uuid]
+                # NOTE: created_at never changes, so only a full instance
+                # carries it.  There is nothing to create an instance from
+                # if only some of its fields were sent.
+                if (isinstance(exc, exception.NotFound) and
+                        'created_at' in values):
+                    values['uuid'] = instance_uuid
+                    self.db.instance_create(message.ctxt, values)
+                else:
+                    LOG.warn(_("Failed to update instance at top: %s"),
+                             exc, instance_uuid=instance_uuid)
+                    info_caches.pop(instance_uuid, None)
+                    failed.append(instance_uuid)
+        for instance_uuid, info_cache in info_caches.iteritems():
+            self._update_info_cache_at_top(message.ctxt, instance_uuid,
+                                           info_cache)
+        return failed
 
     def instance_destroy_at_top(self, message, instance, **kwargs):
         """Destroy an instance from the DB if we're a top level cell."""
@@ -1431,6 +1485,20 @@ class MessageRunner(object):
                                     run_locally=False)
         message.process()
 
+    def instance_update_many_at_top(self, ctxt, instances):
+        """Update several instances at the top level cell.
+
+        Returns the set of uuids of the instances which could not be
+        updated.  Raises if the top level cell could not be reached.
+        """
+        message = _BroadcastMessage(self, ctxt, 'instance_update_many_at_top',
+                                    dict(instances=instances), 'up',
+                                    run_locally=False, need_response=True)
+        failed = set()
+        for response in message.process():
+            failed.update(response.value_or_raise())
+        return failed
+
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
         message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
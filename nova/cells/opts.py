@@ -53,6 +53,10 @@ cells_opts = [
     cfg.IntOpt('bandwidth_update_interval',
                 default=600,
                 help='Seconds between bandwidth updates for cells.'),
+    cfg.IntOpt('instance_sync_batch_size',
+               default=1000,
+               help='Number of instances to load from the database at a '
+                    'time when syncing instances with parent cells.'),
 ]
 
 CONF = cfg.CONF
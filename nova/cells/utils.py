@@ -18,8 +18,13 @@ Cells Utility Methods
 """
 import random
 
+from oslo.config import cfg
+
 from nova import db
 
+CONF = cfg.CONF
+CONF.import_opt('instance_sync_batch_size', 'nova.cells.opts', group='cells')
+
 # Separator used between cell names for the 'full cell name' and routing
 # path
 PATH_CELL_SEP = '!'
@@ -34,24 +39,32 @@ def get_instances_to_sync(context, updated_since=None, project_id=None,
     optionally be shuffled for periodic updates so that multiple
     cells services aren't self-healing the same instances in nearly
     lockstep.
+
+    Instances are loaded from the database in batches of
+    CONF.cells.instance_sync_batch_size, in the order of their ids, and
+    only when the previous batch has been consumed.  When shuffling, each
+    batch is shuffled on its own.
     """
-    filters = {}
-    if updated_since is not None:
-        filters['changes-since'] = updated_since
-    if project_id is not None:
-        filters['project_id'] = project_id
-    if not deleted:
-        filters['deleted'] = False
-    # Active instances first.
-    instances = db.instance_get_all_by_filters(
-            context, filters, 'deleted', 'asc')
-    if shuffle:
-        random.shuffle(instances)
-    for instance in instances:
-        if uuids_only:
-            yield instance['uuid']
-        else:
-            yield instance
+    batch_size = CONF.cells.instance_sync_batch_size
+    columns_to_join = [] if uuids_only else None
+    cursor = None
+    while True:
+        instances = db.instance_get_all_by_updated_at(
+                context, updated_since=updated_since, cursor=cursor,
+                limit=batch_size, project_id=project_id, deleted=deleted,
+                columns_to_join=columns_to_join)
+        if not instances:
+            return
+        cursor = instances[-1]['id']
+        if shuffle:
+            random.shuffle(instances)
+        for instance in instances:
+            if uuids_only:
+                yield instance['uuid']
+            else:
+                yield instance
+        if len(instances) < batch_size:
+            return
 
 
 def cell_with_item(cell_name, item):
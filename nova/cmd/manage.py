@@ -919,6 +919,65 @@ class DbCommands(object):
         admin_context = context.get_admin_context()
         db.archive_deleted_rows(admin_context, max_rows)
 
+    @args('--max_number', metavar='<number>',
+            help='Maximum number of instances to migrate')
+    def migrate_flavor_data(self, max_number=None):
+        """Convert the flavors stored in the system_metadata of up to
+        max_number instances from instance_type_* keys to compact records.
+        """
+        if max_number is not None:
+            max_number = int(max_number)
+            if max_number < 0:
+                print(_("Must supply a positive value for max_number"))
+                return(1)
+        admin_context = context.get_admin_context()
+        keys = ['%sinstance_type_id' % prefix
+                for prefix in ('', 'old_', 'new_')]
+        migrated = 0
+        total = 0
+        marker = None
+        while max_number is None or migrated < max_number:
+            limit = None if max_number is None else max_number - migrated
+            # NOTE: the marker moves past the instances whose flavors can
+            # not be migrated, so that they are not selected again.
+            instance_uuids = db.instance_system_metadata_get_instance_uuids(
+                admin_context, keys, limit=limit, marker=marker)
+            if not instance_uuids:
+                break
+            total += len(instance_uuids)
+            marker = instance_uuids[-1]
+            for instance_uuid in instance_uuids:
+                if self._migrate_instance_flavor_data(admin_context,
+                                                      instance_uuid):
+                    migrated += 1
+            if limit is None:
+                break
+        print(_("%(migrated)d of %(total)d instances migrated") %
+              {'migrated': migrated, 'total': total})
+
+    @staticmethod
+    def _migrate_instance_flavor_data(context, instance_uuid):
+        try:
+            instance = objects.Instance.get_by_uuid(
+                context, instance_uuid, expected_attrs=['system_metadata'])
+        except exception.InstanceNotFound:
+            return False
+        sys_meta = dict(instance.system_metadata)
+        if not flavors.migrate_flavor_info(sys_meta):
+            return False
+        instance.system_metadata = sys_meta
+        # NOTE: resizes change the flavors in the system_metadata along with
+        # the task or vm state, so expecting both states to be unchanged
+        # leaves only the migrated keys different from the stored ones.
+        try:
+            instance.save(expected_vm_state=[instance.vm_state],
+                          expected_task_state=[None])
+        except (exception.UnexpectedTaskStateError,
+                exception.UnexpectedVMStateError,
+                exception.InstanceNotFound):
+            return False
+        return True
+
 
 class FlavorCommands(object):
     """Class for managing flavors.
@@ -562,6 +562,11 @@ class API(base.Base):
         }
 
     def _apply_instance_name_template(self, context, instance, index):
+        self._populate_instance_name_template(instance, index)
+        instance.save()
+        return instance
+
+    def _populate_instance_name_template(self, instance, index):
         params = {
             'uuid': instance['uuid'],
             'name': instance['display_name'],
@@ -577,8 +582,6 @@ class API(base.Base):
         instance.display_name = new_name
         if not instance.get('hostname', None):
             instance.hostname = utils.sanitize_hostname(new_name)
-        instance.save()
-        return instance
 
     def _check_config_drive(self, config_drive):
         if config_drive:
@@ -819,15 +822,21 @@ class API(base.Base):
         LOG.debug("Going to run %s instances..." % num_instances)
         instances = []
         try:
-            for i in xrange(num_instances):
+            if num_instances > 1:
+                self._create_db_entries_for_new_instances(
+                        context, instance_type, boot_meta, base_options,
+                        security_groups, block_device_mapping,
+                        num_instances, instances)
+            else:
                 instance = objects.Instance()
                 instance.update(base_options)
                 instance = self.create_db_entry_for_new_instance(
                         context, instance_type, boot_meta, instance,
                         security_groups, block_device_mapping,
-                        num_instances, i)
-
+                        num_instances, 0)
                 instances.append(instance)
+
+            for instance in instances:
                 # send a state update notification for the initial create to
                 # show it going from non-existent to BUILDING
                 notifications.send_update_with_states(context, instance, None,
@@ -1278,6 +1287,43 @@ class API(base.Base):
 
         return instance
 
+    def _create_db_entries_for_new_instances(self, context, instance_type,
+            image, base_options, security_group, block_device_mapping,
+            num_instances, instances):
+        """Create the DB entries for several new instances at once.
+
+        This is the multi-instance equivalent of
+        create_db_entry_for_new_instance(): all instances and their
+        related rows are created in a single database transaction. The
+        created instances are appended to instances, so that the caller
+        can clean them up if a later step fails.
+        """
+        new_instances = []
+        for index in xrange(num_instances):
+            instance = objects.Instance()
+            instance.update(base_options)
+            self._populate_instance_for_create(instance, image, index,
+                                               security_group, instance_type)
+            self._populate_instance_names(instance, num_instances)
+            # NOTE: The UUID is generated before the DB entry is created,
+            # so multi_instance_display_name_template can be applied
+            # without saving each instance a second time.
+            self._populate_instance_name_template(instance, index)
+            self._populate_instance_shutdown_terminate(instance, image,
+                                                       block_device_mapping)
+            new_instances.append(instance)
+
+        self.security_group_api.ensure_default(context)
+        instances.extend(objects.InstanceList.bulk_create(context,
+                                                          new_instances))
+
+        for instance in instances:
+            self._validate_bdm(
+                context, instance, instance_type, block_device_mapping)
+            self._update_block_device_mapping(
+                context, instance_type, instance['uuid'],
+                block_device_mapping)
+
     def _check_create_policies(self, context, availability_zone,
             requested_networks, block_device_mapping):
         """Check policies for create()."""
@@ -29,6 +29,7 @@ from nova import db
 from nova import exception
 from nova.openstack.common.db import exception as db_exc
 from nova.openstack.common.gettextutils import _
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import strutils
 from nova.pci import pci_request
@@ -39,6 +40,15 @@ flavor_opts = [
                default='m1.small',
                help='Default flavor to use for the EC2 API only. The Nova API '
                'does not support a default flavor.'),
+    cfg.BoolOpt('compact_flavor_info',
+                default=False,
+                help='Store the flavor of an instance in system_metadata as '
+                     'a single compact record per flavor, instead of one '
+                     'instance_type_* key per flavor property. Records in '
+                     'either format are always read, so this should only be '
+                     'enabled once all services understand the compact '
+                     'format. Existing instances can be converted with '
+                     '"nova-manage db migrate_flavor_data".'),
 ]
 
 CONF = cfg.CONF
@@ -82,6 +92,17 @@ system_metadata_flavor_props = {
     'vcpu_weight': _int_or_none,
     }
 
+# The order of the flavor properties in a compact flavor record. New
+# properties must only ever be appended.
+_FLAVOR_INFO_KEYS = ('id', 'name', 'memory_mb', 'vcpus', 'root_gb',
+                     'ephemeral_gb', 'flavorid', 'swap', 'rxtx_factor',
+                     'vcpu_weight')
+# The size of the value column of instance_system_metadata. Flavors which
+# do not fit in a compact record are stored as separate keys instead.
+_FLAVOR_INFO_MAX_LENGTH = 255
+_MAX_DECODED_FLAVOR_INFO = 1000
+_decoded_flavor_info = {}
+
 
 def create(name, memory, vcpus, root_gb, ephemeral_gb=0, flavorid=None,
            swap=0, rxtx_factor=1.0, is_public=True):
@@ -277,33 +298,96 @@ def remove_flavor_access(flavorid, projectid, ctxt=None):
     return db.flavor_access_remove(ctxt, flavorid, projectid)
 
 
+def _flavor_info_key(prefix):
+    return '%sflavor_info' % prefix
+
+
+def _encode_flavor_info(instance_type):
+    """Encode instance_type as a compact flavor record, or return None if
+    the record would be too long to be stored in system_metadata.
+    """
+    flavor_info = jsonutils.dumps([instance_type[key]
+                                   for key in _FLAVOR_INFO_KEYS])
+    if len(flavor_info) > _FLAVOR_INFO_MAX_LENGTH:
+        return None
+    return flavor_info
+
+
+def _decode_flavor_info(flavor_info):
+    """Decode a compact flavor record.
+
+    Instances mostly share a handful of flavors, so the decoded records are
+    memoized and a copy is returned.
+    """
+    instance_type = _decoded_flavor_info.get(flavor_info)
+    if instance_type is None:
+        values = jsonutils.loads(flavor_info)
+        instance_type = {}
+        for key, value in zip(_FLAVOR_INFO_KEYS, values):
+            instance_type[key] = system_metadata_flavor_props[key](value)
+        if len(_decoded_flavor_info) >= _MAX_DECODED_FLAVOR_INFO:
+            _decoded_flavor_info.clear()
+        _decoded_flavor_info[flavor_info] = instance_type
+    return dict(instance_type)
+
+
 def extract_flavor(instance, prefix=''):
     """Create an InstanceType-like object from instance's system_metadata
     information.
+
+    The flavor may be stored either as a compact record or as separate
+    [prefix]instance_type_[key] keys.
     """
 
-    instance_type = {}
     sys_meta = utils.instance_sys_meta(instance)
+    flavor_info = sys_meta.get(_flavor_info_key(prefix))
+    if flavor_info is not None:
+        return _decode_flavor_info(flavor_info)
+
+    instance_type = {}
     for key, type_fn in system_metadata_flavor_props.items():
         type_key = '%sinstance_type_%s' % (prefix, key)
         instance_type[key] = type_fn(sys_meta[type_key])
     return instance_type
 
 
+def _save_flavor_keys(metadata, instance_type, prefix):
+    metadata.pop(_flavor_info_key(prefix), None)
+    for key in system_metadata_flavor_props.keys():
+        to_key = '%sinstance_type_%s' % (prefix, key)
+        metadata[to_key] = instance_type[key]
+
+
+def _save_flavor_info_record(metadata, instance_type, prefix):
+    """Save instance_type as a compact record, replacing any separate
+    keys. Returns False if it does not fit in a compact record.
+    """
+    flavor_info = _encode_flavor_info(instance_type)
+    if flavor_info is None:
+        return False
+    for key in system_metadata_flavor_props.keys():
+        metadata.pop('%sinstance_type_%s' % (prefix, key), None)
+    metadata[_flavor_info_key(prefix)] = flavor_info
+    return True
+
+
 def save_flavor_info(metadata, instance_type, prefix=''):
     """Save properties from instance_type into instance's system_metadata,
     in the format of:
 
       [prefix]instance_type_[key]
 
+    or, if compact_flavor_info is enabled, as a single [prefix]flavor_info
+    record.
+
     This can be used to update system_metadata in place from a type, as well
     as stash information about another instance_type for later use (such as
     during resize).
     """
 
-    for key in system_metadata_flavor_props.keys():
-        to_key = '%sinstance_type_%s' % (prefix, key)
-        metadata[to_key] = instance_type[key]
+    if not (CONF.compact_flavor_info and
+            _save_flavor_info_record(metadata, instance_type, prefix)):
+        _save_flavor_keys(metadata, instance_type, prefix)
     pci_request.save_flavor_pci_info(metadata, instance_type, prefix)
     return metadata
 
@@ -313,14 +397,33 @@ def delete_flavor_info(metadata, *prefixes):
     by prefix.
     """
 
-    for key in system_metadata_flavor_props.keys():
-        for prefix in prefixes:
+    for prefix in prefixes:
+        if metadata.pop(_flavor_info_key(prefix), None) is not None:
+            continue
+        for key in system_metadata_flavor_props.keys():
             to_key = '%sinstance_type_%s' % (prefix, key)
             del metadata[to_key]
     pci_request.delete_flavor_pci_info(metadata, *prefixes)
     return metadata
 
 
+def migrate_flavor_info(metadata):
+    """Convert the flavors stored as separate keys in an instance's
+    system_metadata to compact records, in place.
+
+    Returns the number of flavors which were converted.
+    """
+
+    migrated = 0
+    for prefix in ('', 'old_', 'new_'):
+        if '%sinstance_type_id' % prefix not in metadata:
+            continue
+        instance_type = extract_flavor({'system_metadata': metadata}, prefix)
+        if _save_flavor_info_record(metadata, instance_type, prefix):
+            migrated += 1
+    return migrated
+
+
 def validate_extra_spec_keys(key_names_list):
     for key_name in key_names_list:
         if not VALID_EXTRASPEC_NAME_REGEX.match(key_name):
@@ -139,10 +139,29 @@ interval_opts = [
                     'Setting this to 0 will disable, but this will change in '
                     'Juno to mean "run at the default rate".'),
     # TODO(gilliard): Clean the above message after the K release
+    cfg.BoolOpt('sync_power_state_incremental',
+                default=False,
+                help='Only sync the power state of instances which got a '
+                     'lifecycle event from the hypervisor or whose last '
+                     'sync was skipped, and sync all instances on the host '
+                     'every sync_power_state_audit_interval seconds'),
+    cfg.IntOpt('sync_power_state_audit_interval',
+               default=3600,
+               help='Interval in seconds between syncs of the power state '
+                    'of all instances on the host when '
+                    'sync_power_state_incremental is enabled'),
     cfg.IntOpt("heal_instance_info_cache_interval",
                default=60,
                help="Number of seconds between instance info_cache self "
                     "healing updates"),
+    cfg.IntOpt('heal_instance_info_cache_batch_size',
+               default=0,
+               help='If greater than 0, every instance info_cache self '
+                    'healing update refreshes the network info of all '
+                    'instances on the host, getting it from the network API '
+                    'for this number of instances at a time, and only '
+                    'updates the info_caches which changed. Otherwise one '
+                    'instance is refreshed per update'),
     cfg.IntOpt('reclaim_instance_interval',
                default=0,
                help='Interval in seconds for reclaiming deleted instances'),
@@ -572,7 +591,13 @@ class ComputeManager(manager.Manager):
         self._last_host_check = 0
         self._last_bw_usage_poll = 0
         self._bw_usage_supported = True
+        # { (instance uuid, mac) : last usage recorded for the network }
+        self._bw_usage_cache = {}
         self._last_bw_usage_cell_update = 0
+        self._last_power_state_audit = 0
+        # uuids of the instances whose power state needs to be synced by
+        # the next incremental _sync_power_states run
+        self._power_state_dirty = set()
         self.compute_api = compute.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.conductor_api = conductor.API()
@@ -1006,6 +1031,10 @@ class ComputeManager(manager.Manager):
         LOG.info(_("Lifecycle event %(state)d on VM %(uuid)s") %
                   {'state': event.get_transition(),
                    'uuid': event.get_instance_uuid()})
+        # NOTE: the instance is synced again by the next incremental
+        # _sync_power_states run, in case this event is handled while a
+        # task is pending or fails.
+        self._mark_power_state_dirty(event.get_instance_uuid())
         context = nova.context.get_admin_context(read_deleted='yes')
         instance = objects.Instance.get_by_uuid(context,
                                                 event.get_instance_uuid())
@@ -4876,6 +4905,10 @@ class ComputeManager(manager.Manager):
         if not heal_interval:
             return
 
+        if CONF.heal_instance_info_cache_batch_size > 0:
+            self._heal_instance_info_caches(context)
+            return
+
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
         instance = None
 
@@ -4948,6 +4981,39 @@ class ComputeManager(manager.Manager):
             LOG.debug("Didn't find any instances for network info cache "
                         "update.")
 
+    def _heal_instance_info_caches(self, context):
+        """Refresh the network info_cache of all instances on the host.
+
+        The network info of heal_instance_info_cache_batch_size instances
+        is retrieved by each call to the network API.
+        """
+        LOG.debug('Starting heal of all instance info caches')
+        db_instances = objects.InstanceList.get_by_host(
+            context, self.host, expected_attrs=['system_metadata',
+                                                'info_cache'],
+            use_slave=True)
+        # Building instances will get their cache populated once built, and
+        # deleting instances don't need it anymore.
+        instances = [inst for inst in db_instances
+                     if inst.vm_state != vm_states.BUILDING and
+                     inst.task_state != task_states.DELETING]
+        batch_size = CONF.heal_instance_info_cache_batch_size
+        num_healed = 0
+        for i in xrange(0, len(instances), batch_size):
+            batch = instances[i:i + batch_size]
+            try:
+                nw_infos = self.network_api.get_instances_nw_info(context,
+                                                                  batch)
+            except Exception:
+                LOG.error(_('An error occurred while refreshing the network '
+                            'cache of %d instances.'), len(batch),
+                          exc_info=True)
+                continue
+            num_healed += len(nw_infos)
+        LOG.debug('Refreshed the network info of %(healed)d of %(total)d '
+                  'instances', {'healed': num_healed,
+                                'total': len(instances)})
+
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -5168,29 +5234,23 @@ class ComputeManager(manager.Manager):
                 return
 
             refreshed = timeutils.utcnow()
+            current_usages, prev_usages = self._get_last_bw_usages(
+                context, bw_counters, start_time, prev_time)
+            bw_usages = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                # TODO(geekinutah): Once bw_usage_cache object is created
-                #                   need to revisit this and slaveify.
-                usage = self.conductor_api.bw_usage_get(context,
-                                                        bw_ctr['uuid'],
-                                                        start_time,
-                                                        bw_ctr['mac_address'])
+                usage = current_usages.get(key)
                 if usage:
                     bw_in = usage['bw_in']
                     bw_out = usage['bw_out']
                     last_ctr_in = usage['last_ctr_in']
                     last_ctr_out = usage['last_ctr_out']
                 else:
-                    # TODO(geekinutah): Same here, pls slaveify
-                    usage = self.conductor_api.bw_usage_get(
-                        context, bw_ctr['uuid'], prev_time,
-                        bw_ctr['mac_address'])
+                    usage = prev_usages.get(key)
                     if usage:
                         last_ctr_in = usage['last_ctr_in']
                         last_ctr_out = usage['last_ctr_out']
@@ -5209,16 +5269,75 @@ class ComputeManager(manager.Manager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                self.conductor_api.bw_usage_update(context,
-                                                   bw_ctr['uuid'],
-                                                   bw_ctr['mac_address'],
-                                                   start_time,
-                                                   bw_in,
-                                                   bw_out,
-                                                   bw_ctr['bw_in'],
-                                                   bw_ctr['bw_out'],
-                                                   last_refreshed=refreshed,
-                                                   update_cells=update_cells)
+                bw_usages.append({'uuid': bw_ctr['uuid'],
+                                  'mac': bw_ctr['mac_address'],
+                                  'bw_in': bw_in,
+                                  'bw_out': bw_out,
+                                  'last_ctr_in': bw_ctr['bw_in'],
+                                  'last_ctr_out': bw_ctr['bw_out']})
+
+            self.conductor_api.bw_usage_update_many(context, start_time,
+                                                    bw_usages,
+                                                    last_refreshed=refreshed,
+                                                    update_cells=update_cells)
+            # NOTE: Only the networks polled this time are kept, so that
+            # the usage of an instance which left the host and came back
+            # is read from the database again.
+            self._bw_usage_cache = dict(
+                ((usage['uuid'], usage['mac']),
+                 dict(usage, start_period=start_time))
+                for usage in bw_usages)
+
+    def _get_last_bw_usages(self, context, bw_counters, start_time,
+                            prev_time):
+        """Get the last recorded usage of the networks in bw_counters.
+
+        Returns two dicts keyed by (instance uuid, mac), of the usages
+        recorded in the current audit period and in the previous one. The
+        usages this host recorded are cached, so the database is only read
+        for networks seen for the first time and at the start of an audit
+        period.
+        """
+        current_usages = {}
+        prev_usages = {}
+        missing = []
+        for bw_ctr in bw_counters:
+            key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+            usage = self._bw_usage_cache.get(key)
+            if usage and usage['start_period'] == start_time:
+                current_usages[key] = usage
+                continue
+            if usage and usage['start_period'] == prev_time:
+                prev_usages[key] = usage
+            missing.append(bw_ctr)
+
+        if missing:
+            current_usages.update(
+                self._bw_usage_get_many(context, missing, start_time))
+            missing = [bw_ctr for bw_ctr in missing
+                       if (bw_ctr['uuid'], bw_ctr['mac_address']) not in
+                       current_usages and
+                       (bw_ctr['uuid'], bw_ctr['mac_address']) not in
+                       prev_usages]
+        if missing:
+            prev_usages.update(
+                self._bw_usage_get_many(context, missing, prev_time))
+        return current_usages, prev_usages
+
+    def _bw_usage_get_many(self, context, bw_counters, start_period):
+        uuids = list(set(bw_ctr['uuid'] for bw_ctr in bw_counters))
+        try:
+            usages = self.conductor_api.bw_usage_get_by_uuids(
+                context, uuids, start_period)
+        except messaging.RPCVersionCapError:
+            # NOTE: older conductors can only look up one network at a time
+            usages = [self.conductor_api.bw_usage_get(context,
+                                                      bw_ctr['uuid'],
+                                                      start_period,
+                                                      bw_ctr['mac_address'])
+                      for bw_ctr in bw_counters]
+        return dict(((usage['uuid'], usage['mac']), usage)
+                    for usage in usages if usage)
 
     def _get_host_volume_bdms(self, context):
         """Return all block device mappings on a compute host."""
@@ -5266,6 +5385,11 @@ class ComputeManager(manager.Manager):
 
         self._update_volume_usage_cache(context, vol_usages)
 
+    def _mark_power_state_dirty(self, instance_uuid):
+        """Have the next incremental power state sync check an instance."""
+        if CONF.sync_power_state_incremental:
+            self._power_state_dirty.add(instance_uuid)
+
     @compute_utils.periodic_task_spacing_warn("sync_power_state_interval")
     @periodic_task.periodic_task(spacing=CONF.sync_power_state_interval,
                                  run_immediately=True)
@@ -5277,13 +5401,31 @@ class ComputeManager(manager.Manager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
+
+        If sync_power_state_incremental is enabled, only the instances marked
+        dirty are synced, except every sync_power_state_audit_interval
+        seconds.
         """
+        curr_time = time.time()
+        if (CONF.sync_power_state_incremental and
+                curr_time - self._last_power_state_audit <
+                CONF.sync_power_state_audit_interval):
+            self._sync_dirty_power_states(context)
+            return
+        self._last_power_state_audit = curr_time
+        # NOTE: instances marked dirty from now on are synced by the next
+        # run, even if they were synced by this one.
+        self._power_state_dirty.clear()
+
         db_instances = objects.InstanceList.get_by_host(context,
                                                              self.host,
                                                              use_slave=True)
 
         num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
+        # NOTE: drivers which can get the power state of all instances at
+        # once spare a hypervisor query per instance.
+        vm_power_states = self.driver.get_power_states()
 
         if num_vm_instances != num_db_instances:
             LOG.warn(_("Found %(num_db_instances)s in the database and "
@@ -5291,20 +5433,52 @@ class ComputeManager(manager.Manager):
                      {'num_db_instances': num_db_instances,
                       'num_vm_instances': num_vm_instances})
 
+        self._sync_instance_power_states(context, db_instances,
+                                         vm_power_states)
+
+    def _sync_dirty_power_states(self, context):
+        """Align the power states of the instances marked dirty."""
+        if not self._power_state_dirty:
+            return
+        instance_uuids = list(self._power_state_dirty)
+        self._power_state_dirty.clear()
+        LOG.debug("Syncing the power state of %d instances",
+                  len(instance_uuids))
+        filters = {'uuid': instance_uuids, 'host': self.host}
+        db_instances = objects.InstanceList.get_by_filters(context, filters,
+                                                           use_slave=True)
+        self._sync_instance_power_states(context, db_instances,
+                                         self.driver.get_power_states())
+
+    def _sync_instance_power_states(self, context, db_instances,
+                                    vm_power_states):
+        """Align the power states of db_instances with the hypervisor.
+
+        vm_power_states is the result of the driver's get_power_states().
+        """
         for db_instance in db_instances:
             if db_instance['task_state'] is not None:
                 LOG.info(_("During sync_power_state the instance has a "
                            "pending task (%(task)s). Skip."),
                          {'task': db_instance['task_state']},
                          instance=db_instance)
+                self._mark_power_state_dirty(db_instance.uuid)
                 continue
             # No pending tasks. Now try to figure out the real vm_power_state.
             try:
-                try:
-                    vm_instance = self.driver.get_info(db_instance)
-                    vm_power_state = vm_instance['state']
-                except exception.InstanceNotFound:
-                    vm_power_state = power_state.NOSTATE
+                if (vm_power_states is not None and
+                        db_instance.uuid in vm_power_states):
+                    vm_power_state = vm_power_states[db_instance.uuid]
+                else:
+                    # NOTE: an instance missing from the power states may
+                    # have been created, or have failed to report its state,
+                    # while they were gathered: only get_info() tells that
+                    # it is gone.
+                    try:
+                        vm_instance = self.driver.get_info(db_instance)
+                        vm_power_state = vm_instance['state']
+                    except exception.InstanceNotFound:
+                        vm_power_state = power_state.NOSTATE
                 # Note(maoy): the above get_info call might take a long time,
                 # for example, because of a broken libvirt driver.
                 try:
@@ -5317,6 +5491,7 @@ class ComputeManager(manager.Manager):
                     # silently ignore and move on to next instance.
                     continue
             except Exception:
+                self._mark_power_state_dirty(db_instance.uuid)
                 LOG.exception(_("Periodic sync_power_state task had an error "
                                 "while processing an instance."),
                                 instance=db_instance)
@@ -5360,6 +5535,7 @@ class ComputeManager(manager.Manager):
                        "pending task (%(task)s). Skip."),
                      {'task': db_instance.task_state},
                      instance=db_instance)
+            self._mark_power_state_dirty(db_instance.uuid)
             return
 
         if vm_power_state != db_power_state:
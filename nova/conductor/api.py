@@ -98,6 +98,16 @@ class LocalAPI(object):
                                              last_refreshed,
                                              update_cells=update_cells)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        return self._manager.bw_usage_get_by_uuids(context, uuids,
+                                                   start_period)
+
+    def bw_usage_update_many(self, context, start_period, usages,
+                             last_refreshed=None, update_cells=True):
+        return self._manager.bw_usage_update_many(context, start_period,
+                                                  usages, last_refreshed,
+                                                  update_cells=update_cells)
+
     def provider_fw_rule_get_all(self, context):
         return self._manager.provider_fw_rule_get_all(context)
 
@@ -178,6 +188,12 @@ class LocalAPI(object):
     def service_update(self, context, service, values):
         return self._manager.service_update(context, service, values)
 
+    def service_heartbeat(self, context, service):
+        # NOTE: there is no conductor to collect the heartbeats in the
+        # local case, so write them right away.
+        self._manager.service_heartbeat(context, service['id'])
+        self._manager._flush_heartbeats(context)
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         return self._manager.task_log_get(context, task_name, begin, end,
                                           host, state)
@@ -299,6 +315,13 @@ class API(LocalAPI):
         return self._manager.instance_update(context, instance_uuid,
                                              updates, 'conductor')
 
+    def service_heartbeat(self, context, service):
+        """Send a heartbeat for nova-conductor to write with others.
+
+        Returns the updated service if it was written right away, or None.
+        """
+        return self._manager.service_heartbeat(context, service)
+
 
 class ComputeTaskAPI(object):
     """ComputeTask API that queues up compute tasks for nova-conductor."""
@@ -17,6 +17,7 @@
 import copy
 import itertools
 
+from oslo.config import cfg
 from oslo import messaging
 import six
 
@@ -45,12 +46,22 @@ from nova.openstack.common import excutils
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import periodic_task
 from nova.openstack.common import timeutils
 from nova import quota
 from nova.scheduler import driver as scheduler_driver
 from nova.scheduler import rpcapi as scheduler_rpcapi
 from nova.scheduler import utils as scheduler_utils
 
+conductor_manager_opts = [
+    cfg.IntOpt('heartbeat_flush_interval',
+               default=10,
+               help='Interval in seconds at which the service heartbeats '
+                    'received by nova-conductor are written to the database'),
+]
+CONF = cfg.CONF
+CONF.register_opts(conductor_manager_opts, 'conductor')
+
 LOG = logging.getLogger(__name__)
 
 # Instead of having a huge list of arguments to instance_update(), we just
@@ -95,6 +106,8 @@ class ConductorManager(manager.Manager):
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
         self.additional_endpoints.append(self.compute_task_mgr)
         self.additional_endpoints.append(_ConductorManagerV2Proxy(self))
+        # { service_id : (number of heartbeats, time of the last one) }
+        self._heartbeats = {}
 
     @property
     def network_api(self):
@@ -264,6 +277,16 @@ class ConductorManager(manager.Manager):
         usage = self.db.bw_usage_get(context, uuid, start_period, mac)
         return jsonutils.to_primitive(usage)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        usages = self.db.bw_usage_get_by_uuids(context, uuids, start_period)
+        return jsonutils.to_primitive(usages)
+
+    def bw_usage_update_many(self, context, start_period, usages,
+                             last_refreshed=None, update_cells=True):
+        self.db.bw_usage_update_many(context, start_period, usages,
+                                     last_refreshed=last_refreshed,
+                                     update_cells=update_cells)
+
     # NOTE(russellb) This method can be removed in 2.0 of this API.  It is
     # deprecated in favor of the method in the base API.
     def get_backdoor_port(self, context):
@@ -496,6 +519,29 @@ class ConductorManager(manager.Manager):
         svc = self.db.service_update(context, service['id'], values)
         return jsonutils.to_primitive(svc)
 
+    def service_heartbeat(self, context, service_id):
+        count, last_seen = self._heartbeats.get(service_id, (0, None))
+        self._heartbeats[service_id] = (count + 1, timeutils.utcnow())
+
+    @periodic_task.periodic_task(
+            spacing=CONF.conductor.heartbeat_flush_interval)
+    def _flush_heartbeats(self, context):
+        """Write the heartbeats received since the last flush in bulk."""
+        heartbeats, self._heartbeats = self._heartbeats, {}
+        if not heartbeats:
+            return
+        try:
+            self.db.service_heartbeat_bulk_update(context, heartbeats)
+        except Exception:
+            LOG.exception(_('Failed to write %d service heartbeats, will '
+                            'retry'), len(heartbeats))
+            # Merge them back with the ones received meanwhile
+            for service_id, (count, last_seen) in heartbeats.items():
+                if service_id in self._heartbeats:
+                    newer_count, last_seen = self._heartbeats[service_id]
+                    count += newer_count
+                self._heartbeats[service_id] = (count, last_seen)
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         result = self.db.task_log_get(context, task_name, begin, end, host,
                                       state)
@@ -916,7 +962,7 @@ class ComputeTaskManager(base.Base):
 
 class _ConductorManagerV2Proxy(object):
 
-    target = messaging.Target(version='2.0')
+    target = messaging.Target(version='2.2')
 
     def __init__(self, manager):
         self.manager = manager
@@ -955,6 +1001,15 @@ class _ConductorManagerV2Proxy(object):
                 bw_in, bw_out, last_ctr_in, last_ctr_out, last_refreshed,
                 update_cells)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        return self.manager.bw_usage_get_by_uuids(context, uuids,
+                                                  start_period)
+
+    def bw_usage_update_many(self, context, start_period, usages,
+                             last_refreshed, update_cells):
+        return self.manager.bw_usage_update_many(context, start_period,
+                usages, last_refreshed, update_cells)
+
     def provider_fw_rule_get_all(self, context):
         return self.manager.provider_fw_rule_get_all(context)
 
@@ -1035,6 +1090,9 @@ class _ConductorManagerV2Proxy(object):
     def service_update(self, context, service, values):
         return self.manager.service_update(context, service, values)
 
+    def service_heartbeat(self, context, service_id):
+        return self.manager.service_heartbeat(context, service_id)
+
     def task_log_get(self, context, task_name, begin, end, host, state):
         return self.manager.task_log_get(context, task_name, begin, end, host,
                 state)
@@ -148,6 +148,8 @@ class ConductorAPI(object):
     ...  - Remove instance_fault_create()
     ...  - Remove action_event_start() and action_event_finish()
     ...  - Remove instance_get_by_uuid()
+    2.1  - Added service_heartbeat()
+    2.2  - Added bw_usage_get_by_uuids() and bw_usage_update_many()
     """
 
     VERSION_ALIASES = {
@@ -201,6 +203,29 @@ class ConductorAPI(object):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'bw_usage_update', **msg_kwargs)
 
+    def bw_usage_get_by_uuids(self, context, uuids, start_period):
+        cctxt = self.client.prepare(version='2.2')
+        return cctxt.call(context, 'bw_usage_get_by_uuids',
+                          uuids=uuids, start_period=start_period)
+
+    def bw_usage_update_many(self, context, start_period, usages,
+                             last_refreshed=None, update_cells=True):
+        if not self.client.can_send_version('2.2'):
+            # NOTE: older conductors only know how to update one network
+            # at a time
+            for usage in usages:
+                self.bw_usage_update(context, usage['uuid'], usage['mac'],
+                                     start_period, usage['bw_in'],
+                                     usage['bw_out'], usage['last_ctr_in'],
+                                     usage['last_ctr_out'],
+                                     last_refreshed=last_refreshed,
+                                     update_cells=update_cells)
+            return
+        cctxt = self.client.prepare(version='2.2')
+        cctxt.call(context, 'bw_usage_update_many',
+                   start_period=start_period, usages=usages,
+                   last_refreshed=last_refreshed, update_cells=update_cells)
+
     def provider_fw_rule_get_all(self, context):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'provider_fw_rule_get_all')
@@ -288,6 +313,18 @@ class ConductorAPI(object):
         return cctxt.call(context, 'service_update',
                           service=service_p, values=values)
 
+    def service_heartbeat(self, context, service):
+        if not self.client.can_send_version('2.1'):
+            # NOTE: older conductors only know how to update the service,
+            # which is returned so that the next report_count follows it.
+            service_p = jsonutils.to_primitive(service)
+            values = {'report_count': service['report_count'] + 1}
+            cctxt = self.client.prepare()
+            return cctxt.call(context, 'service_update', service=service_p,
+                              values=values)
+        cctxt = self.client.prepare(version='2.1')
+        cctxt.cast(context, 'service_heartbeat', service_id=service['id'])
+
     def task_log_get(self, context, task_name, begin, end, host, state=None):
         cctxt = self.client.prepare()
         return cctxt.call(context, 'task_log_get',
@@ -159,6 +159,20 @@ def service_get_all_by_host(context, host):
     return IMPL.service_get_all_by_host(context, host)
 
 
+def service_get_all_changed_since(context, changed_since, binary=None):
+    """Get all services created or updated since a given time.
+
+    :param context: The security context
+    :param changed_since: datetime; only services created or updated at or
+                          after this time are returned
+    :param binary: If set, only return services running this binary
+
+    :returns: List of dictionaries each containing service properties
+    """
+    return IMPL.service_get_all_changed_since(context, changed_since,
+                                              binary=binary)
+
+
 def service_get_by_compute_host(context, host):
     """Get the service entry for a given compute host.
 
@@ -186,6 +200,15 @@ def service_update(context, service_id, values):
     return IMPL.service_update(context, service_id, values)
 
 
+def service_heartbeat_bulk_update(context, heartbeats):
+    """Record the heartbeats of many services in a single update.
+
+    :param heartbeats: a dict of service id to a (number of heartbeats,
+                       time of the last heartbeat) tuple
+    """
+    return IMPL.service_heartbeat_bulk_update(context, heartbeats)
+
+
 ###################
 
 
@@ -232,6 +255,20 @@ def compute_node_get_all(context, no_date_fields=False):
     return IMPL.compute_node_get_all(context, no_date_fields)
 
 
+def compute_node_get_all_changed_since(context, changed_since):
+    """Get compute nodes created, updated or deleted since a given time.
+
+    :param context: The security context
+    :param changed_since: datetime; only compute nodes created, updated or
+                          deleted at or after this time are returned
+
+    :returns: List of dictionaries each containing compute node properties,
+              including corresponding service. Deleted compute nodes are
+              included and can be recognized by a non-zero 'deleted' field.
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changed_since)
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     """Get compute nodes by hypervisor hostname.
 
@@ -419,6 +456,11 @@ def floating_ip_get_by_fixed_ip_id(context, fixed_ip_id):
     return IMPL.floating_ip_get_by_fixed_ip_id(context, fixed_ip_id)
 
 
+def floating_ip_get_by_instances(context, instance_uuids):
+    """Get the floating ips of the fixed ips of several instances."""
+    return IMPL.floating_ip_get_by_instances(context, instance_uuids)
+
+
 def floating_ip_update(context, address, values):
     """Update a floating ip by address or raise if it doesn't exist."""
     return IMPL.floating_ip_update(context, address, values)
@@ -583,6 +625,11 @@ def fixed_ip_get_by_instance(context, instance_uuid):
     return IMPL.fixed_ip_get_by_instance(context, instance_uuid)
 
 
+def fixed_ip_get_by_instances(context, instance_uuids):
+    """Get the fixed ips of several instances."""
+    return IMPL.fixed_ip_get_by_instances(context, instance_uuids)
+
+
 def fixed_ip_get_by_host(context, host):
     """Get fixed ips by compute host."""
     return IMPL.fixed_ip_get_by_host(context, host)
@@ -598,6 +645,11 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return IMPL.fixed_ips_by_virtual_interface(context, vif_id)
 
 
+def fixed_ip_search_by_address(context, address, exact=False):
+    """Find the fixed ips of instances by their or their floating address."""
+    return IMPL.fixed_ip_search_by_address(context, address, exact=exact)
+
+
 def fixed_ip_update(context, address, values):
     """Create a fixed ip from the values dictionary."""
     return IMPL.fixed_ip_update(context, address, values)
@@ -632,6 +684,13 @@ def virtual_interface_get_by_instance(context, instance_id, use_slave=False):
                                                   use_slave=use_slave)
 
 
+def virtual_interface_get_by_instances(context, instance_uuids,
+                                       use_slave=False):
+    """Gets all virtual_interfaces of several instances."""
+    return IMPL.virtual_interface_get_by_instances(context, instance_uuids,
+                                                   use_slave=use_slave)
+
+
 def virtual_interface_get_by_instance_and_network(context, instance_id,
                                                            network_id):
     """Gets all virtual interfaces for instance."""
@@ -658,6 +717,11 @@ def instance_create(context, values):
     return IMPL.instance_create(context, values)
 
 
+def instance_bulk_create(context, values_list):
+    """Create several instances from a list of values dictionaries."""
+    return IMPL.instance_bulk_create(context, values_list)
+
+
 def instance_destroy(context, instance_uuid, constraint=None,
         update_cells=True):
     """Destroy the instance or raise if it does not exist."""
@@ -698,6 +762,16 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                             use_slave=use_slave)
 
 
+def instance_get_all_by_updated_at(context, updated_since=None, cursor=None,
+                                   limit=None, project_id=None, deleted=True,
+                                   columns_to_join=None):
+    """Get instances updated since a time, in the order of their ids."""
+    return IMPL.instance_get_all_by_updated_at(
+            context, updated_since=updated_since, cursor=cursor, limit=limit,
+            project_id=project_id, deleted=deleted,
+            columns_to_join=columns_to_join)
+
+
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None):
     """Get instances and joins active during a certain time window.
@@ -786,6 +860,15 @@ def instance_update_and_get_original(context, instance_uuid, values,
     return rv
 
 
+def instance_update_many(context, updates):
+    """Set the given properties on several instances.
+
+    Returns a dict of instance uuid -> exception for the updates that
+    could not be applied.  Does not notify cells.
+    """
+    return IMPL.instance_update_many(context, updates)
+
+
 def instance_add_security_group(context, instance_id, security_group_id):
     """Associate the given security group with the given instance."""
     return IMPL.instance_add_security_group(context, instance_id,
@@ -1157,6 +1240,33 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def quota_reserve_cas(context, resources, quotas, user_quotas, deltas,
+                      expire, until_refresh, max_age, project_id=None,
+                      user_id=None):
+    """Check quotas and create appropriate reservations, without locking
+    the usages.
+    """
+    return IMPL.quota_reserve_cas(context, resources, quotas, user_quotas,
+                                  deltas, expire, until_refresh, max_age,
+                                  project_id=project_id, user_id=user_id)
+
+
+def reservation_commit_cas(context, reservations, project_id=None,
+                           user_id=None):
+    """Commit quota reservations made by quota_reserve_cas()."""
+    return IMPL.reservation_commit_cas(context, reservations,
+                                       project_id=project_id,
+                                       user_id=user_id)
+
+
+def reservation_rollback_cas(context, reservations, project_id=None,
+                             user_id=None):
+    """Roll back quota reservations made by quota_reserve_cas()."""
+    return IMPL.reservation_rollback_cas(context, reservations,
+                                         project_id=project_id,
+                                         user_id=user_id)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1173,6 +1283,11 @@ def reservation_expire(context):
     return IMPL.reservation_expire(context)
 
 
+def reservation_expire_cas(context):
+    """Roll back any expired reservations made by quota_reserve_cas()."""
+    return IMPL.reservation_expire_cas(context)
+
+
 ###################
 
 
@@ -1620,6 +1735,16 @@ def instance_system_metadata_get(context, instance_uuid):
     return IMPL.instance_system_metadata_get(context, instance_uuid)
 
 
+def instance_system_metadata_get_instance_uuids(context, keys, limit=None,
+                                                marker=None):
+    """Get the uuids of up to limit instances having any of the given
+    system metadata keys, in order and after the marker uuid if given.
+    """
+    return IMPL.instance_system_metadata_get_instance_uuids(context, keys,
+                                                            limit=limit,
+                                                            marker=marker)
+
+
 def instance_system_metadata_update(context, instance_uuid, metadata, delete):
     """Update metadata if it exists, otherwise create it."""
     IMPL.instance_system_metadata_update(
@@ -1686,6 +1811,30 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_many(context, start_period, usages, last_refreshed=None,
+                         update_cells=True):
+    """Update cached bandwidth usage for many instance networks at once.
+    Creates new records if needed.
+
+    :param usages: a list of dicts with the uuid, mac, bw_in, bw_out,
+                   last_ctr_in and last_ctr_out of each network
+    """
+    rv = IMPL.bw_usage_update_many(context, start_period, usages,
+                                   last_refreshed=last_refreshed)
+    if update_cells:
+        try:
+            cells_api = cells_rpcapi.CellsAPI()
+            for usage in usages:
+                cells_api.bw_usage_update_at_top(context,
+                        usage['uuid'], usage['mac'], start_period,
+                        usage['bw_in'], usage['bw_out'],
+                        usage['last_ctr_in'], usage['last_ctr_out'],
+                        last_refreshed)
+        except Exception:
+            LOG.exception(_("Failed to notify cells of bw_usage update"))
+    return rv
+
+
 ###################
 
 
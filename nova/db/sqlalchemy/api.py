@@ -41,6 +41,8 @@ from sqlalchemy.orm import joinedload_all
 from sqlalchemy.orm import noload
 from sqlalchemy.schema import Table
 from sqlalchemy.sql.expression import asc
+from sqlalchemy.sql.expression import bindparam
+from sqlalchemy.sql.expression import case
 from sqlalchemy.sql.expression import desc
 from sqlalchemy.sql.expression import select
 from sqlalchemy.sql import func
@@ -465,6 +467,22 @@ def service_get_all_by_topic(context, topic):
                 all()
 
 
+@require_admin_context
+def service_get_all_changed_since(context, changed_since, binary=None):
+    service = models.Service.__table__
+
+    where = ((service.c.deleted == 0) &
+             or_(service.c.created_at >= changed_since,
+                 service.c.updated_at >= changed_since))
+    if binary is not None:
+        where = where & (service.c.binary == binary)
+
+    with get_engine().begin() as conn:
+        service_rows = conn.execute(select([service]).where(where)).fetchall()
+
+    return [dict(proxy.items()) for proxy in service_rows]
+
+
 @require_admin_context
 def service_get_by_host_and_topic(context, host, topic):
     return model_query(context, models.Service, read_deleted="no").\
@@ -536,6 +554,26 @@ def service_update(context, service_id, values):
     return service_ref
 
 
+@require_admin_context
+@_retry_on_deadlock
+def service_heartbeat_bulk_update(context, heartbeats):
+    if not heartbeats:
+        return
+    report_counts = dict((service_id, count)
+                         for service_id, (count, last_seen)
+                         in heartbeats.items())
+    updated_ats = dict((service_id, last_seen)
+                       for service_id, (count, last_seen)
+                       in heartbeats.items())
+    model_query(context, models.Service, read_deleted="no").\
+            filter(models.Service.id.in_(heartbeats.keys())).\
+            update({'report_count': models.Service.report_count +
+                        case(report_counts, value=models.Service.id),
+                    'updated_at': case(updated_ats,
+                                       value=models.Service.id)},
+                   synchronize_session=False)
+
+
 ###################
 
 def compute_node_get(context, compute_id):
@@ -612,6 +650,48 @@ def compute_node_get_all(context, no_date_fields):
     return compute_nodes
 
 
+@require_admin_context
+def compute_node_get_all_changed_since(context, changed_since):
+    engine = get_engine()
+
+    compute_node = models.ComputeNode.__table__
+    service = models.Service.__table__
+
+    with engine.begin() as conn:
+        # NOTE(markmc): deleted rows are returned as well, so that callers
+        #               caching compute nodes can drop them.
+        compute_node_query = select([compute_node]).\
+                                where(or_(
+                                    compute_node.c.created_at >= changed_since,
+                                    compute_node.c.updated_at >= changed_since,
+                                    compute_node.c.deleted_at >= changed_since
+                                )).\
+                                order_by(compute_node.c.service_id)
+        compute_node_rows = conn.execute(compute_node_query).fetchall()
+
+        service_ids = set(proxy['service_id'] for proxy in compute_node_rows)
+        service_rows = []
+        if service_ids:
+            service_query = select([service]).\
+                                where((service.c.deleted == 0) &
+                                      (service.c.binary == 'nova-compute') &
+                                      service.c.id.in_(service_ids))
+            service_rows = conn.execute(service_query).fetchall()
+
+    services = {}
+    for proxy in service_rows:
+        services[proxy['id']] = dict(proxy.items())
+
+    compute_nodes = []
+    for proxy in compute_node_rows:
+        node = dict(proxy.items())
+        node['service'] = services.get(proxy['service_id'])
+
+        compute_nodes.append(node)
+
+    return compute_nodes
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -1032,6 +1112,17 @@ def floating_ip_get_by_fixed_ip_id(context, fixed_ip_id):
                 all()
 
 
+@require_context
+def floating_ip_get_by_instances(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return model_query(context, models.FloatingIp).\
+                join(models.FixedIp,
+                     models.FixedIp.id == models.FloatingIp.fixed_ip_id).\
+                filter(models.FixedIp.instance_uuid.in_(instance_uuids)).\
+                all()
+
+
 @require_context
 def floating_ip_update(context, address, values):
     session = get_session()
@@ -1377,6 +1468,15 @@ def fixed_ip_get_by_instance(context, instance_uuid):
     return result
 
 
+@require_context
+def fixed_ip_get_by_instances(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return model_query(context, models.FixedIp, read_deleted="no").\
+                 filter(models.FixedIp.instance_uuid.in_(instance_uuids)).\
+                 all()
+
+
 @require_admin_context
 def fixed_ip_get_by_host(context, host):
     session = get_session()
@@ -1413,6 +1513,57 @@ def fixed_ips_by_virtual_interface(context, vif_id):
     return result
 
 
+def _ip_address_filter(column, address, exact):
+    if exact:
+        return column == address
+    if CONF.database.connection.split(':')[0].split('+')[0] == 'postgresql':
+        # NOTE: INET columns can't be matched with LIKE, match their text
+        column = func.host(column)
+    return column.like(address + '%')
+
+
+@require_context
+def fixed_ip_search_by_address(context, address, exact=False):
+    """Find the fixed ips of instances by their or their floating address.
+
+    :param address: the start of the fixed or floating addresses, as a
+                    LIKE pattern, or the whole address if exact is True.
+                    An empty address matches the fixed ips of all instances
+    :returns: a list of dicts with the instance_uuid and address of the
+              fixed ips, one per floating_address they have, which is
+              None if they have none
+    """
+    query = model_query(context, models.VirtualInterface.instance_uuid,
+                        models.FixedIp.address, models.FloatingIp.address,
+                        base_model=models.VirtualInterface,
+                        read_deleted="no").\
+                join((models.FixedIp,
+                      and_(models.FixedIp.virtual_interface_id ==
+                           models.VirtualInterface.id,
+                           models.FixedIp.deleted == 0))).\
+                outerjoin((models.FloatingIp,
+                           and_(models.FloatingIp.fixed_ip_id ==
+                                models.FixedIp.id,
+                                models.FloatingIp.deleted == 0))).\
+                filter(models.VirtualInterface.instance_uuid != None)
+    if address:
+        # NOTE: a query per address column, so that each can use its index
+        fixed_query = query.filter(
+            _ip_address_filter(models.FixedIp.address, address, exact))
+        floating_query = query.filter(
+            _ip_address_filter(models.FloatingIp.address, address, exact))
+        query = fixed_query.union(floating_query)
+    try:
+        result = query.all()
+    except DataError:
+        # NOTE: postgresql refuses to compare an invalid address with INET
+        return []
+    return [{'instance_uuid': instance_uuid,
+             'address': fixed_address,
+             'floating_address': floating_address}
+            for instance_uuid, fixed_address, floating_address in result]
+
+
 @require_context
 def fixed_ip_update(context, address, values):
     session = get_session()
@@ -1511,6 +1662,23 @@ def virtual_interface_get_by_instance(context, instance_uuid, use_slave=False):
     return vif_refs
 
 
+@require_context
+def virtual_interface_get_by_instances(context, instance_uuids,
+                                       use_slave=False):
+    """Gets all virtual interfaces of several instances.
+
+    :param instance_uuids: = uuids of the instances to retrieve vifs for
+    """
+    if not instance_uuids:
+        return []
+    vif_refs = _virtual_interface_query(context, use_slave=use_slave).\
+                       filter(models.VirtualInterface.instance_uuid.in_(
+                           instance_uuids)).\
+                       order_by(asc("created_at"), asc("id")).\
+                       all()
+    return vif_refs
+
+
 @require_context
 def virtual_interface_get_by_instance_and_network(context, instance_uuid,
                                                   network_id):
@@ -1650,6 +1818,113 @@ def instance_create(context, values):
     return instance_ref
 
 
+def _bulk_insert(session, model, rows):
+    """Insert rows into the table of model with multi-row INSERTs.
+
+    Keys which are not columns of the table are ignored, like they are
+    by model.update(). Rows are grouped by the columns they set, so that
+    each group is a single executemany and column defaults still apply
+    to unset columns.
+    """
+    columns = model.__table__.columns
+    groups = collections.defaultdict(list)
+    for row in rows:
+        row = dict((k, v) for k, v in row.iteritems() if k in columns)
+        groups[tuple(sorted(row))].append(row)
+    for group in groups.values():
+        session.execute(model.__table__.insert(), group)
+
+
+@require_context
+def instance_bulk_create(context, values_list):
+    """Create several Instance records in the database at once.
+
+    All instances and their metadata, system metadata, info cache,
+    security group associations and ec2 id mappings are written with
+    one multi-row INSERT per table, in a single transaction.
+
+    context - request context object
+    values_list - list of dicts containing column values.
+    """
+    instance_rows = []
+    metadata_rows = []
+    system_metadata_rows = []
+    info_cache_rows = []
+    association_rows = []
+    security_groups_by_uuid = {}
+    hostnames = set()
+    for values in values_list:
+        values = values.copy()
+        if not values.get('uuid'):
+            values['uuid'] = str(uuid.uuid4())
+        instance_uuid = values['uuid']
+        _handle_objects_related_type_conversions(values)
+        for k, v in (values.pop('metadata', None) or {}).iteritems():
+            metadata_rows.append({'instance_uuid': instance_uuid,
+                                  'key': k, 'value': v})
+        for k, v in (values.pop('system_metadata', None) or {}).iteritems():
+            system_metadata_rows.append({'instance_uuid': instance_uuid,
+                                         'key': k, 'value': v})
+        info_cache = dict(values.pop('info_cache', None) or {})
+        info_cache['instance_uuid'] = instance_uuid
+        info_cache_rows.append(info_cache)
+        security_groups_by_uuid[instance_uuid] = tuple(
+                values.pop('security_groups', []))
+        if values.get('hostname'):
+            lowername = values['hostname'].lower()
+            if (CONF.osapi_compute_unique_server_name_scope and
+                    lowername in hostnames):
+                raise exception.InstanceExists(name=lowername)
+            hostnames.add(lowername)
+        instance_rows.append(values)
+
+    default_group = security_group_ensure_default(context)
+    session = get_session()
+    with session.begin():
+        for hostname in hostnames:
+            _validate_unique_server_name(context, session, hostname)
+
+        # NOTE: Instances booted together normally share their
+        # security groups, so each distinct set is only looked up once.
+        group_ids = {}
+        for instance_uuid, names in security_groups_by_uuid.iteritems():
+            if names not in group_ids:
+                ids = []
+                if 'default' in names:
+                    ids.append(default_group['id'])
+                other_names = [x for x in names if x != 'default']
+                if other_names:
+                    ids.extend(sg.id for sg in _security_group_get_by_names(
+                            context, session, context.project_id,
+                            other_names))
+                group_ids[names] = ids
+            for group_id in group_ids[names]:
+                association_rows.append({'instance_uuid': instance_uuid,
+                                         'security_group_id': group_id})
+
+        _bulk_insert(session, models.Instance, instance_rows)
+        _bulk_insert(session, models.InstanceMetadata, metadata_rows)
+        _bulk_insert(session, models.InstanceSystemMetadata,
+                     system_metadata_rows)
+        _bulk_insert(session, models.InstanceInfoCache, info_cache_rows)
+        _bulk_insert(session, models.SecurityGroupInstanceAssociation,
+                     association_rows)
+        # create the instance uuid to ec2_id mapping entries
+        _bulk_insert(session, models.InstanceIdMapping,
+                     [{'uuid': row['uuid']} for row in instance_rows])
+
+        uuids = [row['uuid'] for row in instance_rows]
+        query = model_query(context, models.Instance, session=session).\
+                options(joinedload_all('security_groups.rules')).\
+                options(joinedload('info_cache')).\
+                options(joinedload('metadata')).\
+                options(joinedload('system_metadata')).\
+                filter(models.Instance.uuid.in_(uuids))
+        instances = dict((inst['uuid'], inst) for inst in query.all())
+
+    return [instances[instance_uuid] for instance_uuid in uuids]
+
+
 def _instance_data_get_for_user(context, project_id, user_id, session=None):
     result = model_query(context,
                          func.count(models.Instance.id),
@@ -1973,6 +2248,57 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
 
 
+@require_context
+def instance_get_all_by_updated_at(context, updated_since=None, cursor=None,
+                                   limit=None, project_id=None, deleted=True,
+                                   columns_to_join=None):
+    """Return instances, optionally only those updated since a time, in
+    the order of their ids.
+
+    Deleted instances are returned unless deleted is False.
+
+    :param updated_since: only return instances updated since this time
+    :param cursor: id of the last instance of a previous batch; only
+                   instances with a greater id are returned
+    :param limit: maximum number of instances to return
+    """
+    if limit == 0:
+        return []
+
+    if columns_to_join is None:
+        columns_to_join = ['info_cache', 'security_groups']
+        manual_joins = ['metadata', 'system_metadata']
+    else:
+        manual_joins, columns_to_join = _manual_join_columns(columns_to_join)
+
+    query = get_session().query(models.Instance)
+    for column in columns_to_join:
+        query = query.options(joinedload(column))
+
+    if updated_since is not None:
+        updated_since = timeutils.normalize_time(updated_since)
+        query = query.filter(models.Instance.updated_at >= updated_since)
+    if not context.is_admin:
+        project_id = context.project_id
+    if project_id is not None:
+        query = query.filter_by(project_id=project_id)
+    if not deleted:
+        not_soft_deleted = or_(
+            models.Instance.vm_state != vm_states.SOFT_DELETED,
+            models.Instance.vm_state == None)
+        query = query.filter_by(deleted=0).filter(not_soft_deleted)
+    if cursor is not None:
+        query = query.filter(models.Instance.id > cursor)
+
+    # NOTE: paging on the primary key lets each batch be read from the
+    # index, without sorting the instances table.
+    query = query.order_by(models.Instance.id)
+    if limit is not None:
+        query = query.limit(limit)
+
+    return _instances_fill_metadata(context, query.all(), manual_joins)
+
+
 def tag_filter(context, query, model, model_metadata,
                model_uuid, filters):
     """Applies tag filtering to a query.
@@ -2229,6 +2555,63 @@ def instance_update_and_get_original(context, instance_uuid, values,
                             columns_to_join=columns_to_join)
 
 
+@require_context
+def instance_update_many(context, updates):
+    """Set the given properties on several instances in one transaction.
+
+    :param updates: dict of instance uuid -> dict of values, as taken by
+                    instance_update()
+
+    :returns: dict of instance uuid -> exception for the updates that
+              could not be applied, e.g. InstanceNotFound or
+              UnexpectedTaskStateError.  The other updates are applied.
+    """
+    if not updates:
+        return {}
+    try:
+        return _instance_update_many(context, updates)
+    except Exception:
+        # NOTE: a database error, e.g. raised by the autoflush done when
+        # checking the uniqueness of a hostname, aborts the transaction of
+        # the whole batch.  Apply the updates one by one so that only the
+        # failing ones are lost.
+        LOG.exception(_("Failed to update %d instances at once, updating "
+                        "them one by one"), len(updates))
+    failures = {}
+    for instance_uuid, values in updates.iteritems():
+        try:
+            _instance_update(context, instance_uuid, dict(values))
+        except Exception as e:
+            failures[instance_uuid] = e
+    return failures
+
+
+def _instance_update_many(context, updates):
+    failures = {}
+    session = get_session()
+    with session.begin():
+        instance_refs = _build_instance_get(context, session=session).\
+                filter(models.Instance.uuid.in_(updates.keys())).\
+                all()
+        instance_refs = dict((ref['uuid'], ref) for ref in instance_refs)
+        for instance_uuid, values in updates.iteritems():
+            instance_ref = instance_refs.get(instance_uuid)
+            if instance_ref is None:
+                failures[instance_uuid] = exception.InstanceNotFound(
+                        instance_id=instance_uuid)
+                continue
+            # NOTE: _instance_update_ref() only raises before it changes
+            # anything, so a failed update leaves the transaction usable
+            # for the others.
+            try:
+                _instance_update_ref(context, session, instance_ref,
+                                     dict(values))
+            except exception.NovaException as e:
+                failures[instance_uuid] = e
+
+    return failures
+
+
 # NOTE(danms): This updates the instance's metadata list in-place and in
 # the database to avoid stale data and refresh issues. It assumes the
 # delete=True behavior of instance_metadata_update(...)
@@ -2265,61 +2648,76 @@ def _instance_update(context, instance_uuid, values, copy_old_instance=False,
         instance_ref = _instance_get_by_uuid(context, instance_uuid,
                                              session=session,
                                              columns_to_join=columns_to_join)
-        if "expected_task_state" in values:
-            # it is not a db column so always pop out
-            expected = values.pop("expected_task_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["task_state"]
-            if actual_state not in expected:
-                if actual_state == task_states.DELETING:
-                    raise exception.UnexpectedDeletingTaskStateError(
-                            actual=actual_state, expected=expected)
-                else:
-                    raise exception.UnexpectedTaskStateError(
-                            actual=actual_state, expected=expected)
-        if "expected_vm_state" in values:
-            expected = values.pop("expected_vm_state")
-            if not isinstance(expected, (tuple, list, set)):
-                expected = (expected,)
-            actual_state = instance_ref["vm_state"]
-            if actual_state not in expected:
-                raise exception.UnexpectedVMStateError(actual=actual_state,
-                                                       expected=expected)
-
-        instance_hostname = instance_ref['hostname'] or ''
-        if ("hostname" in values and
-                values["hostname"].lower() != instance_hostname.lower()):
-                _validate_unique_server_name(context,
-                                             session,
-                                             values['hostname'])
-
-        if copy_old_instance:
-            old_instance_ref = copy.copy(instance_ref)
-        else:
-            old_instance_ref = None
+        old_instance_ref = _instance_update_ref(
+                context, session, instance_ref, values,
+                copy_old_instance=copy_old_instance)
 
-        metadata = values.get('metadata')
-        if metadata is not None:
-            _instance_metadata_update_in_place(context, instance_ref,
-                                               'metadata',
-                                               models.InstanceMetadata,
-                                               values.pop('metadata'),
-                                               session)
-
-        system_metadata = values.get('system_metadata')
-        if system_metadata is not None:
-            _instance_metadata_update_in_place(context, instance_ref,
-                                               'system_metadata',
-                                               models.InstanceSystemMetadata,
-                                               values.pop('system_metadata'),
-                                               session)
+    return (old_instance_ref, instance_ref)
 
-        _handle_objects_related_type_conversions(values)
-        instance_ref.update(values)
-        session.add(instance_ref)
 
-    return (old_instance_ref, instance_ref)
+def _instance_update_ref(context, session, instance_ref, values,
+                         copy_old_instance=False):
+    """Apply values to an instance loaded in session.
+
+    Raises before changing anything if the expected states or hostname in
+    values do not allow the update.  Returns a shallow copy of the
+    original instance if copy_old_instance is set, otherwise None.
+    """
+    if "expected_task_state" in values:
+        # it is not a db column so always pop out
+        expected = values.pop("expected_task_state")
+        if not isinstance(expected, (tuple, list, set)):
+            expected = (expected,)
+        actual_state = instance_ref["task_state"]
+        if actual_state not in expected:
+            if actual_state == task_states.DELETING:
+                raise exception.UnexpectedDeletingTaskStateError(
+                        actual=actual_state, expected=expected)
+            else:
+                raise exception.UnexpectedTaskStateError(
+                        actual=actual_state, expected=expected)
+    if "expected_vm_state" in values:
+        expected = values.pop("expected_vm_state")
+        if not isinstance(expected, (tuple, list, set)):
+            expected = (expected,)
+        actual_state = instance_ref["vm_state"]
+        if actual_state not in expected:
+            raise exception.UnexpectedVMStateError(actual=actual_state,
+                                                   expected=expected)
+
+    instance_hostname = instance_ref['hostname'] or ''
+    if ("hostname" in values and
+            values["hostname"].lower() != instance_hostname.lower()):
+            _validate_unique_server_name(context,
+                                         session,
+                                         values['hostname'])
+
+    if copy_old_instance:
+        old_instance_ref = copy.copy(instance_ref)
+    else:
+        old_instance_ref = None
+
+    metadata = values.get('metadata')
+    if metadata is not None:
+        _instance_metadata_update_in_place(context, instance_ref,
+                                           'metadata',
+                                           models.InstanceMetadata,
+                                           values.pop('metadata'),
+                                           session)
+
+    system_metadata = values.get('system_metadata')
+    if system_metadata is not None:
+        _instance_metadata_update_in_place(context, instance_ref,
+                                           'system_metadata',
+                                           models.InstanceSystemMetadata,
+                                           values.pop('system_metadata'),
+                                           session)
+
+    _handle_objects_related_type_conversions(values)
+    instance_ref.update(values)
+    session.add(instance_ref)
+
+    return old_instance_ref
 
 
 def instance_add_security_group(context, instance_uuid, security_group_id):
@@ -3047,13 +3445,18 @@ def _reservation_create(context, uuid, usage, project_id, user_id, resource,
 # on reservations.
 
 def _get_project_user_quota_usages(context, session, project_id,
-                                   user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+                                   user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                   filter_by(project_id=project_id)
+    if lock:
+        query = query.with_lockmode('update')
+    else:
+        # NOTE: without the lock concurrent reservations may both create
+        # a missing usage, so make every caller pick the oldest row.
+        query = query.order_by(desc(models.QuotaUsage.id))
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3244,39 +3647,45 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         LOG.warning(_("Change will make usage less than 0 for the following "
                       "resources: %s"), unders)
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
-        else:
-            usages = user_usages
-        usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
-                      for k, v in usages.items())
-        headroom = dict((res, user_quotas[res] -
-                             (usages[res]['in_use'] + usages[res]['reserved']))
-                        for res in user_quotas.keys())
-
-        # If quota_cores is unlimited [-1]:
-        # - set cores headroom based on instances headroom:
-        if user_quotas.get('cores') == -1:
-            if deltas['cores']:
-                hc = headroom['instances'] * deltas['cores']
-                headroom['cores'] = hc / deltas['instances']
-            else:
-                headroom['cores'] = headroom['instances']
-
-        # If quota_ram is unlimited [-1]:
-        # - set ram headroom based on instances headroom:
-        if user_quotas.get('ram') == -1:
-            if deltas['ram']:
-                hr = headroom['instances'] * deltas['ram']
-                headroom['ram'] = hr / deltas['instances']
-            else:
-                headroom['ram'] = headroom['instances']
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages, headroom=headroom)
+        _raise_over_quota(overs, project_quotas, user_quotas, project_usages,
+                          user_usages, deltas)
 
     return reservations
 
 
+def _raise_over_quota(overs, project_quotas, user_quotas, project_usages,
+                      user_usages, deltas):
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        usages = user_usages
+    usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
+                  for k, v in usages.items())
+    headroom = dict((res, user_quotas[res] -
+                         (usages[res]['in_use'] + usages[res]['reserved']))
+                    for res in user_quotas.keys())
+
+    # If quota_cores is unlimited [-1]:
+    # - set cores headroom based on instances headroom:
+    if user_quotas.get('cores') == -1:
+        if deltas['cores']:
+            hc = headroom['instances'] * deltas['cores']
+            headroom['cores'] = hc / deltas['instances']
+        else:
+            headroom['cores'] = headroom['instances']
+
+    # If quota_ram is unlimited [-1]:
+    # - set ram headroom based on instances headroom:
+    if user_quotas.get('ram') == -1:
+        if deltas['ram']:
+            hr = headroom['instances'] * deltas['ram']
+            headroom['ram'] = hr / deltas['instances']
+        else:
+            headroom['ram'] = headroom['instances']
+    raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                              usages=usages, headroom=headroom)
+
+
 def _quota_reservations_query(session, context, reservations):
     """Return the relevant reservations."""
 
@@ -3389,6 +3798,246 @@ def reservation_expire(context):
 ###################
 
 
+# NOTE: the *_cas functions below keep the same usages and reservations as
+# quota_reserve() and friends, but only lock usages for as long as a single
+# one is moved. A reservation moves each usage with a single UPDATE whose
+# WHERE clause checks the user quota against the row as it is at that
+# moment. The project quota spans the rows of all the users of the project,
+# so they are locked while it is checked; reservations in the project only
+# wait for each other when they move the same resource.
+
+@_retry_on_deadlock
+def _quota_usage_reserve_cas(context, usage, delta, project_quota,
+                             user_quota):
+    """Add delta to the reserved count of usage if the quotas allow it.
+
+    Returns whether they did.
+    """
+    session = get_session()
+    with session.begin():
+        if project_quota >= 0:
+            project_usages = model_query(context, models.QuotaUsage,
+                                         session=session,
+                                         read_deleted="no").\
+                    filter_by(project_id=usage.project_id).\
+                    filter_by(resource=usage.resource).\
+                    with_lockmode('update').\
+                    all()
+            project_total = sum(project_usage.in_use + project_usage.reserved
+                                for project_usage in project_usages)
+            if project_total + delta > project_quota:
+                return False
+        query = model_query(context, models.QuotaUsage, session=session,
+                            read_deleted="no").\
+                    filter_by(id=usage.id)
+        if user_quota >= 0:
+            query = query.filter(models.QuotaUsage.in_use +
+                                 models.QuotaUsage.reserved + delta <=
+                                 user_quota)
+        return bool(query.update(
+                {'reserved': models.QuotaUsage.reserved + delta},
+                synchronize_session=False))
+
+
+@_retry_on_deadlock
+def _quota_usage_release_cas(context, usage, delta):
+    model_query(context, models.QuotaUsage, read_deleted="no").\
+            filter_by(id=usage.id).\
+            update({'reserved': models.QuotaUsage.reserved - delta},
+                   synchronize_session=False)
+
+
+@require_context
+def quota_reserve_cas(context, resources, project_quotas, user_quotas, deltas,
+                      expire, until_refresh, max_age, project_id=None,
+                      user_id=None):
+    elevated = context.elevated()
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    _project_usages, user_usages = _get_project_user_quota_usages(
+            context, None, project_id, user_id, lock=False)
+    created = set(res for res in deltas if res not in user_usages)
+    for res in created:
+        usage_user_id = None if res in PER_PROJECT_QUOTAS else user_id
+        _quota_usage_create(elevated, project_id, usage_user_id, res, 0, 0,
+                            until_refresh or None)
+    if created:
+        _project_usages, user_usages = _get_project_user_quota_usages(
+                context, None, project_id, user_id, lock=False)
+
+    # Handle usage refresh, as quota_reserve() does. The refreshed counts
+    # are written as they are, so a refresh racing with a commit may be
+    # off until the next one.
+    work = set(deltas.keys())
+    while work:
+        resource = work.pop()
+        usage = user_usages[resource]
+        refresh = False
+        if resource in created:
+            refresh = True
+        elif usage.in_use < 0:
+            # Negative in_use count indicates a desync, so try to
+            # heal from that...
+            refresh = True
+        elif usage.until_refresh is not None:
+            model_query(elevated, models.QuotaUsage, read_deleted="no").\
+                    filter_by(id=usage.id).\
+                    update({'until_refresh':
+                                models.QuotaUsage.until_refresh - 1},
+                           synchronize_session=False)
+            refresh = usage.until_refresh <= 1
+        elif max_age and timeutils.is_older_than(usage.updated_at, max_age):
+            refresh = True
+
+        if refresh:
+            sync = QUOTA_SYNC_FUNCTIONS[resources[resource].sync]
+            updates = sync(elevated, project_id, user_id, get_session())
+            for res, in_use in updates.items():
+                # NOTE: usages which are not reserved are left to be
+                # refreshed by the first reservation of them.
+                if res not in user_usages:
+                    continue
+                usage = user_usages[res]
+                if usage.in_use != in_use:
+                    LOG.debug('quota_usages out of sync, updating. '
+                              'project_id: %(project_id)s, '
+                              'user_id: %(user_id)s, '
+                              'resource: %(res)s, '
+                              'tracked usage: %(tracked_use)s, '
+                              'actual usage: %(in_use)s',
+                        {'project_id': project_id,
+                         'user_id': user_id,
+                         'res': res,
+                         'tracked_use': usage.in_use,
+                         'in_use': in_use})
+                model_query(elevated, models.QuotaUsage,
+                            read_deleted="no").\
+                        filter_by(id=usage.id).\
+                        update({'in_use': in_use,
+                                'until_refresh': until_refresh or None},
+                               synchronize_session=False)
+                usage.in_use = in_use
+                work.discard(res)
+
+    # Check for deltas that would go negative
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and
+              delta + user_usages[res].in_use < 0]
+    if unders:
+        LOG.warning(_("Change will make usage less than 0 for the following "
+                      "resources: %s"), unders)
+
+    # NOTE: as in quota_reserve(), only positive increments are checked
+    # against the quotas and added to the reserved counts. The usages are
+    # always moved in the same order, so that concurrent reservations lock
+    # them in the same order.
+    overs = []
+    reserved = []
+    for res, delta in sorted(deltas.items()):
+        if delta < 0:
+            continue
+        if not _quota_usage_reserve_cas(elevated, user_usages[res], delta,
+                                        project_quotas[res],
+                                        user_quotas[res]):
+            overs.append(res)
+        elif delta > 0:
+            reserved.append(res)
+
+    if overs:
+        for res in reserved:
+            _quota_usage_release_cas(elevated, user_usages[res], deltas[res])
+        project_usages, user_usages = _get_project_user_quota_usages(
+                context, None, project_id, user_id, lock=False)
+        for key, value in user_usages.items():
+            if key not in project_usages:
+                project_usages[key] = value
+        _raise_over_quota(overs, project_quotas, user_quotas, project_usages,
+                          user_usages, deltas)
+
+    try:
+        session = get_session()
+        with session.begin():
+            reservations = []
+            for res, delta in deltas.items():
+                reservation = _reservation_create(elevated,
+                                                  str(uuid.uuid4()),
+                                                  user_usages[res],
+                                                  project_id,
+                                                  user_id,
+                                                  res, delta, expire,
+                                                  session=session)
+                reservations.append(reservation.uuid)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            for res in reserved:
+                _quota_usage_release_cas(elevated, user_usages[res],
+                                         deltas[res])
+    return reservations
+
+
+@_retry_on_deadlock
+def _reservations_finish_cas(context, reservations, commit):
+    session = get_session()
+    with session.begin():
+        for reservation in sorted(reservations, key=lambda r: r.usage_id):
+            # NOTE: only the caller which deletes a reservation applies it,
+            # so a reservation committed while it expires is applied once.
+            deleted = model_query(context, models.Reservation,
+                                  session=session, read_deleted="no").\
+                            filter_by(id=reservation.id).\
+                            soft_delete(synchronize_session=False)
+            if not deleted:
+                continue
+            updates = {}
+            if reservation.delta >= 0:
+                updates['reserved'] = (models.QuotaUsage.reserved -
+                                       reservation.delta)
+            if commit:
+                updates['in_use'] = (models.QuotaUsage.in_use +
+                                     reservation.delta)
+            if updates:
+                model_query(context, models.QuotaUsage, session=session,
+                            read_deleted="no").\
+                        filter_by(id=reservation.usage_id).\
+                        update(updates, synchronize_session=False)
+
+
+@require_context
+def reservation_commit_cas(context, reservations, project_id=None,
+                           user_id=None):
+    reservation_refs = model_query(context, models.Reservation,
+                                   read_deleted="no").\
+                            filter(models.Reservation.uuid.in_(reservations)).\
+                            all()
+    _reservations_finish_cas(context, reservation_refs, commit=True)
+
+
+@require_context
+def reservation_rollback_cas(context, reservations, project_id=None,
+                             user_id=None):
+    reservation_refs = model_query(context, models.Reservation,
+                                   read_deleted="no").\
+                            filter(models.Reservation.uuid.in_(reservations)).\
+                            all()
+    _reservations_finish_cas(context, reservation_refs, commit=False)
+
+
+@require_admin_context
+def reservation_expire_cas(context):
+    reservation_refs = model_query(context, models.Reservation,
+                                   read_deleted="no").\
+                            filter(models.Reservation.expire <
+                                   timeutils.utcnow()).\
+                            all()
+    _reservations_finish_cas(context, reservation_refs, commit=False)
+
+
+###################
+
+
 def _ec2_volume_get_query(context, session=None):
     return model_query(context, models.VolumeIdMapping,
                        session=session, read_deleted='yes')
@@ -4680,6 +5329,23 @@ def instance_system_metadata_get(context, instance_uuid):
     return dict((row['key'], row['value']) for row in rows)
 
 
+@require_admin_context
+def instance_system_metadata_get_instance_uuids(context, keys, limit=None,
+                                                marker=None):
+    query = model_query(context, models.InstanceSystemMetadata.instance_uuid,
+                        base_model=models.InstanceSystemMetadata,
+                        read_deleted="no").\
+                    filter(models.InstanceSystemMetadata.key.in_(keys)).\
+                    distinct().\
+                    order_by(models.InstanceSystemMetadata.instance_uuid)
+    if marker is not None:
+        query = query.filter(
+            models.InstanceSystemMetadata.instance_uuid > marker)
+    if limit is not None:
+        query = query.limit(limit)
+    return [row[0] for row in query.all()]
+
+
 @require_context
 def instance_system_metadata_update(context, instance_uuid, metadata, delete):
     all_keys = metadata.keys()
@@ -4828,6 +5494,51 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
             pass
 
 
+@require_context
+@_retry_on_deadlock
+def bw_usage_update_many(context, start_period, usages, last_refreshed=None):
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    session = get_session()
+    with session.begin():
+        uuids = set(usage['uuid'] for usage in usages)
+        rows = model_query(context, models.BandwidthUsage.id,
+                           models.BandwidthUsage.uuid,
+                           models.BandwidthUsage.mac,
+                           base_model=models.BandwidthUsage,
+                           session=session, read_deleted="yes").\
+                      filter_by(start_period=start_period).\
+                      filter(models.BandwidthUsage.uuid.in_(uuids)).\
+                      all()
+        ids = dict(((uuid, mac), id) for id, uuid, mac in rows)
+
+        updates = []
+        inserts = []
+        for usage in usages:
+            values = {'last_refreshed': last_refreshed,
+                      'last_ctr_in': usage['last_ctr_in'],
+                      'last_ctr_out': usage['last_ctr_out'],
+                      'bw_in': usage['bw_in'],
+                      'bw_out': usage['bw_out']}
+            id = ids.get((usage['uuid'], usage['mac']))
+            if id is not None:
+                values['_id'] = id
+                updates.append(values)
+            else:
+                values.update(start_period=start_period,
+                              uuid=usage['uuid'],
+                              mac=usage['mac'])
+                inserts.append(values)
+
+        if updates:
+            table = models.BandwidthUsage.__table__
+            session.execute(table.update().
+                                where(table.c.id == bindparam('_id')),
+                            updates)
+        _bulk_insert(session, models.BandwidthUsage, inserts)
+
+
 ####################
 
 
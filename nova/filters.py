@@ -17,6 +17,8 @@
 Filter support
 """
 
+import time
+
 from nova import loadables
 from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
@@ -43,10 +45,25 @@ class BaseFilter(object):
             if self._filter_one(obj, filter_properties):
                 yield obj
 
+    def filter_batch(self, table, filter_properties):
+        """Return a boolean mask of the objects in table passing the filter.
+
+        Override this in a subclass to evaluate the filter over the
+        columnar table of all objects in one pass.  Returning None falls
+        back to filter_all().
+        """
+        return None
+
     # Set to true in a subclass if a filter only needs to be run once
     # for each request rather than for each instance
     run_filter_once_per_request = False
 
+    # Set to true in a subclass if the result of a filter for an object only
+    # depends on the state of that object and on the request.  When placing
+    # multiple instances such a filter only needs to be re-run for objects
+    # whose state changed since it was last run.
+    depends_on_host_state_only = False
+
     def run_filter_for_index(self, index):
         """Return True if the filter needs to be run for the "index-th"
         instance in a request.  Only need to override this if a filter
@@ -64,22 +81,66 @@ class BaseFilterHandler(loadables.BaseLoader):
     This class should be subclassed where one needs to use filters.
     """
 
+    def __init__(self, loadable_cls_type):
+        super(BaseFilterHandler, self).__init__(loadable_cls_type)
+        # { filter class name : {'calls', 'seconds', 'objs_in', 'objs_out'} }
+        self.filter_stats = {}
+
+    def _record_stats(self, cls_name, start, objs_in, objs_out):
+        stats = self.filter_stats.get(cls_name)
+        if stats is None:
+            stats = self.filter_stats[cls_name] = dict(
+                    calls=0, seconds=0.0, objs_in=0, objs_out=0)
+        stats['calls'] += 1
+        stats['seconds'] += time.time() - start
+        stats['objs_in'] += objs_in
+        stats['objs_out'] += objs_out
+
+    def pop_filter_stats(self):
+        """Return the time spent in each filter and the objects it was
+        given and passed since the previous call, and reset them.
+        """
+        filter_stats = self.filter_stats
+        self.filter_stats = {}
+        return filter_stats
+
+    def _get_batch_table(self, objs):
+        """Return a columnar table of objs for filter_batch(), or None.
+
+        Override this in a subclass to enable batch filtering.
+        """
+        return None
+
     def get_filtered_objects(self, filter_classes, objs,
             filter_properties, index=0):
         list_objs = list(objs)
         LOG.debug("Starting with %d host(s)", len(list_objs))
+        table = self._get_batch_table(list_objs)
         for filter_cls in filter_classes:
             cls_name = filter_cls.__name__
             filter = filter_cls()
 
             if filter.run_filter_for_index(index):
-                objs = filter.filter_all(list_objs,
-                                               filter_properties)
-                if objs is None:
-                    LOG.debug("Filter %(cls_name)s says to stop filtering",
-                              {'cls_name': cls_name})
-                    return
-                list_objs = list(objs)
+                start = time.time()
+                objs_in = len(list_objs)
+                mask = None
+                if table is not None:
+                    mask = filter.filter_batch(table, filter_properties)
+                if mask is not None:
+                    table = table.select(mask)
+                    list_objs = table.objs
+                else:
+                    objs = filter.filter_all(list_objs,
+                                                   filter_properties)
+                    if objs is None:
+                        self._record_stats(cls_name, start, objs_in, 0)
+                        LOG.debug("Filter %(cls_name)s says to stop "
+                                  "filtering", {'cls_name': cls_name})
+                        return
+                    list_objs = list(objs)
+                    if table is not None:
+                        table = table.subset(list_objs)
+                self._record_stats(cls_name, start, objs_in, len(list_objs))
                 if not list_objs:
                     LOG.info(_("Filter %s returned 0 hosts"), cls_name)
                     break
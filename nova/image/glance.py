@@ -18,6 +18,8 @@
 from __future__ import absolute_import
 
 import copy
+import hashlib
+import httplib
 import itertools
 import json
 import random
@@ -79,6 +81,11 @@ glance_opts = [
                      'via the direct_url.  Currently supported schemes: '
                      '[file].',
                deprecated_group='DEFAULT'),
+    cfg.BoolOpt('preallocate_downloads',
+                default=False,
+                help='Allocate the space of the images downloaded to a file '
+                     'with fallocate before writing them, so that they are '
+                     'not fragmented'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -328,20 +335,64 @@ class GlanceImageService(object):
         except Exception:
             _reraise_translated_image_exception(image_id)
 
-        close_file = False
         if data is None and dst_path:
-            data = open(dst_path, 'wb')
-            close_file = True
+            return self._download_to_file(context, image_id, image_chunks,
+                                          dst_path)
 
         if data is None:
             return image_chunks
         else:
-            try:
-                for chunk in image_chunks:
-                    data.write(chunk)
-            finally:
-                if close_file:
-                    data.close()
+            for chunk in image_chunks:
+                data.write(chunk)
+
+    def _download_to_file(self, context, image_id, image_chunks, dst_path):
+        """Write the image data to dst_path and return its SHA1, computed
+        while writing it.
+
+        A transfer failing midway is started again, up to
+        CONF.glance.num_retries times.
+        """
+        num_attempts = 1 + CONF.glance.num_retries
+        with open(dst_path, 'wb') as data:
+            for attempt in xrange(1, num_attempts + 1):
+                if CONF.glance.preallocate_downloads:
+                    self._preallocate(context, image_id, dst_path)
+                checksum = hashlib.sha1()
+                try:
+                    for chunk in image_chunks:
+                        checksum.update(chunk)
+                        data.write(chunk)
+                    return checksum.hexdigest()
+                except (IOError, httplib.HTTPException) as e:
+                    if attempt == num_attempts:
+                        raise
+                    LOG.warn(_("Error downloading image %(image_id)s, "
+                               "retrying: %(error)s"),
+                             {'image_id': image_id, 'error': e})
+
+                data.seek(0)
+                data.truncate()
+                try:
+                    image_chunks = self._client.call(context, 1, 'data',
+                                                     image_id)
+                except Exception:
+                    _reraise_translated_image_exception(image_id)
+
+    def _preallocate(self, context, image_id, dst_path):
+        """Allocate the space of the image at dst_path, when fallocate is
+        available and the size of the image is known.
+        """
+        try:
+            image = self._client.call(context, 1, 'get', image_id)
+        except Exception:
+            _reraise_translated_image_exception(image_id)
+        size = getattr(image, 'size', None)
+        if not size:
+            return
+        _out, err = utils.trycmd('fallocate', '-n', '-l', size, dst_path)
+        if err:
+            LOG.debug("Unable to preallocate %(path)s: %(err)s",
+                      {'path': dst_path, 'err': err})
 
     def create(self, context, image_meta, data=None):
         """Store the image data and return the new image object."""
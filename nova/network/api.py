@@ -347,17 +347,38 @@ class API(base_api.NetworkAPI):
                                                     result, update_cells=False)
         return result
 
-    def _get_instance_nw_info(self, context, instance):
-        """Returns all network info related to an instance."""
+    @wrap_check_policy
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances, by instance uuid.
+
+        Only the info caches which changed are updated.
+        """
+        return super(API, self).get_instances_nw_info(context, instances)
+
+    def _get_nw_info_args(self, instance):
         flavor = flavors.extract_flavor(instance)
-        args = {'instance_id': instance['uuid'],
+        return {'instance_id': instance['uuid'],
                 'rxtx_factor': flavor['rxtx_factor'],
                 'host': instance['host'],
                 'project_id': instance['project_id']}
+
+    def _get_instance_nw_info(self, context, instance):
+        """Returns all network info related to an instance."""
+        args = self._get_nw_info_args(instance)
         nw_info = self.network_rpcapi.get_instance_nw_info(context, **args)
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances in one call."""
+        if not self.network_rpcapi.client.can_send_version('1.13'):
+            return super(API, self)._get_instances_nw_info(context,
+                                                           instances)
+        args = [self._get_nw_info_args(instance) for instance in instances]
+        nw_infos = self.network_rpcapi.get_instances_nw_info(context, args)
+        return dict((instance_uuid, network_model.NetworkInfo.hydrate(nw_info))
+                    for instance_uuid, nw_info in nw_infos.iteritems())
+
     @wrap_check_policy
     def validate_networks(self, context, requested_networks, num_instances):
         """validate the networks passed at the time of creating
@@ -233,6 +233,39 @@ class NetworkAPI(base.Base):
         """Returns all network info related to an instance."""
         raise NotImplementedError()
 
+    def get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances, by instance uuid.
+
+        Only the info caches which changed are updated.  Instances whose
+        network info could not be retrieved are left out.
+        """
+        nw_infos = self._get_instances_nw_info(context, instances)
+        for instance in instances:
+            nw_info = nw_infos.get(instance['uuid'])
+            if nw_info is None:
+                continue
+            info_cache = instance['info_cache']
+            if info_cache is not None and info_cache.network_info == nw_info:
+                continue
+            update_instance_cache_with_nw_info(self, context, instance,
+                                               nw_info, update_cells=False)
+        return nw_infos
+
+    def _get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances without caching it.
+
+        Implementations which can retrieve it in bulk override this.
+        """
+        nw_infos = {}
+        for instance in instances:
+            try:
+                nw_infos[instance['uuid']] = self._get_instance_nw_info(
+                        context, instance)
+            except Exception:
+                LOG.exception(_('Failed to get the network info'),
+                              instance=instance)
+        return nw_infos
+
     def validate_networks(self, context, requested_networks, num_instances):
         """validate the networks passed at the time of creating
         the server.
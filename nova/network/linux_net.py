@@ -18,10 +18,13 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
+import tempfile
 
+from eventlet import greenthread
 import netaddr
 from oslo.config import cfg
 import six
@@ -127,6 +130,12 @@ linux_net_opts = [
     cfg.BoolOpt('fake_network',
                 default=False,
                 help='If passed, use fake network devices and addresses'),
+    cfg.FloatOpt('dnsmasq_reload_delay',
+                 default=0.5,
+                 help='Number of seconds to wait before reloading dnsmasq '
+                      'after an incremental change to its hosts file, so '
+                      'that changes made in quick succession share a '
+                      'single reload. 0 reloads immediately.'),
     ]
 
 CONF = cfg.CONF
@@ -468,7 +477,20 @@ class IptablesManager(object):
         end = lines[start:].index('COMMIT') + start + 2
         return (start, end)
 
+    @staticmethod
+    def _rule_key(line):
+        """Return a line of iptables-save output without its counts."""
+        # ignore [packet:byte] counts at beginning of lines
+        if line.startswith('['):
+            line = line.split(']', 1)[1]
+        return line.strip()
+
     def _modify_rules(self, current_lines, table, table_name):
+        """Merge the rules of table into the iptables-save lines of a table.
+
+        Lines are matched against rules through sets and dicts keyed by
+        rule, so that the merge is linear in the number of lines and rules.
+        """
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
         remove_chains = table.remove_chains
@@ -482,27 +504,25 @@ class IptablesManager(object):
             current_lines = fake_table
 
         # Remove any trace of our rules
-        new_filter = filter(lambda line: binary_name not in line,
-                            current_lines)
+        new_filter = [line for line in current_lines
+                      if binary_name not in line]
 
         top_rules = []
         bottom_rules = []
 
         if CONF.iptables_top_regex:
             regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            top_rules = temp_filter
+            top_rules = [line for line in new_filter if regex.search(line)]
+            top_lines = set(line.strip() for line in top_rules)
+            new_filter = [line for line in new_filter
+                          if line.strip() not in top_lines]
 
         if CONF.iptables_bottom_regex:
             regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                    new_filter)
-            bottom_rules = temp_filter
+            bottom_rules = [line for line in new_filter if regex.search(line)]
+            bottom_lines = set(line.strip() for line in bottom_rules)
+            new_filter = [line for line in new_filter
+                          if line.strip() not in bottom_lines]
 
         seen_chains = False
         rules_index = 0
@@ -517,6 +537,11 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
+        # The last line of each rule already in the table
+        current_rules = dict((self._rule_key(line), line)
+                             for line in new_filter)
+        top_keys = set()
+
         our_rules = top_rules
         bot_rules = []
         for rule in rules:
@@ -530,29 +555,23 @@ class IptablesManager(object):
                 # [packet:byte] counts and replace it with [0:0], so let's
                 # go look for a duplicate, and over-ride our table rule if
                 # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = filter(lambda s: rule_str.strip() in s.strip(),
-                                    new_filter)
-
-                new_filter = filter(lambda s:
-                                    rule_str.strip() not in s.strip(),
-                                    new_filter)
+                key = self._rule_key(rule_str)
+                dup = None
+                if key not in top_keys:
+                    dup = current_rules.get(key)
+                    top_keys.add(key)
                 # if no duplicates, use original rule
-                if dup_filter:
-                    # grab the last entry, if there is one
-                    dup = dup_filter[-1]
+                if dup:
                     rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
 
                 our_rules += [rule_str]
             else:
                 bot_rules += [rule_str]
 
+        if top_keys:
+            new_filter = [line for line in new_filter
+                          if self._rule_key(line) not in top_keys]
+
         our_rules += bot_rules
 
         new_filter[rules_index:rules_index] = our_rules
@@ -567,11 +586,15 @@ class IptablesManager(object):
         new_filter[commit_index:commit_index] = bottom_rules
         seen_lines = set()
 
+        # Each rule to remove removes a single line, so count them by rule
+        remove_counts = {}
+        for rule in remove_rules:
+            key = self._rule_key(str(rule))
+            remove_counts[key] = remove_counts.get(key, 0) + 1
+        removed_counts = {}
+
         def _weed_out_duplicates(line):
-            # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
+            line = self._rule_key(line)
             if line in seen_lines:
                 return False
             else:
@@ -586,23 +609,16 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chains:
+                    remove_chains.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                line = self._rule_key(line)
+                if remove_counts.get(line):
+                    remove_counts[line] -= 1
+                    removed_counts[line] = removed_counts.get(line, 0) + 1
+                    return False
 
             # Leave it alone
             return True
@@ -615,6 +631,16 @@ class IptablesManager(object):
         new_filter = filter(_weed_out_removes, new_filter)
         new_filter.reverse()
 
+        # Forget the rules which were removed
+        remaining_rules = []
+        for rule in remove_rules:
+            key = self._rule_key(str(rule))
+            if removed_counts.get(key):
+                removed_counts[key] -= 1
+            else:
+                remaining_rules.append(rule)
+        remove_rules[:] = remaining_rules
+
         # flush lists, just in case we didn't find something
         remove_chains.clear()
         for rule in remove_rules:
@@ -623,11 +649,91 @@ class IptablesManager(object):
         return new_filter
 
 
+class IpsetManager(object):
+    """Wrapper for ipset.
+
+    Keeps sets of IP addresses, which iptables rules can match with
+    "-m set --match-set <name> src".  Their members are updated in place,
+    without reloading the iptables tables.
+
+    """
+
+    def __init__(self, execute=None):
+        if not execute:
+            self.execute = _execute
+        else:
+            self.execute = execute
+        # The members of each set, by set name
+        self.sets = {}
+
+    @utils.synchronized('ipset')
+    def set_members(self, name, version, members):
+        """Make members the IP addresses of the named set.
+
+        The set is created if needed.  Only the members which changed are
+        added or deleted, with a single ipset call.
+
+        """
+        members = set(members)
+        current = self.sets.get(name)
+        commands = []
+        if current is None:
+            # The set may be left over by a previous run
+            family = 'inet6' if version == 6 else 'inet'
+            commands.append('create %s hash:ip family %s' % (name, family))
+            commands.append('flush %s' % name)
+            current = set()
+        commands += ['add %s %s' % (name, ip)
+                     for ip in sorted(members - current)]
+        commands += ['del %s %s' % (name, ip)
+                     for ip in sorted(current - members)]
+        if commands:
+            self.execute('ipset', '-exist', 'restore',
+                         process_input='\n'.join(commands) + '\n',
+                         run_as_root=True)
+        self.sets[name] = members
+
+    @utils.synchronized('ipset')
+    def destroy(self, name):
+        """Destroy the named set.
+
+        This fails while iptables rules still use the set, in which case
+        the set is kept, to be destroyed by a later call.
+
+        """
+        if name not in self.sets:
+            return
+        try:
+            self.execute('ipset', 'destroy', name, run_as_root=True)
+        except processutils.ProcessExecutionError:
+            LOG.debug('Could not destroy ipset %s, it is probably still in '
+                      'use', name)
+            return
+        del self.sets[name]
+
+
 # NOTE(jkoelker) This is just a nice little stub point since mocking
 #                builtins with mox is a nightmare
 def write_to_file(file, data, mode='w'):
-    with open(file, mode) as f:
-        f.write(data)
+    if mode != 'w':
+        with open(file, mode) as f:
+            f.write(data)
+        return
+
+    # NOTE: Write to a temporary file and rename it over the original so
+    #       that a reader (e.g. dnsmasq reloading on HUP) never sees a
+    #       partially written file.
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(file),
+                                     prefix='.%s.' % os.path.basename(file),
+                                     delete=False) as f:
+        try:
+            os.fchmod(f.fileno(), 0o644)
+            f.write(data)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                f.close()
+                os.unlink(f.name)
+    os.rename(f.name, file)
 
 
 def metadata_forward():
@@ -890,23 +996,41 @@ def get_dhcp_leases(context, network_ref):
     return '\n'.join(hosts)
 
 
-def get_dhcp_hosts(context, network_ref):
-    """Get network's hosts config in dhcp-host format."""
-    hosts = []
+def _get_dhcp_host_entries(context, network_ref):
+    """Return a network's allocated fixed ips as dhcp-host entries.
+
+    The result maps each fixed ip address to a (mac, entry) tuple, in the
+    order the addresses should appear in the hosts file.
+    """
+    entries = collections.OrderedDict()
     host = None
     if network_ref['multi_host']:
         host = CONF.host
-    macs = set()
     for fixedip in fixed_ip_obj.FixedIPList.get_by_network(context,
                                                            network_ref,
                                                            host=host):
         if fixedip.allocated:
-            if fixedip.virtual_interface.address not in macs:
-                hosts.append(_host_dhcp(fixedip))
-                macs.add(fixedip.virtual_interface.address)
+            entries[str(fixedip.address)] = (
+                fixedip.virtual_interface.address, _host_dhcp(fixedip))
+    return entries
+
+
+def _render_dhcp_hosts(entries):
+    """Render dhcp-host entries, keeping only the first one for a mac."""
+    hosts = []
+    macs = set()
+    for mac, entry in entries.itervalues():
+        if mac not in macs:
+            hosts.append(entry)
+            macs.add(mac)
     return '\n'.join(hosts)
 
 
+def get_dhcp_hosts(context, network_ref):
+    """Get network's hosts config in dhcp-host format."""
+    return _render_dhcp_hosts(_get_dhcp_host_entries(context, network_ref))
+
+
 def get_dns_hosts(context, network_ref):
     """Get network's DNS hosts in hosts format."""
     hosts = []
@@ -994,12 +1118,97 @@ def release_dhcp(dev, address, mac_address):
     utils.execute('dhcp_release', dev, address, mac_address, run_as_root=True)
 
 
+# NOTE: Rendered dhcp-host entries for each device, as returned by
+#       _get_dhcp_host_entries().  This lets allocations and releases
+#       rewrite the hosts file without reloading every fixed ip in the
+#       network from the database.
+_dhcp_host_entries = {}
+
+# NOTE: Devices with a dnsmasq reload scheduled, mapped to the arguments
+#       the reload should be made with.
+_pending_dhcp_restarts = {}
+
+
 def update_dhcp(context, dev, network_ref):
+    """Rebuild a network's dhcp hosts file and (re)start dnsmasq."""
     conffile = _dhcp_file(dev, 'conf')
-    write_to_file(conffile, get_dhcp_hosts(context, network_ref))
+    entries = _get_dhcp_host_entries(context, network_ref)
+    _dhcp_host_entries[dev] = entries
+    write_to_file(conffile, _render_dhcp_hosts(entries))
+    _pending_dhcp_restarts.pop(dev, None)
+    restart_dhcp(context, dev, network_ref)
+
+
+def add_dhcp_host(context, dev, network_ref, fixedip):
+    """Add an allocated fixed ip to a network's dhcp hosts file.
+
+    The fixed ip must have its instance and virtual_interface set. Falls
+    back to a full update_dhcp() if the hosts file has not been built yet.
+    """
+    entries = _dhcp_host_entries.get(dev)
+    if entries is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    entries[str(fixedip.address)] = (fixedip.virtual_interface.address,
+                                     _host_dhcp(fixedip))
+    _write_dhcp_hosts(dev, entries)
+    _schedule_restart_dhcp(context, dev, network_ref)
+
+
+def remove_dhcp_host(context, dev, network_ref, fixedip):
+    """Remove a fixed ip from a network's dhcp hosts file.
+
+    dnsmasq is reloaded before returning, so that the lease of the fixed
+    ip can be released right away.  Falls back to a full update_dhcp() if
+    the hosts file has not been built yet.
+    """
+    entries = _dhcp_host_entries.get(dev)
+    if entries is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    if entries.pop(str(fixedip.address), None) is None:
+        return
+    _write_dhcp_hosts(dev, entries)
+    # NOTE: dhcp_release is only honoured once dnsmasq no longer has the
+    #       fixed ip in its hosts, so removals can not wait for a
+    #       scheduled restart.  The restart also picks up any pending
+    #       additions.
+    _pending_dhcp_restarts.pop(dev, None)
     restart_dhcp(context, dev, network_ref)
 
 
+def _write_dhcp_hosts(dev, entries):
+    conffile = _dhcp_file(dev, 'conf')
+    write_to_file(conffile, _render_dhcp_hosts(entries))
+
+
+def _schedule_restart_dhcp(context, dev, network_ref):
+    """Restart dnsmasq once the reload delay has passed.
+
+    Requests made while a restart is already scheduled for the device are
+    folded into that restart.
+    """
+    if CONF.dnsmasq_reload_delay <= 0:
+        restart_dhcp(context, dev, network_ref)
+        return
+    scheduled = dev in _pending_dhcp_restarts
+    _pending_dhcp_restarts[dev] = (context, network_ref)
+    if not scheduled:
+        greenthread.spawn_after(CONF.dnsmasq_reload_delay,
+                                _run_pending_dhcp_restart, dev)
+
+
+def _run_pending_dhcp_restart(dev):
+    pending = _pending_dhcp_restarts.pop(dev, None)
+    if pending is None:
+        return
+    context, network_ref = pending
+    try:
+        restart_dhcp(context, dev, network_ref)
+    except Exception:
+        LOG.exception(_('Failed to restart dnsmasq for %s'), dev)
+
+
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
     write_to_file(hostsfile, get_dns_hosts(context, network_ref))
@@ -1007,11 +1216,14 @@ def update_dns(context, dev, network_ref):
 
 
 def update_dhcp_hostfile_with_text(dev, hosts_text):
+    _dhcp_host_entries.pop(dev, None)
     conffile = _dhcp_file(dev, 'conf')
     write_to_file(conffile, hosts_text)
 
 
 def kill_dhcp(dev):
+    _dhcp_host_entries.pop(dev, None)
+    _pending_dhcp_restarts.pop(dev, None)
     pid = _dnsmasq_pid_for(dev)
     if pid:
         # Check that the process exists and looks like a dnsmasq process
@@ -1836,3 +2048,4 @@ class NeutronLinuxBridgeInterfaceDriver(LinuxNetInterfaceDriver):
 QuantumLinuxBridgeInterfaceDriver = NeutronLinuxBridgeInterfaceDriver
 
 iptables_manager = IptablesManager()
+ipset_manager = IpsetManager()
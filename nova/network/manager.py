@@ -41,10 +41,12 @@ topologies.  All of the network commands are issued to a subclass of
 
 """
 
+import collections
 import datetime
 import itertools
 import math
 import re
+import string
 import uuid
 
 import eventlet
@@ -65,6 +67,7 @@ from nova.network import rpcapi as network_rpcapi
 from nova.objects import base as obj_base
 from nova.objects import dns_domain as dns_domain_obj
 from nova.objects import fixed_ip as fixed_ip_obj
+from nova.objects import floating_ip as floating_ip_obj
 from nova.objects import instance as instance_obj
 from nova.objects import instance_info_cache as info_cache_obj
 from nova.objects import network as network_obj
@@ -166,6 +169,42 @@ CONF.import_opt('fake_network', 'nova.network.linux_net')
 CONF.import_opt('share_dhcp_address', 'nova.objects.network')
 
 
+def _ip_filter_prefix(ip_filter):
+    """Find the start of the addresses which an IP filter regex matches.
+
+    :returns: a tuple of that start, as a LIKE pattern, and whether the
+              regex only matches that address
+    """
+    if '|' in ip_filter or '(?' in ip_filter:
+        # Alternatives and flags can change the meaning of anything
+        return '', False
+    prefix = ''
+    wildcard = False
+    i = 1 if ip_filter.startswith('^') else 0
+    while i < len(ip_filter):
+        char = ip_filter[i]
+        if ip_filter[i:i + 2] == '\\.':
+            char = '.'
+            i += 2
+        elif char == '.':
+            char = '_'
+            wildcard = True
+            i += 1
+        elif char in string.hexdigits or char == ':':
+            i += 1
+        elif char == '$' and i == len(ip_filter) - 1:
+            return prefix, not wildcard
+        else:
+            break
+        if ip_filter[i:i + 1] in ('*', '?', '{'):
+            # The character may not be there at all
+            break
+        prefix += char
+        if ip_filter[i:i + 1] == '+':
+            break
+    return prefix, False
+
+
 class RPCAllocateFixedIP(object):
     """Mixin class originally for FlatDCHP and VLAN network managers.
 
@@ -266,7 +305,7 @@ class NetworkManager(manager.Manager):
         The one at a time part is to flatten the layout to help scale
     """
 
-    target = messaging.Target(version='1.12')
+    target = messaging.Target(version='1.13')
 
     # If True, this manager requires VIF to create a bridge.
     SHOULD_CREATE_BRIDGE = False
@@ -417,49 +456,72 @@ class NetworkManager(manager.Manager):
                   'IP filter: %s. IPv6 filter: %s', fixed_ip_filter,
                   str(filters.get('ip')), str(filters.get('ip6')))
 
+        # NOTE: only the addresses which start like the filters are
+        #       fetched, with an indexed query, and then matched here.
+        searches = []
+        if fixed_ip_filter is not None:
+            searches.append((str(fixed_ip_filter), True))
+        if filters.get('ip') is not None:
+            searches.append(_ip_filter_prefix(str(filters.get('ip'))))
+        candidates = []
+        floating_addresses = {}
+        for address, exact in searches:
+            fixed_ips = fixed_ip_obj.FixedIPList.search_by_address(
+                context, address, exact=exact)
+            for fixed_ip in fixed_ips:
+                key = (fixed_ip['instance_uuid'], fixed_ip['address'])
+                if key not in floating_addresses:
+                    candidates.append(key)
+                    floating_addresses[key] = []
+                floating_address = fixed_ip['floating_address']
+                if (floating_address and
+                        floating_address not in floating_addresses[key]):
+                    floating_addresses[key].append(floating_address)
+
+        results = []
+        for instance_uuid, address in candidates:
+            if address == fixed_ip_filter or ip_filter.match(address):
+                results.append({'instance_uuid': instance_uuid,
+                                'ip': address})
+                continue
+            for floating_address in floating_addresses[(instance_uuid,
+                                                         address)]:
+                if ip_filter.match(floating_address):
+                    results.append({'instance_uuid': instance_uuid,
+                                    'ip': floating_address})
+
+        if filters.get('ip6') is not None:
+            results.extend(self._get_instance_uuids_by_ipv6_filter(
+                context, ipv6_filter))
+        return results
+
+    def _get_instance_uuids_by_ipv6_filter(self, context, ipv6_filter):
         # NOTE(jkoelker) Should probably figure out a better way to do
         #                this. But for now it "works", this could suck on
         #                large installs.
-
+        # NOTE: the global IPv6 addresses aren't stored but computed from
+        #       the MAC addresses, which requires going through all of them.
         vifs = vif_obj.VirtualInterfaceList.get_all(context)
+        networks = {}
         results = []
 
         for vif in vifs:
             if vif.instance_uuid is None:
                 continue
 
-            network = self._get_network_by_id(context, vif.network_id)
-            fixed_ipv6 = None
-            if network['cidr_v6'] is not None:
-                fixed_ipv6 = ipv6.to_global(network['cidr_v6'],
-                                            vif.address,
-                                            context.project_id)
-
-            if fixed_ipv6 and ipv6_filter.match(fixed_ipv6):
+            if vif.network_id not in networks:
+                networks[vif.network_id] = self._get_network_by_id(
+                    context, vif.network_id)
+            network = networks[vif.network_id]
+            if network['cidr_v6'] is None:
+                continue
+            fixed_ipv6 = ipv6.to_global(network['cidr_v6'],
+                                        vif.address,
+                                        context.project_id)
+            if ipv6_filter.match(fixed_ipv6):
                 results.append({'instance_uuid': vif.instance_uuid,
                                 'ip': fixed_ipv6})
 
-            fixed_ips = fixed_ip_obj.FixedIPList.get_by_virtual_interface_id(
-                context, vif.id)
-            for fixed_ip in fixed_ips:
-                if not fixed_ip or not fixed_ip.address:
-                    continue
-                if str(fixed_ip.address) == fixed_ip_filter:
-                    results.append({'instance_uuid': vif.instance_uuid,
-                                    'ip': fixed_ip.address})
-                    continue
-                if ip_filter.match(str(fixed_ip.address)):
-                    results.append({'instance_uuid': vif.instance_uuid,
-                                    'ip': fixed_ip.address})
-                    continue
-                for floating_ip in fixed_ip.floating_ips:
-                    if not floating_ip or not floating_ip.address:
-                        continue
-                    if ip_filter.match(str(floating_ip.address)):
-                        results.append({'instance_uuid': vif.instance_uuid,
-                                        'ip': floating_ip.address})
-                        continue
-
         return results
 
     def _get_networks_for_instance(self, context, instance_id, project_id,
@@ -590,25 +652,105 @@ class NetworkManager(manager.Manager):
         if not uuidutils.is_uuid_like(instance_id):
             instance_id = instance_uuid
         instance_uuid = instance_id
+        return self._get_instance_nw_info(context, instance_uuid,
+                                          rxtx_factor, host, use_slave)
+
+    def _get_instance_nw_info(self, context, instance_uuid, rxtx_factor,
+                              host, use_slave=False, networks_by_id=None,
+                              vifs=None, **kwargs):
+        """Creates network info list for instance.
+
+        The networks of the instance are picked from networks_by_id, a dict
+        of the networks already looked up by id, which the looked up
+        networks are added to.  The virtual interfaces of the instance are
+        queried unless given, the other keyword arguments are passed to
+        build_network_info_model().
+        """
         LOG.debug('Get instance network info', instance_uuid=instance_uuid)
 
-        vifs = vif_obj.VirtualInterfaceList.get_by_instance_uuid(context,
-                instance_uuid, use_slave=use_slave)
+        if networks_by_id is None:
+            networks_by_id = {}
+        if vifs is None:
+            vifs = vif_obj.VirtualInterfaceList.get_by_instance_uuid(context,
+                    instance_uuid, use_slave=use_slave)
         networks = {}
 
         for vif in vifs:
             if vif.network_id is not None:
-                network = self._get_network_by_id(context, vif.network_id)
-                networks[vif.uuid] = network
+                if vif.network_id not in networks_by_id:
+                    networks_by_id[vif.network_id] = self._get_network_by_id(
+                            context, vif.network_id)
+                networks[vif.uuid] = networks_by_id[vif.network_id]
 
         nw_info = self.build_network_info_model(context, vifs, networks,
-                                                         rxtx_factor, host)
+                                                rxtx_factor, host, **kwargs)
         return nw_info
 
+    def get_instances_nw_info(self, context, instances):
+        """Creates the network info of several instances.
+
+        :param instances: list of the get_instance_nw_info() arguments of
+                          each instance
+        :returns: dict of the network info of each instance, by uuid.
+                  Instances whose network info could not be created are
+                  left out.
+
+        The virtual interfaces, fixed ips and floating ips of all the
+        instances are queried at once, and each network and its subnets
+        are looked up once.
+        """
+        instance_uuids = [kwargs['instance_id'] for kwargs in instances]
+        use_slave = all(kwargs.get('use_slave') for kwargs in instances)
+        vifs_by_instance = collections.defaultdict(list)
+        for vif in vif_obj.VirtualInterfaceList.get_by_instance_uuids(
+                context, instance_uuids, use_slave=use_slave):
+            vifs_by_instance[vif.instance_uuid].append(vif)
+        fixed_ips_by_vif = collections.defaultdict(list)
+        fixed_addresses = {}
+        for fixed_ip in fixed_ip_obj.FixedIPList.get_by_instance_uuids(
+                context, instance_uuids):
+            fixed_ips_by_vif[fixed_ip.virtual_interface_id].append(fixed_ip)
+            fixed_addresses[fixed_ip.id] = str(fixed_ip.address)
+        floating_ips_by_fixed_address = collections.defaultdict(list)
+        for floating_ip in floating_ip_obj.FloatingIPList.\
+                get_by_instance_uuids(context, instance_uuids):
+            fixed_address = fixed_addresses.get(floating_ip.fixed_ip_id)
+            if fixed_address is not None:
+                floating_ips_by_fixed_address[fixed_address].append(
+                        floating_ip)
+
+        nw_infos = {}
+        networks_by_id = {}
+        ipam_subnets_by_net_id = {}
+        for kwargs in instances:
+            instance_uuid = kwargs['instance_id']
+            try:
+                nw_infos[instance_uuid] = self._get_instance_nw_info(
+                        context, instance_uuid, kwargs['rxtx_factor'],
+                        kwargs['host'], networks_by_id=networks_by_id,
+                        vifs=vifs_by_instance[instance_uuid],
+                        fixed_ips_by_vif=fixed_ips_by_vif,
+                        floating_ips_by_fixed_address=(
+                            floating_ips_by_fixed_address),
+                        ipam_subnets_by_net_id=ipam_subnets_by_net_id)
+            except Exception:
+                LOG.exception(_('Failed to get the network info'),
+                              instance_uuid=instance_uuid)
+        return nw_infos
+
     def build_network_info_model(self, context, vifs, networks,
-                                 rxtx_factor, instance_host):
+                                 rxtx_factor, instance_host,
+                                 fixed_ips_by_vif=None,
+                                 floating_ips_by_fixed_address=None,
+                                 ipam_subnets_by_net_id=None):
         """Builds a NetworkInfo object containing all network information
         for an instance.
+
+        The fixed ips are taken from fixed_ips_by_vif, a dict of the fixed
+        ip objects of each virtual interface by id, and their floating ips
+        from floating_ips_by_fixed_address, when given.  Otherwise they are
+        queried for each virtual interface.  ipam_subnets_by_net_id is
+        passed to _get_subnets_from_network().
         """
         nw_info = network_model.NetworkInfo()
         for vif in vifs:
@@ -624,8 +766,9 @@ class NetworkManager(manager.Manager):
 
             # get network dict for vif from args and build the subnets
             network = networks[vif.uuid]
-            subnets = self._get_subnets_from_network(context, network, vif,
-                                                     instance_host)
+            subnets = self._get_subnets_from_network(
+                    context, network, vif, instance_host,
+                    ipam_subnets_by_net_id=ipam_subnets_by_net_id)
 
             # if rxtx_cap data are not set everywhere, set to none
             try:
@@ -634,14 +777,21 @@ class NetworkManager(manager.Manager):
                 rxtx_cap = None
 
             # get fixed_ips
-            v4_IPs = self.ipam.get_v4_ips_by_interface(context,
-                                                       network['uuid'],
-                                                       vif.uuid,
-                                                       network['project_id'])
-            v6_IPs = self.ipam.get_v6_ips_by_interface(context,
-                                                       network['uuid'],
-                                                       vif.uuid,
-                                                       network['project_id'])
+            if fixed_ips_by_vif is None:
+                v4_IPs = self.ipam.get_v4_ips_by_interface(
+                        context, network['uuid'], vif.uuid,
+                        network['project_id'])
+                v6_IPs = self.ipam.get_v6_ips_by_interface(
+                        context, network['uuid'], vif.uuid,
+                        network['project_id'])
+            else:
+                v4_IPs = [str(fixed_ip.address)
+                          for fixed_ip in fixed_ips_by_vif.get(vif.id, [])]
+                v6_IPs = []
+                if network['cidr_v6'] and vif.address:
+                    v6_IPs.append(ipv6.to_global(network['cidr_v6'],
+                                                 vif.address,
+                                                 network['project_id']))
 
             # create model FixedIPs from these fixed_ips
             network_IPs = [network_model.FixedIP(address=ip_address)
@@ -652,8 +802,12 @@ class NetworkManager(manager.Manager):
             for fixed_ip in network_IPs:
                 if fixed_ip['version'] == 6:
                     continue
-                gfipbfa = self.ipam.get_floating_ips_by_fixed_address
-                floating_ips = gfipbfa(context, fixed_ip['address'])
+                if floating_ips_by_fixed_address is None:
+                    gfipbfa = self.ipam.get_floating_ips_by_fixed_address
+                    floating_ips = gfipbfa(context, fixed_ip['address'])
+                else:
+                    floating_ips = floating_ips_by_fixed_address.get(
+                            fixed_ip['address'], [])
                 floating_ips = [network_model.IP(address=str(ip['address']),
                                                  type='floating')
                                 for ip in floating_ips]
@@ -698,11 +852,23 @@ class NetworkManager(manager.Manager):
         return network_dict
 
     def _get_subnets_from_network(self, context, network,
-                                  vif, instance_host=None):
-        """Returns the 1 or 2 possible subnets for a nova network."""
+                                  vif, instance_host=None,
+                                  ipam_subnets_by_net_id=None):
+        """Returns the 1 or 2 possible subnets for a nova network.
+
+        The subnets of the network are looked up in ipam_subnets_by_net_id,
+        a dict of the ipam subnets already looked up by network uuid, when
+        given, and added to it.
+        """
         # get subnets
-        ipam_subnets = self.ipam.get_subnets_by_net_id(context,
-                           network['project_id'], network['uuid'], vif.uuid)
+        if ipam_subnets_by_net_id is None:
+            ipam_subnets_by_net_id = {}
+        ipam_subnets = ipam_subnets_by_net_id.get(network['uuid'])
+        if ipam_subnets is None:
+            ipam_subnets = self.ipam.get_subnets_by_net_id(context,
+                               network['project_id'], network['uuid'],
+                               vif.uuid)
+            ipam_subnets_by_net_id[network['uuid']] = ipam_subnets
 
         subnets = []
         for subnet in ipam_subnets:
@@ -854,6 +1020,7 @@ class NetworkManager(manager.Manager):
         #             and use that network here with a method like
         #             network_get_by_compute_host
         address = None
+        fip = None
 
         # NOTE(vish) This db query could be removed if we pass az and name
         #            (or the whole instance object).
@@ -890,6 +1057,8 @@ class NetworkManager(manager.Manager):
                 fip.allocated = True
                 fip.virtual_interface_id = vif.id
                 fip.save()
+                fip.instance = instance
+                fip.virtual_interface = vif
                 self._do_trigger_security_group_members_refresh_for_instance(
                     instance_id)
 
@@ -901,7 +1070,7 @@ class NetworkManager(manager.Manager):
                 self.instance_dns_manager.create_entry(
                     instance_id, str(fip.address), "A",
                     self.instance_dns_domain)
-            self._setup_network_on_host(context, network)
+            self._setup_network_on_host(context, network, fixed_ip=fip)
 
             quotas.commit(context)
             LOG.debug('Allocated fixed ip %s on network %s', address,
@@ -976,7 +1145,8 @@ class NetworkManager(manager.Manager):
                 # NOTE(cfb): Call teardown before release_dhcp to ensure
                 #            that the IP can't be re-leased after a release
                 #            packet is sent.
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               fixed_ip=fixed_ip_ref)
                 # NOTE(vish): This forces a packet so that the release_fixed_ip
                 #             callback will get called by nova-dhcpbridge.
                 self.driver.release_dhcp(dev, address, vif.address)
@@ -992,7 +1162,8 @@ class NetworkManager(manager.Manager):
                     fixed_ip_ref.disassociate()
             else:
                 # We can't try to free the IP address so just call teardown
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               fixed_ip=fixed_ip_ref)
 
         # Commit the reservations
         quotas.commit(context)
@@ -1350,12 +1521,19 @@ class NetworkManager(manager.Manager):
         network = network_obj.Network.get_by_id(context, network_id)
         call_func(context, network)
 
-    def _setup_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _setup_network_on_host(self, context, network, fixed_ip=None):
+        """Sets up network on this host.
+
+        If fixed_ip is given, it is the only fixed ip that was allocated
+        since the network was last set up.
+        """
         raise NotImplementedError()
 
-    def _teardown_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _teardown_network_on_host(self, context, network, fixed_ip=None):
+        """Sets up network on this host.
+
+        If fixed_ip is given, it is the only fixed ip that was released.
+        """
         raise NotImplementedError()
 
     def validate_networks(self, context, networks):
@@ -1551,7 +1729,7 @@ class FlatManager(NetworkManager):
                                                      instance=instance)
         fixed_ip_obj.FixedIP.disassociate_by_address(context, address)
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixed_ip=None):
         """Setup Network on this host."""
         # NOTE(tr3buchet): this does not need to happen on every ip
         # allocation, this functionality makes more sense in create_network
@@ -1559,7 +1737,7 @@ class FlatManager(NetworkManager):
         network.injected = CONF.flat_injected
         network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, fixed_ip=None):
         """Tear down network on this host."""
         pass
 
@@ -1680,7 +1858,7 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
 
         self.driver.iptables_manager.defer_apply_off()
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixed_ip=None):
         """Sets up network on this host."""
         network['dhcp_server'] = self._get_dhcp_ip(context, network)
 
@@ -1691,20 +1869,27 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            if fixed_ip is None:
+                self.driver.update_dhcp(elevated, dev, network)
+            else:
+                self.driver.add_dhcp_host(elevated, dev, network, fixed_ip)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
                 network.gateway_v6 = gateway
                 network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, fixed_ip=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            if fixed_ip is None:
+                self.driver.update_dhcp(elevated, dev, network)
+            else:
+                self.driver.remove_dhcp_host(elevated, dev, network,
+                                             fixed_ip)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
@@ -1812,7 +1997,9 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                    "A",
                                                    self.instance_dns_domain)
 
-        self._setup_network_on_host(context, network)
+        fip.instance = instance
+        fip.virtual_interface = vif
+        self._setup_network_on_host(context, network, fixed_ip=fip)
         LOG.debug('Allocated fixed ip %s on network %s', address,
                   network['uuid'], instance=instance)
         return address
@@ -1907,7 +2094,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             self, context, vpn=True, **kwargs)
 
     @utils.synchronized('setup_network', external=True)
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, fixed_ip=None):
         """Sets up network on this host."""
         if not network.vpn_public_address:
             address = CONF.vpn_ip
@@ -1931,7 +2118,10 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            if fixed_ip is None:
+                self.driver.update_dhcp(elevated, dev, network)
+            else:
+                self.driver.add_dhcp_host(elevated, dev, network, fixed_ip)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
@@ -1939,13 +2129,17 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                 network.save()
 
     @utils.synchronized('setup_network', external=True)
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, fixed_ip=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            if fixed_ip is None:
+                self.driver.update_dhcp(elevated, dev, network)
+            else:
+                self.driver.remove_dhcp_host(elevated, dev, network,
+                                             fixed_ip)
 
             # NOTE(ethuleau): For multi hosted networks, if the network is no
             # more used on this host and if VPN forwarding rule aren't handed
@@ -1964,8 +2158,6 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                     fip.allocated = False
                     fip.host = None
                     fip.save()
-            else:
-                self.driver.update_dhcp(elevated, dev, network)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
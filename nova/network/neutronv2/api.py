@@ -511,9 +511,73 @@ class API(base_api.NetworkAPI):
                                                  port_ids)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _get_instances_nw_info(self, context, instances):
+        """Returns the network info of several instances without caching it.
+
+        The ports, floating ips, networks, subnets and DHCP ports of all
+        instances are listed with one neutron call each.
+        """
+        if not instances:
+            return {}
+        client = neutronv2.get_client(context, admin=True)
+        data = client.list_ports(device_id=[instance['uuid']
+                                            for instance in instances])
+        ports = data.get('ports', [])
+        floating_ips = self._get_floating_ips_by_ports(
+                client, [port['id'] for port in ports])
+
+        net_ids = set()
+        for instance in instances:
+            for iface in compute_utils.get_nw_info_for_instance(instance):
+                net_ids.add(iface['network']['id'])
+        networks_by_id = {}
+        if net_ids:
+            data = client.list_networks(id=list(net_ids))
+            for network in data.get('networks', []):
+                networks_by_id[network['id']] = network
+
+        subnet_ids = set(fixed_ip['subnet_id'] for port in ports
+                         for fixed_ip in port['fixed_ips'])
+        subnets_by_id = {}
+        dhcp_ports_by_network = {}
+        if subnet_ids:
+            data = client.list_subnets(id=list(subnet_ids))
+            for subnet in data.get('subnets', []):
+                subnets_by_id[subnet['id']] = subnet
+                dhcp_ports_by_network[subnet['network_id']] = []
+        if dhcp_ports_by_network:
+            data = client.list_ports(network_id=list(dhcp_ports_by_network),
+                                     device_owner='network:dhcp')
+            for port in data.get('ports', []):
+                dhcp_ports_by_network[port['network_id']].append(port)
+
+        nw_infos = {}
+        for instance in instances:
+            instance_ports = [port for port in ports
+                              if port['device_id'] == instance['uuid'] and
+                              port['tenant_id'] == instance['project_id']]
+            try:
+                nw_info = self._build_network_info_model(context, instance,
+                        neutron_ports=instance_ports,
+                        floating_ips=floating_ips,
+                        networks_by_id=networks_by_id,
+                        subnets_by_id=subnets_by_id,
+                        dhcp_ports_by_network=dhcp_ports_by_network)
+            except Exception:
+                LOG.exception(_('Failed to get the network info'),
+                              instance=instance)
+                continue
+            nw_infos[instance['uuid']] = network_model.NetworkInfo.hydrate(
+                    nw_info)
+        return nw_infos
+
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
-                                      port_ids=None):
-        """Return an instance's complete list of port_ids and networks."""
+                                      port_ids=None, networks_by_id=None):
+        """Return an instance's complete list of port_ids and networks.
+
+        When refreshing the network info cache, the networks of the cached
+        interfaces are picked from networks_by_id if given, or listed.
+        """
 
         if ((networks is None and port_ids is not None) or
             (port_ids is None and networks is not None)):
@@ -528,7 +592,10 @@ class API(base_api.NetworkAPI):
             port_ids = [iface['id'] for iface in ifaces]
             net_ids = [iface['network']['id'] for iface in ifaces]
 
-        if networks is None:
+        if networks is None and networks_by_id is not None:
+            networks = [networks_by_id[net_id] for net_id in net_ids
+                        if net_id in networks_by_id]
+        elif networks is None:
             networks = self._get_available_networks(context,
                                                     instance['project_id'],
                                                     net_ids)
@@ -1014,6 +1081,29 @@ class API(base_api.NetworkAPI):
                               {'fixed_ip': fixed_ip, 'port_id': port})
         return data['floatingips']
 
+    def _get_floating_ips_by_ports(self, client, port_ids):
+        """Get the floatingips of several ports.
+
+        Returns a dict of the floatingips of each (port id, fixed ip).
+        """
+        floating_ips = {}
+        if not port_ids:
+            return floating_ips
+        try:
+            data = client.list_floatingips(port_id=port_ids)
+        # If a neutron plugin does not implement the L3 API a 404 from
+        # list_floatingips will be raised.
+        except neutronv2.exceptions.NeutronClientException as e:
+            if e.status_code == 404:
+                return floating_ips
+            with excutils.save_and_reraise_exception():
+                LOG.exception(_('Unable to access floating IPs of ports '
+                                '%s'), port_ids)
+        for fip in data['floatingips']:
+            key = (fip['port_id'], fip['fixed_ip_address'])
+            floating_ips.setdefault(key, []).append(fip)
+        return floating_ips
+
     def release_floating_ip(self, context, address,
                             affect_auto_assigned=False):
         """Remove a floating ip with the given address from a project."""
@@ -1075,12 +1165,16 @@ class API(base_api.NetworkAPI):
         """Force add a network to the project."""
         raise NotImplementedError()
 
-    def _nw_info_get_ips(self, client, port):
+    def _nw_info_get_ips(self, client, port, floating_ips=None):
         network_IPs = []
         for fixed_ip in port['fixed_ips']:
             fixed = network_model.FixedIP(address=fixed_ip['ip_address'])
-            floats = self._get_floating_ips_by_fixed_and_port(
-                client, fixed_ip['ip_address'], port['id'])
+            if floating_ips is not None:
+                floats = floating_ips.get(
+                        (port['id'], fixed_ip['ip_address']), [])
+            else:
+                floats = self._get_floating_ips_by_fixed_and_port(
+                    client, fixed_ip['ip_address'], port['id'])
             for ip in floats:
                 fip = network_model.IP(address=ip['floating_ip_address'],
                                        type='floating')
@@ -1088,8 +1182,10 @@ class API(base_api.NetworkAPI):
             network_IPs.append(fixed)
         return network_IPs
 
-    def _nw_info_get_subnets(self, context, port, network_IPs):
-        subnets = self._get_subnets_from_port(context, port)
+    def _nw_info_get_subnets(self, context, port, network_IPs,
+                             subnets_by_id=None, dhcp_ports_by_network=None):
+        subnets = self._get_subnets_from_port(context, port, subnets_by_id,
+                                              dhcp_ports_by_network)
         for subnet in subnets:
             subnet['ips'] = [fixed_ip for fixed_ip in network_IPs
                              if fixed_ip.is_in_subnet(subnet)]
@@ -1145,7 +1241,10 @@ class API(base_api.NetworkAPI):
         return network, ovs_interfaceid
 
     def _build_network_info_model(self, context, instance, networks=None,
-                                  port_ids=None):
+                                  port_ids=None, neutron_ports=None,
+                                  floating_ips=None, networks_by_id=None,
+                                  subnets_by_id=None,
+                                  dhcp_ports_by_network=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1157,16 +1256,34 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
+        :param neutron_ports - List of the neutron ports of the instance.
+                               If value is None they are listed.
+        :param floating_ips - Dict of the floating ips of each (port id,
+                              fixed ip), as returned by
+                              _get_floating_ips_by_ports().  If value is
+                              None they are listed for each fixed ip.
+        :param networks_by_id - Dict of the neutron networks the cached
+                                interfaces are attached to, by id.  If value
+                                is None they are listed.
+        :param subnets_by_id - Dict of the neutron subnets of the ports, by
+                               id.  If value is None they are listed for
+                               each port.
+        :param dhcp_ports_by_network - Dict of the DHCP ports of the
+                                       networks of these subnets, by network
+                                       id.  If value is None they are listed
+                                       for each subnet.
         """
 
-        search_opts = {'tenant_id': instance['project_id'],
-                       'device_id': instance['uuid'], }
         client = neutronv2.get_client(context, admin=True)
-        data = client.list_ports(**search_opts)
+        if neutron_ports is None:
+            search_opts = {'tenant_id': instance['project_id'],
+                           'device_id': instance['uuid'], }
+            data = client.list_ports(**search_opts)
+            neutron_ports = data.get('ports', [])
 
-        current_neutron_ports = data.get('ports', [])
+        current_neutron_ports = neutron_ports
         networks, port_ids = self._gather_port_ids_and_networks(
-                context, instance, networks, port_ids)
+                context, instance, networks, port_ids, networks_by_id)
         nw_info = network_model.NetworkInfo()
 
         current_neutron_port_map = {}
@@ -1183,10 +1300,13 @@ class API(base_api.NetworkAPI):
                     vif_active = True
 
                 network_IPs = self._nw_info_get_ips(client,
-                                                    current_neutron_port)
+                                                    current_neutron_port,
+                                                    floating_ips)
                 subnets = self._nw_info_get_subnets(context,
                                                     current_neutron_port,
-                                                    network_IPs)
+                                                    network_IPs,
+                                                    subnets_by_id,
+                                                    dhcp_ports_by_network)
 
                 devname = "tap" + current_neutron_port['id']
                 devname = devname[:network_model.NIC_NAME_LEN]
@@ -1207,8 +1327,13 @@ class API(base_api.NetworkAPI):
 
         return nw_info
 
-    def _get_subnets_from_port(self, context, port):
-        """Return the subnets for a given port."""
+    def _get_subnets_from_port(self, context, port, subnets_by_id=None,
+                               dhcp_ports_by_network=None):
+        """Return the subnets for a given port.
+
+        The subnets and the DHCP ports of their networks are picked from
+        subnets_by_id and dhcp_ports_by_network if given, or listed.
+        """
 
         fixed_ips = port['fixed_ips']
         # No fixed_ips for the port means there is no subnet associated
@@ -1218,9 +1343,18 @@ class API(base_api.NetworkAPI):
         # related to the port. To avoid this, the method returns here.
         if not fixed_ips:
             return []
-        search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
-        data = neutronv2.get_client(context).list_subnets(**search_opts)
-        ipam_subnets = data.get('subnets', [])
+        if subnets_by_id is not None:
+            subnet_ids = []
+            for ip in fixed_ips:
+                if (ip['subnet_id'] in subnets_by_id and
+                        ip['subnet_id'] not in subnet_ids):
+                    subnet_ids.append(ip['subnet_id'])
+            ipam_subnets = [subnets_by_id[subnet_id]
+                            for subnet_id in subnet_ids]
+        else:
+            search_opts = {'id': [ip['subnet_id'] for ip in fixed_ips]}
+            data = neutronv2.get_client(context).list_subnets(**search_opts)
+            ipam_subnets = data.get('subnets', [])
         subnets = []
 
         for subnet in ipam_subnets:
@@ -1231,10 +1365,15 @@ class API(base_api.NetworkAPI):
             }
 
             # attempt to populate DHCP server field
-            search_opts = {'network_id': subnet['network_id'],
-                           'device_owner': 'network:dhcp'}
-            data = neutronv2.get_client(context).list_ports(**search_opts)
-            dhcp_ports = data.get('ports', [])
+            if dhcp_ports_by_network is not None:
+                dhcp_ports = dhcp_ports_by_network.get(subnet['network_id'],
+                                                       [])
+            else:
+                search_opts = {'network_id': subnet['network_id'],
+                               'device_owner': 'network:dhcp'}
+                data = neutronv2.get_client(context).list_ports(
+                        **search_opts)
+                dhcp_ports = data.get('ports', [])
             for p in dhcp_ports:
                 for ip_pair in p['fixed_ips']:
                     if ip_pair['subnet_id'] == subnet['id']:
@@ -79,6 +79,8 @@ class NetworkAPI(object):
         ... Icehouse supports message version 1.12.  So, any changes to
         existing methods in 1.x after that point should be done such that they
         can handle the version_cap being set to 1.12.
+
+        1.13 - Adds get_instances_nw_info()
     '''
 
     VERSION_ALIASES = {
@@ -226,6 +228,10 @@ class NetworkAPI(object):
                           instance_id=instance_id, rxtx_factor=rxtx_factor,
                           host=host, project_id=project_id)
 
+    def get_instances_nw_info(self, ctxt, instances):
+        cctxt = self.client.prepare(version='1.13')
+        return cctxt.call(ctxt, 'get_instances_nw_info', instances=instances)
+
     def validate_networks(self, ctxt, networks):
         return self.client.call(ctxt, 'validate_networks', networks=networks)
 
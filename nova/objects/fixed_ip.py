@@ -165,7 +165,9 @@ class FixedIP(obj_base.NovaPersistentObject, obj_base.NovaObject):
 class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Added get_by_network()
-    VERSION = '1.1'
+    # Version 1.2: Added search_by_address()
+    # Version 1.3: Added get_by_instance_uuids()
+    VERSION = '1.3'
 
     fields = {
         'objects': fields.ListOfObjectsField('FixedIP'),
@@ -173,6 +175,8 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
     child_versions = {
         '1.0': '1.0',
         '1.1': '1.1',
+        '1.2': '1.1',
+        '1.3': '1.1',
         }
 
     @obj_base.remotable_classmethod
@@ -185,6 +189,11 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         db_fixedips = db.fixed_ip_get_by_instance(context, instance_uuid)
         return obj_base.obj_make_list(context, cls(), FixedIP, db_fixedips)
 
+    @obj_base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids):
+        db_fixedips = db.fixed_ip_get_by_instances(context, instance_uuids)
+        return obj_base.obj_make_list(context, cls(), FixedIP, db_fixedips)
+
     @obj_base.remotable_classmethod
     def get_by_host(cls, context, host):
         db_fixedips = db.fixed_ip_get_by_host(context, host)
@@ -227,6 +236,16 @@ class FixedIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         fips.obj_reset_changes()
         return fips
 
+    @obj_base.remotable_classmethod
+    def search_by_address(cls, context, address, exact=False):
+        """Find the fixed ips of instances by their or their floating address.
+
+        Unlike the other methods, this only returns a list of dicts with
+        the instance_uuid, address and floating_address of the matches,
+        which is all that searching instances by address needs.
+        """
+        return db.fixed_ip_search_by_address(context, address, exact=exact)
+
     @obj_base.remotable_classmethod
     def bulk_create(self, context, fixed_ips):
         ips = []
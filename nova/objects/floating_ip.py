@@ -143,6 +143,7 @@ class FloatingIP(obj_base.NovaPersistentObject, obj_base.NovaObject):
 
 
 class FloatingIPList(obj_base.ObjectListBase, obj_base.NovaObject):
+    # Version 1.3: Added get_by_instance_uuids()
     fields = {
         'objects': fields.ListOfObjectsField('FloatingIP'),
         }
@@ -150,8 +151,9 @@ class FloatingIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         '1.0': '1.0',
         '1.1': '1.1',
         '1.2': '1.1',
+        '1.3': '1.1',
         }
-    VERSION = '1.2'
+    VERSION = '1.3'
 
     @obj_base.remotable_classmethod
     def get_all(cls, context):
@@ -185,6 +187,13 @@ class FloatingIPList(obj_base.ObjectListBase, obj_base.NovaObject):
         return obj_base.obj_make_list(context, cls(), FloatingIP,
                                       db_floatingips)
 
+    @obj_base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids):
+        db_floatingips = db.floating_ip_get_by_instances(context,
+                                                         instance_uuids)
+        return obj_base.obj_make_list(context, cls(), FloatingIP,
+                                      db_floatingips)
+
     @staticmethod
     def make_ip_info(address, pool, interface):
         return {'address': str(address),
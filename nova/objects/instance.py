@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import weakref
+
 from nova.cells import opts as cells_opts
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
@@ -274,9 +276,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         if 'system_metadata' in expected_attrs:
             instance['system_metadata'] = utils.instance_sys_meta(db_inst)
         if 'fault' in expected_attrs:
-            instance['fault'] = (
-                instance_fault.InstanceFault.get_latest_for_instance(
-                    context, instance.uuid))
+            _load_faults(context, [instance])
 
         if 'pci_devices' in expected_attrs:
             pci_devices = base.obj_make_list(
@@ -324,15 +324,14 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         return cls._from_db_object(context, cls(), db_inst,
                                    expected_attrs)
 
-    @base.remotable
-    def create(self, context):
+    def _get_create_updates(self):
+        """Return the values to create this instance in the database with.
+        """
         if self.obj_attr_is_set('id'):
             raise exception.ObjectActionError(action='create',
                                               reason='already created')
         updates = self.obj_get_changes()
         updates.pop('id', None)
-        expected_attrs = [attr for attr in INSTANCE_DEFAULT_FIELDS
-                          if attr in updates]
         if 'security_groups' in updates:
             updates['security_groups'] = [x.name for x in
                                           updates['security_groups']]
@@ -340,6 +339,13 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
             updates['info_cache'] = {
                 'network_info': updates['info_cache'].network_info.json()
                 }
+        return updates
+
+    @base.remotable
+    def create(self, context):
+        updates = self._get_create_updates()
+        expected_attrs = [attr for attr in INSTANCE_DEFAULT_FIELDS
+                          if attr in updates]
         db_inst = db.instance_create(context, updates)
         Instance._from_db_object(context, self, db_inst, expected_attrs)
 
@@ -518,6 +524,16 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
                    'name': self.obj_name(),
                    'uuid': self.uuid,
                    })
+        if attrname == 'fault':
+            # NOTE: the fault doesn't need the instance to be loaded again,
+            # and it is loaded along with the faults of the instances which
+            # were fetched together with this one, if any.
+            fault_loader = getattr(self, '_fault_loader', None)
+            if fault_loader:
+                fault_loader.load(self)
+            else:
+                _load_faults(self._context, [self])
+            return
         # FIXME(comstud): This should be optimized to only load the attr.
         instance = self.__class__.get_by_uuid(self._context,
                                               uuid=self.uuid,
@@ -571,26 +587,67 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
             self.obj_reset_changes(['metadata'])
 
 
+def _load_faults(context, instances):
+    """Set the latest fault of instances, with a single query.
+
+    :returns: A list of instance uuids for which faults were found.
+    """
+    uuids = [inst.uuid for inst in instances]
+    faults = instance_fault.InstanceFaultList.get_by_instance_uuids(
+        context, uuids)
+    faults_by_uuid = {}
+    for fault in faults:
+        if fault.instance_uuid not in faults_by_uuid:
+            faults_by_uuid[fault.instance_uuid] = fault
+
+    for instance in instances:
+        # NOTE(danms): Instances without faults get None, otherwise the
+        # caller will cause a lazy-load when checking it, and we know there
+        # are none
+        instance.fault = faults_by_uuid.get(instance.uuid)
+        instance.obj_reset_changes(['fault'])
+
+    return faults_by_uuid.keys()
+
+
+class _InstanceFaultLoader(object):
+    """Lazy-loads the faults of instances which were fetched together.
+
+    Lazy-loading the fault of one of them loads the faults of all the ones
+    which are still around and don't have theirs yet, with a single query,
+    instead of one query per instance.
+    """
+
+    def __init__(self, context, instances):
+        self.context = context
+        # NOTE: weak references, so that the instances can go away, and
+        # copying one of them doesn't copy all of them
+        self.instances = [weakref.ref(inst) for inst in instances]
+
+    def load(self, instance):
+        instances = [ref() for ref in self.instances]
+        instances = [inst for inst in instances
+                     if inst is not None and inst is not instance and
+                     not inst.obj_attr_is_set('fault')]
+        _load_faults(self.context, [instance] + instances)
+
+
 def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     get_fault = expected_attrs and 'fault' in expected_attrs
-    inst_faults = {}
     if get_fault:
-        # Build an instance_uuid:latest-fault mapping
         expected_attrs.remove('fault')
-        instance_uuids = [inst['uuid'] for inst in db_inst_list]
-        faults = instance_fault.InstanceFaultList.get_by_instance_uuids(
-            context, instance_uuids)
-        for fault in faults:
-            if fault.instance_uuid not in inst_faults:
-                inst_faults[fault.instance_uuid] = fault
 
     inst_list.objects = []
     for db_inst in db_inst_list:
         inst_obj = Instance._from_db_object(context, Instance(), db_inst,
                                             expected_attrs=expected_attrs)
-        if get_fault:
-            inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
+    if get_fault:
+        _load_faults(context, inst_list.objects)
+    elif len(inst_list.objects) > 1:
+        fault_loader = _InstanceFaultLoader(context, inst_list.objects)
+        for inst_obj in inst_list.objects:
+            inst_obj._fault_loader = fault_loader
     inst_list.obj_reset_changes()
     return inst_list
 
@@ -604,7 +661,8 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.4: Instance <= version 1.12
     # Version 1.5: Added method get_active_by_window_joined.
     # Version 1.6: Instance <= version 1.13
-    VERSION = '1.6'
+    # Version 1.7: Added bulk_create
+    VERSION = '1.7'
 
     fields = {
         'objects': fields.ListOfObjectsField('Instance'),
@@ -617,8 +675,23 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.4': '1.12',
         '1.5': '1.12',
         '1.6': '1.13',
+        '1.7': '1.13',
         }
 
+    @base.remotable_classmethod
+    def bulk_create(cls, context, instances):
+        """Create several new instances in the database at once.
+
+        :param context: nova request context
+        :param instances: list of Instance objects which have not been
+                          created yet
+        :returns: InstanceList of the created instances, in the same order
+        """
+        db_inst_list = db.instance_bulk_create(
+            context, [inst._get_create_updates() for inst in instances])
+        return _make_instance_list(context, cls(), db_inst_list,
+                                   list(INSTANCE_DEFAULT_FIELDS))
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
@@ -718,21 +791,4 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
 
         :returns: A list of instance uuids for which faults were found.
         """
-        uuids = [inst.uuid for inst in self]
-        faults = instance_fault.InstanceFaultList.get_by_instance_uuids(
-            self._context, uuids)
-        faults_by_uuid = {}
-        for fault in faults:
-            if fault.instance_uuid not in faults_by_uuid:
-                faults_by_uuid[fault.instance_uuid] = fault
-
-        for instance in self:
-            if instance.uuid in faults_by_uuid:
-                instance.fault = faults_by_uuid[instance.uuid]
-            else:
-                # NOTE(danms): Otherwise the caller will cause a lazy-load
-                # when checking it, and we know there are none
-                instance.fault = None
-            instance.obj_reset_changes(['fault'])
-
-        return faults_by_uuid.keys()
+        return _load_faults(self._context, self.objects)
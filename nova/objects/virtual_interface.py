@@ -79,12 +79,14 @@ class VirtualInterface(base.NovaPersistentObject, base.NovaObject):
 
 class VirtualInterfaceList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
-    VERSION = '1.0'
+    # Version 1.1: Added get_by_instance_uuids()
+    VERSION = '1.1'
     fields = {
         'objects': fields.ListOfObjectsField('VirtualInterface'),
     }
     child_versions = {
         '1.0': '1.0',
+        '1.1': '1.0',
     }
 
     @base.remotable_classmethod
@@ -97,3 +99,9 @@ class VirtualInterfaceList(base.ObjectListBase, base.NovaObject):
         db_vifs = db.virtual_interface_get_by_instance(context, instance_uuid,
                 use_slave=use_slave)
         return base.obj_make_list(context, cls(), VirtualInterface, db_vifs)
+
+    @base.remotable_classmethod
+    def get_by_instance_uuids(cls, context, instance_uuids, use_slave=False):
+        db_vifs = db.virtual_interface_get_by_instances(context,
+                instance_uuids, use_slave=use_slave)
+        return base.obj_make_list(context, cls(), VirtualInterface, db_vifs)
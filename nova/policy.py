@@ -15,9 +15,36 @@
 
 """Policy Engine For Nova."""
 
+import ast
+import logging as std_logging
+import time
+
+from oslo.config import cfg
+import six
+
 from nova import exception
+from nova.openstack.common import fileutils
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
 from nova.openstack.common import policy
 
+policy_opts = [
+    cfg.BoolOpt('compile_policy',
+                default=False,
+                help=_('Compile the policy rules into Python functions '
+                       'when they are loaded, rather than walking the rule '
+                       'trees on every check')),
+    cfg.IntOpt('policy_check_interval',
+               default=60,
+               help=_('Number of seconds between checks whether the policy '
+                      'file was modified, when compile_policy is set. 0 '
+                      'checks on every policy check')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(policy_opts)
+
+LOG = logging.getLogger(__name__)
 
 _ENFORCER = None
 
@@ -43,10 +70,14 @@ def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
 
     global _ENFORCER
     if not _ENFORCER:
-        _ENFORCER = policy.Enforcer(policy_file=policy_file,
-                                    rules=rules,
-                                    default_rule=default_rule,
-                                    use_conf=use_conf)
+        if CONF.compile_policy:
+            enforcer_cls = CompiledEnforcer
+        else:
+            enforcer_cls = policy.Enforcer
+        _ENFORCER = enforcer_cls(policy_file=policy_file,
+                                 rules=rules,
+                                 default_rule=default_rule,
+                                 use_conf=use_conf)
 
 
 def set_rules(rules, overwrite=True, use_conf=False):
@@ -124,3 +155,226 @@ class IsAdminCheck(policy.Check):
 def get_rules():
     if _ENFORCER:
         return _ENFORCER.rules
+
+
+class CompiledEnforcer(policy.Enforcer):
+    """Enforcer compiling each rule into a function the first time it is
+    checked after the rules were loaded.
+
+    The functions inline the rules they refer to and the parts of the checks
+    which do not depend on the request, such as the lower-cased roles and
+    the literals of generic checks.  The results of the rules which only
+    depend on the roles and is_admin flag of the credentials are memoized.
+
+    Rules modified in place, rather than through set_rules(), are not
+    recompiled.
+    """
+
+    # Rule results memoized, for each combination of roles
+    MAX_MEMOIZED = 10000
+
+    def __init__(self, *args, **kwargs):
+        self._compiled = {}
+        self._memo = {}
+        self._compiled_rules = None
+        self._checked = None
+        super(CompiledEnforcer, self).__init__(*args, **kwargs)
+
+    def set_rules(self, rules, overwrite=True, use_conf=False):
+        super(CompiledEnforcer, self).set_rules(rules, overwrite, use_conf)
+        self._compiled = {}
+        self._memo = {}
+
+    def load_rules(self, force_reload=False):
+        """Loads policy_path's rules.
+
+        Unlike Enforcer, keeps checking whether the policy file was
+        modified after loading it, every policy_check_interval seconds.
+
+        :param force_reload: Whether to overwrite current rules.
+        """
+        if force_reload:
+            self.use_conf = force_reload
+
+        if not self.use_conf:
+            return
+
+        now = time.time()
+        if (not force_reload and self.rules and self._checked is not None
+                and now - self._checked < CONF.policy_check_interval):
+            return
+
+        if not self.policy_path:
+            self.policy_path = self._get_policy_path()
+
+        reloaded, data = fileutils.read_cached_file(
+            self.policy_path, force_reload=force_reload)
+        if reloaded or not self.rules:
+            rules = policy.Rules.load_json(data, self.default_rule)
+            self.set_rules(rules, use_conf=True)
+            LOG.debug("Rules successfully reloaded")
+        self._checked = now
+
+    def enforce(self, rule, target, creds, do_raise=False,
+                exc=None, *args, **kwargs):
+        # NOTE: the log adapter does its work before checking the level.
+        if LOG.isEnabledFor(std_logging.DEBUG):
+            LOG.debug("Rule %s will be now enforced", rule)
+
+        self.load_rules()
+
+        if not isinstance(rule, six.string_types):
+            result = self._compile(rule, set())[0](target, creds)
+        elif not self.rules:
+            # No rules to reference means we're going to fail closed
+            result = False
+        else:
+            try:
+                result = self._check_rule(rule, target, creds)
+            except KeyError:
+                LOG.debug("Rule [%s] doesn't exist", rule)
+                # If the rule doesn't exist, fail closed
+                result = False
+
+        if do_raise and not result:
+            if exc:
+                raise exc(*args, **kwargs)
+
+            raise policy.PolicyNotAuthorized(rule)
+
+        return result
+
+    def _check_rule(self, name, target, creds):
+        """Evaluate the rule of the given name, raising KeyError when it
+        does not exist.
+        """
+        if self._compiled_rules is not self.rules:
+            # The rules were replaced without set_rules()
+            self._compiled = {}
+            self._memo = {}
+            self._compiled_rules = self.rules
+
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            compiled = self._compiled[name] = self._compile(self.rules[name],
+                                                            set([name]))
+        func, creds_only = compiled
+        if not creds_only:
+            return func(target, creds)
+
+        key = (name, creds.get('is_admin'), tuple(creds.get('roles', ())))
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Roles which cannot be hashed
+            return func(target, creds)
+        if len(self._memo) >= self.MAX_MEMOIZED:
+            self._memo.clear()
+        result = self._memo[key] = func(target, creds)
+        return result
+
+    def _compile(self, check, compiling):
+        """Return a function evaluating the check tree, and whether its
+        result only depends on the roles and is_admin flag of the
+        credentials.
+
+        :param compiling: names of the rules being compiled, which are
+                          referred to rather than inlined
+        """
+        if isinstance(check, policy.TrueCheck):
+            return lambda target, creds: True, True
+        if isinstance(check, policy.FalseCheck):
+            return lambda target, creds: False, True
+
+        if isinstance(check, policy.NotCheck):
+            func, creds_only = self._compile(check.rule, compiling)
+            return lambda target, creds: not func(target, creds), creds_only
+
+        if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+            compiled = [self._compile(rule, compiling)
+                        for rule in check.rules]
+            funcs = [func for func, creds_only in compiled]
+            creds_only = all(creds_only for func, creds_only in compiled)
+            if isinstance(check, policy.AndCheck):
+                def and_check(target, creds):
+                    for func in funcs:
+                        if not func(target, creds):
+                            return False
+                    return True
+                return and_check, creds_only
+
+            def or_check(target, creds):
+                for func in funcs:
+                    if func(target, creds):
+                        return True
+                return False
+            return or_check, creds_only
+
+        if type(check) is policy.RuleCheck:
+            name = check.match
+            if name in compiling:
+                # NOTE: a rule referring to itself is only looked up when
+                # it is evaluated, as walking the rule tree does.
+                def rule_check(target, creds):
+                    try:
+                        return self._check_rule(name, target, creds)
+                    except KeyError:
+                        return False
+                return rule_check, False
+            try:
+                rule = self.rules[name]
+            except KeyError:
+                # We don't have any matching rule; fail closed
+                return lambda target, creds: False, True
+            return self._compile(rule, compiling | set([name]))
+
+        if type(check) is policy.RoleCheck:
+            role = check.match.lower()
+
+            def role_check(target, creds):
+                for x in creds['roles']:
+                    if x.lower() == role:
+                        return True
+                return False
+            return role_check, True
+
+        if type(check) is IsAdminCheck:
+            expected = check.expected
+            return lambda target, creds: creds['is_admin'] == expected, True
+
+        if type(check) is policy.GenericCheck:
+            return self._compile_generic(check.kind, check.match), False
+
+        # Checks registered by extensions, http checks, ...
+        return lambda target, creds: check(target, creds, self), False
+
+    @staticmethod
+    def _compile_generic(kind, match):
+        """Return a function evaluating a GenericCheck."""
+        try:
+            # Try to interpret kind as a literal
+            leftval = six.text_type(ast.literal_eval(kind))
+        except ValueError:
+            leftval = None
+
+        if leftval is not None and '%' not in match:
+            result = match == leftval
+            return lambda target, creds: result
+
+        def generic_check(target, creds):
+            try:
+                value = match % target
+            except KeyError:
+                # While doing GenericCheck if key not
+                # present in Target return false
+                return False
+
+            if leftval is not None:
+                return value == leftval
+            try:
+                return value == six.text_type(creds[kind])
+            except KeyError:
+                return False
+        return generic_check
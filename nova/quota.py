@@ -538,6 +538,11 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
+        return self._reserve(context, resources, quotas, user_quotas,
+                             deltas, expire, project_id, user_id)
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
         return db.quota_reserve(context, resources, quotas, user_quotas,
                                 deltas, expire,
                                 CONF.until_refresh, CONF.max_age,
@@ -651,6 +656,68 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class CasQuotaDriver(DbQuotaDriver):
+    """Driver which keeps the quota usages in the database like
+    DbQuotaDriver, but never locks them.  Each reservation moves the
+    reserved counts with compare-and-set updates which only succeed
+    when the quotas allow it, and commits, rollbacks and expirations
+    only update the usages of their own reservations.  Reservations in
+    the same project thus no longer wait for each other's transactions,
+    at the price of usage refreshes (until_refresh and max_age) being
+    best effort under concurrent commits.
+    """
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
+        return db.quota_reserve_cas(context, resources, quotas, user_quotas,
+                                    deltas, expire,
+                                    CONF.until_refresh, CONF.max_age,
+                                    project_id=project_id, user_id=user_id)
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        :param user_id: Specify the user_id if current context
+                        is admin and admin wants to impact on
+                        common user.
+        """
+        db.reservation_commit_cas(context, reservations,
+                                  project_id=project_id, user_id=user_id)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Specify the project_id if current context
+                           is admin and admin wants to impact on
+                           common user's tenant.
+        :param user_id: Specify the user_id if current context
+                        is admin and admin wants to impact on
+                        common user.
+        """
+        db.reservation_rollback_cas(context, reservations,
+                                    project_id=project_id, user_id=user_id)
+
+    def expire(self, context):
+        """Expire reservations.
+
+        Explores all currently existing reservations and rolls back
+        any that have expired.
+
+        :param context: The request context, for access checks.
+        """
+
+        db.reservation_expire_cas(context)
+
+
 class NoopQuotaDriver(object):
     """Driver that turns quotas calls into no-ops and pretends that quotas
     for all resources are unlimited.  This can be used if you do not
@@ -0,0 +1,225 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Place all instances of a multi-instance request in one pass.
+
+The FilterScheduler used to re-run every filter and weigher over every host
+for each instance of a request.  BatchPlacement filters and weighs all hosts
+once for the first instance and keeps the candidates in a priority queue.
+For each following instance only the host chosen for the previous instance
+has changed, so only that host is re-checked and re-weighed, unless a filter
+has to be run over all hosts for that index.
+"""
+
+import heapq
+import random
+
+from nova.scheduler import weights
+
+
+class BatchPlacement(object):
+    """Choose hosts for the instances of a single request.
+
+    Filters which set depends_on_host_state_only are only re-run for the
+    hosts whose resources were consumed.  Other filters which need to run
+    for an index (see run_filter_for_index) are run over all remaining
+    candidates.  Weighers are expected to weigh each host independently of
+    the others, as _weigh_object() does.
+    """
+
+    def __init__(self, host_manager, filter_properties, subset_size=1):
+        self.host_manager = host_manager
+        self.filter_properties = filter_properties
+        self.subset_size = max(subset_size, 1)
+        self.filter_classes = host_manager._choose_host_filters(None)
+        self.weigher_classes = host_manager.weight_classes
+        self._weighers = [cls() for cls in self.weigher_classes]
+        self._multipliers = [weigher.weight_multiplier()
+                             for weigher in self._weighers]
+
+        # Filter classes which were already run over all candidates
+        self._checked = set()
+        # Candidate host states, in their original order
+        self._hosts = []
+        # { id(host_state) : [raw weight of each weigher] }
+        self._raw = {}
+        # (minval, maxval) of each weigher over the candidates
+        self._bounds = []
+        self._order = {}
+        self._heap = []
+
+    def _filter(self, filter_classes, hosts, index):
+        if not filter_classes:
+            return hosts
+        return self.host_manager.filter_handler.get_filtered_objects(
+                filter_classes, hosts, self.filter_properties, index) or []
+
+    def _weigh_raw(self, host_state):
+        """Return the un-normalized weight of host_state for each weigher."""
+        weighed_obj = [weights.WeighedHost(host_state, 0.0)]
+        return [weigher.weigh_objects(weighed_obj, self.filter_properties)[0]
+                for weigher in self._weighers]
+
+    def _compute_bounds(self):
+        bounds = []
+        for i, weigher_cls in enumerate(self.weigher_classes):
+            values = [self._raw[id(h)][i] for h in self._hosts]
+            minval = min(values)
+            maxval = max(values)
+            if weigher_cls.minval is not None:
+                minval = min(minval, weigher_cls.minval)
+            if weigher_cls.maxval is not None:
+                maxval = max(maxval, weigher_cls.maxval)
+            bounds.append((minval, maxval))
+        return bounds
+
+    def _combine(self, raw):
+        weight = 0.0
+        for i, multiplier in enumerate(self._multipliers):
+            minval, maxval = self._bounds[i]
+            if minval == maxval:
+                continue
+            normalized = (raw[i] - float(minval)) / (maxval - minval)
+            weight += multiplier * normalized
+        return weight
+
+    def _entry(self, host_state):
+        # NOTE: the original position of the host breaks ties, as the
+        # stable sort of the weight handler does.
+        weight = self._combine(self._raw[id(host_state)])
+        return (-weight, self._order[id(host_state)], host_state)
+
+    def _rebuild(self):
+        """Recompute all combined weights after normalization changed."""
+        self._heap = [self._entry(host_state) for host_state in self._hosts]
+        heapq.heapify(self._heap)
+
+    def _at_bounds(self, raw):
+        for i, value in enumerate(raw):
+            if value in self._bounds[i]:
+                return True
+        return False
+
+    def _start(self, hosts):
+        """Filter and weigh all hosts for the first instance."""
+        self._hosts = list(self.host_manager.get_filtered_hosts(hosts,
+                self.filter_properties, index=0))
+        for filter_cls in self.filter_classes:
+            if filter_cls().run_filter_for_index(0):
+                self._checked.add(filter_cls)
+        self._order = dict((id(h), i) for i, h in enumerate(self._hosts))
+        self._raw = dict((id(h), self._weigh_raw(h)) for h in self._hosts)
+        if self._hosts:
+            self._bounds = self._compute_bounds()
+            self._rebuild()
+
+    def _update(self, changed_host, index):
+        """Re-check and re-weigh after changed_host's resources changed."""
+        full_filters = []
+        changed_filters = []
+        for filter_cls in self.filter_classes:
+            if not filter_cls().run_filter_for_index(index):
+                continue
+            if (filter_cls in self._checked and
+                    filter_cls.depends_on_host_state_only):
+                changed_filters.append(filter_cls)
+            else:
+                full_filters.append(filter_cls)
+                self._checked.add(filter_cls)
+
+        old_raw = self._raw[id(changed_host)]
+        hosts = self._filter(full_filters, self._hosts, index)
+        passes = (changed_host in hosts and
+                  self._filter(changed_filters, [changed_host], index))
+        if not passes:
+            hosts = [h for h in hosts if h is not changed_host]
+
+        remaining = set(id(h) for h in hosts)
+        removed = [h for h in self._hosts if id(h) not in remaining]
+        self._hosts = hosts
+        if not hosts:
+            return
+
+        removed_raw = [self._raw.pop(id(h)) for h in removed]
+        rebound = any(self._at_bounds(raw) for raw in removed_raw)
+        if passes:
+            new_raw = self._weigh_raw(changed_host)
+            self._raw[id(changed_host)] = new_raw
+            rebound = (rebound or self._at_bounds(old_raw) or
+                       any(not (minval <= value <= maxval)
+                           for value, (minval, maxval) in
+                           zip(new_raw, self._bounds)))
+
+        if rebound:
+            bounds = self._compute_bounds()
+            if bounds != self._bounds:
+                self._bounds = bounds
+                self._rebuild()
+                return
+        if passes:
+            heapq.heappush(self._heap, self._entry(changed_host))
+
+    def _pop_valid(self):
+        """Pop the best entry whose host is still a candidate.
+
+        The host chosen for an instance is popped and pushed back once it
+        is re-weighed, so the only stale entries are of removed hosts.
+        """
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if id(entry[2]) in self._raw:
+                return entry
+        return None
+
+    def _choose(self):
+        best = []
+        while len(best) < self.subset_size:
+            entry = self._pop_valid()
+            if entry is None:
+                break
+            best.append(entry)
+        if not best:
+            return None
+        chosen = random.choice(best)
+        for entry in best:
+            if entry is not chosen:
+                heapq.heappush(self._heap, entry)
+        neg_weight, order, host_state = chosen
+        return weights.WeighedHost(host_state, -neg_weight)
+
+    def place(self, hosts, instance_properties, num_instances,
+              update_group_hosts=False):
+        """Return a WeighedHost for each instance which could be placed."""
+        selected_hosts = []
+        self._start(hosts)
+        for num in xrange(num_instances):
+            if num > 0:
+                self._update(selected_hosts[-1].obj, num)
+            if not self._hosts:
+                break
+
+            chosen_host = self._choose()
+            if chosen_host is None:
+                break
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources so the filter/weights
+            # will change for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            if update_group_hosts is True:
+                self.filter_properties['group_hosts'].add(
+                        chosen_host.obj.host)
+        return selected_hosts
@@ -30,6 +30,7 @@ from nova.openstack.common.gettextutils import _
 from nova.openstack.common import log as logging
 from nova.pci import pci_request
 from nova import rpc
+from nova.scheduler import batch_placement
 from nova.scheduler import driver
 from nova.scheduler import scheduler_options
 from nova.scheduler import utils as scheduler_utils
@@ -48,7 +49,14 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=False,
+                help='Place all instances of a multi-instance request in '
+                     'one pass, only re-checking and re-weighing the hosts '
+                     'whose resources were consumed by the previous '
+                     'instances instead of re-running every filter and '
+                     'weigher over every host for each instance'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -258,6 +266,13 @@ class FilterScheduler(driver.Scheduler):
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+
+        if self._use_batch_placement(filter_properties, num_instances):
+            placement = batch_placement.BatchPlacement(self.host_manager,
+                    filter_properties, CONF.scheduler_host_subset_size)
+            return placement.place(hosts, instance_properties,
+                                   num_instances, update_group_hosts)
+
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -290,6 +305,14 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].add(chosen_host.obj.host)
         return selected_hosts
 
+    @staticmethod
+    def _use_batch_placement(filter_properties, num_instances):
+        # NOTE: forced hosts and nodes skip filtering altogether, so there
+        # is nothing to gain from batch placement for them.
+        return (CONF.scheduler_batch_placement and num_instances > 1 and
+                not filter_properties.get('force_hosts') and
+                not filter_properties.get('force_nodes'))
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
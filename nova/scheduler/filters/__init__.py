@@ -18,6 +18,7 @@ Scheduler host filters
 """
 
 from nova import filters
+from nova.scheduler import host_table
 
 
 class BaseHostFilter(filters.BaseFilter):
@@ -37,6 +38,9 @@ class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def _get_batch_table(self, host_states):
+        return host_table.get_host_state_table(host_states)
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
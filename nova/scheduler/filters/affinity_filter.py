@@ -103,6 +103,10 @@ class _GroupAntiAffinityFilter(AffinityFilter):
     hosts.
     """
 
+    # NOTE: group_hosts only grows by the hosts chosen for the previous
+    # instances of a request, whose state changed anyway.
+    depends_on_host_state_only = True
+
     def __init__(self):
         super(_GroupAntiAffinityFilter, self).__init__()
 
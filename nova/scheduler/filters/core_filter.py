@@ -37,6 +37,8 @@ CONF.register_opt(cpu_allocation_ratio_opt)
 
 class BaseCoreFilter(filters.BaseHostFilter):
 
+    depends_on_host_state_only = True
+
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         raise NotImplementedError
 
@@ -70,6 +72,27 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return CONF.cpu_allocation_ratio
 
+    def filter_batch(self, table, filter_properties):
+        """Return a mask of hosts with sufficient CPU cores."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return None
+
+        # Fail safe for hosts with no VCPUs set
+        unset = table.vcpus_total == 0
+        if unset.any():
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+
+        vcpus_total = table.vcpus_total * CONF.cpu_allocation_ratio
+        mask = unset | ((vcpus_total - table.vcpus_used) >=
+                        instance_type['vcpus'])
+
+        # Only provide a VCPU limit to compute if the virt driver is reporting
+        # an accurate count of installed VCPUs. (XenServer driver does not)
+        for i in (~unset & (vcpus_total > 0)).nonzero()[0]:
+            table.objs[i].limits['vcpu'] = vcpus_total[i].item()
+        return mask
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -32,6 +32,8 @@ class PciPassthroughFilter(filters.BaseHostFilter):
     The filter checks if the host passes or not based on this information.
     """
 
+    depends_on_host_state_only = True
+
     def host_passes(self, host_state, filter_properties):
         """Return true if the host has the required PCI devices."""
         if not filter_properties.get('pci_requests'):
@@ -35,6 +35,7 @@ CONF.register_opt(ram_allocation_ratio_opt)
 
 
 class BaseRamFilter(filters.BaseHostFilter):
+    depends_on_host_state_only = True
 
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         raise NotImplementedError
@@ -72,6 +73,20 @@ class RamFilter(BaseRamFilter):
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         return self.ram_allocation_ratio
 
+    def filter_batch(self, table, filter_properties):
+        """Only return hosts with sufficient available RAM."""
+        instance_type = filter_properties.get('instance_type')
+        requested_ram = instance_type['memory_mb']
+
+        memory_mb_limit = table.total_usable_ram_mb * self.ram_allocation_ratio
+        used_ram_mb = table.total_usable_ram_mb - table.free_ram_mb
+        mask = (memory_mb_limit - used_ram_mb) >= requested_ram
+
+        # save oversubscription limit for compute node to test against:
+        for i in mask.nonzero()[0]:
+            table.objs[i].limits['memory_mb'] = memory_mb_limit[i].item()
+        return mask
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
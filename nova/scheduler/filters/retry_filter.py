@@ -24,6 +24,8 @@ class RetryFilter(filters.BaseHostFilter):
     purposes
     """
 
+    depends_on_host_state_only = True
+
     def host_passes(self, host_state, filter_properties):
         """Skip nodes that have already been attempted."""
         retry = filter_properties.get('retry', None)
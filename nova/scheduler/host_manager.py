@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import UserDict
 
 from oslo.config import cfg
@@ -58,6 +59,17 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.BoolOpt('scheduler_incremental_host_states',
+                default=False,
+                help='Keep host states current incrementally by only '
+                     'reading compute nodes and services which changed '
+                     'since the previous refresh, rather than reading and '
+                     'parsing every compute node for each request'),
+    cfg.IntOpt('scheduler_host_states_full_refresh_interval',
+               default=600,
+               help='Number of seconds between full refreshes of host '
+                    'states when scheduler_incremental_host_states is '
+                    'enabled'),
     ]
 
 CONF = cfg.CONF
@@ -98,6 +110,10 @@ class ReadOnlyDict(UserDict.IterableUserDict):
             raise TypeError()
 
 
+# Changes are looked up from slightly before the previous refresh started,
+# so that rows committed while that refresh was running are not missed.
+CHANGED_SINCE_OVERLAP_SECONDS = 5
+
 # Representation of a single metric value from a compute node.
 MetricItem = collections.namedtuple(
              'MetricItem', ['value', 'timestamp', 'source'])
@@ -334,6 +350,17 @@ class HostManager(object):
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
+        # { compute node id : (host, hypervisor_hostname) }
+        self._compute_node_keys = {}
+        self._last_refresh_start = None
+        self.host_state_stats = {
+            'last_refresh': None,
+            'last_full_refresh': None,
+            'last_refresh_seconds': 0.0,
+            'last_refresh_nodes': 0,
+            'full_refreshes': 0,
+            'incremental_refreshes': 0,
+        }
 
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
@@ -437,42 +464,140 @@ class HostManager(object):
         return self.weight_handler.get_weighed_objects(self.weight_classes,
                 hosts, weight_properties)
 
-    def get_all_host_states(self, context):
-        """Returns a list of HostStates that represents all the hosts
-        the HostManager knows about. Also, each of the consumable resources
-        in HostState are pre-populated and adjusted based on data in the db.
-        """
+    def _update_host_state(self, compute):
+        """Create or update the HostState for a compute node.
 
+        Returns the state key of the host, or None if the compute node
+        has no service.
+        """
+        service = compute['service']
+        if not service:
+            LOG.warn(_("No service for compute ID %s") % compute['id'])
+            return None
+        host = service['host']
+        node = compute.get('hypervisor_hostname')
+        state_key = (host, node)
+        capabilities = self.service_states.get(state_key, None)
+        host_state = self.host_state_map.get(state_key)
+        if host_state:
+            host_state.update_capabilities(capabilities,
+                                           dict(service.iteritems()))
+        else:
+            host_state = self.host_state_cls(host, node,
+                    capabilities=capabilities,
+                    service=dict(service.iteritems()))
+            self.host_state_map[state_key] = host_state
+        host_state.update_from_compute_node(compute)
+        self._compute_node_keys[compute['id']] = state_key
+        return state_key
+
+    def _remove_host_state(self, state_key):
+        host, node = state_key
+        LOG.info(_("Removing dead compute node %(host)s:%(node)s "
+                   "from scheduler") % {'host': host, 'node': node})
+        del self.host_state_map[state_key]
+
+    def _refresh_all_host_states(self, context):
         # Get resource usage across the available compute nodes:
         compute_nodes = db.compute_node_get_all(context)
+        self._compute_node_keys = {}
         seen_nodes = set()
         for compute in compute_nodes:
-            service = compute['service']
-            if not service:
-                LOG.warn(_("No service for compute ID %s") % compute['id'])
-                continue
-            host = service['host']
-            node = compute.get('hypervisor_hostname')
-            state_key = (host, node)
-            capabilities = self.service_states.get(state_key, None)
-            host_state = self.host_state_map.get(state_key)
-            if host_state:
-                host_state.update_capabilities(capabilities,
-                                               dict(service.iteritems()))
-            else:
-                host_state = self.host_state_cls(host, node,
-                        capabilities=capabilities,
-                        service=dict(service.iteritems()))
-                self.host_state_map[state_key] = host_state
-            host_state.update_from_compute_node(compute)
-            seen_nodes.add(state_key)
+            state_key = self._update_host_state(compute)
+            if state_key:
+                seen_nodes.add(state_key)
 
         # remove compute nodes from host_state_map if they are not active
         dead_nodes = set(self.host_state_map.keys()) - seen_nodes
         for state_key in dead_nodes:
-            host, node = state_key
-            LOG.info(_("Removing dead compute node %(host)s:%(node)s "
-                       "from scheduler") % {'host': host, 'node': node})
-            del self.host_state_map[state_key]
+            self._remove_host_state(state_key)
+        return len(compute_nodes)
+
+    def _refresh_changed_host_states(self, context, changed_since):
+        compute_nodes = db.compute_node_get_all_changed_since(context,
+                                                              changed_since)
+        for compute in compute_nodes:
+            if not compute['deleted'] and self._update_host_state(compute):
+                continue
+            state_key = self._compute_node_keys.pop(compute['id'], None)
+            if state_key in self.host_state_map:
+                self._remove_host_state(state_key)
+
+        # NOTE(markmc): services are refreshed separately from their compute
+        #               nodes, since their heartbeats are what the filters
+        #               use to decide whether a host is up.
+        services = db.service_get_all_changed_since(context, changed_since,
+                                                    binary='nova-compute')
+        services = dict((service['id'], service) for service in services)
+        if services:
+            for state_key, host_state in self.host_state_map.iteritems():
+                service = services.get(host_state.service.get('id'))
+                if service:
+                    capabilities = self.service_states.get(state_key, None)
+                    host_state.update_capabilities(capabilities, service)
+        return len(compute_nodes)
+
+    def get_host_state_stats(self):
+        """Return statistics about the freshness and cost of host states.
+
+        'staleness' is the number of seconds since host states were last
+        refreshed from the database.
+        """
+        stats = dict(self.host_state_stats)
+        stats['staleness'] = None
+        if stats['last_refresh']:
+            stats['staleness'] = timeutils.delta_seconds(
+                    stats['last_refresh'], timeutils.utcnow())
+        stats['num_hosts'] = len(self.host_state_map)
+        return stats
+
+    def pop_filter_and_weigher_stats(self):
+        """Return the time spent in each filter and weigher, and the hosts
+        they were given and passed, since the previous call.
+        """
+        return {'filters': self.filter_handler.pop_filter_stats(),
+                'weighers': self.weight_handler.pop_weigher_stats()}
+
+    def get_all_host_states(self, context):
+        """Returns a list of HostStates that represents all the hosts
+        the HostManager knows about. Also, each of the consumable resources
+        in HostState are pre-populated and adjusted based on data in the db.
+
+        If scheduler_incremental_host_states is enabled, only compute nodes
+        and services which changed since the previous call are read, with a
+        full refresh every scheduler_host_states_full_refresh_interval
+        seconds.
+        """
+        stats = self.host_state_stats
+        start = timeutils.utcnow()
+
+        full_refresh = (not CONF.scheduler_incremental_host_states or
+                        self._last_refresh_start is None or
+                        timeutils.is_older_than(
+                            stats['last_full_refresh'],
+                            CONF.scheduler_host_states_full_refresh_interval))
+        if full_refresh:
+            num_nodes = self._refresh_all_host_states(context)
+            stats['last_full_refresh'] = start
+            stats['full_refreshes'] += 1
+        else:
+            changed_since = (self._last_refresh_start -
+                    datetime.timedelta(seconds=CHANGED_SINCE_OVERLAP_SECONDS))
+            num_nodes = self._refresh_changed_host_states(context,
+                                                          changed_since)
+            stats['incremental_refreshes'] += 1
+
+        self._last_refresh_start = start
+        stats['last_refresh'] = timeutils.utcnow()
+        stats['last_refresh_seconds'] = timeutils.delta_seconds(
+                start, stats['last_refresh'])
+        stats['last_refresh_nodes'] = num_nodes
+        if CONF.scheduler_incremental_host_states:
+            LOG.debug("Refreshed %(num_nodes)d of %(num_hosts)d host states "
+                      "in %(seconds).3f seconds (full refresh: %(full)s)",
+                      {'num_nodes': num_nodes,
+                       'num_hosts': len(self.host_state_map),
+                       'seconds': stats['last_refresh_seconds'],
+                       'full': full_refresh})
 
         return self.host_state_map.itervalues()
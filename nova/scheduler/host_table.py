@@ -0,0 +1,133 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar view of host states for batch filtering and weighing.
+
+Filters and weighers which implement filter_batch() or weigh_batch() are
+evaluated over all hosts in one pass using the NumPy arrays of a
+HostStateTable, rather than with a Python call per host.
+"""
+
+try:
+    import numpy
+except ImportError:
+    # This module needs to be importable despite numpy not being a
+    # requirement; batch evaluation is simply disabled without it.
+    numpy = None
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _LW
+from nova.openstack.common import log as logging
+
+host_table_opts = [
+    cfg.BoolOpt('scheduler_batch_evaluation',
+                default=False,
+                help='Evaluate filters and weighers which support it over '
+                     'a columnar table of all hosts in one pass. Requires '
+                     'numpy; filters and weighers without batch support '
+                     'are still evaluated host by host'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(host_table_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class HostStateTable(object):
+    """NumPy arrays of the consumable resources of a list of HostStates.
+
+    Row i of every column describes objs[i].
+    """
+
+    columns = ('free_ram_mb', 'total_usable_ram_mb', 'free_disk_mb',
+               'total_usable_disk_gb', 'vcpus_total', 'vcpus_used',
+               'num_instances', 'num_io_ops')
+
+    def __init__(self, objs, arrays=None):
+        self.objs = objs
+        self._rows = None
+        if arrays is None:
+            arrays = {}
+            for column in self.columns:
+                arrays[column] = numpy.fromiter(
+                        (getattr(obj, column) for obj in objs),
+                        dtype=numpy.float64, count=len(objs))
+        self._arrays = arrays
+
+    def __len__(self):
+        return len(self.objs)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_arrays'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def metric(self, name):
+        """Return the values of a metric, with NaN where it is missing."""
+        nan = float('nan')
+        return numpy.fromiter(
+                (obj.metrics[name].value if name in obj.metrics else nan
+                 for obj in self.objs),
+                dtype=numpy.float64, count=len(self.objs))
+
+    def normalize(self, weights, minval, maxval):
+        """Normalize an array of weights between 0 and 1.0.
+
+        Vectorized equivalent of nova.weights.normalize().
+        """
+        maxval = float(maxval)
+        minval = float(minval)
+        if minval == maxval:
+            return numpy.zeros(len(weights))
+        return (weights - minval) / (maxval - minval)
+
+    def select(self, mask):
+        """Return a new table with only the rows where mask is True."""
+        indexes = numpy.flatnonzero(mask)
+        objs = [self.objs[i] for i in indexes]
+        arrays = dict((column, array[indexes])
+                      for column, array in self._arrays.iteritems())
+        return HostStateTable(objs, arrays)
+
+    def subset(self, objs):
+        """Return a new table with only the rows of objs, in that order.
+
+        Used to keep the table in step with filters evaluated per object.
+        """
+        if self._rows is None:
+            self._rows = dict((id(obj), i) for i, obj in enumerate(self.objs))
+        indexes = numpy.array([self._rows[id(obj)] for obj in objs],
+                              dtype=numpy.intp)
+        arrays = dict((column, array[indexes])
+                      for column, array in self._arrays.iteritems())
+        return HostStateTable(list(objs), arrays)
+
+
+def get_host_state_table(host_states):
+    """Return a HostStateTable of host_states if batch evaluation is enabled.
+
+    Returns None if batch evaluation is disabled or numpy is not available.
+    """
+    if not CONF.scheduler_batch_evaluation:
+        return None
+    if numpy is None:
+        LOG.warning(_LW("scheduler_batch_evaluation is enabled but numpy "
+                        "is not installed, evaluating hosts one by one"))
+        return None
+    return HostStateTable(host_states)
@@ -31,6 +31,7 @@ from nova import exception
 from nova import manager
 from nova.objects import instance as instance_obj
 from nova.openstack.common import excutils
+from nova.openstack.common.gettextutils import _
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
@@ -52,6 +53,12 @@ scheduler_driver_opts = [
                     'Please note this is likely to interact with the value '
                     'of service_down_time, but exactly how they interact '
                     'will depend on your choice of scheduler driver.'),
+    cfg.IntOpt('scheduler_stats_report_interval',
+               default=600,
+               help='How often (in seconds) to log and send a notification '
+                    'of the time spent in each scheduler filter and weigher '
+                    'and the number of hosts they were given and passed. '
+                    'A negative value disables the reports'),
 ]
 CONF = cfg.CONF
 CONF.register_opts(scheduler_driver_opts)
@@ -269,6 +276,25 @@ class SchedulerManager(manager.Manager):
     def _run_periodic_tasks(self, context):
         self.driver.run_periodic_tasks(context)
 
+    @periodic_task.periodic_task(
+            spacing=CONF.scheduler_stats_report_interval)
+    def _report_filter_and_weigher_stats(self, context):
+        stats = self.driver.host_manager.pop_filter_and_weigher_stats()
+        if not stats['filters'] and not stats['weighers']:
+            return
+        for name, filter_stats in sorted(stats['filters'].iteritems()):
+            LOG.info(_("Scheduler filter %(name)s: calls=%(calls)d "
+                       "seconds=%(seconds).3f hosts_in=%(objs_in)d "
+                       "hosts_out=%(objs_out)d"),
+                     dict(filter_stats, name=name))
+        for name, weigher_stats in sorted(stats['weighers'].iteritems()):
+            LOG.info(_("Scheduler weigher %(name)s: calls=%(calls)d "
+                       "seconds=%(seconds).3f hosts=%(objs)d"),
+                     dict(weigher_stats, name=name))
+        payload = dict(stats, host=self.host)
+        self.notifier.info(context, 'scheduler.filter_weigher.stats',
+                           payload)
+
     # NOTE(russellb) This method can be removed in 3.0 of this API.  It is
     # deprecated in favor of the method in the base API.
     def get_backdoor_port(self, context):
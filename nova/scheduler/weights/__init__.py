@@ -19,6 +19,7 @@ Scheduler host weights
 
 from oslo.config import cfg
 
+from nova.scheduler import host_table
 from nova import weights
 
 CONF = cfg.CONF
@@ -46,6 +47,9 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def _get_batch_table(self, host_states):
+        return host_table.get_host_state_table(host_states)
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
@@ -102,3 +102,38 @@ class MetricsWeigher(weights.BaseHostWeigher):
                         return CONF.metrics.weight_of_unavailable
 
         return value
+
+    def _weigh_batch(self, table, weight_properties):
+        values = None
+        unavailable = None
+
+        for (name, ratio) in self.setting:
+            metric = table.metric(name)
+            # Hosts missing the metric have a NaN value, the only value
+            # which is not equal to itself.
+            missing = metric != metric
+            if missing.any():
+                if CONF.metrics.required:
+                    host_state = table.objs[missing.nonzero()[0][0]]
+                    raise exception.ComputeHostMetricNotFound(
+                            host=host_state.host,
+                            node=host_state.nodename,
+                            name=name)
+                # Do nothing if ratio or weight_multiplier is 0.
+                if ratio * self.weight_multiplier() != 0:
+                    if unavailable is None:
+                        unavailable = missing
+                    else:
+                        unavailable = unavailable | missing
+                metric[missing] = 0.0
+
+            if values is None:
+                values = metric * ratio
+            else:
+                values += metric * ratio
+
+        if values is None:
+            return None
+        if unavailable is not None:
+            values[unavailable] = CONF.metrics.weight_of_unavailable
+        return values
@@ -13,6 +13,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 from oslo.config import cfg
 import six
 
@@ -24,8 +26,32 @@ from nova.openstack.common import timeutils
 from nova.servicegroup import api
 
 
+db_driver_opts = [
+    cfg.BoolOpt('servicegroup_batch_heartbeats',
+                default=False,
+                help='Send the heartbeats of the services to nova-conductor '
+                     'without waiting for them to be written, which writes '
+                     'them to the database in bulk every '
+                     'conductor.heartbeat_flush_interval seconds. That '
+                     'interval has to stay well below service_down_time'),
+    cfg.IntOpt('servicegroup_cache_time',
+               default=0,
+               help='Number of seconds for which the members of a group '
+                    'read from the database are reused to tell which are '
+                    'up. 0 reads them every time. The cached heartbeats '
+                    'age while they are reused, so this plus '
+                    'report_interval (and '
+                    'conductor.heartbeat_flush_interval when heartbeats '
+                    'are batched) has to stay below service_down_time; '
+                    'larger values are lowered to fit'),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(db_driver_opts)
 CONF.import_opt('service_down_time', 'nova.service')
+CONF.import_opt('report_interval', 'nova.service')
+CONF.import_opt('heartbeat_flush_interval', 'nova.conductor.manager',
+                group='conductor')
 
 LOG = logging.getLogger(__name__)
 
@@ -36,6 +62,34 @@ class DbDriver(api.ServiceGroupDriver):
         self.db_allowed = kwargs.get('db_allowed', True)
         self.conductor_api = conductor.API(use_local=self.db_allowed)
         self.service_down_time = CONF.service_down_time
+        self.cache_time = self._get_cache_time()
+        # { group_id : (time read, services) }
+        self._members = {}
+
+    def _get_cache_time(self):
+        """Returns the number of seconds group members may be cached.
+
+        A cached heartbeat is compared with the current time for as long as
+        it is reused, so a live service whose last heartbeat was already
+        report_interval (plus the conductor flush interval when batching)
+        old when read would be seen as down once the cache gets that close
+        to service_down_time.
+        """
+        cache_time = CONF.servicegroup_cache_time
+        if not cache_time:
+            return 0
+        heartbeat_age = CONF.report_interval
+        if CONF.servicegroup_batch_heartbeats:
+            heartbeat_age += CONF.conductor.heartbeat_flush_interval
+        max_cache_time = max(self.service_down_time - heartbeat_age - 1, 0)
+        if cache_time > max_cache_time:
+            LOG.warn(_('servicegroup_cache_time of %(cache)ds would report '
+                       'live services as down with a service_down_time of '
+                       '%(down)ds, using %(max)ds instead'),
+                     {'cache': cache_time, 'down': self.service_down_time,
+                      'max': max_cache_time})
+            return max_cache_time
+        return cache_time
 
     def join(self, member_id, group_id, service=None):
         """Join the given service with its group."""
@@ -80,8 +134,18 @@ class DbDriver(api.ServiceGroupDriver):
         """
         LOG.debug('DB_Driver: get_all members of the %s group', group_id)
         rs = []
-        ctxt = context.get_admin_context()
-        services = self.conductor_api.service_get_all_by_topic(ctxt, group_id)
+        # NOTE: the cached heartbeats are checked against the current time,
+        # so they age while reused; _get_cache_time() keeps the cache short
+        # enough for a live service not to look down.
+        read_at, services = self._members.get(group_id, (None, None))
+        now = time.time()
+        if (read_at is None or
+                now - read_at >= self.cache_time):
+            ctxt = context.get_admin_context()
+            services = self.conductor_api.service_get_all_by_topic(ctxt,
+                                                                   group_id)
+            if self.cache_time:
+                self._members[group_id] = (now, services)
         for service in services:
             if self.is_up(service):
                 rs.append(service['host'])
@@ -92,11 +156,17 @@ class DbDriver(api.ServiceGroupDriver):
         ctxt = context.get_admin_context()
         state_catalog = {}
         try:
-            report_count = service.service_ref['report_count'] + 1
-            state_catalog['report_count'] = report_count
-
-            service.service_ref = self.conductor_api.service_update(ctxt,
-                    service.service_ref, state_catalog)
+            if CONF.servicegroup_batch_heartbeats:
+                service_ref = self.conductor_api.service_heartbeat(
+                        ctxt, service.service_ref)
+                if service_ref is not None:
+                    service.service_ref = service_ref
+            else:
+                report_count = service.service_ref['report_count'] + 1
+                state_catalog['report_count'] = report_count
+
+                service.service_ref = self.conductor_api.service_update(ctxt,
+                        service.service_ref, state_catalog)
 
             # TODO(termie): make this pattern be more elegant.
             if getattr(service, 'model_disconnected', False):
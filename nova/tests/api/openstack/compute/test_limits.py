@@ -29,6 +29,7 @@ from nova.api.openstack.compute import views
 from nova.api.openstack import xmlutil
 import nova.context
 from nova.openstack.common import jsonutils
+from nova.openstack.common import memorycache
 from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests import matchers
@@ -422,6 +423,48 @@ class LimitTest(BaseLimitTestSuite):
         self.assertEqual(4, limit.last_request)
 
 
+class LimitMatcherTest(test.NoDBTestCase):
+    """Tests for the `limits.LimitMatcher` class."""
+
+    def test_match(self):
+        matcher = limits.LimitMatcher(TEST_LIMITS)
+        self.assertEqual([1, 2], matcher.match("POST", "/servers/1"))
+        self.assertEqual([1], matcher.match("POST", "/images"))
+        self.assertEqual([3, 4], matcher.match("PUT", "/servers"))
+        self.assertEqual([0], matcher.match("GET", "/delayed"))
+        self.assertEqual([], matcher.match("GET", "/servers"))
+        self.assertEqual([], matcher.match("DELETE", "/servers"))
+
+    def test_match_backreference(self):
+        # Backreferences are numbered across the combined regex
+        matcher = limits.LimitMatcher([
+            limits.Limit("GET", "*", "^/(servers|images)", 1, 1),
+            limits.Limit("GET", "*", r"^/(\w)\1", 1, 1),
+        ])
+        self.assertEqual([0], matcher.match("GET", "/servers"))
+        self.assertEqual([1], matcher.match("GET", "/aa"))
+        self.assertEqual([], matcher.match("GET", "/ab"))
+
+    def test_match_inline_flags(self):
+        # Inline flags would apply to the whole combined regex
+        matcher = limits.LimitMatcher([
+            limits.Limit("GET", "*", "(?i)^/A", 1, 1),
+            limits.Limit("GET", "*", "^/b", 1, 1),
+        ])
+        self.assertEqual([0], matcher.match("GET", "/a"))
+        self.assertEqual([1], matcher.match("GET", "/b"))
+        self.assertEqual([], matcher.match("GET", "/B"))
+
+    def test_match_many_limits(self):
+        # More groups than a single regex can have
+        matcher = limits.LimitMatcher([
+            limits.Limit("GET", "*", "^/(servers)/%d$" % i, 1, 1)
+            for i in range(150)])
+        self.assertEqual([0], matcher.match("GET", "/servers/0"))
+        self.assertEqual([149], matcher.match("GET", "/servers/149"))
+        self.assertEqual([], matcher.match("GET", "/servers/150"))
+
+
 class ParseLimitsTest(BaseLimitTestSuite):
     """Tests for the default limits parser in the in-memory
     `limits.Limiter` class.
@@ -650,6 +693,43 @@ class LimiterTest(BaseLimitTestSuite):
         self.assertEqual(expected, results)
 
 
+class SharedLimiterTest(LimiterTest):
+    """Tests for the `limits.SharedLimiter` class."""
+
+    def setUp(self):
+        super(SharedLimiterTest, self).setUp()
+        userlimits = {'limits.user3': '',
+                      'limits.user0': '(get, *, .*, 4, minute);'
+                                      '(put, *, .*, 2, minute)'}
+        self.limiter = limits.SharedLimiter(TEST_LIMITS, **userlimits)
+        self.limiter._cache = memorycache.Client()
+
+    def test_not_shared(self):
+        self.assertIsNone(limits.SharedLimiter(TEST_LIMITS)._cache)
+
+    def test_shared_levels(self):
+        other = limits.SharedLimiter(TEST_LIMITS)
+        other._cache = self.limiter._cache
+        expected = [None] * 3 + [20.0]
+        results = [limiter.check_for_delay("POST", "/servers", "user1")[0]
+                   for limiter in (self.limiter, other, self.limiter, other)]
+        self.assertEqual(expected, results)
+
+    def test_level_changed(self):
+        stored = []
+
+        def fake_set(key, value, time=0):
+            stored.append(value)
+            return False
+
+        self.stubs.Set(self.limiter._cache, 'get', lambda key: '0.0 0.0')
+        self.stubs.Set(self.limiter._cache, 'set', fake_set)
+        # The request goes through when the level cannot be updated
+        self.assertEqual((None, None),
+                         self.limiter.check_for_delay("PUT", "/foo"))
+        self.assertEqual(['6.0 0.0'] * limits.SharedLimiter.RETRIES, stored)
+
+
 class WsgiLimiterTest(BaseLimitTestSuite):
     """Tests for `limits.WsgiLimiter` class."""
 
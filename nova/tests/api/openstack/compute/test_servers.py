@@ -1780,6 +1780,9 @@ class ServersControllerCreateTest(test.TestCase):
             self.instance_cache_by_uuid[instance['uuid']] = instance
             return instance
 
+        def instance_bulk_create(context, values_list):
+            return [instance_create(context, inst) for inst in values_list]
+
         def instance_get(context, instance_id):
             """Stub for compute/api create() pulling in instance after
             scheduling
@@ -1821,6 +1824,7 @@ class ServersControllerCreateTest(test.TestCase):
         self.stubs.Set(db, 'project_get_networks',
                        project_get_networks)
         self.stubs.Set(db, 'instance_create', instance_create)
+        self.stubs.Set(db, 'instance_bulk_create', instance_bulk_create)
         self.stubs.Set(db, 'instance_system_metadata_update',
                        fake_method)
         self.stubs.Set(db, 'instance_get', instance_get)
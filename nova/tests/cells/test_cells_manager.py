@@ -15,12 +15,14 @@
 """
 Tests For CellsManager
 """
+import contextlib
 import copy
 import datetime
 
 import mock
 from oslo.config import cfg
 
+from nova.cells import manager
 from nova.cells import messaging
 from nova.cells import utils as cells_utils
 from nova import context
@@ -147,12 +149,126 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
         self.cells_manager.instance_update_at_top(self.ctxt,
                                                   instance='fake-instance')
 
+    def test_instance_update_at_top_batched(self):
+        self.flags(instance_update_sync_delay=0.5, group='cells')
+        instance1 = {'uuid': 'fake_uuid1', 'vm_state': 'building',
+                     'host': None}
+        instance2 = {'uuid': 'fake_uuid2', 'vm_state': 'active'}
+        instance1_update = dict(instance1, host='fake-host')
+
+        with contextlib.nested(
+                mock.patch.object(manager.greenthread, 'spawn_after'),
+                mock.patch.object(self.msg_runner,
+                                  'instance_update_many_at_top'),
+                mock.patch.object(self.msg_runner, 'instance_update_at_top'),
+                mock.patch.object(context, 'get_admin_context',
+                                  return_value=self.ctxt),
+        ) as (spawn_after, update_many, update, get_admin_context):
+            self.cells_manager.instance_update_at_top(self.ctxt, instance1)
+            self.cells_manager.instance_update_at_top(self.ctxt, instance2)
+            spawn_after.assert_called_once_with(
+                    0.5, self.cells_manager._send_instance_updates)
+            self.assertFalse(update_many.called)
+
+            self.cells_manager._send_instance_updates()
+            self.assertFalse(update.called)
+            update_many.assert_called_once_with(self.ctxt, mock.ANY)
+            self.assertEqual(
+                    sorted([instance1, instance2]),
+                    sorted(update_many.call_args[0][1]))
+
+            # Only the changes to instance1 are sent, and nothing for an
+            # instance2 update that didn't change anything.
+            update_many.reset_mock()
+            self.cells_manager.instance_update_at_top(self.ctxt,
+                                                      dict(instance1))
+            self.cells_manager.instance_update_at_top(self.ctxt,
+                                                      instance1_update)
+            self.cells_manager.instance_update_at_top(self.ctxt,
+                                                      dict(instance2))
+            self.cells_manager._send_instance_updates()
+            update_many.assert_called_once_with(
+                    self.ctxt, [{'uuid': 'fake_uuid1', 'host': 'fake-host'}])
+
+    def test_instance_update_at_top_batched_nothing_changed(self):
+        self.flags(instance_update_sync_delay=0.5, group='cells')
+        instance = {'uuid': 'fake_uuid', 'vm_state': 'active'}
+        self.cells_manager._sent_instance_updates['fake_uuid'] = instance
+
+        with contextlib.nested(
+                mock.patch.object(manager.greenthread, 'spawn_after'),
+                mock.patch.object(self.msg_runner,
+                                  'instance_update_many_at_top'),
+        ) as (spawn_after, update_many):
+            self.cells_manager.instance_update_at_top(self.ctxt,
+                                                      dict(instance))
+            self.cells_manager._send_instance_updates()
+            self.assertFalse(update_many.called)
+
+    def test_instance_update_at_top_batched_send_fails(self):
+        self.flags(instance_update_sync_delay=0.5, group='cells')
+        instance = {'uuid': 'fake_uuid', 'vm_state': 'active'}
+        self.cells_manager._sent_instance_updates['fake_uuid'] = dict(
+                instance, vm_state='building')
+
+        with contextlib.nested(
+                mock.patch.object(manager.greenthread, 'spawn_after'),
+                mock.patch.object(self.msg_runner,
+                                  'instance_update_many_at_top',
+                                  side_effect=test.TestingException),
+        ) as (spawn_after, update_many):
+            self.cells_manager.instance_update_at_top(self.ctxt, instance)
+            self.cells_manager._send_instance_updates()
+            update_many.assert_called_once_with(
+                    mock.ANY, [{'uuid': 'fake_uuid', 'vm_state': 'active'}])
+            # The next update is sent in full.
+            self.assertNotIn('fake_uuid',
+                             self.cells_manager._sent_instance_updates)
+
+    def test_instance_update_at_top_batched_update_fails(self):
+        self.flags(instance_update_sync_delay=0.5, group='cells')
+        instance1 = {'uuid': 'fake_uuid1', 'vm_state': 'active'}
+        instance2 = {'uuid': 'fake_uuid2', 'vm_state': 'active'}
+        self.cells_manager._sent_instance_updates['fake_uuid1'] = dict(
+                instance1, vm_state='building')
+
+        with contextlib.nested(
+                mock.patch.object(manager.greenthread, 'spawn_after'),
+                mock.patch.object(self.msg_runner,
+                                  'instance_update_many_at_top',
+                                  return_value=set(['fake_uuid1'])),
+        ) as (spawn_after, update_many):
+            self.cells_manager.instance_update_at_top(self.ctxt, instance1)
+            self.cells_manager.instance_update_at_top(self.ctxt, instance2)
+            self.cells_manager._send_instance_updates()
+            # The top level cell did not apply the changes to instance1, so
+            # its next update is sent in full.
+            self.assertEqual({'fake_uuid2': instance2},
+                             self.cells_manager._sent_instance_updates)
+
     def test_instance_destroy_at_top(self):
+        fake_instance = {'uuid': 'fake_uuid'}
+        self.cells_manager._pending_instance_updates['fake_uuid'] = (
+                fake_instance)
+        self.cells_manager._sent_instance_updates['fake_uuid'] = (
+                fake_instance)
         self.mox.StubOutWithMock(self.msg_runner, 'instance_destroy_at_top')
-        self.msg_runner.instance_destroy_at_top(self.ctxt, 'fake-instance')
+        self.msg_runner.instance_destroy_at_top(self.ctxt, fake_instance)
         self.mox.ReplayAll()
         self.cells_manager.instance_destroy_at_top(self.ctxt,
-                                                  instance='fake-instance')
+                                                  instance=fake_instance)
+        self.assertEqual({}, self.cells_manager._pending_instance_updates)
+        self.assertEqual({}, self.cells_manager._sent_instance_updates)
+
+    def test_sync_instance(self):
+        fake_instance = {'uuid': 'fake_uuid', 'deleted': False}
+        self.cells_manager._sent_instance_updates['fake_uuid'] = (
+                fake_instance)
+        self.mox.StubOutWithMock(self.msg_runner, 'instance_update_at_top')
+        self.msg_runner.instance_update_at_top(self.ctxt, fake_instance)
+        self.mox.ReplayAll()
+        self.cells_manager._sync_instance(self.ctxt, fake_instance)
+        self.assertEqual({}, self.cells_manager._sent_instance_updates)
 
     def test_instance_delete_everywhere(self):
         self.mox.StubOutWithMock(self.msg_runner,
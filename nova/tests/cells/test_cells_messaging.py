@@ -1546,6 +1546,62 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.instance_update_at_top(self.ctxt, fake_instance)
 
+    def test_instance_update_many_at_top(self):
+        fake_info_cache = {'id': 1,
+                           'instance': 'fake_instance',
+                           'network_info': []}
+        full_instance = {'id': 2,
+                         'uuid': 'fake_uuid1',
+                         'security_groups': 'fake',
+                         'cell_name': 'fake',
+                         'created_at': 'fake-created-at',
+                         'info_cache': fake_info_cache,
+                         'other': 'meow'}
+        changed_instance = {'uuid': 'fake_uuid2',
+                            'vm_state': vm_states.BUILDING}
+        missing_full_instance = {'uuid': 'fake_uuid3',
+                                 'created_at': 'fake-created-at'}
+        missing_changed_instance = {'uuid': 'fake_uuid4',
+                                    'other': 'woof',
+                                    'info_cache': {'network_info': []}}
+        expected_cell_name = 'api-cell!child-cell2!grandchild-cell1'
+        expected_updates = {
+            'fake_uuid1': {'cell_name': expected_cell_name,
+                           'created_at': 'fake-created-at',
+                           'other': 'meow'},
+            'fake_uuid2': {'cell_name': expected_cell_name,
+                           'vm_state': vm_states.BUILDING,
+                           'expected_vm_state': [vm_states.BUILDING, None]},
+            'fake_uuid3': {'cell_name': expected_cell_name,
+                           'created_at': 'fake-created-at'},
+            'fake_uuid4': {'cell_name': expected_cell_name,
+                           'other': 'woof'}}
+        failures = {
+            'fake_uuid3': exception.InstanceNotFound(instance_id='fake_uuid3'),
+            'fake_uuid4': exception.InstanceNotFound(instance_id='fake_uuid4')}
+
+        # To show these should not be called in src/mid-level cell
+        self.mox.StubOutWithMock(self.src_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.mid_db_inst, 'instance_update_many')
+
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_update_many')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'instance_create')
+        self.mox.StubOutWithMock(self.tgt_db_inst,
+                                 'instance_info_cache_update')
+        self.tgt_db_inst.instance_update_many(
+                self.ctxt, expected_updates).AndReturn(failures)
+        self.tgt_db_inst.instance_create(
+                self.ctxt, dict(expected_updates['fake_uuid3'],
+                                uuid='fake_uuid3'))
+        self.tgt_db_inst.instance_info_cache_update(
+                self.ctxt, 'fake_uuid1', {'network_info': '[]'})
+        self.mox.ReplayAll()
+
+        failed = self.src_msg_runner.instance_update_many_at_top(
+                self.ctxt, [full_instance, changed_instance,
+                            missing_full_instance, missing_changed_instance])
+        self.assertEqual(set(['fake_uuid4']), failed)
+
     def test_instance_destroy_at_top(self):
         fake_instance = {'uuid': 'fake_uuid'}
 
@@ -33,24 +33,31 @@ class CellsUtilsTestCase(test.NoDBTestCase):
         def random_shuffle(_list):
             call_info['shuffle'] += 1
 
-        def instance_get_all_by_filters(context, filters,
-                sort_key, sort_order):
+        def instance_get_all_by_updated_at(context, updated_since=None,
+                cursor=None, limit=None, project_id=None, deleted=True,
+                columns_to_join=None):
             self.assertEqual(context, fake_context)
-            self.assertEqual(sort_key, 'deleted')
-            self.assertEqual(sort_order, 'asc')
-            call_info['got_filters'] = filters
+            self.assertIsNone(cursor)
+            self.assertEqual(1000, limit)
+            call_info['got_kwargs'] = dict(updated_since=updated_since,
+                                           project_id=project_id,
+                                           deleted=deleted,
+                                           columns_to_join=columns_to_join)
             call_info['get_all'] += 1
-            return ['fake_instance1', 'fake_instance2', 'fake_instance3']
+            return [{'id': i, 'uuid': 'fake_uuid%d' % i}
+                    for i in range(3)]
 
-        self.stubs.Set(db, 'instance_get_all_by_filters',
-                instance_get_all_by_filters)
+        self.stubs.Set(db, 'instance_get_all_by_updated_at',
+                instance_get_all_by_updated_at)
         self.stubs.Set(random, 'shuffle', random_shuffle)
 
         instances = cells_utils.get_instances_to_sync(fake_context)
         self.assertTrue(inspect.isgenerator(instances))
         self.assertEqual(len([x for x in instances]), 3)
         self.assertEqual(call_info['get_all'], 1)
-        self.assertEqual(call_info['got_filters'], {})
+        self.assertEqual(call_info['got_kwargs'],
+                {'updated_since': None, 'project_id': None, 'deleted': True,
+                 'columns_to_join': None})
         self.assertEqual(call_info['shuffle'], 0)
 
         instances = cells_utils.get_instances_to_sync(fake_context,
@@ -58,29 +65,53 @@ class CellsUtilsTestCase(test.NoDBTestCase):
         self.assertTrue(inspect.isgenerator(instances))
         self.assertEqual(len([x for x in instances]), 3)
         self.assertEqual(call_info['get_all'], 2)
-        self.assertEqual(call_info['got_filters'], {})
         self.assertEqual(call_info['shuffle'], 1)
 
         instances = cells_utils.get_instances_to_sync(fake_context,
-                updated_since='fake-updated-since')
+                updated_since='fake-updated-since', uuids_only=True)
         self.assertTrue(inspect.isgenerator(instances))
-        self.assertEqual(len([x for x in instances]), 3)
+        self.assertEqual(['fake_uuid0', 'fake_uuid1', 'fake_uuid2'],
+                         list(instances))
         self.assertEqual(call_info['get_all'], 3)
-        self.assertEqual(call_info['got_filters'],
-                {'changes-since': 'fake-updated-since'})
+        self.assertEqual(call_info['got_kwargs'],
+                {'updated_since': 'fake-updated-since', 'project_id': None,
+                 'deleted': True, 'columns_to_join': []})
         self.assertEqual(call_info['shuffle'], 1)
 
         instances = cells_utils.get_instances_to_sync(fake_context,
-                project_id='fake-project',
+                project_id='fake-project', deleted=False,
                 updated_since='fake-updated-since', shuffle=True)
         self.assertTrue(inspect.isgenerator(instances))
         self.assertEqual(len([x for x in instances]), 3)
         self.assertEqual(call_info['get_all'], 4)
-        self.assertEqual(call_info['got_filters'],
-                {'changes-since': 'fake-updated-since',
-                 'project_id': 'fake-project'})
+        self.assertEqual(call_info['got_kwargs'],
+                {'updated_since': 'fake-updated-since',
+                 'project_id': 'fake-project', 'deleted': False,
+                 'columns_to_join': None})
         self.assertEqual(call_info['shuffle'], 2)
 
+    def test_get_instances_to_sync_in_batches(self):
+        self.flags(instance_sync_batch_size=2, group='cells')
+        instances = [{'id': i, 'uuid': 'fake_uuid%d' % i}
+                     for i in range(5)]
+        batches = [instances[:2], instances[2:4], instances[4:]]
+        cursors = []
+
+        def instance_get_all_by_updated_at(context, cursor=None, limit=None,
+                                           **kwargs):
+            self.assertEqual(2, limit)
+            cursors.append(cursor)
+            return batches[len(cursors) - 1]
+
+        self.stubs.Set(db, 'instance_get_all_by_updated_at',
+                instance_get_all_by_updated_at)
+
+        instances_to_sync = cells_utils.get_instances_to_sync('fake_context')
+        self.assertEqual(instances[0], next(instances_to_sync))
+        self.assertEqual(1, len(cursors))
+        self.assertEqual(instances, [instances[0]] + list(instances_to_sync))
+        self.assertEqual([None, 1, 3], cursors)
+
     def test_split_cell_and_item(self):
         path = 'australia', 'queensland', 'gold_coast'
         cell = cells_utils.PATH_CELL_SEP.join(path)
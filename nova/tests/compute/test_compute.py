@@ -634,6 +634,98 @@ class ComputeVolumeTestCase(BaseTestCase):
         self.compute._poll_bandwidth_usage(ctxt)
         self.mox.UnsetStubs()
 
+    def _assert_bw_usage(self, ctxt, start_period, uuid, mac, bw_in, bw_out,
+                         last_ctr_in, last_ctr_out):
+        usage = db.bw_usage_get(ctxt, uuid, start_period, mac)
+        self.assertEqual((bw_in, bw_out, last_ctr_in, last_ctr_out),
+                         (usage['bw_in'], usage['bw_out'],
+                          usage['last_ctr_in'], usage['last_ctr_out']))
+
+    def test_poll_bandwidth_usage(self):
+        ctxt = context.get_admin_context()
+        prev_time = datetime.datetime(2014, 1, 1)
+        start_time = datetime.datetime(2014, 2, 1)
+        db.bw_usage_update(ctxt, 'uuid1', 'mac1', prev_time,
+                           10, 20, 100, 200)
+        db.bw_usage_update(ctxt, 'uuid2', 'mac2', start_time,
+                           30, 40, 300, 400)
+        bw_counters = [
+            {'uuid': 'uuid1', 'mac_address': 'mac1',
+             'bw_in': 150, 'bw_out': 250},
+            # bw_out rolled over
+            {'uuid': 'uuid2', 'mac_address': 'mac2',
+             'bw_in': 350, 'bw_out': 50},
+            {'uuid': 'uuid3', 'mac_address': 'mac3',
+             'bw_in': 5, 'bw_out': 6}]
+        get_by_uuids = self.compute.conductor_api.bw_usage_get_by_uuids
+        update_many = self.compute.conductor_api.bw_usage_update_many
+        self.flags(bandwidth_poll_interval=1)
+
+        with contextlib.nested(
+            mock.patch.object(utils, 'last_completed_audit_period',
+                              return_value=(prev_time, start_time)),
+            mock.patch.object(objects.InstanceList, 'get_by_host',
+                              return_value=[]),
+            mock.patch.object(self.compute.driver, 'get_all_bw_counters',
+                              return_value=bw_counters),
+            mock.patch.object(self.compute.conductor_api,
+                              'bw_usage_get_by_uuids',
+                              side_effect=get_by_uuids),
+            mock.patch.object(self.compute.conductor_api,
+                              'bw_usage_update_many',
+                              side_effect=update_many),
+        ) as (mock_period, mock_get_by_host, mock_counters, mock_get,
+              mock_update):
+            self.compute._poll_bandwidth_usage(ctxt)
+            # The current period, then the previous one for the networks
+            # which have no usage recorded in the current one yet
+            self.assertEqual([(['uuid1', 'uuid2', 'uuid3'], start_time),
+                              (['uuid1', 'uuid3'], prev_time)],
+                             [(sorted(args[1]), args[2]) for args, kwargs
+                              in mock_get.call_args_list])
+            self.assertEqual(1, mock_update.call_count)
+            self._assert_bw_usage(ctxt, start_time, 'uuid1', 'mac1',
+                                  50, 50, 150, 250)
+            self._assert_bw_usage(ctxt, start_time, 'uuid2', 'mac2',
+                                  80, 90, 350, 50)
+            self._assert_bw_usage(ctxt, start_time, 'uuid3', 'mac3',
+                                  0, 0, 5, 6)
+
+            bw_counters[0].update(bw_in=170, bw_out=260)
+            self.compute._last_bw_usage_poll = 0
+            self.compute._poll_bandwidth_usage(ctxt)
+            # The last usages were cached
+            self.assertEqual(2, mock_get.call_count)
+            self.assertEqual(2, mock_update.call_count)
+            self._assert_bw_usage(ctxt, start_time, 'uuid1', 'mac1',
+                                  70, 60, 170, 260)
+
+    def test_poll_bandwidth_usage_version_cap(self):
+        ctxt = context.get_admin_context()
+        prev_time = datetime.datetime(2014, 1, 1)
+        start_time = datetime.datetime(2014, 2, 1)
+        db.bw_usage_update(ctxt, 'uuid1', 'mac1', start_time,
+                           10, 20, 100, 200)
+        bw_counters = [{'uuid': 'uuid1', 'mac_address': 'mac1',
+                        'bw_in': 150, 'bw_out': 250}]
+        self.flags(bandwidth_poll_interval=1)
+
+        with contextlib.nested(
+            mock.patch.object(utils, 'last_completed_audit_period',
+                              return_value=(prev_time, start_time)),
+            mock.patch.object(objects.InstanceList, 'get_by_host',
+                              return_value=[]),
+            mock.patch.object(self.compute.driver, 'get_all_bw_counters',
+                              return_value=bw_counters),
+            mock.patch.object(self.compute.conductor_api,
+                              'bw_usage_get_by_uuids',
+                              side_effect=messaging.RPCVersionCapError(
+                                  version='2.2', version_cap='2.0')),
+        ):
+            self.compute._poll_bandwidth_usage(ctxt)
+        self._assert_bw_usage(ctxt, start_time, 'uuid1', 'mac1',
+                              60, 70, 150, 250)
+
     @mock.patch.object(objects.InstanceList, 'get_by_host')
     @mock.patch.object(objects.BlockDeviceMappingList,
                        'get_by_instance_uuid')
@@ -5948,6 +6040,42 @@ class ComputeTestCase(BaseTestCase):
         # Stays the same because we didn't find anything to process
         self.assertEqual(3, call_info['get_nw_info'])
 
+    def test_heal_instance_info_cache_batch(self):
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2)
+        ctxt = context.get_admin_context()
+        instances = [objects.Instance(uuid='fake-uuid-%s' % x,
+                                      vm_state=vm_states.ACTIVE,
+                                      task_state=None)
+                     for x in xrange(6)]
+        # Make an instance appear to be still Building
+        instances[0].vm_state = vm_states.BUILDING
+        # Make an instance appear to be Deleting
+        instances[1].task_state = task_states.DELETING
+
+        def fake_get_instances_nw_info(context, batch):
+            if batch[0] is instances[4]:
+                raise test.TestingException()
+            return dict((inst.uuid, None) for inst in batch)
+
+        with contextlib.nested(
+            mock.patch.object(objects.InstanceList, 'get_by_host',
+                              return_value=instances),
+            mock.patch.object(self.compute.network_api,
+                              'get_instances_nw_info',
+                              side_effect=fake_get_instances_nw_info),
+            mock.patch.object(self.compute, '_get_instance_nw_info')
+        ) as (get_by_host, get_instances_nw_info, get_instance_nw_info):
+            self.compute._heal_instance_info_cache(ctxt)
+            get_by_host.assert_called_once_with(
+                ctxt, self.compute.host,
+                expected_attrs=['system_metadata', 'info_cache'],
+                use_slave=True)
+            self.assertEqual([mock.call(ctxt, instances[2:4]),
+                              mock.call(ctxt, instances[4:6])],
+                             get_instances_nw_info.call_args_list)
+            self.assertFalse(get_instance_nw_info.called)
+
     @mock.patch('nova.objects.instance.InstanceList.get_by_filters')
     @mock.patch('nova.compute.api.API.unrescue')
     def test_poll_rescued_instances(self, unrescue, get):
@@ -7497,13 +7625,14 @@ class ComputeAPITestCase(BaseTestCase):
         db.instance_destroy(c, instance3['uuid'])
 
     @mock.patch('nova.db.network_get')
-    @mock.patch('nova.db.fixed_ips_by_virtual_interface')
-    def test_get_all_by_multiple_options_at_once(self, fixed_get, network_get):
+    @mock.patch('nova.db.fixed_ip_search_by_address')
+    def test_get_all_by_multiple_options_at_once(self, fixed_search,
+                                                 network_get):
         # Test searching by multiple options at once.
         c = context.get_admin_context()
         network_manager = fake_network.FakeNetworkManager(self.stubs)
-        fixed_get.side_effect = (
-            network_manager.db.fixed_ips_by_virtual_interface)
+        fixed_search.side_effect = (
+            network_manager.db.fixed_ip_search_by_address)
         network_get.return_value = (
             dict(test_network.fake_network,
                  **network_manager.db.network_get(None, 1)))
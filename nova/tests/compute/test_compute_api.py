@@ -2031,6 +2031,82 @@ class _ComputeAPIUnitTestMixIn(object):
                             fake_index)
             destroy.assert_called_once_with(self.context)
 
+    def _fake_populate_instance_for_create(self, instance, image, index,
+                                           security_groups, instance_type):
+        instance.uuid = 'fake-uuid-%d' % index
+        instance.launch_index = index
+
+    @mock.patch.object(quota.QUOTAS, 'commit')
+    @mock.patch.object(compute_api.API, '_check_num_instances_quota',
+                       return_value=(3, 'fake-reservations'))
+    @mock.patch('nova.notifications.send_update_with_states')
+    @mock.patch.object(compute_api.API, '_update_block_device_mapping')
+    @mock.patch.object(compute_api.API, '_validate_bdm')
+    @mock.patch.object(compute_api.SecurityGroupAPI, 'ensure_default')
+    def test_provision_instances_bulk(self, mock_ensure, mock_validate,
+                                      mock_update_bdm, mock_notify,
+                                      mock_quota, mock_commit):
+        self.flags(multi_instance_display_name_template='%(name)s-%(count)s')
+        instance_type = self._create_flavor()
+
+        def fake_bulk_create(context, instances):
+            self.assertEqual(['foo-1', 'foo-2', 'foo-3'],
+                             [inst.display_name for inst in instances])
+            self.assertEqual(['foo-1', 'foo-2', 'foo-3'],
+                             [inst.hostname for inst in instances])
+            return instances
+
+        with contextlib.nested(
+            mock.patch.object(self.compute_api,
+                              '_populate_instance_for_create',
+                              side_effect=
+                                  self._fake_populate_instance_for_create),
+            mock.patch.object(objects.InstanceList, 'bulk_create',
+                              side_effect=fake_bulk_create),
+            mock.patch.object(objects.Instance, 'create'),
+        ) as (mock_populate, mock_bulk_create, mock_create):
+            instances = self.compute_api._provision_instances(
+                self.context, instance_type, 1, 3,
+                {'display_name': 'foo'}, {}, ['default'], [])
+
+        self.assertEqual(3, len(instances))
+        mock_bulk_create.assert_called_once_with(self.context, instances)
+        self.assertFalse(mock_create.called)
+        mock_ensure.assert_called_once_with(self.context)
+        self.assertEqual(3, mock_validate.call_count)
+        self.assertEqual(3, mock_update_bdm.call_count)
+        self.assertEqual(3, mock_notify.call_count)
+        mock_commit.assert_called_once_with(self.context, 'fake-reservations')
+
+    @mock.patch.object(quota.QUOTAS, 'rollback')
+    @mock.patch.object(compute_api.API, '_check_num_instances_quota',
+                       return_value=(2, 'fake-reservations'))
+    @mock.patch.object(compute_api.API, '_update_block_device_mapping')
+    @mock.patch.object(compute_api.API, '_validate_bdm',
+                       side_effect=[None, exception.InvalidBDM()])
+    @mock.patch.object(compute_api.SecurityGroupAPI, 'ensure_default')
+    def test_provision_instances_bulk_cleanup(self, mock_ensure,
+                                              mock_validate, mock_update_bdm,
+                                              mock_quota, mock_rollback):
+        instance_type = self._create_flavor()
+        with contextlib.nested(
+            mock.patch.object(self.compute_api,
+                              '_populate_instance_for_create',
+                              side_effect=
+                                  self._fake_populate_instance_for_create),
+            mock.patch.object(objects.InstanceList, 'bulk_create',
+                              side_effect=lambda ctxt, insts: insts),
+            mock.patch.object(objects.Instance, 'destroy'),
+        ) as (mock_populate, mock_bulk_create, mock_destroy):
+            self.assertRaises(exception.InvalidBDM,
+                              self.compute_api._provision_instances,
+                              self.context, instance_type, 1, 2,
+                              {'display_name': 'foo'}, {}, ['default'], [])
+
+        self.assertEqual(2, mock_destroy.call_count)
+        mock_rollback.assert_called_once_with(self.context,
+                                              'fake-reservations')
+
     def _test_rescue(self, vm_state):
         instance = self._create_instance_obj(params={'vm_state': vm_state})
         bdms = []
@@ -41,6 +41,7 @@ from nova.tests import fake_block_device
 from nova.tests import fake_instance
 from nova.tests.objects import test_instance_fault
 from nova.tests.objects import test_instance_info_cache
+from nova.virt import event as virtevent
 
 
 CONF = cfg.CONF
@@ -802,6 +803,117 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                 self._test_sync_to_stop(power_state.RUNNING, vs, ps,
                                         stop=False)
 
+    def test_sync_power_states_from_driver_power_states(self):
+        instances = [self._get_sync_instance(power_state.RUNNING,
+                                             vm_states.ACTIVE)
+                     for i in xrange(2)]
+        instances[1].uuid = 'fake-uuid2'
+        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_host')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        objects.InstanceList.get_by_host(self.context, self.compute.host,
+                                         use_slave=True).AndReturn(instances)
+        self.compute.driver.get_num_instances().AndReturn(1)
+        self.compute.driver.get_power_states().AndReturn(
+                {'fake-uuid': power_state.SHUTDOWN})
+        self.compute._sync_instance_power_state(self.context, instances[0],
+                power_state.SHUTDOWN, use_slave=True)
+        # Instances missing from the power states are looked up
+        self.compute.driver.get_info(instances[1]).AndRaise(
+                exception.InstanceNotFound(instance_id='fake-uuid2'))
+        self.compute._sync_instance_power_state(self.context, instances[1],
+                power_state.NOSTATE, use_slave=True)
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+
+    def test_sync_power_states_missing_from_driver_power_states(self):
+        self.flags(sync_power_state_incremental=True)
+        instances = [self._get_sync_instance(power_state.RUNNING,
+                                             vm_states.ACTIVE)
+                     for i in xrange(2)]
+        instances[1].uuid = 'fake-uuid2'
+        self.mox.StubOutWithMock(self.compute.driver, 'get_info')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        # The first instance was created after the power states were
+        # gathered, the driver failed to get the state of the second one.
+        self.compute.driver.get_info(instances[0]).AndReturn(
+                {'state': power_state.RUNNING})
+        self.compute._sync_instance_power_state(self.context, instances[0],
+                power_state.RUNNING, use_slave=True)
+        self.compute.driver.get_info(instances[1]).AndRaise(
+                exception.NovaException())
+        self.mox.ReplayAll()
+        self.compute._sync_instance_power_states(self.context, instances, {})
+        # The second instance is not synced to NOSTATE but retried
+        self.assertEqual(set(['fake-uuid2']), self.compute._power_state_dirty)
+
+    def test_sync_power_states_incremental(self):
+        self.flags(sync_power_state_incremental=True,
+                   sync_power_state_audit_interval=3600)
+        instance = self._get_sync_instance(power_state.RUNNING,
+                                           vm_states.ACTIVE)
+        self.compute._last_power_state_audit = time.time()
+        self.compute._power_state_dirty.add('fake-uuid')
+        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_host')
+        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_filters')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
+        self.mox.StubOutWithMock(self.compute, '_sync_instance_power_state')
+        objects.InstanceList.get_by_filters(self.context,
+                {'uuid': ['fake-uuid'], 'host': self.compute.host},
+                use_slave=True).AndReturn([instance])
+        self.compute.driver.get_power_states().AndReturn(
+                {'fake-uuid': power_state.SHUTDOWN})
+        self.compute._sync_instance_power_state(self.context, instance,
+                power_state.SHUTDOWN, use_slave=True)
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+        self.assertEqual(set(), self.compute._power_state_dirty)
+        # Nothing is synced until an instance is marked dirty again
+        self.compute._sync_power_states(self.context)
+
+    def test_sync_power_states_incremental_audit(self):
+        self.flags(sync_power_state_incremental=True,
+                   sync_power_state_audit_interval=3600)
+        self.compute._last_power_state_audit = time.time() - 3600
+        self.compute._power_state_dirty.add('fake-uuid')
+        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_host')
+        self.mox.StubOutWithMock(objects.InstanceList, 'get_by_filters')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_num_instances')
+        self.mox.StubOutWithMock(self.compute.driver, 'get_power_states')
+        objects.InstanceList.get_by_host(self.context, self.compute.host,
+                                         use_slave=True).AndReturn([])
+        self.compute.driver.get_num_instances().AndReturn(0)
+        self.compute.driver.get_power_states().AndReturn({})
+        self.mox.ReplayAll()
+        self.compute._sync_power_states(self.context)
+        self.assertEqual(set(), self.compute._power_state_dirty)
+        self.assertTrue(self.compute._last_power_state_audit >
+                        time.time() - 3600)
+
+    def test_sync_power_states_incremental_pending_task(self):
+        self.flags(sync_power_state_incremental=True)
+        instance = self._get_sync_instance(power_state.RUNNING,
+                                           vm_states.ACTIVE,
+                                           task_state=task_states.REBOOTING)
+        self.compute._sync_instance_power_states(self.context, [instance],
+                                                 {})
+        self.assertEqual(set(['fake-uuid']), self.compute._power_state_dirty)
+
+    def test_lifecycle_event_marks_power_state_dirty(self):
+        self.flags(sync_power_state_incremental=True)
+        event = virtevent.LifecycleEvent('fake-uuid',
+                                         virtevent.EVENT_LIFECYCLE_STOPPED)
+        with contextlib.nested(
+            mock.patch.object(objects.Instance, 'get_by_uuid'),
+            mock.patch.object(self.compute, '_sync_instance_power_state')
+        ) as (get_by_uuid, sync):
+            self.compute.handle_lifecycle_event(event)
+        self.assertEqual(set(['fake-uuid']), self.compute._power_state_dirty)
+        sync.assert_called_once_with(mock.ANY, get_by_uuid.return_value,
+                                     power_state.SHUTDOWN)
+
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
 
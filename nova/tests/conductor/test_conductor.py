@@ -163,6 +163,25 @@ class _BaseTestCase(object):
         result = self.conductor.bw_usage_update(*update_args)
         self.assertEqual(result, 'foo')
 
+    def test_bw_usage_get_by_uuids(self):
+        self.mox.StubOutWithMock(db, 'bw_usage_get_by_uuids')
+        db.bw_usage_get_by_uuids(self.context, ['uuid1', 'uuid2'],
+                                 0).AndReturn(['foo', 'bar'])
+        self.mox.ReplayAll()
+        result = self.conductor.bw_usage_get_by_uuids(self.context,
+                                                      ['uuid1', 'uuid2'], 0)
+        self.assertEqual(['foo', 'bar'], result)
+
+    def test_bw_usage_update_many(self):
+        usages = [{'uuid': 'uuid', 'mac': 'mac', 'bw_in': 10, 'bw_out': 20,
+                   'last_ctr_in': 5, 'last_ctr_out': 10}]
+        self.mox.StubOutWithMock(db, 'bw_usage_update_many')
+        db.bw_usage_update_many(self.context, 0, usages, last_refreshed=20,
+                                update_cells=False)
+        self.mox.ReplayAll()
+        self.conductor.bw_usage_update_many(self.context, 0, usages, 20,
+                                            update_cells=False)
+
     def test_provider_fw_rule_get_all(self):
         fake_rules = ['a', 'b', 'c']
         self.mox.StubOutWithMock(db, 'provider_fw_rule_get_all')
@@ -793,6 +812,39 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
             self.conductor.service_update,
             [error], {'id': 1}, None)
 
+    def test_service_heartbeat(self):
+        self.useFixture(test.TimeOverride())
+        self.conductor.service_heartbeat(self.context, 1)
+        timeutils.advance_time_seconds(5)
+        last_seen = timeutils.utcnow()
+        self.conductor.service_heartbeat(self.context, 1)
+        self.conductor.service_heartbeat(self.context, 2)
+        self.mox.StubOutWithMock(db, 'service_heartbeat_bulk_update')
+        db.service_heartbeat_bulk_update(self.context,
+                                         {1: (2, last_seen),
+                                          2: (1, last_seen)})
+        self.mox.ReplayAll()
+        self.conductor._flush_heartbeats(self.context)
+        # Nothing left to write
+        self.conductor._flush_heartbeats(self.context)
+
+    def test_service_heartbeat_flush_fails(self):
+        self.useFixture(test.TimeOverride())
+        first_seen = timeutils.utcnow()
+        self.conductor.service_heartbeat(self.context, 1)
+        self.conductor.service_heartbeat(self.context, 2)
+        self.mox.StubOutWithMock(db, 'service_heartbeat_bulk_update')
+        db.service_heartbeat_bulk_update(self.context, mox.IgnoreArg()).\
+                AndRaise(test.TestingException())
+        self.mox.ReplayAll()
+        self.conductor._flush_heartbeats(self.context)
+        timeutils.advance_time_seconds(5)
+        self.conductor.service_heartbeat(self.context, 1)
+        # The heartbeats are kept for the next flush
+        self.assertEqual({1: (2, timeutils.utcnow()),
+                          2: (1, first_seen)},
+                         self.conductor._heartbeats)
+
     def test_service_destroy_expected_exceptions(self):
         error = exc.ServiceNotFound(service_id=1)
         self._test_expected_exceptions(
@@ -1020,6 +1072,50 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor.security_groups_trigger_handler(self.context,
                                                        'event', ['arg'])
 
+    def test_service_heartbeat(self):
+        self.useFixture(cast_as_call.CastAsCall(self.stubs))
+        self.context = self.context.elevated()
+        service = db.service_create(self.context,
+                                    {'host': 'fake-host',
+                                     'binary': 'nova-fake',
+                                     'topic': 'fake', 'report_count': 3})
+        self.conductor.service_heartbeat(self.context, service)
+        self.assertEqual(3, db.service_get(self.context,
+                                           service['id'])['report_count'])
+        self.conductor_manager._flush_heartbeats(self.context)
+        self.assertEqual(4, db.service_get(self.context,
+                                           service['id'])['report_count'])
+
+    def test_bw_usage_update_many_version_cap(self):
+        self.flags(conductor='icehouse', group='upgrade_levels')
+        self.conductor = conductor_rpcapi.ConductorAPI()
+        usages = [{'uuid': 'uuid%d' % i, 'mac': 'mac', 'bw_in': 10,
+                   'bw_out': 20, 'last_ctr_in': 5, 'last_ctr_out': 10}
+                  for i in range(2)]
+        self.mox.StubOutWithMock(db, 'bw_usage_update')
+        self.mox.StubOutWithMock(db, 'bw_usage_get')
+        for usage in usages:
+            db.bw_usage_update(self.context, usage['uuid'], 'mac', 0,
+                               10, 20, 5, 10, 20, update_cells=True)
+            db.bw_usage_get(self.context, usage['uuid'], 0, 'mac')
+        self.mox.ReplayAll()
+        self.conductor.bw_usage_update_many(self.context, 0, usages, 20)
+
+    def test_service_heartbeat_version_cap(self):
+        self.context = self.context.elevated()
+        self.flags(conductor='icehouse', group='upgrade_levels')
+        self.conductor = conductor_rpcapi.ConductorAPI()
+        service = db.service_create(self.context,
+                                    {'host': 'fake-host',
+                                     'binary': 'nova-fake',
+                                     'topic': 'fake', 'report_count': 3})
+        service = self.conductor.service_heartbeat(self.context, service)
+        self.assertEqual(4, service['report_count'])
+        # The next heartbeat counts from the returned service
+        self.conductor.service_heartbeat(self.context, service)
+        self.assertEqual(5, db.service_get(self.context,
+                                           service['id'])['report_count'])
+
 
 class ConductorAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor API Tests."""
@@ -1195,6 +1291,16 @@ class ConductorLocalAPITestCase(ConductorAPITestCase):
         # Override test in ConductorAPITestCase
         pass
 
+    def test_service_heartbeat(self):
+        ctxt = context.get_admin_context()
+        service = db.service_create(ctxt,
+                                    {'host': 'fake-host',
+                                     'binary': 'nova-fake',
+                                     'topic': 'fake', 'report_count': 3})
+        self.conductor.service_heartbeat(ctxt, service)
+        self.assertEqual(4, db.service_get(ctxt,
+                                           service['id'])['report_count'])
+
 
 class ConductorImportTest(test.TestCase):
     def test_import_conductor_local(self):
@@ -2092,6 +2198,8 @@ class ConductorV2ManagerProxyTestCase(test.NoDBTestCase):
             ('aggregate_host_delete', 2),
             ('aggregate_metadata_get_by_host', 2),
             ('bw_usage_update', 9),
+            ('bw_usage_get_by_uuids', 2),
+            ('bw_usage_update_many', 4),
             ('provider_fw_rule_get_all', 0),
             ('agent_build_get_by_triple', 3),
             ('block_device_mapping_update_or_create', 2),
@@ -2113,6 +2221,7 @@ class ConductorV2ManagerProxyTestCase(test.NoDBTestCase):
             ('compute_node_update', 2),
             ('compute_node_delete', 1),
             ('service_update', 2),
+            ('service_heartbeat', 1),
             ('task_log_get', 5),
             ('task_log_begin_task', 6),
             ('task_log_end_task', 6),
@@ -955,6 +955,22 @@ class InstanceSystemMetadataTestCase(test.TestCase):
                                                    self.instance['uuid'])
         self.assertEqual(metadata, {'new_key': 'new_value'})
 
+    def test_instance_system_metadata_get_instance_uuids(self):
+        uuids = sorted(db.instance_create(
+                           self.ctxt, {'system_metadata': {'key': 'value'}})
+                       ['uuid'] for i in range(3))
+        uuids = sorted(uuids + [self.instance['uuid']])
+        self.assertEqual(uuids, db.instance_system_metadata_get_instance_uuids(
+            self.ctxt, ['key']))
+        self.assertEqual(uuids[:2],
+                         db.instance_system_metadata_get_instance_uuids(
+                             self.ctxt, ['key'], limit=2))
+        self.assertEqual(uuids[2:],
+                         db.instance_system_metadata_get_instance_uuids(
+                             self.ctxt, ['key'], marker=uuids[1]))
+        self.assertEqual([], db.instance_system_metadata_get_instance_uuids(
+            self.ctxt, ['other_key']))
+
     @test.testtools.skip("bug 1189462")
     def test_instance_system_metadata_update_nonexistent(self):
         self.assertRaises(exception.InstanceNotFound,
@@ -1031,6 +1047,149 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                             self.ctxt, 'project1', 'user1'))
 
 
+class QuotaReserveCasTestCase(test.TestCase):
+
+    """Tests for db.api.quota_reserve_cas() and reservation_*_cas()."""
+
+    def setUp(self):
+        super(QuotaReserveCasTestCase, self).setUp()
+        self.ctxt = context.get_admin_context()
+        self.in_use = {'resource0': 0, 'resource1': 0}
+
+        def get_sync(resource):
+            def sync(elevated, project_id, user_id, session):
+                return {resource: self.in_use[resource]}
+            return sync
+        self.stubs.Set(sqlalchemy_api, 'QUOTA_SYNC_FUNCTIONS',
+                       dict(('_sync_%s' % res, get_sync(res))
+                            for res in self.in_use))
+        self.resources = dict(
+                (res, quota.ReservableResource(res, '_sync_%s' % res))
+                for res in self.in_use)
+
+    def _reserve(self, deltas, user_id='user1', project_quota=10,
+                 user_quota=5, expire=None):
+        quotas = dict((res, project_quota) for res in deltas)
+        user_quotas = dict((res, user_quota) for res in deltas)
+        if expire is None:
+            expire = timeutils.utcnow() + datetime.timedelta(days=1)
+        return db.quota_reserve_cas(self.ctxt, self.resources, quotas,
+                                    user_quotas, deltas, expire, 0, 0,
+                                    'project1', user_id)
+
+    def _usages(self, user_id='user1'):
+        usages = db.quota_usage_get_all_by_project_and_user(
+                self.ctxt, 'project1', user_id)
+        return dict((res, (usage['in_use'], usage['reserved']))
+                    for res, usage in usages.items() if res in self.in_use)
+
+    def test_reserve_commit(self):
+        reservations = self._reserve({'resource0': 2, 'resource1': 3})
+        self.assertEqual(2, len(reservations))
+        self.assertEqual({'resource0': (0, 2), 'resource1': (0, 3)},
+                         self._usages())
+        db.reservation_commit_cas(self.ctxt, reservations, 'project1',
+                                  'user1')
+        self.assertEqual({'resource0': (2, 0), 'resource1': (3, 0)},
+                         self._usages())
+        self.assertRaises(exception.ReservationNotFound,
+                          _reservation_get, self.ctxt, reservations[0])
+
+    def test_reserve_rollback(self):
+        reservations = self._reserve({'resource0': 2, 'resource1': 3})
+        db.reservation_rollback_cas(self.ctxt, reservations, 'project1',
+                                    'user1')
+        self.assertEqual({'resource0': (0, 0), 'resource1': (0, 0)},
+                         self._usages())
+
+    def test_commit_twice(self):
+        reservations = self._reserve({'resource0': 2})
+        db.reservation_commit_cas(self.ctxt, reservations)
+        db.reservation_commit_cas(self.ctxt, reservations)
+        db.reservation_rollback_cas(self.ctxt, reservations)
+        self.assertEqual({'resource0': (2, 0)}, self._usages())
+
+    def test_negative_delta(self):
+        self.in_use['resource0'] = 3
+        reservations = self._reserve({'resource0': -2})
+        self.assertEqual({'resource0': (3, 0)}, self._usages())
+        db.reservation_commit_cas(self.ctxt, reservations)
+        self.assertEqual({'resource0': (1, 0)}, self._usages())
+
+    def test_reserve_over_user_quota(self):
+        self._reserve({'resource1': 4})
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                {'resource0': 1, 'resource1': 2})
+        self.assertEqual(['resource1'], exc.kwargs['overs'])
+        self.assertEqual({'resource0': 5, 'resource1': 1},
+                         exc.kwargs['headroom'])
+        # The increment which fit is given back
+        self.assertEqual({'resource0': (0, 0), 'resource1': (0, 4)},
+                         self._usages())
+
+    def test_reserve_over_project_quota(self):
+        self._reserve({'resource0': 5}, user_id='user1')
+        self._reserve({'resource0': 4}, user_id='user2')
+        self.assertRaises(exception.OverQuota, self._reserve,
+                          {'resource0': 2}, user_id='user3')
+        self._reserve({'resource0': 1}, user_id='user3')
+        self.assertEqual({'resource0': (0, 1)}, self._usages('user3'))
+
+    def test_reserve_interleaved_users(self):
+        # user1 and user2 both reserve the last unit of the project quota
+        reserve_cas = sqlalchemy_api._quota_usage_reserve_cas
+        interleaved = []
+
+        def fake_reserve_cas(context, usage, delta, project_quota,
+                             user_quota):
+            if not interleaved:
+                # user2 reserves once user1 read its usages, before user1
+                # moves them
+                interleaved.append(usage.user_id)
+                self._reserve({'resource0': 1}, user_id='user2',
+                              project_quota=1)
+            return reserve_cas(context, usage, delta, project_quota,
+                               user_quota)
+
+        with_lockmode = query.Query.with_lockmode
+        lockmodes = []
+
+        def fake_with_lockmode(query_self, mode):
+            lockmodes.append(mode)
+            return with_lockmode(query_self, mode)
+
+        self.stubs.Set(sqlalchemy_api, '_quota_usage_reserve_cas',
+                       fake_reserve_cas)
+        self.stubs.Set(query.Query, 'with_lockmode', fake_with_lockmode)
+        self.assertRaises(exception.OverQuota, self._reserve,
+                          {'resource0': 1}, user_id='user1', project_quota=1)
+        # The project's usages are locked while the quota is checked
+        self.assertEqual(['update', 'update'], lockmodes)
+        self.assertEqual(['user1'], interleaved)
+        self.assertEqual({'resource0': (0, 0)}, self._usages('user1'))
+        self.assertEqual({'resource0': (0, 1)}, self._usages('user2'))
+
+    def test_reserve_unlimited(self):
+        self._reserve({'resource0': 50}, project_quota=-1, user_quota=-1)
+        self.assertEqual({'resource0': (0, 50)}, self._usages())
+
+    def test_reserve_refreshes_negative_usage(self):
+        reservations = self._reserve({'resource0': -1})
+        db.reservation_commit_cas(self.ctxt, reservations)
+        self.assertEqual({'resource0': (-1, 0)}, self._usages())
+        self.in_use['resource0'] = 4
+        self._reserve({'resource0': 1})
+        self.assertEqual({'resource0': (4, 1)}, self._usages())
+
+    def test_reservation_expire(self):
+        self._reserve({'resource0': 2}, expire=timeutils.utcnow() -
+                      datetime.timedelta(seconds=1))
+        self._reserve({'resource1': 3})
+        db.reservation_expire_cas(self.ctxt)
+        self.assertEqual({'resource0': (0, 0), 'resource1': (0, 3)},
+                         self._usages())
+
+
 class SecurityGroupRuleTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
         super(SecurityGroupRuleTestCase, self).setUp()
@@ -1528,6 +1687,64 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.create_instance_with_args(context=context2, hostname='h2')
         self.flags(osapi_compute_unique_server_name_scope=None)
 
+    def test_instance_bulk_create(self):
+        ctxt = context.RequestContext('user1', 'project1')
+        db.security_group_create(ctxt, {'name': 'group1',
+                                        'user_id': 'user1',
+                                        'project_id': 'project1'})
+        values_list = []
+        for i in range(3):
+            values = self.sample_data.copy()
+            values['hostname'] = 'host%d' % i
+            values['security_groups'] = ['default', 'group1']
+            values_list.append(values)
+        values_list[1]['uuid'] = 'fake-uuid'
+
+        instances = db.instance_bulk_create(ctxt, values_list)
+
+        self.assertEqual(['host0', 'host1', 'host2'],
+                         [inst['hostname'] for inst in instances])
+        self.assertEqual('fake-uuid', instances[1]['uuid'])
+        for inst in instances:
+            expected = db.instance_get_by_uuid(ctxt, inst['uuid'])
+            self._assertEqualObjects(expected, inst,
+                    ignored_keys=['metadata', 'system_metadata',
+                                  'info_cache', 'security_groups'])
+            self.assertEqual(self.sample_data['metadata'],
+                             utils.metadata_to_dict(inst['metadata']))
+            self.assertEqual(self.sample_data['system_metadata'],
+                             utils.metadata_to_dict(inst['system_metadata']))
+            self.assertEqual(0, inst['deleted'])
+            self.assertIsNotNone(inst['created_at'])
+            self.assertIsNone(inst['info_cache']['network_info'])
+            self.assertEqual(['default', 'group1'],
+                             sorted(sg['name']
+                                    for sg in inst['security_groups']))
+            self.assertEqual(inst['uuid'],
+                db.get_instance_uuid_by_ec2_id(
+                    ctxt, db.ec2_instance_get_by_uuid(ctxt,
+                                                      inst['uuid'])['id']))
+
+    def test_instance_bulk_create_security_group_not_found(self):
+        values = self.sample_data.copy()
+        values['security_groups'] = ['missing']
+        self.assertRaises(exception.SecurityGroupNotFoundForProject,
+                          db.instance_bulk_create, self.ctxt, [values])
+        self.assertEqual([], db.instance_get_all(self.ctxt))
+
+    def test_instance_bulk_create_unique_hostname(self):
+        self.create_instance_with_args(hostname='h1')
+        values = self.sample_data.copy()
+        self.flags(osapi_compute_unique_server_name_scope='global')
+        self.assertRaises(exception.InstanceExists,
+                          db.instance_bulk_create, self.ctxt,
+                          [dict(values, hostname='h1')])
+        self.assertRaises(exception.InstanceExists,
+                          db.instance_bulk_create, self.ctxt,
+                          [dict(values, hostname='h2'),
+                           dict(values, hostname='H2')])
+        self.assertEqual(1, len(db.instance_get_all(self.ctxt)))
+
     def test_instance_get_all_by_filters_with_meta(self):
         inst = self.create_instance_with_args()
         for inst in db.instance_get_all_by_filters(self.ctxt, {}):
@@ -1604,6 +1821,45 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                  changes_since})
         self._assertEqualListsOfInstances([i2], result)
 
+    def test_instance_get_all_by_updated_at(self):
+        i1 = self.create_instance_with_args(
+            created_at=datetime.datetime(2013, 12, 5, 15, 3, 20),
+            updated_at=datetime.datetime(2013, 12, 5, 15, 3, 27))
+        i2 = self.create_instance_with_args(
+            created_at=datetime.datetime(2013, 12, 5, 15, 3, 21),
+            updated_at=None)
+        i3 = self.create_instance_with_args(
+            created_at=datetime.datetime(2013, 12, 5, 15, 3, 22),
+            updated_at=datetime.datetime(2013, 12, 5, 15, 3, 25))
+        i4 = self.create_instance_with_args(
+            created_at=datetime.datetime(2013, 12, 5, 15, 3, 23),
+            updated_at=datetime.datetime(2013, 12, 5, 15, 3, 25),
+            vm_state=vm_states.SOFT_DELETED)
+
+        def _get_uuids(**kwargs):
+            result = db.instance_get_all_by_updated_at(self.ctxt, **kwargs)
+            return [inst['uuid'] for inst in result]
+
+        self.assertEqual([i1['uuid'], i2['uuid'], i3['uuid'], i4['uuid']],
+                         _get_uuids())
+        self.assertEqual([i1['uuid'], i2['uuid']], _get_uuids(limit=2))
+        self.assertEqual([i3['uuid'], i4['uuid']],
+                         _get_uuids(cursor=i2['id']))
+        self.assertEqual([i4['uuid']], _get_uuids(cursor=i3['id']))
+        self.assertEqual(
+            [i1['uuid'], i3['uuid']],
+            _get_uuids(updated_since=datetime.datetime(2013, 12, 5, 15, 3,
+                                                       25),
+                       deleted=False))
+
+    def test_instance_get_all_by_updated_at_uuids_only(self):
+        instance = self.create_instance_with_args()
+        result = db.instance_get_all_by_updated_at(self.ctxt,
+                                                   columns_to_join=[])
+        self.assertEqual([instance['uuid']],
+                         [inst['uuid'] for inst in result])
+        self.assertNotIn('info_cache', result[0])
+
     def test_instance_get_all_by_filters_exact_match(self):
         instance = self.create_instance_with_args(host='host1')
         self.create_instance_with_args(host='host12')
@@ -1886,6 +2142,57 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual('building', old_ref['vm_state'])
         self.assertEqual('needscoffee', new_ref['vm_state'])
 
+    def test_instance_update_many(self):
+        i1 = self.create_instance_with_args(vm_state='building')
+        i2 = self.create_instance_with_args(task_state='spawning')
+        i3 = self.create_instance_with_args(hostname='fake_name')
+        failures = db.instance_update_many(self.ctxt, {
+            i1['uuid']: {'vm_state': 'active',
+                         'metadata': {'mk1': 'mv3'}},
+            i2['uuid']: {'task_state': None,
+                         'expected_task_state': 'deleting'},
+            i3['uuid']: {'host': 'fake_host'},
+            'fake_uuid': {'host': 'fake_host'}})
+
+        self.assertEqual(set([i2['uuid'], 'fake_uuid']), set(failures))
+        self.assertIsInstance(failures[i2['uuid']],
+                              exception.UnexpectedTaskStateError)
+        self.assertIsInstance(failures['fake_uuid'],
+                              exception.InstanceNotFound)
+        i1 = db.instance_get_by_uuid(self.ctxt, i1['uuid'])
+        self.assertEqual('active', i1['vm_state'])
+        self.assertEqual({'mk1': 'mv3'},
+                         utils.metadata_to_dict(i1['metadata']))
+        i2 = db.instance_get_by_uuid(self.ctxt, i2['uuid'])
+        self.assertEqual('spawning', i2['task_state'])
+        i3 = db.instance_get_by_uuid(self.ctxt, i3['uuid'])
+        self.assertEqual('fake_host', i3['host'])
+
+    def test_instance_update_many_db_error(self):
+        i1 = self.create_instance_with_args(hostname='fake_name1')
+        i2 = self.create_instance_with_args(hostname='fake_name2')
+        orig_validate_unique_server_name = (
+            sqlalchemy_api._validate_unique_server_name)
+
+        def fake_validate_unique_server_name(context, session, name):
+            if name == 'bad_name':
+                raise db_exc.DBError()
+            orig_validate_unique_server_name(context, session, name)
+
+        self.stubs.Set(sqlalchemy_api, '_validate_unique_server_name',
+                       fake_validate_unique_server_name)
+        failures = db.instance_update_many(self.ctxt, {
+            i1['uuid']: {'hostname': 'bad_name'},
+            i2['uuid']: {'hostname': 'good_name', 'host': 'fake_host'}})
+
+        self.assertEqual([i1['uuid']], failures.keys())
+        self.assertIsInstance(failures[i1['uuid']], db_exc.DBError)
+        i1 = db.instance_get_by_uuid(self.ctxt, i1['uuid'])
+        self.assertEqual('fake_name1', i1['hostname'])
+        i2 = db.instance_get_by_uuid(self.ctxt, i2['uuid'])
+        self.assertEqual('good_name', i2['hostname'])
+        self.assertEqual('fake_host', i2['host'])
+
     def test_instance_update_and_get_original_metadata(self):
         instance = self.create_instance_with_args()
         columns_to_join = ['metadata']
@@ -2128,6 +2435,29 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertRaises(exception.ServiceNotFound,
                           db.service_update, self.ctxt, 100500, {})
 
+    def test_service_heartbeat_bulk_update(self):
+        service1 = self._create_service({})
+        service2 = self._create_service({'host': 'fake_host2'})
+        service3 = self._create_service({'host': 'fake_host3'})
+        seen1 = datetime.datetime(2014, 1, 1, 10, 0, 0)
+        seen2 = datetime.datetime(2014, 1, 1, 10, 0, 5)
+        db.service_heartbeat_bulk_update(self.ctxt,
+                                         {service1['id']: (1, seen1),
+                                          service2['id']: (2, seen2),
+                                          100500: (1, seen2)})
+        real_service1 = db.service_get(self.ctxt, service1['id'])
+        self.assertEqual(4, real_service1['report_count'])
+        self.assertEqual(seen1, real_service1['updated_at'])
+        real_service2 = db.service_get(self.ctxt, service2['id'])
+        self.assertEqual(5, real_service2['report_count'])
+        self.assertEqual(seen2, real_service2['updated_at'])
+        real_service3 = db.service_get(self.ctxt, service3['id'])
+        self.assertEqual(3, real_service3['report_count'])
+        self.assertIsNone(real_service3['updated_at'])
+
+    def test_service_heartbeat_bulk_update_empty(self):
+        db.service_heartbeat_bulk_update(self.ctxt, {})
+
     def test_service_get(self):
         service1 = self._create_service({})
         self._create_service({'host': 'some_other_fake_host'})
@@ -2193,6 +2523,27 @@ class ServiceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         real = db.service_get_all_by_topic(self.ctxt, 't1')
         self._assertEqualListsOfObjects(expected, real)
 
+    def test_service_get_all_changed_since(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        service1 = self._create_service({'host': 'host1'})
+        service2 = self._create_service({'host': 'host2',
+                                         'binary': 'other_binary'})
+        timeutils.advance_time_seconds(60)
+        since = timeutils.utcnow()
+        self.assertEqual([],
+                db.service_get_all_changed_since(self.ctxt, since))
+
+        db.service_update(self.ctxt, service1['id'], {'report_count': 4})
+        db.service_update(self.ctxt, service2['id'], {'report_count': 4})
+        real = db.service_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(set([service1['id'], service2['id']]),
+                         set(service['id'] for service in real))
+        real = db.service_get_all_changed_since(self.ctxt, since,
+                                                binary='fake_binary')
+        self.assertEqual([service1['id']],
+                         [service['id'] for service in real])
+
     def test_service_get_all_by_host(self):
         values = [
             {'host': 'host1', 'topic': 't11', 'binary': 'b11'},
@@ -3294,6 +3645,19 @@ class FixedIPTestCase(BaseInstanceTypeTestCase):
                           db.fixed_ip_get_by_instance,
                           self.ctxt, instance_uuid)
 
+    def test_fixed_ip_get_by_instances(self):
+        instance_uuids = [self._create_instance() for i in range(3)]
+        for i, instance_uuid in enumerate(instance_uuids):
+            db.fixed_ip_create(self.ctxt, dict(
+                instance_uuid=instance_uuid, address='192.168.1.%d' % i))
+
+        ips_list = db.fixed_ip_get_by_instances(self.ctxt,
+                                                instance_uuids[:2])
+        self._assertEqualListsOfPrimitivesAsSets(
+            ['192.168.1.0', '192.168.1.1'],
+            [fixed_ip.address for fixed_ip in ips_list])
+        self.assertEqual([], db.fixed_ip_get_by_instances(self.ctxt, []))
+
     def test_fixed_ips_by_virtual_interface_fixed_ip_found(self):
         instance_uuid = self._create_instance()
 
@@ -3358,6 +3722,63 @@ class FixedIPTestCase(BaseInstanceTypeTestCase):
         ips_list = db.fixed_ips_by_virtual_interface(self.ctxt, vif.id)
         self.assertEqual(0, len(ips_list))
 
+    def _create_search_fixed_ips(self):
+        instance_uuid = self._create_instance()
+        vif = db.virtual_interface_create(
+            self.ctxt, dict(instance_uuid=instance_uuid))
+        fixed_ip = db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif.id, address='192.168.1.5'))
+        db.floating_ip_create(self.ctxt, dict(
+            fixed_ip_id=fixed_ip['id'], address='10.1.1.5'))
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=vif.id, address='192.168.2.5'))
+        # Without a virtual interface
+        db.fixed_ip_create(self.ctxt, dict(address='192.168.1.6'))
+        # Without an instance
+        other_vif = db.virtual_interface_create(self.ctxt, {})
+        db.fixed_ip_create(self.ctxt, dict(
+            virtual_interface_id=other_vif.id, address='192.168.1.7'))
+        return instance_uuid
+
+    def test_fixed_ip_search_by_address(self):
+        instance_uuid = self._create_search_fixed_ips()
+
+        result = db.fixed_ip_search_by_address(self.ctxt, '192.168.1')
+        self.assertEqual([{'instance_uuid': instance_uuid,
+                           'address': '192.168.1.5',
+                           'floating_address': '10.1.1.5'}], result)
+        result = db.fixed_ip_search_by_address(self.ctxt, '192_168_2')
+        self.assertEqual([{'instance_uuid': instance_uuid,
+                           'address': '192.168.2.5',
+                           'floating_address': None}], result)
+        result = db.fixed_ip_search_by_address(self.ctxt, '10.1.')
+        self.assertEqual([{'instance_uuid': instance_uuid,
+                           'address': '192.168.1.5',
+                           'floating_address': '10.1.1.5'}], result)
+        result = db.fixed_ip_search_by_address(self.ctxt, '172.')
+        self.assertEqual([], result)
+
+    def test_fixed_ip_search_by_address_exact(self):
+        instance_uuid = self._create_search_fixed_ips()
+
+        result = db.fixed_ip_search_by_address(self.ctxt, '10.1.1.5',
+                                               exact=True)
+        self.assertEqual([{'instance_uuid': instance_uuid,
+                           'address': '192.168.1.5',
+                           'floating_address': '10.1.1.5'}], result)
+        result = db.fixed_ip_search_by_address(self.ctxt, '192.168.2',
+                                               exact=True)
+        self.assertEqual([], result)
+
+    def test_fixed_ip_search_by_address_all(self):
+        instance_uuid = self._create_search_fixed_ips()
+
+        result = db.fixed_ip_search_by_address(self.ctxt, '')
+        self.assertEqual(['192.168.1.5', '192.168.2.5'],
+                         sorted(ip['address'] for ip in result))
+        self.assertEqual(set([instance_uuid]),
+                         set(ip['instance_uuid'] for ip in result))
+
     def create_fixed_ip(self, **params):
         default_params = {'address': '192.168.0.1'}
         default_params.update(params)
@@ -4083,6 +4504,24 @@ class FloatingIpTestCase(test.TestCase, ModelsObjectComparatorMixin):
                                                          fixed_ip['id'])
             self.assertEqual(float_addr, float_ip[0]['address'])
 
+    def test_floating_ip_get_by_instances(self):
+        instance_uuids = [db.instance_create(self.ctxt, {})['uuid']
+                          for i in range(3)]
+        for i, instance_uuid in enumerate(instance_uuids):
+            self._create_floating_ip({'address': '2.2.2.%d' % i})
+            self._create_fixed_ip({'address': '1.1.1.%d' % i,
+                                   'instance_uuid': instance_uuid})
+            db.floating_ip_fixed_ip_associate(self.ctxt, '2.2.2.%d' % i,
+                                              '1.1.1.%d' % i, 'some_host')
+        self._create_floating_ip({'address': '2.2.2.9'})
+
+        float_ips = db.floating_ip_get_by_instances(self.ctxt,
+                                                    instance_uuids[:2])
+        self.assertEqual(['2.2.2.0', '2.2.2.1'],
+                         sorted(float_ip['address']
+                                for float_ip in float_ips))
+        self.assertEqual([], db.floating_ip_get_by_instances(self.ctxt, []))
+
     def test_floating_ip_update(self):
         float_ip = self._create_floating_ip({})
 
@@ -4831,6 +5270,20 @@ class VirtualInterfaceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects(vifs1, vifs1_real)
         self._assertEqualOrderedListOfObjects(vifs2, vifs2_real)
 
+    def test_virtual_interface_get_by_instances(self):
+        inst_uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        inst_uuid3 = db.instance_create(self.ctxt, {})['uuid']
+        vifs = [self._create_virt_interface({'address': 'fake1'}),
+                self._create_virt_interface({'address': 'fake2',
+                                             'instance_uuid': inst_uuid2})]
+        self._create_virt_interface({'address': 'fake3',
+                                     'instance_uuid': inst_uuid3})
+        real_vifs = db.virtual_interface_get_by_instances(
+            self.ctxt, [self.instance_uuid, inst_uuid2])
+        self._assertEqualOrderedListOfObjects(vifs, real_vifs)
+        self.assertEqual([], db.virtual_interface_get_by_instances(self.ctxt,
+                                                                   []))
+
     def test_virtual_interface_get_by_instance_and_network(self):
         inst_uuid2 = db.instance_create(self.ctxt, {})['uuid']
         values = {'host': 'localhost', 'project_id': 'project2'}
@@ -5631,6 +6084,25 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects(expected, result,
                                         ignored_keys=['stats'])
 
+    def test_compute_node_get_all_changed_since(self):
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        before = timeutils.utcnow() - datetime.timedelta(seconds=1)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, before)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(self.item['id'], nodes[0]['id'])
+        self.assertEqual(self.service['id'], nodes[0]['service']['id'])
+
+        timeutils.advance_time_seconds(60)
+        since = timeutils.utcnow()
+        self.assertEqual([],
+                db.compute_node_get_all_changed_since(self.ctxt, since))
+
+        db.compute_node_delete(self.ctxt, self.item['id'])
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertTrue(nodes[0]['deleted'])
+
     def test_compute_node_get(self):
         compute_node_id = self.item['id']
         node = db.compute_node_get(self.ctxt, compute_node_id)
@@ -6231,6 +6703,49 @@ class BwUsageTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualObjects(bw_usage, expected_bw_usage,
                                  ignored_keys=self._ignored_keys)
 
+    def test_bw_usage_update_many(self):
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+        refreshed = now - datetime.timedelta(seconds=5)
+
+        db.bw_usage_update(self.ctxt, 'fake_uuid1', 'fake_mac1',
+                           start_period, 1, 2, 3, 4)
+        db.bw_usage_update(self.ctxt, 'fake_uuid2', 'fake_mac2',
+                           start_period - datetime.timedelta(days=1),
+                           1, 2, 3, 4)
+        usages = [{'uuid': 'fake_uuid1', 'mac': 'fake_mac1',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890},
+                  {'uuid': 'fake_uuid1', 'mac': 'fake_mac2',
+                   'bw_in': 200, 'bw_out': 300,
+                   'last_ctr_in': 22345, 'last_ctr_out': 77890},
+                  {'uuid': 'fake_uuid2', 'mac': 'fake_mac2',
+                   'bw_in': 400, 'bw_out': 500,
+                   'last_ctr_in': 32345, 'last_ctr_out': 87890}]
+        db.bw_usage_update_many(self.ctxt, start_period, usages,
+                                last_refreshed=refreshed)
+
+        bw_usages = db.bw_usage_get_by_uuids(self.ctxt,
+                ['fake_uuid1', 'fake_uuid2'], start_period)
+        self.assertEqual(3, len(bw_usages))
+        bw_usages = dict(((usage['uuid'], usage['mac']), usage)
+                         for usage in bw_usages)
+        for usage in usages:
+            expected = dict(usage, start_period=start_period,
+                            last_refreshed=refreshed)
+            self._assertEqualObjects(
+                expected, bw_usages[(usage['uuid'], usage['mac'])],
+                ignored_keys=self._ignored_keys)
+
+        # Updating again uses the existing rows
+        db.bw_usage_update_many(self.ctxt, start_period, usages[:1])
+        bw_usages = db.bw_usage_get_by_uuids(self.ctxt, ['fake_uuid1'],
+                                             start_period)
+        self.assertEqual(2, len(bw_usages))
+        usage = db.bw_usage_get(self.ctxt, 'fake_uuid1', start_period,
+                                'fake_mac1')
+        self.assertEqual(now, usage['last_refreshed'])
+
 
 class Ec2TestCase(test.TestCase):
 
@@ -13,6 +13,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import re
+
 from oslo.config import cfg
 
 from nova.compute import api as compute_api
@@ -171,6 +173,29 @@ class FakeNetworkManager(network_manager.NetworkManager):
             return [ip for ip in self.fixed_ips
                     if ip['virtual_interface_id'] == vif_id]
 
+        def fixed_ip_search_by_address(self, context, address, exact=False):
+            if exact:
+                match = lambda ip: ip == address
+            else:
+                pattern = re.compile(re.escape(address).replace('\\_', '.'))
+                match = pattern.match
+            result = []
+            for vif in self.vifs:
+                for fixed_ip in self.fixed_ips_by_virtual_interface(
+                        context, vif['id']):
+                    floating_addresses = [
+                        floating_ip['address']
+                        for floating_ip in self.floating_ips
+                        if floating_ip['fixed_ip_id'] == fixed_ip['id']]
+                    if not (match(fixed_ip['address']) or
+                            any(match(ip) for ip in floating_addresses)):
+                        continue
+                    for floating_address in floating_addresses or [None]:
+                        result.append({'instance_uuid': vif['instance_uuid'],
+                                       'address': fixed_ip['address'],
+                                       'floating_address': floating_address})
+            return result
+
         def fixed_ip_disassociate(self, context, address):
             return True
 
@@ -16,6 +16,7 @@
 
 import datetime
 import filecmp
+import hashlib
 import os
 import random
 import tempfile
@@ -206,6 +207,69 @@ class TestGlanceImageService(test.NoDBTestCase):
         self.flags(num_retries=1, group='glance')
         service.download(self.context, image_id, data=writer)
 
+    def test_download_to_file(self):
+
+        class MyGlanceStubClient(glance_stubs.StubGlanceClient):
+            def data(self, image_id):
+                return ['aa', 'bb']
+
+        service = self._create_image_service(MyGlanceStubClient())
+        (outfd, tmpfname) = self._get_tempfile()
+        os.close(outfd)
+        checksum = service.download(self.context, 1, dst_path=tmpfname)
+        self.assertEqual(hashlib.sha1('aabb').hexdigest(), checksum)
+        with open(tmpfname) as f:
+            self.assertEqual('aabb', f.read())
+
+    def test_download_to_file_restarted(self):
+        tries = [0]
+
+        class MyGlanceStubClient(glance_stubs.StubGlanceClient):
+            """A client whose first transfer fails midway."""
+            def data(self, image_id):
+                tries[0] += 1
+                yield 'aa'
+                if tries[0] == 1:
+                    raise IOError('connection reset')
+                yield 'bb'
+
+        service = self._create_image_service(MyGlanceStubClient())
+        (outfd, tmpfname) = self._get_tempfile()
+        os.close(outfd)
+
+        self.flags(num_retries=0, group='glance')
+        self.assertRaises(IOError, service.download, self.context, 1,
+                          dst_path=tmpfname)
+
+        tries = [0]
+        self.flags(num_retries=1, group='glance')
+        checksum = service.download(self.context, 1, dst_path=tmpfname)
+        self.assertEqual(2, tries[0])
+        self.assertEqual(hashlib.sha1('aabb').hexdigest(), checksum)
+        with open(tmpfname) as f:
+            self.assertEqual('aabb', f.read())
+
+    def test_download_to_file_preallocated(self):
+        self.flags(preallocate_downloads=True, group='glance')
+
+        class MyGlanceStubClient(glance_stubs.StubGlanceClient):
+            def get(self, image_id):
+                return type('GlanceImage', (object,), {'size': 4})
+
+            def data(self, image_id):
+                return ['aa', 'bb']
+
+        service = self._create_image_service(MyGlanceStubClient())
+        (outfd, tmpfname) = self._get_tempfile()
+        os.close(outfd)
+        with mock.patch.object(utils, 'trycmd',
+                               return_value=('', '')) as mock_trycmd:
+            service.download(self.context, 1, dst_path=tmpfname)
+        mock_trycmd.assert_called_once_with('fallocate', '-n', '-l', 4,
+                                            tmpfname)
+        with open(tmpfname) as f:
+            self.assertEqual('aabb', f.read())
+
     def test_download_file_url(self):
         self.flags(allowed_direct_url_schemes=['file'], group='glance')
 
@@ -0,0 +1,98 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Benchmark harness for the rate limiters of the OpenStack API.
+
+Replays a mix of API requests from a number of users against a limiter
+configured with the default limits and reports the p50/p99 time spent
+checking each request and the share of requests which were rate-limited.
+
+Run it with contrib/benchmark.py limits.
+"""
+
+import random
+import time
+
+from nova.api.openstack.compute import limits
+from nova.tests import benchmark_utils
+
+LIMITERS = {
+    'Limiter': limits.Limiter,
+    'SharedLimiter': limits.SharedLimiter,
+}
+
+# The verbs and paths of the requests replayed
+REQUESTS = [
+    ('GET', '/v2/fake/servers/detail'),
+    ('GET', '/v2/fake/servers/detail?changes-since=2014-01-01T00:00:00Z'),
+    ('GET', '/v2/fake/flavors/detail'),
+    ('POST', '/v2/fake/servers'),
+    ('POST', '/v2/fake/servers/fake/action'),
+    ('PUT', '/v2/fake/servers/fake'),
+    ('DELETE', '/v2/fake/servers/fake'),
+    ('GET', '/v2/fake/os-fping'),
+]
+
+
+class LimitsBenchmark(object):
+    """Replay API requests against a rate limiter."""
+
+    def __init__(self, limiter_name, num_users=100, seed=0):
+        self.limiter_name = limiter_name
+        self.limiter = LIMITERS[limiter_name](limits.DEFAULT_LIMITS)
+        self.num_users = num_users
+        self.rand = random.Random(seed)
+
+    def run(self, num_requests):
+        """Check num_requests requests and return the report."""
+        requests = [(self.rand.choice(REQUESTS),
+                     'user%d' % self.rand.randrange(self.num_users))
+                    for i in xrange(num_requests)]
+        latencies = []
+        limited = 0
+        for (verb, url), username in requests:
+            start = time.time()
+            delay, error = self.limiter.check_for_delay(verb, url, username)
+            latencies.append(time.time() - start)
+            if delay:
+                limited += 1
+
+        return {
+            'limiter': self.limiter_name,
+            'users': self.num_users,
+            'requests': num_requests,
+            'limited': limited,
+            'p50_us': self._us(benchmark_utils.percentile(latencies, 50)),
+            'p99_us': self._us(benchmark_utils.percentile(latencies, 99)),
+        }
+
+    @staticmethod
+    def _us(seconds):
+        return None if seconds is None else seconds * 1000000
+
+
+def format_report(report):
+    """Return the line of a human readable benchmark report."""
+    def us(value):
+        return '-' if value is None else '%.1f' % value
+
+    return ('%(limiter)-14s %(users)6d users %(requests)8d requests  '
+            'p50 %(p50)8s us  p99 %(p99)8s us  limited %(limited)8d' %
+            {'limiter': report['limiter'],
+             'users': report['users'],
+             'requests': report['requests'],
+             'p50': us(report['p50_us']),
+             'p99': us(report['p99_us']),
+             'limited': report['limited']})
@@ -32,6 +32,7 @@ from nova.network import model as network_model
 from nova.network import rpcapi as network_rpcapi
 from nova.objects import fields
 from nova.objects import fixed_ip as fixed_ip_obj
+from nova.objects import instance_info_cache
 from nova.objects import network as network_obj
 from nova import policy
 from nova import test
@@ -333,6 +334,60 @@ class ApiTestCase(test.TestCase):
         self._test_refresh_cache('remove_fixed_ip_from_instance', self.context,
                                  instance, address)
 
+    def _get_instances_with_info_cache(self, count):
+        sys_meta = flavors.save_flavor_info({}, test_flavor.fake_flavor)
+        instances = []
+        for i in xrange(count):
+            instance = fake_instance.fake_instance_obj(
+                self.context, uuid='fake-uuid%d' % i,
+                expected_attrs=['system_metadata'], system_metadata=sys_meta)
+            instance.info_cache = instance_info_cache.InstanceInfoCache(
+                network_info=network_model.NetworkInfo([]))
+            instances.append(instance)
+        return instances
+
+    @mock.patch.object(base_api, 'update_instance_cache_with_nw_info')
+    def test_get_instances_nw_info(self, update_mock):
+        instances = self._get_instances_with_info_cache(3)
+        nw_info = network_model.NetworkInfo([
+            network_model.VIF(id='fake-vif')])
+        with contextlib.nested(
+            mock.patch.object(self.network_api.network_rpcapi.client,
+                              'can_send_version', return_value=True),
+            mock.patch.object(self.network_api.network_rpcapi,
+                              'get_instances_nw_info')
+        ) as (can_send_mock, nwinfo_mock):
+            nwinfo_mock.return_value = {'fake-uuid0': [],
+                                        'fake-uuid1': nw_info}
+            nw_infos = self.network_api.get_instances_nw_info(self.context,
+                                                              instances)
+            can_send_mock.assert_called_once_with('1.13')
+            args = nwinfo_mock.call_args[0][1]
+            self.assertEqual(['fake-uuid0', 'fake-uuid1', 'fake-uuid2'],
+                             [arg['instance_id'] for arg in args])
+        self.assertEqual(['fake-uuid0', 'fake-uuid1'], sorted(nw_infos))
+        self.assertIsInstance(nw_infos['fake-uuid0'],
+                              network_model.NetworkInfo)
+        # Only the cache of the instance whose network info changed is
+        # updated
+        update_mock.assert_called_once_with(self.network_api, self.context,
+                                            instances[1], nw_info,
+                                            update_cells=False)
+
+    def test_get_instances_nw_info_old_network_service(self):
+        instances = self._get_instances_with_info_cache(2)
+        with contextlib.nested(
+            mock.patch.object(self.network_api.network_rpcapi.client,
+                              'can_send_version', return_value=False),
+            mock.patch.object(self.network_api.network_rpcapi,
+                              'get_instance_nw_info'),
+        ) as (can_send_mock, nwinfo_mock):
+            nwinfo_mock.side_effect = [[], test.TestingException()]
+            nw_infos = self.network_api.get_instances_nw_info(self.context,
+                                                              instances)
+        self.assertEqual(2, nwinfo_mock.call_count)
+        self.assertEqual({'fake-uuid0': []}, nw_infos)
+
     @mock.patch('nova.db.fixed_ip_get_by_address')
     def test_get_fixed_ip_by_address(self, fip_get):
         fip_get.return_value = test_fixed_ip.fake_fixed_ip
@@ -28,6 +28,8 @@ from nova import exception
 from nova.network import driver
 from nova.network import linux_net
 from nova.objects import fixed_ip as fixed_ip_obj
+from nova.objects import instance as instance_obj
+from nova.objects import virtual_interface as vif_obj
 from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
@@ -289,6 +291,8 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
         self.stubs.Set(db, 'virtual_interface_get_by_instance', get_vifs)
         self.stubs.Set(db, 'instance_get', get_instance)
         self.stubs.Set(db, 'network_get_associated_fixed_ips', get_associated)
+        self.stubs.Set(linux_net, '_dhcp_host_entries', {})
+        self.stubs.Set(linux_net, '_pending_dhcp_restarts', {})
 
     def _test_add_snat_rule(self, expected):
         def verify_add_rule(chain, rule):
@@ -386,6 +390,154 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
         actual_hosts = self.driver.get_dhcp_hosts(self.context, networks[1])
         self.assertEqual(actual_hosts, expected)
 
+    def _fake_dhcp_hosts_files(self):
+        written = []
+        self.stubs.Set(fileutils, 'ensure_tree', lambda *a, **kw: None)
+        self.stubs.Set(linux_net, 'write_to_file',
+                       lambda path, data: written.append(data))
+        return written
+
+    def _fake_fixed_ip(self, address, hostname, mac, vif_id):
+        return fixed_ip_obj.FixedIP(
+            address=address, virtual_interface_id=vif_id,
+            instance=instance_obj.Instance(hostname=hostname),
+            virtual_interface=vif_obj.VirtualInterface(address=mac))
+
+    def test_add_and_remove_dhcp_host(self):
+        self.flags(dnsmasq_reload_delay=0)
+        written = self._fake_dhcp_hosts_files()
+        fixedip = self._fake_fixed_ip('192.168.0.103', 'fake_instance02',
+                                      'DE:AD:BE:EF:00:07', 7)
+        hosts = [
+            "DE:AD:BE:EF:00:00,fake_instance00.novalocal,192.168.0.100",
+            "DE:AD:BE:EF:00:03,fake_instance01.novalocal,192.168.1.101",
+            "DE:AD:BE:EF:00:04,fake_instance00.novalocal,192.168.0.102",
+        ]
+        new_host = "DE:AD:BE:EF:00:07,fake_instance02.novalocal,192.168.0.103"
+
+        with mock.patch.object(linux_net, 'restart_dhcp') as restart:
+            self.driver.update_dhcp(self.context, "eth0", networks[0])
+            self.assertEqual('\n'.join(hosts), written[-1])
+
+            with mock.patch.object(fixed_ip_obj.FixedIPList,
+                                   'get_by_network') as get_by_network:
+                self.driver.add_dhcp_host(self.context, "eth0", networks[0],
+                                          fixedip)
+                self.assertEqual('\n'.join(hosts + [new_host]), written[-1])
+
+                self.driver.remove_dhcp_host(self.context, "eth0",
+                                             networks[0], fixedip)
+                self.assertEqual('\n'.join(hosts), written[-1])
+                self.assertFalse(get_by_network.called)
+
+            self.assertEqual(3, len(written))
+            self.assertEqual(3, restart.call_count)
+
+    def test_remove_unknown_dhcp_host(self):
+        written = self._fake_dhcp_hosts_files()
+        fixedip = self._fake_fixed_ip('192.168.0.103', 'fake_instance02',
+                                      'DE:AD:BE:EF:00:07', 7)
+        with mock.patch.object(linux_net, 'restart_dhcp') as restart:
+            self.driver.update_dhcp(self.context, "eth0", networks[0])
+            self.driver.remove_dhcp_host(self.context, "eth0", networks[0],
+                                         fixedip)
+            self.assertEqual(1, len(written))
+            self.assertEqual(1, restart.call_count)
+
+    def test_add_dhcp_host_without_hosts_file(self):
+        fixedip = self._fake_fixed_ip('192.168.0.103', 'fake_instance02',
+                                      'DE:AD:BE:EF:00:07', 7)
+        with mock.patch.object(linux_net, 'update_dhcp') as update_dhcp:
+            self.driver.add_dhcp_host(self.context, "eth0", networks[0],
+                                      fixedip)
+            update_dhcp.assert_called_once_with(self.context, "eth0",
+                                                networks[0])
+
+    def test_dhcp_host_changes_share_restart(self):
+        self.flags(dnsmasq_reload_delay=0.5)
+        self._fake_dhcp_hosts_files()
+        linux_net._dhcp_host_entries['eth0'] = {}
+        fixedips = [self._fake_fixed_ip('192.168.0.10%d' % i,
+                                        'fake_instance0%d' % i,
+                                        'DE:AD:BE:EF:00:1%d' % i, i)
+                    for i in range(3)]
+        network_refs = [dict(networks[0], label='label%d' % i)
+                        for i in range(3)]
+
+        with contextlib.nested(
+                mock.patch.object(linux_net.greenthread, 'spawn_after'),
+                mock.patch.object(linux_net, 'restart_dhcp'),
+        ) as (spawn_after, restart):
+            for fixedip, network_ref in zip(fixedips, network_refs):
+                self.driver.add_dhcp_host(self.context, "eth0", network_ref,
+                                          fixedip)
+            spawn_after.assert_called_once_with(
+                0.5, linux_net._run_pending_dhcp_restart, "eth0")
+            self.assertFalse(restart.called)
+
+            linux_net._run_pending_dhcp_restart("eth0")
+            restart.assert_called_once_with(self.context, "eth0",
+                                            network_refs[-1])
+
+            # NOTE: A full rebuild restarts dnsmasq itself, which makes any
+            #       scheduled restart redundant.
+            self.driver.add_dhcp_host(self.context, "eth0", networks[0],
+                                      fixedips[0])
+            self.driver.update_dhcp(self.context, "eth0", networks[0])
+            linux_net._run_pending_dhcp_restart("eth0")
+            self.assertEqual(2, restart.call_count)
+
+    def test_remove_dhcp_host_restarts_before_release(self):
+        self.flags(dnsmasq_reload_delay=0.5)
+        self._fake_dhcp_hosts_files()
+        linux_net._dhcp_host_entries['eth0'] = {}
+        fixedip = self._fake_fixed_ip('192.168.0.103', 'fake_instance02',
+                                      'DE:AD:BE:EF:00:07', 7)
+        calls = mock.Mock()
+
+        with contextlib.nested(
+                mock.patch.object(linux_net.greenthread, 'spawn_after'),
+                mock.patch.object(linux_net, 'restart_dhcp',
+                                  calls.restart_dhcp),
+                mock.patch.object(linux_net.utils, 'execute', calls.execute),
+        ):
+            self.driver.add_dhcp_host(self.context, "eth0", networks[0],
+                                      fixedip)
+            self.driver.remove_dhcp_host(self.context, "eth0", networks[0],
+                                         fixedip)
+            self.driver.release_dhcp("eth0", '192.168.0.103',
+                                     'DE:AD:BE:EF:00:07')
+            self.assertEqual(
+                [mock.call.restart_dhcp(self.context, "eth0", networks[0]),
+                 mock.call.execute('dhcp_release', "eth0", '192.168.0.103',
+                                   'DE:AD:BE:EF:00:07', run_as_root=True)],
+                calls.mock_calls)
+
+            # NOTE: The restart made by the removal covers the one scheduled
+            #       by the addition.
+            linux_net._run_pending_dhcp_restart("eth0")
+            self.assertEqual(1, calls.restart_dhcp.call_count)
+
+    def test_kill_dhcp_forgets_hosts(self):
+        linux_net._dhcp_host_entries['eth0'] = {}
+        self.stubs.Set(linux_net, '_dnsmasq_pid_for', lambda *a, **kw: None)
+        self.stubs.Set(linux_net, '_remove_dnsmasq_accept_rules',
+                       lambda *a, **kw: None)
+        self.stubs.Set(linux_net, '_remove_dhcp_mangle_rule',
+                       lambda *a, **kw: None)
+        self.driver.kill_dhcp("eth0")
+        self.assertNotIn("eth0", linux_net._dhcp_host_entries)
+
+    def test_write_to_file_replaces_file(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'nova-eth0.conf')
+            linux_net.write_to_file(path, 'old')
+            linux_net.write_to_file(path, 'new')
+            with open(path) as f:
+                self.assertEqual('new', f.read())
+            self.assertEqual(['nova-eth0.conf'], os.listdir(tmpdir))
+            self.assertEqual(0o644, os.stat(path).st_mode & 0o777)
+
     def test_get_dns_hosts_for_nw00(self):
         expected = (
                 "192.168.0.100\tfake_instance00.novalocal\n"
@@ -15,6 +15,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import contextlib
+
 import fixtures
 import mock
 import mox
@@ -36,6 +38,7 @@ from nova.objects import floating_ip as floating_ip_obj
 from nova.objects import instance as instance_obj
 from nova.objects import network as network_obj
 from nova.objects import quotas as quotas_obj
+from nova.objects import virtual_interface as vif_obj
 from nova.openstack.common.db import exception as db_exc
 from nova.openstack.common import importutils
 from nova.openstack.common import log as logging
@@ -268,6 +271,86 @@ class FlatNetworkTestCase(test.TestCase):
 
             self.assertThat(vif_dict, matchers.DictMatches(check))
 
+    def test_get_instances_nw_info(self):
+        instances = [{'instance_id': 'fake-uuid%d' % i,
+                      'rxtx_factor': 1.0, 'host': HOST,
+                      'project_id': 'testproject'} for i in xrange(2)]
+        vifs = [vif_obj.VirtualInterface(id=i, uuid='vif%d' % i,
+                                         network_id=1,
+                                         instance_uuid='fake-uuid%d' % i)
+                for i in xrange(2)]
+        fixed_ips = [fixed_ip_obj.FixedIP(id=i, address='10.0.0.%d' % i,
+                                          virtual_interface_id=i)
+                     for i in xrange(2)]
+        floating_ip = floating_ip_obj.FloatingIP(address='1.2.3.4',
+                                                 fixed_ip_id=1)
+        with contextlib.nested(
+            mock.patch.object(vif_obj.VirtualInterfaceList,
+                              'get_by_instance_uuids', return_value=vifs),
+            mock.patch.object(fixed_ip_obj.FixedIPList,
+                              'get_by_instance_uuids',
+                              return_value=fixed_ips),
+            mock.patch.object(floating_ip_obj.FloatingIPList,
+                              'get_by_instance_uuids',
+                              return_value=[floating_ip]),
+            mock.patch.object(self.network, '_get_network_by_id',
+                              return_value='net1'),
+            mock.patch.object(self.network, 'build_network_info_model',
+                              side_effect=['nw_info0',
+                                           test.TestingException()])
+        ) as (get_vifs, get_fixed_ips, get_floating_ips, get_network,
+              build):
+            nw_infos = self.network.get_instances_nw_info(self.context,
+                                                          instances)
+            # The interfaces and ips of both instances are queried at once,
+            # and their network is looked up once.
+            uuids = ['fake-uuid0', 'fake-uuid1']
+            get_vifs.assert_called_once_with(self.context, uuids,
+                                             use_slave=False)
+            get_fixed_ips.assert_called_once_with(self.context, uuids)
+            get_floating_ips.assert_called_once_with(self.context, uuids)
+            get_network.assert_called_once_with(self.context, 1)
+            for i in xrange(2):
+                build.assert_any_call(
+                    self.context, [vifs[i]], {'vif%d' % i: 'net1'}, 1.0,
+                    HOST, fixed_ips_by_vif={0: [fixed_ips[0]],
+                                            1: [fixed_ips[1]]},
+                    floating_ips_by_fixed_address={'10.0.0.1': [floating_ip]},
+                    ipam_subnets_by_net_id={})
+        self.assertEqual({'fake-uuid0': 'nw_info0'}, nw_infos)
+
+    def test_build_network_info_model_with_ips(self):
+        self.flags(use_ipv6=True)
+        network = network_obj.Network._from_db_object(
+            self.context, network_obj.Network(),
+            dict(test_network.fake_network, **networks[0]))
+        vif = vif_obj.VirtualInterface(id=1, uuid='vif1',
+                                       address='DE:AD:BE:EF:00:00')
+        fixed_ip = fixed_ip_obj.FixedIP(address='192.168.0.100')
+        floating_ip = floating_ip_obj.FloatingIP(address='1.2.3.4')
+        self.mox.StubOutWithMock(self.network.ipam, 'get_v4_ips_by_interface')
+        self.mox.StubOutWithMock(self.network.ipam, 'get_v6_ips_by_interface')
+        self.mox.StubOutWithMock(self.network.ipam,
+                                 'get_floating_ips_by_fixed_address')
+        self.mox.ReplayAll()
+
+        nw_info = self.network.build_network_info_model(
+            self.context, [vif], {'vif1': network}, 1.0, HOST,
+            fixed_ips_by_vif={1: [fixed_ip]},
+            floating_ips_by_fixed_address={'192.168.0.100': [floating_ip]},
+            ipam_subnets_by_net_id={network['uuid']: [
+                {'cidr': str(network['cidr']),
+                 'gateway': str(network['gateway'])},
+                {'cidr': str(network['cidr_v6']),
+                 'gateway': str(network['gateway_v6'])}]})
+        self.assertEqual(
+            ['192.168.0.100', ipv6.to_global(network['cidr_v6'],
+                                             'DE:AD:BE:EF:00:00',
+                                             network['project_id'])],
+            [ip['address'] for ip in nw_info[0].fixed_ips()])
+        self.assertEqual(['1.2.3.4'], [ip['address']
+                                       for ip in nw_info[0].floating_ips()])
+
     def test_validate_networks(self):
         self.mox.StubOutWithMock(db, 'network_get_all_by_uuids')
         self.mox.StubOutWithMock(db, 'fixed_ip_get_by_address')
@@ -732,6 +815,51 @@ class FlatDHCPNetworkTestCase(test.TestCase):
         self.network.init_host()
         self.assertEqual(1, fake_apply.count)
 
+    def _test_setup_network_on_host_dhcp(self, fixed_ip, teardown=False):
+        self.flags(fake_network=False, use_ipv6=False)
+        network = network_obj.Network._from_db_object(
+            self.context, network_obj.Network(),
+            dict(test_network.fake_network, **networks[0]))
+        driver = self.network.driver
+        with contextlib.nested(
+                mock.patch.object(self.network, '_get_dhcp_ip',
+                                  return_value='192.168.0.1'),
+                mock.patch.object(self.network, 'l3driver'),
+                mock.patch.object(driver, 'get_dev', return_value='br100'),
+                mock.patch.object(driver, 'update_dhcp'),
+                mock.patch.object(driver, 'add_dhcp_host'),
+                mock.patch.object(driver, 'remove_dhcp_host'),
+        ) as (get_dhcp_ip, l3driver, get_dev, update_dhcp, add_dhcp_host,
+              remove_dhcp_host):
+            if teardown:
+                self.network._teardown_network_on_host(self.context, network,
+                                                       fixed_ip=fixed_ip)
+            else:
+                self.network._setup_network_on_host(self.context, network,
+                                                    fixed_ip=fixed_ip)
+            return update_dhcp, add_dhcp_host, remove_dhcp_host
+
+    def test_setup_network_on_host_rebuilds_dhcp(self):
+        update, add, remove = self._test_setup_network_on_host_dhcp(None)
+        update.assert_called_once_with(mock.ANY, 'br100', mock.ANY)
+        self.assertFalse(add.called)
+        self.assertFalse(remove.called)
+
+    def test_setup_network_on_host_adds_dhcp_host(self):
+        fixed_ip = fixed_ip_obj.FixedIP(address='192.168.0.100')
+        update, add, remove = self._test_setup_network_on_host_dhcp(fixed_ip)
+        add.assert_called_once_with(mock.ANY, 'br100', mock.ANY, fixed_ip)
+        self.assertFalse(update.called)
+        self.assertFalse(remove.called)
+
+    def test_teardown_network_on_host_removes_dhcp_host(self):
+        fixed_ip = fixed_ip_obj.FixedIP(address='192.168.0.100')
+        update, add, remove = self._test_setup_network_on_host_dhcp(
+            fixed_ip, teardown=True)
+        remove.assert_called_once_with(mock.ANY, 'br100', mock.ANY, fixed_ip)
+        self.assertFalse(update.called)
+        self.assertFalse(add.called)
+
 
 class VlanNetworkTestCase(test.TestCase):
     def setUp(self):
@@ -830,6 +958,35 @@ class VlanNetworkTestCase(test.TestCase):
         network.vpn_private_address = '192.168.0.2'
         self.network.allocate_fixed_ip(self.context, FAKEUUID, network)
 
+    def test_allocate_fixed_ip_sets_up_allocated_ip(self):
+        self.stubs.Set(self.network,
+                '_do_trigger_security_group_members_refresh_for_instance',
+                lambda *a, **kw: None)
+        fixed = dict(test_fixed_ip.fake_fixed_ip, address='192.168.0.1')
+        network = network_obj.Network._from_db_object(
+            self.context, network_obj.Network(),
+            dict(test_network.fake_network, **networks[0]))
+        with contextlib.nested(
+                mock.patch.object(db, 'fixed_ip_associate_pool',
+                                  return_value=fixed),
+                mock.patch.object(db, 'fixed_ip_update'),
+                mock.patch.object(
+                    db, 'virtual_interface_get_by_instance_and_network',
+                    return_value=vifs[0]),
+                mock.patch.object(db, 'instance_get_by_uuid',
+                                  return_value=fake_inst(display_name=HOST,
+                                                         uuid=FAKEUUID)),
+                mock.patch.object(self.network, '_setup_network_on_host'),
+        ) as (associate, update, vif_get, instance_get, setup):
+            self.network.allocate_fixed_ip(self.context, FAKEUUID, network)
+            setup.assert_called_once_with(self.context, network,
+                                          fixed_ip=mock.ANY)
+            fixed_ip = setup.call_args[1]['fixed_ip']
+            self.assertEqual('192.168.0.1', str(fixed_ip.address))
+            self.assertEqual(vifs[0]['address'],
+                             fixed_ip.virtual_interface.address)
+            self.assertEqual(FAKEUUID, fixed_ip.instance.uuid)
+
     @mock.patch('nova.objects.instance.Instance.get_by_uuid')
     @mock.patch('nova.objects.fixed_ip.FixedIP.associate')
     def test_allocate_fixed_ip_passes_string_address(self, mock_associate,
@@ -1533,7 +1690,7 @@ class VlanNetworkTestCase(test.TestCase):
     def test_deallocate_fixed_deleted(self):
         # Verify doesn't deallocate deleted fixed_ip from deleted network.
 
-        def teardown_network_on_host(_context, network):
+        def teardown_network_on_host(_context, network, fixed_ip=None):
             if network['id'] == 0:
                 raise test.TestingException()
 
@@ -1965,10 +2122,10 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertTrue(manager.create_networks(*args))
 
     @mock.patch('nova.db.network_get')
-    @mock.patch('nova.db.fixed_ips_by_virtual_interface')
-    def test_get_instance_uuids_by_ip_regex(self, fixed_get, network_get):
+    @mock.patch('nova.db.fixed_ip_search_by_address')
+    def test_get_instance_uuids_by_ip_regex(self, fixed_search, network_get):
         manager = fake_network.FakeNetworkManager(self.stubs)
-        fixed_get.side_effect = manager.db.fixed_ips_by_virtual_interface
+        fixed_search.side_effect = manager.db.fixed_ip_search_by_address
         _vifs = manager.db.virtual_interface_get_all(None)
         fake_context = context.RequestContext('user', 'project')
         network_get.return_value = dict(test_network.fake_network,
@@ -2014,6 +2171,36 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(res[0]['instance_uuid'], _vifs[1]['instance_uuid'])
         self.assertEqual(res[1]['instance_uuid'], _vifs[2]['instance_uuid'])
 
+        # Get instance 1 by its floating ip
+        res = manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                      {'ip': '172.16.1.2'})
+        self.assertEqual([{'instance_uuid': _vifs[1]['instance_uuid'],
+                           'ip': '172.16.1.2'}], res)
+
+        # Only the addresses which start like the regex are searched
+        fixed_search.reset_mock()
+        manager.get_instance_uuids_by_ip_filter(fake_context,
+                                                {'ip': '^172\\.16\\.0\\.2$'})
+        fixed_search.assert_called_once_with(fake_context, '172.16.0.2',
+                                             exact=True)
+
+    def test_ip_filter_prefix(self):
+        for ip_filter, expected in (
+                ('.*', ('', False)),
+                ('10.0.0.1', ('10_0_0_1', False)),
+                ('^10\\.0\\.0\\.1$', ('10.0.0.1', True)),
+                ('10\\.0\\.0\\.1$', ('10.0.0.1', True)),
+                ('10\\.0\\..\\.1$', ('10.0._.1', False)),
+                ('10\\.0\\.0\\.*', ('10.0.0', False)),
+                ('10\\.0+\\.1', ('10.0', False)),
+                ('10\\.0?', ('10.', False)),
+                ('10\\.0[1-3]', ('10.0', False)),
+                ('fe80::', ('fe80::', False)),
+                ('10\\.0\\.0\\.1|192', ('', False)),
+                ('(?i)FE80', ('', False))):
+            self.assertEqual(expected,
+                             network_manager._ip_filter_prefix(ip_filter))
+
     @mock.patch('nova.db.network_get')
     def test_get_instance_uuids_by_ipv6_regex(self, network_get):
         manager = fake_network.FakeNetworkManager(self.stubs)
@@ -2068,10 +2255,10 @@ class CommonNetworkTestCase(test.TestCase):
         self.assertEqual(res[1]['instance_uuid'], _vifs[2]['instance_uuid'])
 
     @mock.patch('nova.db.network_get')
-    @mock.patch('nova.db.fixed_ips_by_virtual_interface')
-    def test_get_instance_uuids_by_ip(self, fixed_get, network_get):
+    @mock.patch('nova.db.fixed_ip_search_by_address')
+    def test_get_instance_uuids_by_ip(self, fixed_search, network_get):
         manager = fake_network.FakeNetworkManager(self.stubs)
-        fixed_get.side_effect = manager.db.fixed_ips_by_virtual_interface
+        fixed_search.side_effect = manager.db.fixed_ip_search_by_address
         _vifs = manager.db.virtual_interface_get_all(None)
         fake_context = context.RequestContext('user', 'project')
         network_get.return_value = dict(test_network.fake_network,
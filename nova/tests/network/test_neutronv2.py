@@ -1987,8 +1987,8 @@ class TestNeutronv2(TestNeutronv2Base):
         fake_ips = [model.IP(x['ip_address']) for x in fake_port['fixed_ips']]
         api = neutronapi.API()
         self.mox.StubOutWithMock(api, '_get_subnets_from_port')
-        api._get_subnets_from_port(self.context, fake_port).AndReturn(
-            [fake_subnet])
+        api._get_subnets_from_port(self.context, fake_port, None,
+                                   None).AndReturn([fake_subnet])
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
         subnets = api._nw_info_get_subnets(self.context, fake_port, fake_ips)
@@ -2116,8 +2116,8 @@ class TestNeutronv2(TestNeutronv2Base):
                 self.moxed_client, '1.1.1.1', requested_port['id']).AndReturn(
                     [{'floating_ip_address': '10.0.0.1'}])
         for requested_port in requested_ports:
-            api._get_subnets_from_port(self.context, requested_port
-                ).AndReturn(fake_subnets)
+            api._get_subnets_from_port(self.context, requested_port, None,
+                                       None).AndReturn(fake_subnets)
 
         self.mox.ReplayAll()
         neutronv2.get_client('fake')
@@ -2145,6 +2145,123 @@ class TestNeutronv2(TestNeutronv2Base):
         self.assertEqual(nw_infos[1]['id'], 'port1')
         self.assertEqual(nw_infos[2]['id'], 'port2')
 
+    def test_build_network_info_model_with_ports_and_floating_ips(self):
+        api = neutronapi.API()
+        fake_inst = {'project_id': 'fake', 'uuid': 'uuid',
+                     'info_cache': {'network_info': []}}
+        fake_port = {'id': 'port1',
+                     'network_id': 'net-id',
+                     'admin_state_up': True,
+                     'status': 'ACTIVE',
+                     'fixed_ips': [{'ip_address': '1.1.1.1'}],
+                     'mac_address': 'de:ad:be:ef:00:01',
+                     'binding:vif_type': model.VIF_TYPE_BRIDGE}
+        fake_nets = [{'id': 'net-id', 'name': 'foo', 'tenant_id': 'fake'}]
+        floating_ips = {('port1', '1.1.1.1'): [
+                {'floating_ip_address': '10.0.0.1'}]}
+        neutronv2.get_client(mox.IgnoreArg(), admin=True).MultipleTimes(
+            ).AndReturn(self.moxed_client)
+        self.mox.StubOutWithMock(api, '_get_subnets_from_port')
+        api._get_subnets_from_port(self.context, fake_port, None,
+                                   None).AndReturn(
+            [model.Subnet(cidr='1.0.0.0/8')])
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        nw_infos = api._build_network_info_model(self.context, fake_inst,
+                                                 fake_nets, ['port1'],
+                                                 neutron_ports=[fake_port],
+                                                 floating_ips=floating_ips)
+        self.assertEqual(1, len(nw_infos))
+        self.assertEqual(['10.0.0.1'], [ip['address'] for ip in
+                                        nw_infos[0].floating_ips()])
+
+    def test_get_floating_ips_by_ports(self):
+        api = neutronapi.API()
+        fips = [{'port_id': 'port1', 'fixed_ip_address': '1.1.1.1'},
+                {'port_id': 'port1', 'fixed_ip_address': '1.1.1.2'},
+                {'port_id': 'port2', 'fixed_ip_address': '1.1.1.3'}]
+        self.moxed_client.list_floatingips(
+            port_id=['port1', 'port2']).AndReturn({'floatingips': fips})
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        floating_ips = api._get_floating_ips_by_ports(self.moxed_client,
+                                                      ['port1', 'port2'])
+        self.assertEqual({('port1', '1.1.1.1'): [fips[0]],
+                          ('port1', '1.1.1.2'): [fips[1]],
+                          ('port2', '1.1.1.3'): [fips[2]]}, floating_ips)
+        # No port, no floating ips to list
+        self.assertEqual({}, api._get_floating_ips_by_ports(
+                self.moxed_client, []))
+
+    def test_get_floating_ips_by_ports_without_l3_support(self):
+        api = neutronapi.API()
+        NeutronNotFound = exceptions.NeutronClientException(
+            status_code=404)
+        self.moxed_client.list_floatingips(
+            port_id=['port1']).AndRaise(NeutronNotFound)
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        self.assertEqual({}, api._get_floating_ips_by_ports(
+                self.moxed_client, ['port1']))
+
+    def test_get_instances_nw_info(self):
+        api = neutronapi.API()
+        info_cache = {'network_info': [{'id': 'port1',
+                                        'network': {'id': 'net1'}}]}
+        instances = [{'uuid': 'uuid1', 'project_id': 'fake',
+                      'info_cache': info_cache},
+                     {'uuid': 'uuid2', 'project_id': 'fake',
+                      'info_cache': None},
+                     {'uuid': 'uuid3', 'project_id': 'fake',
+                      'info_cache': None}]
+        ports = [{'id': 'port1', 'device_id': 'uuid1', 'tenant_id': 'fake',
+                  'fixed_ips': [{'subnet_id': 'subnet1'}]},
+                 {'id': 'port2', 'device_id': 'uuid2', 'tenant_id': 'fake',
+                  'fixed_ips': []},
+                 {'id': 'port3', 'device_id': 'uuid2', 'tenant_id': 'other',
+                  'fixed_ips': [{'subnet_id': 'subnet1'}]}]
+        net1 = {'id': 'net1'}
+        subnet1 = {'id': 'subnet1', 'network_id': 'net1'}
+        dhcp_port = {'id': 'dhcp1', 'network_id': 'net1'}
+        neutronv2.get_client(mox.IgnoreArg(), admin=True).MultipleTimes(
+            ).AndReturn(self.moxed_client)
+        self.moxed_client.list_ports(
+            device_id=['uuid1', 'uuid2', 'uuid3']).AndReturn(
+                {'ports': ports})
+        self.mox.StubOutWithMock(api, '_get_floating_ips_by_ports')
+        self.mox.StubOutWithMock(api, '_build_network_info_model')
+        api._get_floating_ips_by_ports(
+            self.moxed_client, ['port1', 'port2', 'port3']).AndReturn('fips')
+        # The networks, subnets and DHCP ports are listed once for all
+        self.moxed_client.list_networks(id=['net1']).AndReturn(
+                {'networks': [net1]})
+        self.moxed_client.list_subnets(id=['subnet1']).AndReturn(
+                {'subnets': [subnet1]})
+        self.moxed_client.list_ports(
+            network_id=['net1'], device_owner='network:dhcp').AndReturn(
+                {'ports': [dhcp_port]})
+        kwargs = {'floating_ips': 'fips',
+                  'networks_by_id': {'net1': net1},
+                  'subnets_by_id': {'subnet1': subnet1},
+                  'dhcp_ports_by_network': {'net1': [dhcp_port]}}
+        api._build_network_info_model(self.context, instances[0],
+                                      neutron_ports=[ports[0]],
+                                      **kwargs).AndReturn(
+                                          model.NetworkInfo())
+        api._build_network_info_model(self.context, instances[1],
+                                      neutron_ports=[ports[1]],
+                                      **kwargs).AndRaise(
+                                          test.TestingException())
+        api._build_network_info_model(self.context, instances[2],
+                                      neutron_ports=[],
+                                      **kwargs).AndReturn(
+                                          model.NetworkInfo())
+        self.mox.ReplayAll()
+        neutronv2.get_client('fake')
+        nw_infos = api._get_instances_nw_info(self.context, instances)
+        self.assertEqual(['uuid1', 'uuid3'], sorted(nw_infos))
+        self.assertIsInstance(nw_infos['uuid1'], model.NetworkInfo)
+
     def test_get_all_empty_list_networks(self):
         api = neutronapi.API()
         self.moxed_client.list_networks().AndReturn({'networks': []})
@@ -2287,6 +2404,40 @@ class TestNeutronv2ModuleMethods(test.TestCase):
                           'fake_context', 'fake_instance',
                           None, ['list', 'of', 'port_ids'])
 
+    def test_gather_port_ids_and_networks_by_id(self):
+        api = neutronapi.API()
+        instance = {'info_cache': {'network_info': [
+                        {'id': 'port1', 'network': {'id': 'net1'}},
+                        {'id': 'port2', 'network': {'id': 'net2'}}]}}
+        networks_by_id = {'net2': {'id': 'net2'}, 'net3': {'id': 'net3'}}
+
+        networks, port_ids = api._gather_port_ids_and_networks(
+                'fake_context', instance, networks_by_id=networks_by_id)
+        self.assertEqual([{'id': 'net2'}], networks)
+        self.assertEqual(['port1', 'port2'], port_ids)
+
+    def test_get_subnets_from_port_by_id(self):
+        api = neutronapi.API()
+        port = {'fixed_ips': [{'subnet_id': 'subnet1'},
+                              {'subnet_id': 'subnet1'},
+                              {'subnet_id': 'subnet2'}]}
+        subnets_by_id = {'subnet1': {'id': 'subnet1', 'network_id': 'net1',
+                                     'cidr': '10.0.0.0/24',
+                                     'gateway_ip': '10.0.0.1',
+                                     'dns_nameservers': ['8.8.8.8']}}
+        dhcp_ports_by_network = {'net1': [
+                {'fixed_ips': [{'subnet_id': 'subnet1',
+                                'ip_address': '10.0.0.2'}]}]}
+
+        # Nothing is listed from neutron
+        subnets = api._get_subnets_from_port('fake_context', port,
+                                             subnets_by_id,
+                                             dhcp_ports_by_network)
+        self.assertEqual(1, len(subnets))
+        self.assertEqual('10.0.0.0/24', subnets[0]['cidr'])
+        self.assertEqual('10.0.0.2', subnets[0]['meta']['dhcp_server'])
+        self.assertEqual('8.8.8.8', subnets[0]['dns'][0]['address'])
+
     def test_ensure_requested_network_ordering_no_preference_ids(self):
         l = [1, 2, 3]
 
@@ -232,6 +232,15 @@ class _TestFixedIPObject(object):
         get.assert_called_once_with(self.context, 'fake-uuid')
         self._compare(fixedips[0], fake_fixed_ip)
 
+    @mock.patch('nova.db.fixed_ip_get_by_instances')
+    def test_get_by_instance_uuids(self, get):
+        get.return_value = [fake_fixed_ip]
+        fixedips = fixed_ip.FixedIPList.get_by_instance_uuids(
+            self.context, ['fake-uuid'])
+        self.assertEqual(1, len(fixedips))
+        get.assert_called_once_with(self.context, ['fake-uuid'])
+        self._compare(fixedips[0], fake_fixed_ip)
+
     @mock.patch('nova.db.fixed_ip_get_by_host')
     def test_get_by_host(self, get):
         get.return_value = [fake_fixed_ip]
@@ -290,6 +299,17 @@ class _TestFixedIPObject(object):
         self.assertEqual(1, fip.virtual_interface.id)
         self.assertEqual(info['vif_address'], fip.virtual_interface.address)
 
+    @mock.patch('nova.db.fixed_ip_search_by_address')
+    def test_search_by_address(self, search):
+        info = {'instance_uuid': 'fake-uuid',
+                'address': '1.2.3.4',
+                'floating_address': '5.6.7.8'}
+        search.return_value = [info]
+        result = fixed_ip.FixedIPList.search_by_address(self.context, '5.6.',
+                                                        exact=False)
+        search.assert_called_once_with(self.context, '5.6.', exact=False)
+        self.assertEqual([info], result)
+
 
 class TestFixedIPObject(test_objects._LocalTest,
                         _TestFixedIPObject):
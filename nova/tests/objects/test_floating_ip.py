@@ -181,6 +181,15 @@ class _TestFloatingIPObject(object):
         self._compare(floatingips[0], fake_floating_ip)
         get.assert_called_with(self.context, 123)
 
+    @mock.patch('nova.db.floating_ip_get_by_instances')
+    def test_get_by_instance_uuids(self, get):
+        get.return_value = [fake_floating_ip]
+        floatingips = floating_ip.FloatingIPList.get_by_instance_uuids(
+            self.context, ['fake-uuid'])
+        self.assertEqual(1, len(floatingips))
+        self._compare(floatingips[0], fake_floating_ip)
+        get.assert_called_with(self.context, ['fake-uuid'])
+
     @mock.patch('nova.db.instance_floating_address_get_all')
     def test_get_addresses_by_instance(self, get_all):
         expected = ['1.2.3.4', '4.5.6.7']
@@ -174,6 +174,26 @@ class _TestInstanceObject(object):
         self.assertEqual(sys_meta2, {'foo': 'bar'})
         self.assertRemotes()
 
+    def test_load_fault(self):
+        fake_uuid = self.fake_instance['uuid']
+        fake_faults = [dict(x, instance_uuid=fake_uuid)
+                       for x in test_instance_fault.fake_faults['fake-uuid']]
+        self.mox.StubOutWithMock(db, 'instance_get_by_uuid')
+        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        db.instance_get_by_uuid(self.context, fake_uuid,
+                                columns_to_join=[],
+                                use_slave=False
+                                ).AndReturn(self.fake_instance)
+        # The instance itself isn't loaded again, only its fault is
+        db.instance_fault_get_by_instance_uuids(
+            self.context, [fake_uuid]).AndReturn({fake_uuid: fake_faults})
+        self.mox.ReplayAll()
+        inst = instance.Instance.get_by_uuid(self.context, fake_uuid,
+                                             expected_attrs=[])
+        self.assertEqual(fake_faults[0], dict(inst.fault.items()))
+        self.assertEqual(set(), inst.obj_what_changed())
+        self.assertRemotes()
+
     def test_load_invalid(self):
         inst = instance.Instance(context=self.context, uuid='fake-uuid')
         self.assertRaises(exception.ObjectActionError,
@@ -885,6 +905,50 @@ class _TestInstanceListObject(object):
             self.assertEqual(inst_list.objects[i].uuid, fakes[i]['uuid'])
         self.assertRemotes()
 
+    def test_bulk_create(self):
+        fakes = [fake_instance.fake_db_instance(id=1),
+                 fake_instance.fake_db_instance(id=2)]
+        self.mox.StubOutWithMock(db, 'instance_bulk_create')
+        db.instance_bulk_create(self.context,
+                                [{'host': 'foo-host'},
+                                 {'host': 'foo-host',
+                                  'security_groups': ['default']}]
+                                ).AndReturn(fakes)
+        self.mox.ReplayAll()
+        secgroups = security_group.SecurityGroupList()
+        secgroups.objects = [security_group.SecurityGroup(name='default')]
+        inst_list = instance.InstanceList.bulk_create(
+            self.context,
+            [instance.Instance(host='foo-host'),
+             instance.Instance(host='foo-host', security_groups=secgroups)])
+
+        self.assertEqual(2, len(inst_list))
+        for i in range(0, len(fakes)):
+            self.assertIsInstance(inst_list.objects[i], instance.Instance)
+            self.assertEqual(fakes[i]['uuid'], inst_list.objects[i].uuid)
+            self.assertEqual(fakes[i]['id'], inst_list.objects[i].id)
+            self.assertFalse(inst_list.objects[i].obj_what_changed())
+        self.assertRemotes()
+
+    def test_bulk_create_with_values(self):
+        insts = [instance.Instance(user_id=self.context.user_id,
+                                   project_id=self.context.project_id,
+                                   host='foo-host', display_name=name)
+                 for name in ('foo', 'bar')]
+        inst_list = instance.InstanceList.bulk_create(self.context, insts)
+        self.assertEqual(['foo', 'bar'],
+                         [inst.display_name for inst in inst_list])
+        inst = instance.Instance.get_by_uuid(self.context,
+                                             inst_list[1].uuid)
+        self.assertEqual('bar', inst.display_name)
+        self.assertEqual('foo-host', inst.host)
+
+    def test_bulk_create_recreate_fails(self):
+        inst = instance.Instance(id=1)
+        self.assertRaises(exception.ObjectActionError,
+                          instance.InstanceList.bulk_create,
+                          self.context, [inst])
+
     def test_get_all_by_filters_works_for_cleaned(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2, updates={'deleted': 2,
@@ -1075,7 +1139,34 @@ class _TestInstanceListObject(object):
 
 class TestInstanceListObject(test_objects._LocalTest,
                              _TestInstanceListObject):
-    pass
+    def test_load_fault(self):
+        fake_insts = [
+            fake_instance.fake_db_instance(uuid='fake-uuid', host='host'),
+            fake_instance.fake_db_instance(uuid='fake-inst2', host='host'),
+            fake_instance.fake_db_instance(uuid='fake-inst3', host='host'),
+            ]
+        fake_faults = test_instance_fault.fake_faults
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_host')
+        self.mox.StubOutWithMock(db, 'instance_fault_get_by_instance_uuids')
+        db.instance_get_all_by_host(self.context, 'host',
+                                    columns_to_join=None,
+                                    use_slave=False
+                                    ).AndReturn(fake_insts)
+        # Lazy-loading the fault of an instance loads the faults of all the
+        # instances fetched with it, which still need theirs
+        db.instance_fault_get_by_instance_uuids(
+            self.context, ['fake-inst2', 'fake-uuid']
+            ).AndReturn(fake_faults)
+        self.mox.ReplayAll()
+        instances = instance.InstanceList.get_by_host(self.context, 'host',
+                                                      use_slave=False)
+        instances[2].fault = None
+        instances[2].obj_reset_changes(['fault'])
+        self.assertIsNone(instances[1].fault)
+        self.assertEqual(fake_faults['fake-uuid'][0],
+                         dict(instances[0].fault.iteritems()))
+        for inst in instances:
+            self.assertNotIn('fault', inst.obj_what_changed())
 
 
 class TestRemoteInstanceListObject(test_objects._RemoteTest,
@@ -887,11 +887,11 @@ object_data = {
     'EC2InstanceMapping': '1.0-c9ebf3e641800d1f453ef9f19b159971',
     'EC2VolumeMapping': '1.0-f376082f497bba08583119ef7cbbb07e',
     'FixedIP': '1.1-70b8c86daf93913c7bb11afc901dda76',
-    'FixedIPList': '1.1-cbe7d8ff7eea9d3aecb7d537e1007742',
+    'FixedIPList': '1.3-291336f57060e781917078ab75f2cf37',
     'Flavor': '1.0-2956744a9d1edd729bf8bf0dcc98c235',
     'FlavorList': '1.0-07d83f9f303186954879949adf0ee60d',
     'FloatingIP': '1.1-e7c74bf87bda4370aba6d46253d2f8e6',
-    'FloatingIPList': '1.2-2b48d645da4c9a6af48c167df5307a87',
+    'FloatingIPList': '1.3-211b93dfee71b7be8d67c3cca94c1e9b',
     'Instance': '1.13-33b01aa5bae61817ffd70761aa516b03',
     'InstanceAction': '1.1-6b21abed7121856422cd6160df4f4676',
     'InstanceActionEvent': '1.1-28326849b2dddc4dc457aa23ad8fb872',
@@ -903,7 +903,7 @@ object_data = {
     'InstanceGroup': '1.6-c1cbdd4ed694b71f2373810c240f0dca',
     'InstanceGroupList': '1.2-28db742d254c466d8961a3bc5146fa74',
     'InstanceInfoCache': '1.5-b457ac4ba2d7522069fb559eef6096d2',
-    'InstanceList': '1.6-72ffa5e0fcb980988d3fcae6cbb3f671',
+    'InstanceList': '1.7-71a400d1da6faad101ffb3998e953ab8',
     'KeyPair': '1.1-e8c19c3025f15c6d5c38b6f9f621dd4b',
     'KeyPairList': '1.0-3e5aaf43f81e7f6cea40618786e39d66',
     'Migration': '1.1-eeb2164ef6fd182ea0d5659b8ed71053',
@@ -923,7 +923,7 @@ object_data = {
     'ServiceList': '1.0-08441b0ab42f016140e24a12e93cd25c',
     'TestSubclassedObject': '1.6-5e9f181288c104ae0d1aad6f8c0d40b9',
     'VirtualInterface': '1.0-513adc400c9c4dfcbd0a638a0a415183',
-    'VirtualInterfaceList': '1.0-15f2f3e0517805f585b402ab1547ba92',
+    'VirtualInterfaceList': '1.1-e66b08e9885cf864aefa56d4706fa4ad',
     }
 
 
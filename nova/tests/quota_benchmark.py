@@ -0,0 +1,165 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Concurrency benchmark harness for the quota drivers.
+
+Runs greenthreads which boot and delete instances as far as quotas are
+concerned: each reserves instances, cores and ram, commits or rolls the
+reservation back, and gives committed usage back right away with a
+negative reservation.  All the users share one project, so the workers
+compete for the same quota usages.  It reports the throughput, the p50/p99
+latency of the reservations, the over-quota failures and whether the
+usages are back to zero at the end.
+
+Run it with contrib/benchmark.py quota.
+"""
+
+import random
+import time
+
+import eventlet
+
+from nova import context
+from nova import db
+from nova import exception
+from nova import quota
+from nova.tests import benchmark_utils
+
+DRIVERS = {
+    'DbQuotaDriver': quota.DbQuotaDriver,
+    'CasQuotaDriver': quota.CasQuotaDriver,
+}
+
+# The usage of one instance
+DELTAS = {'instances': 1, 'cores': 2, 'ram': 2048}
+
+
+class QuotaBenchmark(object):
+    """Replay instance boots and deletes against a quota driver."""
+
+    def __init__(self, driver_name, project_id='benchmark', num_users=4,
+                 rollback_ratio=0.1, seed=0):
+        self.driver_name = driver_name
+        self.driver = DRIVERS[driver_name]()
+        self.engine = quota.QuotaEngine(quota_driver_class=self.driver)
+        self.engine.register_resources(
+                [quota.QUOTAS._resources[res] for res in DELTAS])
+        self.project_id = project_id
+        self.num_users = num_users
+        self.rollback_ratio = rollback_ratio
+        self.rand = random.Random(seed)
+
+    def _context(self, user):
+        return context.RequestContext('%s-user%d' % (self.project_id, user),
+                                      self.project_id)
+
+    def _worker(self, num_requests, latencies, results):
+        deltas = dict((res, -delta) for res, delta in DELTAS.items())
+        for i in xrange(num_requests):
+            ctxt = self._context(self.rand.randrange(self.num_users))
+            start = time.time()
+            try:
+                reservations = self.engine.reserve(ctxt, **DELTAS)
+            except exception.OverQuota:
+                results['over_quota'] += 1
+                latencies.append(time.time() - start)
+                eventlet.sleep(0)
+                continue
+            # NOTE: let the other workers in between the reservation and
+            # its commit, as the API does while it creates the instance.
+            eventlet.sleep(0)
+            if self.rand.random() < self.rollback_ratio:
+                self.engine.rollback(ctxt, reservations)
+                results['rolled_back'] += 1
+                latencies.append(time.time() - start)
+                continue
+            self.engine.commit(ctxt, reservations)
+            results['committed'] += 1
+            latencies.append(time.time() - start)
+            eventlet.sleep(0)
+            # Delete the instance
+            reservations = self.engine.reserve(ctxt, **deltas)
+            eventlet.sleep(0)
+            self.engine.commit(ctxt, reservations)
+
+    def usages(self):
+        """Return the total in_use and reserved counts of the project."""
+        admin = context.get_admin_context()
+        totals = dict((res, {'in_use': 0, 'reserved': 0}) for res in DELTAS)
+        for user in xrange(self.num_users):
+            usages = db.quota_usage_get_all_by_project_and_user(admin,
+                    self.project_id, self._context(user).user_id)
+            for res in DELTAS:
+                if res in usages:
+                    totals[res]['in_use'] += usages[res]['in_use']
+                    totals[res]['reserved'] += usages[res]['reserved']
+        return totals
+
+    def run(self, num_workers, num_requests):
+        """Run num_workers greenthreads making num_requests reservations
+        each and return the report.
+        """
+        latencies = []
+        results = [dict(committed=0, rolled_back=0, over_quota=0)
+                   for i in xrange(num_workers)]
+        pool = eventlet.GreenPool(num_workers)
+        start = time.time()
+        for worker_results in results:
+            pool.spawn_n(self._worker, num_requests, latencies,
+                         worker_results)
+        pool.waitall()
+        seconds = time.time() - start
+
+        totals = dict((name, sum(r[name] for r in results))
+                      for name in results[0])
+        usages = self.usages()
+        return {
+            'driver': self.driver_name,
+            'workers': num_workers,
+            'requests': num_workers * num_requests,
+            'seconds': seconds,
+            'ops_per_second': len(latencies) / seconds if seconds else None,
+            'p50_ms': self._ms(benchmark_utils.percentile(latencies, 50)),
+            'p99_ms': self._ms(benchmark_utils.percentile(latencies, 99)),
+            'committed': totals['committed'],
+            'rolled_back': totals['rolled_back'],
+            'over_quota': totals['over_quota'],
+            'usages': usages,
+            'consistent': all(usage['in_use'] == 0 and usage['reserved'] == 0
+                              for usage in usages.values()),
+        }
+
+    @staticmethod
+    def _ms(seconds):
+        return None if seconds is None else seconds * 1000
+
+
+def format_report(report):
+    """Return the line of a human readable benchmark report."""
+    def ms(value):
+        return '-' if value is None else '%.2f' % value
+
+    return ('%(driver)-16s %(workers)4d workers %(requests)7d requests '
+            '%(ops)10s ops/s  p50 %(p50)8s ms  p99 %(p99)8s ms  '
+            'over quota %(over_quota)6d  %(consistent)s' %
+            {'driver': report['driver'],
+             'workers': report['workers'],
+             'requests': report['requests'],
+             'ops': ms(report['ops_per_second']),
+             'p50': ms(report['p50_ms']),
+             'p99': ms(report['p99_ms']),
+             'over_quota': report['over_quota'],
+             'consistent': ('consistent' if report['consistent']
+                            else 'INCONSISTENT %s' % report['usages'])})
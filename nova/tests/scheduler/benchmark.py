@@ -0,0 +1,396 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Benchmark harness for the FilterScheduler.
+
+Generates a synthetic fleet of compute nodes, with aggregates, metrics and
+pci_stats, and replays a mix of requests against FilterScheduler and
+HostManager with the database calls stubbed.  It reports the p50/p99
+latency of select_destinations, the time spent in each filter and weigher
+and the memory used.
+
+Run it with contrib/benchmark.py scheduler.
+"""
+
+import random
+import resource
+import time
+import types
+
+import mock
+
+from nova import context
+from nova import db
+from nova import exception
+from nova.objects import instance_group as instance_group_obj
+from nova.openstack.common import jsonutils
+from nova.openstack.common import timeutils
+from nova.scheduler import filter_scheduler
+from nova.tests import benchmark_utils
+
+
+FLAVORS = [
+    dict(name='m1.small', flavorid='2', memory_mb=2048, vcpus=1,
+         root_gb=20, ephemeral_gb=0, swap=0, extra_specs={}),
+    dict(name='m1.medium', flavorid='3', memory_mb=4096, vcpus=2,
+         root_gb=40, ephemeral_gb=0, swap=0, extra_specs={}),
+    dict(name='m1.large', flavorid='4', memory_mb=8192, vcpus=4,
+         root_gb=80, ephemeral_gb=0, swap=0, extra_specs={}),
+]
+
+# (memory_mb, vcpus, local_gb) of the hardware making up a fleet
+HOST_MODELS = [
+    (65536, 16, 1024),
+    (131072, 32, 2048),
+    (262144, 48, 4096),
+]
+
+PCI_POOLS = [
+    dict(vendor_id='8086', product_id='10ed', extra_info={}),
+    dict(vendor_id='15b3', product_id='1004', extra_info={}),
+]
+
+
+def generate_compute_nodes(num_hosts, seed=0):
+    """Return num_hosts compute_nodes rows, as db.compute_node_get_all()."""
+    rand = random.Random(seed)
+    now = timeutils.utcnow()
+    compute_nodes = []
+    for i in xrange(num_hosts):
+        host = 'host%05d' % i
+        memory_mb, vcpus, local_gb = rand.choice(HOST_MODELS)
+        vcpus_used = rand.randint(0, vcpus)
+        num_instances = rand.randint(0, vcpus_used)
+        memory_mb_used = min(memory_mb, num_instances * 4096)
+        local_gb_used = min(local_gb, num_instances * 40)
+        stats = {'num_instances': num_instances,
+                 'io_workload': rand.randint(0, 4),
+                 'num_vm_active': num_instances,
+                 'num_task_None': num_instances,
+                 'num_os_type_linux': num_instances}
+        for project in xrange(rand.randint(0, 3)):
+            stats['num_proj_project%d' % project] = 1
+        metrics = [dict(name='cpu.percent', value=rand.random(),
+                        timestamp=timeutils.strtime(now), source='libvirt'),
+                   dict(name='cpu.frequency', value=2400,
+                        timestamp=timeutils.strtime(now), source='libvirt')]
+        service = dict(id=i + 1, host=host, binary='nova-compute',
+                       topic='compute', report_count=1,
+                       disabled=rand.random() < 0.01, disabled_reason=None,
+                       created_at=now, updated_at=now, deleted_at=None,
+                       deleted=0)
+        compute = dict(id=i + 1, service_id=i + 1, service=service,
+                       hypervisor_hostname=host,
+                       host_ip='10.%d.%d.%d' % (i >> 16, (i >> 8) & 255,
+                                                i & 255),
+                       hypervisor_type='QEMU', hypervisor_version=1002000,
+                       cpu_info='',
+                       supported_instances=jsonutils.dumps(
+                           [['x86_64', 'qemu', 'hvm'],
+                            ['x86_64', 'kvm', 'hvm']]),
+                       memory_mb=memory_mb,
+                       memory_mb_used=memory_mb_used,
+                       free_ram_mb=memory_mb - memory_mb_used,
+                       vcpus=vcpus, vcpus_used=vcpus_used,
+                       local_gb=local_gb, local_gb_used=local_gb_used,
+                       free_disk_gb=local_gb - local_gb_used,
+                       disk_available_least=local_gb - local_gb_used,
+                       running_vms=num_instances,
+                       current_workload=stats['io_workload'],
+                       stats=jsonutils.dumps(stats),
+                       metrics=jsonutils.dumps(metrics),
+                       created_at=now, updated_at=now, deleted_at=None,
+                       deleted=0)
+        if rand.random() < 0.1:
+            pool = dict(rand.choice(PCI_POOLS), count=rand.randint(1, 8))
+            compute['pci_stats'] = jsonutils.dumps([pool])
+        compute_nodes.append(compute)
+    return compute_nodes
+
+
+def generate_aggregates(compute_nodes, num_zones=4, seed=0):
+    """Return the aggregate metadata of each host of compute_nodes.
+
+    Hosts are spread over num_zones availability zones, and some of them
+    are also members of aggregates with SSD disks or reserved to a tenant.
+    The result is {host: {key: set(values)}}, as returned by
+    db.aggregate_metadata_get_by_host().
+    """
+    rand = random.Random(seed)
+    aggregates = {}
+    for i, compute in enumerate(compute_nodes):
+        metadata = {'availability_zone': set(['az%d' % (i % num_zones)])}
+        if rand.random() < 0.25:
+            metadata['ssd'] = set(['true'])
+        if rand.random() < 0.05:
+            metadata['filter_tenant_id'] = set(['project0'])
+        aggregates[compute['service']['host']] = metadata
+    return aggregates
+
+
+class FakeInstanceGroup(object):
+    """Instance group looked up by the FilterScheduler for group hints."""
+
+    def __init__(self, policies):
+        self.policies = policies
+
+    def get_hosts(self, context, exclude=None):
+        return []
+
+
+def _request(flavor, num_instances=1, availability_zone=None, group=None):
+    instance_properties = dict(project_id='project0', user_id='user0',
+                               os_type='linux',
+                               availability_zone=availability_zone,
+                               memory_mb=flavor['memory_mb'],
+                               vcpus=flavor['vcpus'],
+                               root_gb=flavor['root_gb'],
+                               ephemeral_gb=flavor['ephemeral_gb'])
+    request_spec = dict(instance_type=dict(flavor),
+                        instance_properties=instance_properties,
+                        image=dict(properties={}),
+                        num_instances=num_instances)
+    filter_properties = {}
+    if group:
+        filter_properties['scheduler_hints'] = {'group': group}
+    return request_spec, filter_properties
+
+
+def single_boot_request(rand, num):
+    """A single instance of a random flavor."""
+    return _request(rand.choice(FLAVORS))
+
+
+def multi_boot_request(rand, num):
+    """Many instances of the same flavor in one request."""
+    return _request(rand.choice(FLAVORS), num_instances=50)
+
+
+def availability_zone_request(rand, num):
+    """A single instance in a given availability zone."""
+    return _request(rand.choice(FLAVORS), availability_zone='az0')
+
+
+def anti_affinity_request(rand, num):
+    """Instances of a new anti-affinity group."""
+    return _request(FLAVORS[0], num_instances=10,
+                    group='anti-affinity-%d' % num)
+
+
+# { name : (request generator, share of the requests of a mix) }
+REQUEST_MIX = {
+    'single': (single_boot_request, 0.6),
+    'availability_zone': (availability_zone_request, 0.2),
+    'multi': (multi_boot_request, 0.1),
+    'anti_affinity': (anti_affinity_request, 0.1),
+}
+
+
+def _maxrss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Timings(object):
+    """Accumulate the time spent in methods of the filters and weighers."""
+
+    def __init__(self):
+        # { name : [calls, seconds] }
+        self.timings = {}
+
+    def wrap(self, name, func):
+        def timed(*args, **kwargs):
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+                # NOTE: filter_all() returns a generator, so the filter
+                # only runs once the result is consumed.
+                if isinstance(result, types.GeneratorType):
+                    result = list(result)
+                return result
+            finally:
+                timing = self.timings.setdefault(name, [0, 0.0])
+                timing[0] += 1
+                timing[1] += time.time() - start
+        return timed
+
+    def report(self):
+        return dict((name, {'calls': calls, 'seconds': seconds})
+                    for name, (calls, seconds) in self.timings.iteritems())
+
+
+class SchedulerBenchmark(object):
+    """Replay requests against a FilterScheduler over a synthetic fleet.
+
+    The scheduler uses the filters and weighers configured by
+    scheduler_default_filters and scheduler_weight_classes.  RPC needs to
+    be initialized, as for any FilterScheduler.
+    """
+
+    def __init__(self, compute_nodes, aggregates=None, seed=0):
+        self.compute_nodes = compute_nodes
+        self.aggregates = aggregates or {}
+        self.seed = seed
+        self.context = context.get_admin_context()
+
+    def _compute_node_get_all(self, context):
+        # NOTE: the services keep reporting in, otherwise ComputeFilter
+        # would consider them down once service_down_time has passed.
+        now = timeutils.utcnow()
+        for compute in self.compute_nodes:
+            compute['service']['updated_at'] = now
+        return self.compute_nodes
+
+    def _aggregate_metadata_get_by_host(self, context, host, key=None):
+        metadata = self.aggregates.get(host, {})
+        if key is not None:
+            return dict((k, v) for k, v in metadata.iteritems() if k == key)
+        return metadata
+
+    def _patch(self, timings, scheduler):
+        patches = [
+            mock.patch.object(db, 'compute_node_get_all',
+                              side_effect=self._compute_node_get_all),
+            mock.patch.object(db, 'aggregate_metadata_get_by_host',
+                    side_effect=self._aggregate_metadata_get_by_host),
+            mock.patch.object(instance_group_obj.InstanceGroup,
+                              'get_by_hint',
+                              return_value=FakeInstanceGroup(
+                                  ['anti-affinity'])),
+        ]
+        hm = scheduler.host_manager
+        # Get the original methods of all classes before patching any, in
+        # case some of them are subclasses of others.
+        methods = []
+        for filter_cls in hm.filter_classes:
+            methods.append((filter_cls, 'filter_all', filter_cls.filter_all))
+            methods.append((filter_cls, 'filter_batch',
+                            filter_cls.filter_batch))
+        for weigher_cls in hm.weight_classes:
+            methods.append((weigher_cls, 'weigh_objects',
+                            weigher_cls.weigh_objects))
+            methods.append((weigher_cls, 'weigh_batch',
+                            weigher_cls.weigh_batch))
+        for cls, name, method in methods:
+            patches.append(mock.patch.object(cls, name,
+                    timings.wrap(cls.__name__, method)))
+        patches.append(mock.patch.object(hm, 'get_all_host_states',
+                timings.wrap('get_all_host_states', hm.get_all_host_states)))
+        return patches
+
+    def run(self, num_requests, mix=None):
+        """Run num_requests requests of the mix and return a report.
+
+        mix is a dict of {name: (request generator, share)} and defaults
+        to REQUEST_MIX.
+        """
+        mix = mix or REQUEST_MIX
+        rand = random.Random(self.seed)
+        names = sorted(mix)
+        shares = [mix[name][1] for name in names]
+        total_share = float(sum(shares))
+
+        rss_start = _maxrss_kb()
+        scheduler = filter_scheduler.FilterScheduler()
+        timings = Timings()
+        patches = self._patch(timings, scheduler)
+        for patch in patches:
+            patch.start()
+        latencies = dict((name, []) for name in names)
+        failures = dict((name, 0) for name in names)
+        try:
+            # Load the fleet, so the first request is not an outlier
+            scheduler.host_manager.get_all_host_states(self.context)
+            rss_loaded = _maxrss_kb()
+            timings.timings.clear()
+
+            for num in xrange(num_requests):
+                pick = rand.random() * total_share
+                for name, share in zip(names, shares):
+                    pick -= share
+                    if pick < 0:
+                        break
+                request_spec, filter_properties = mix[name][0](rand, num)
+                start = time.time()
+                try:
+                    scheduler.select_destinations(self.context,
+                            request_spec, filter_properties)
+                except exception.NoValidHost:
+                    failures[name] += 1
+                latencies[name].append(time.time() - start)
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+        all_latencies = []
+        requests = {}
+        for name in names:
+            all_latencies.extend(latencies[name])
+            requests[name] = self._latency_report(latencies[name])
+            requests[name]['no_valid_host'] = failures[name]
+        requests['all'] = self._latency_report(all_latencies)
+        requests['all']['no_valid_host'] = sum(failures.values())
+
+        filter_names = set(cls.__name__
+                           for cls in scheduler.host_manager.filter_classes)
+        step_timings = timings.report()
+        return {
+            'hosts': len(self.compute_nodes),
+            'requests': requests,
+            'filters': dict((name, timing)
+                            for name, timing in step_timings.iteritems()
+                            if name in filter_names),
+            'weighers': dict((name, timing)
+                             for name, timing in step_timings.iteritems()
+                             if name not in filter_names and
+                                name != 'get_all_host_states'),
+            'host_states': step_timings.get('get_all_host_states'),
+            'memory': {'maxrss_kb': _maxrss_kb(),
+                       'fleet_kb': rss_loaded - rss_start},
+        }
+
+    @staticmethod
+    def _latency_report(latencies):
+        if not latencies:
+            return {'count': 0, 'p50_ms': None, 'p99_ms': None}
+        return {'count': len(latencies),
+                'p50_ms': benchmark_utils.percentile(latencies, 50) * 1000,
+                'p99_ms': benchmark_utils.percentile(latencies, 99) * 1000}
+
+
+def format_report(report):
+    """Return the lines of a human readable benchmark report."""
+    def ms(value):
+        return '-' if value is None else '%.2f' % value
+
+    lines = ['Fleet of %d hosts' % report['hosts'],
+             '  %-20s %8s %10s %10s %12s' % ('request', 'count', 'p50 ms',
+                                             'p99 ms', 'NoValidHost')]
+    for name, latency in sorted(report['requests'].iteritems()):
+        lines.append('  %-20s %8d %10s %10s %12d' % (
+                name, latency['count'], ms(latency['p50_ms']),
+                ms(latency['p99_ms']), latency['no_valid_host']))
+    for kind in ('filters', 'weighers'):
+        lines.append('  %-36s %8s %12s' % (kind, 'calls', 'seconds'))
+        for name, timing in sorted(report[kind].iteritems(),
+                                   key=lambda item: -item[1]['seconds']):
+            lines.append('  %-36s %8d %12.4f' % (name, timing['calls'],
+                                                 timing['seconds']))
+    if report['host_states']:
+        lines.append('  %-36s %8d %12.4f' % ('get_all_host_states',
+                report['host_states']['calls'],
+                report['host_states']['seconds']))
+    lines.append('  max RSS %(maxrss_kb)d KB, fleet %(fleet_kb)d KB' %
+                 report['memory'])
+    return lines
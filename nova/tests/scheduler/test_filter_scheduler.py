@@ -31,6 +31,7 @@ from nova.objects import instance_group as instance_group_obj
 from nova.pci import pci_request
 from nova.scheduler import driver
 from nova.scheduler import filter_scheduler
+from nova.scheduler.filters import ram_filter
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
@@ -476,6 +477,49 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         # one host should be chose
         self.assertEqual(len(hosts), 1)
 
+    def _schedule_batch_placement(self, batch_placement):
+        self.flags(scheduler_batch_placement=batch_placement,
+                   scheduler_default_filters=['RamFilter',
+                                              'NumInstancesFilter'],
+                   scheduler_weight_classes=[
+                       'nova.scheduler.weights.ram.RAMWeigher'],
+                   max_instances_per_host=3)
+        sched = fakes.FakeFilterScheduler()
+        self.stubs.Set(db, 'compute_node_get_all',
+                       lambda context: fakes.COMPUTE_NODES)
+
+        instance_properties = {'project_id': 1,
+                               'root_gb': 1,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux'}
+        request_spec = {'num_instances': 8,
+                        'instance_type': {'memory_mb': 512, 'root_gb': 1,
+                                          'ephemeral_gb': 0, 'vcpus': 1},
+                        'instance_properties': instance_properties}
+        hosts = sched._schedule(self.context, request_spec, {})
+        return [(host.obj.host, host.weight) for host in hosts]
+
+    def test_schedule_batch_placement(self):
+        expected = self._schedule_batch_placement(False)
+        self.assertEqual(8, len(expected))
+        self.assertEqual(expected, self._schedule_batch_placement(True))
+
+    def test_schedule_batch_placement_rechecks_changed_hosts(self):
+        calls = []
+
+        def _fake_host_passes(_self, host_state, filter_properties):
+            calls.append(host_state.host)
+            return True
+
+        self.stubs.Set(ram_filter.BaseRamFilter, 'host_passes',
+                       _fake_host_passes)
+        self._schedule_batch_placement(True)
+        # All four hosts for the first instance, then only the host chosen
+        # for the previous instance.
+        self.assertEqual(4 + 7, len(calls))
+
     def test_schedule_chooses_best_host(self):
         """If scheduler_host_subset_size is 1, the largest host with greatest
         weight should be returned.
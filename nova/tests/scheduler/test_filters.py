@@ -204,3 +204,30 @@ class FiltersTestCase(test.NoDBTestCase):
                                                      filter_objs_initial,
                                                      filter_properties)
         self.assertIsNone(result)
+
+    def test_get_filtered_objects_stats(self):
+        class OddFilter(filters.BaseFilter):
+            def _filter_one(self, obj, filter_properties):
+                return obj % 2 == 1
+
+        def _fake_base_loader_init(*args, **kwargs):
+            pass
+
+        self.stubs.Set(loadables.BaseLoader, '__init__',
+                       _fake_base_loader_init)
+
+        filter_handler = filters.BaseFilterHandler(filters.BaseFilter)
+        filter_classes = [Filter1, OddFilter]
+        filter_handler.get_filtered_objects(filter_classes, range(10), {})
+        filter_handler.get_filtered_objects(filter_classes, range(4), {})
+
+        stats = filter_handler.pop_filter_stats()
+        self.assertEqual(['Filter1', 'OddFilter'], sorted(stats))
+        self.assertEqual(2, stats['Filter1']['calls'])
+        self.assertEqual(14, stats['Filter1']['objs_in'])
+        self.assertEqual(14, stats['Filter1']['objs_out'])
+        self.assertEqual(2, stats['OddFilter']['calls'])
+        self.assertEqual(14, stats['OddFilter']['objs_in'])
+        self.assertEqual(7, stats['OddFilter']['objs_out'])
+        self.assertTrue(stats['OddFilter']['seconds'] >= 0.0)
+        self.assertEqual({}, filter_handler.pop_filter_stats())
@@ -15,6 +15,10 @@
 """
 Tests For HostManager
 """
+import datetime
+
+import mox
+
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
@@ -373,6 +377,96 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+class HostManagerIncrementalTestCase(test.NoDBTestCase):
+    """Test case for HostManager with incremental host state refreshes."""
+
+    def setUp(self):
+        super(HostManagerIncrementalTestCase, self).setUp()
+        self.flags(scheduler_incremental_host_states=True)
+        self.host_manager = host_manager.HostManager()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.compute_nodes = []
+        for node in fakes.COMPUTE_NODES[:4]:
+            node = dict(node, deleted=0)
+            node['service'] = dict(node['service'], id=node['id'])
+            self.compute_nodes.append(node)
+
+    def test_get_all_host_states_incremental(self):
+        context = 'fake_context'
+        start = timeutils.utcnow()
+        changed_since = start - datetime.timedelta(
+                seconds=host_manager.CHANGED_SINCE_OVERLAP_SECONDS)
+        changed_node = dict(self.compute_nodes[0], free_ram_mb=256)
+        changed_service = dict(self.compute_nodes[1]['service'],
+                               disabled=False)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'service_get_all_changed_since')
+        db.compute_node_get_all(context).AndReturn(self.compute_nodes)
+        db.compute_node_get_all_changed_since(
+                context, changed_since).AndReturn([changed_node])
+        db.service_get_all_changed_since(
+                context, changed_since,
+                binary='nova-compute').AndReturn([changed_service])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+
+        self.assertEqual(4, len(host_states_map))
+        self.assertEqual(256, host_states_map[('host1', 'node1')].free_ram_mb)
+        self.assertFalse(
+                host_states_map[('host2', 'node2')].service['disabled'])
+        stats = self.host_manager.get_host_state_stats()
+        self.assertEqual(1, stats['full_refreshes'])
+        self.assertEqual(1, stats['incremental_refreshes'])
+        self.assertEqual(1, stats['last_refresh_nodes'])
+        self.assertEqual(4, stats['num_hosts'])
+        self.assertEqual(0, stats['staleness'])
+
+    def test_get_all_host_states_incremental_deleted(self):
+        context = 'fake_context'
+        deleted_node = dict(self.compute_nodes[3], deleted=4)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'service_get_all_changed_since')
+        db.compute_node_get_all(context).AndReturn(self.compute_nodes)
+        db.compute_node_get_all_changed_since(
+                context, mox.IgnoreArg()).AndReturn([deleted_node])
+        db.service_get_all_changed_since(
+                context, mox.IgnoreArg(), binary='nova-compute').AndReturn([])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+
+        self.assertEqual(3, len(host_states_map))
+        self.assertNotIn(('host4', 'node4'), host_states_map)
+
+    def test_get_all_host_states_full_refresh_interval(self):
+        context = 'fake_context'
+        self.flags(scheduler_host_states_full_refresh_interval=60)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        db.compute_node_get_all(context).AndReturn(self.compute_nodes)
+        db.compute_node_get_all(context).AndReturn(self.compute_nodes[:2])
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        timeutils.advance_time_seconds(61)
+        self.host_manager.get_all_host_states(context)
+
+        self.assertEqual(2, len(self.host_manager.host_state_map))
+        stats = self.host_manager.get_host_state_stats()
+        self.assertEqual(2, stats['full_refreshes'])
+        self.assertEqual(0, stats['incremental_refreshes'])
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
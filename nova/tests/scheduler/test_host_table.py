@@ -0,0 +1,155 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For batch evaluation of scheduler filters and weighers.
+"""
+
+import testtools
+
+from nova import exception
+from nova.scheduler import filters
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_manager
+from nova.scheduler import host_table
+from nova.scheduler import weights
+from nova.scheduler.weights import metrics
+from nova.scheduler.weights import ram
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+class FakeOddFilter(filters.BaseHostFilter):
+    """Filter without batch support, passing every other host."""
+    def host_passes(self, host_state, filter_properties):
+        return host_state.num_instances % 2 == 1
+
+
+@testtools.skipIf(host_table.numpy is None, "numpy is not installed")
+class HostStateTableTestCase(test.NoDBTestCase):
+    """Test case for batch filtering and weighing of host states."""
+
+    def setUp(self):
+        super(HostStateTableTestCase, self).setUp()
+        self.flags(scheduler_batch_evaluation=True)
+        self.filter_handler = filters.HostFilterHandler()
+        self.weight_handler = weights.HostWeightHandler()
+        self.hosts = []
+        for i in xrange(10):
+            self.hosts.append(fakes.FakeHostState('host%s' % i, 'node',
+                    {'free_ram_mb': 512 * i,
+                     'total_usable_ram_mb': 4096,
+                     'free_disk_mb': 1024 * i,
+                     'total_usable_disk_gb': 10,
+                     'vcpus_total': 4,
+                     'vcpus_used': i,
+                     'num_instances': i,
+                     'num_io_ops': i}))
+
+    def _filter(self, filter_classes, filter_properties, batch=True):
+        self.flags(scheduler_batch_evaluation=batch)
+        return self.filter_handler.get_filtered_objects(filter_classes,
+                self.hosts, filter_properties)
+
+    def _assert_batch_matches(self, filter_classes, filter_properties):
+        expected = self._filter(filter_classes, filter_properties,
+                                batch=False)
+        expected_limits = [dict(host.limits) for host in expected]
+        for host in self.hosts:
+            host.limits = {}
+        result = self._filter(filter_classes, filter_properties)
+        self.assertEqual(expected, result)
+        self.assertEqual(expected_limits, [host.limits for host in result])
+        self.assertNotEqual([], result)
+        self.assertNotEqual(self.hosts, result)
+
+    def test_get_host_state_table_disabled(self):
+        self.flags(scheduler_batch_evaluation=False)
+        self.assertIsNone(host_table.get_host_state_table(self.hosts))
+
+    def test_select_and_subset(self):
+        table = host_table.get_host_state_table(self.hosts)
+        selected = table.select(table.num_instances >= 5)
+        self.assertEqual(self.hosts[5:], selected.objs)
+        self.assertEqual([5, 6, 7, 8, 9], selected.num_io_ops.tolist())
+        subset = selected.subset([self.hosts[9], self.hosts[6]])
+        self.assertEqual([9, 6], subset.vcpus_used.tolist())
+
+    def test_ram_filter(self):
+        self._assert_batch_matches(
+                [ram_filter.RamFilter],
+                {'instance_type': {'memory_mb': 4096}})
+
+    def test_core_filter(self):
+        self.flags(cpu_allocation_ratio=1.0)
+        self._assert_batch_matches(
+                [core_filter.CoreFilter],
+                {'instance_type': {'vcpus': 2}})
+
+    def test_disk_filter(self):
+        self._assert_batch_matches(
+                [disk_filter.DiskFilter],
+                {'instance_type': {'root_gb': 2, 'ephemeral_gb': 1,
+                                   'swap': 512}})
+
+    def test_num_instances_and_io_ops_filters(self):
+        self.flags(max_instances_per_host=8, max_io_ops_per_host=6)
+        self._assert_batch_matches(
+                [num_instances_filter.NumInstancesFilter,
+                 io_ops_filter.IoOpsFilter],
+                {})
+
+    def test_mixed_batch_and_object_filters(self):
+        self.flags(max_io_ops_per_host=6)
+        classes = [FakeOddFilter, io_ops_filter.IoOpsFilter]
+        result = self.filter_handler.get_filtered_objects(classes,
+                self.hosts, {})
+        self.assertEqual([self.hosts[1], self.hosts[3], self.hosts[5]],
+                         result)
+
+    def test_ram_weigher(self):
+        classes = [ram.RAMWeigher]
+        self.flags(scheduler_batch_evaluation=False)
+        expected = self.weight_handler.get_weighed_objects(classes,
+                self.hosts, {})
+        self.flags(scheduler_batch_evaluation=True)
+        result = self.weight_handler.get_weighed_objects(classes,
+                self.hosts, {})
+        self.assertEqual([(w.obj, w.weight) for w in expected],
+                         [(w.obj, w.weight) for w in result])
+
+    def test_metrics_weigher_unavailable(self):
+        self.flags(weight_setting=['foo=1.0'], required=False,
+                   group='metrics')
+        for i, host in enumerate(self.hosts[1:]):
+            host.metrics = {'foo': host_manager.MetricItem(
+                    value=i, timestamp=None, source='fake')}
+        classes = [metrics.MetricsWeigher]
+        result = self.weight_handler.get_weighed_objects(classes,
+                self.hosts, {})
+        self.assertEqual(self.hosts[9], result[0].obj)
+        self.assertEqual(self.hosts[0], result[-1].obj)
+        self.assertEqual(0.0, result[-1].weight)
+
+    def test_metrics_weigher_required(self):
+        self.flags(weight_setting=['foo=1.0'], required=True,
+                   group='metrics')
+        classes = [metrics.MetricsWeigher]
+        self.assertRaises(exception.ComputeHostMetricNotFound,
+                          self.weight_handler.get_weighed_objects,
+                          classes, self.hosts, {})
@@ -407,6 +407,27 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                           self.manager.select_hosts,
                           self.context, {}, {})
 
+    def test_report_filter_and_weigher_stats(self):
+        stats = {'filters': {'RamFilter': {'calls': 2, 'seconds': 0.5,
+                                           'objs_in': 20, 'objs_out': 15}},
+                 'weighers': {'RAMWeigher': {'calls': 2, 'seconds': 0.25,
+                                             'objs': 15}}}
+        self.mox.StubOutWithMock(self.manager.driver.host_manager,
+                                 'pop_filter_and_weigher_stats')
+        self.mox.StubOutWithMock(self.manager.notifier, 'info')
+        self.manager.driver.host_manager.pop_filter_and_weigher_stats(
+                ).AndReturn(stats)
+        self.manager.notifier.info(self.context,
+                                   'scheduler.filter_weigher.stats',
+                                   dict(stats, host=self.manager.host))
+        self.manager.driver.host_manager.pop_filter_and_weigher_stats(
+                ).AndReturn({'filters': {}, 'weighers': {}})
+
+        self.mox.ReplayAll()
+        self.manager._report_filter_and_weigher_stats(self.context)
+        # Nothing is reported if no request was scheduled since
+        self.manager._report_filter_and_weigher_stats(self.context)
+
     def test_prep_resize_post_populates_retry(self):
         self.manager.driver = fakes.FakeFilterScheduler()
 
@@ -0,0 +1,62 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the scheduler benchmark harness.
+"""
+
+from nova import test
+from nova.tests.scheduler import benchmark
+
+
+class SchedulerBenchmarkTestCase(test.NoDBTestCase):
+    """Test case for the scheduler benchmark harness."""
+
+    def setUp(self):
+        super(SchedulerBenchmarkTestCase, self).setUp()
+        self.flags(scheduler_driver='nova.scheduler.filter_scheduler.'
+                                    'FilterScheduler')
+
+    def _run(self, num_hosts, num_requests):
+        compute_nodes = benchmark.generate_compute_nodes(num_hosts)
+        aggregates = benchmark.generate_aggregates(compute_nodes)
+        harness = benchmark.SchedulerBenchmark(compute_nodes, aggregates)
+        return harness.run(num_requests)
+
+    def test_generate_compute_nodes(self):
+        compute_nodes = benchmark.generate_compute_nodes(20)
+        self.assertEqual(20, len(compute_nodes))
+        self.assertEqual(20, len(set(c['service']['host']
+                                     for c in compute_nodes)))
+        # The fleet only depends on the seed
+        self.assertEqual([c['memory_mb'] for c in compute_nodes],
+                         [c['memory_mb'] for c in
+                          benchmark.generate_compute_nodes(20)])
+        aggregates = benchmark.generate_aggregates(compute_nodes,
+                                                   num_zones=2)
+        self.assertEqual(set(['az1']),
+                         aggregates['host00001']['availability_zone'])
+
+    def test_run(self):
+        report = self._run(50, 20)
+        self.assertEqual(50, report['hosts'])
+        self.assertEqual(20, report['requests']['all']['count'])
+        self.assertEqual(20, sum(latency['count'] for name, latency in
+                                 report['requests'].iteritems()
+                                 if name != 'all'))
+        self.assertIn('RamFilter', report['filters'])
+        self.assertIn('ServerGroupAntiAffinityFilter', report['filters'])
+        self.assertIn('RAMWeigher', report['weighers'])
+        self.assertEqual(20, report['host_states']['calls'])
+        self.assertTrue(benchmark.format_report(report))
@@ -62,6 +62,17 @@ class RamWeigherTestCase(test.NoDBTestCase):
         ctxt = context.get_admin_context()
         return self.host_manager.get_all_host_states(ctxt)
 
+    def test_weigher_stats(self):
+        hostinfo_list = list(self._get_all_hosts())
+        self._get_weighed_host(hostinfo_list)
+        self._get_weighed_host(hostinfo_list[:2])
+
+        stats = self.weight_handler.pop_weigher_stats()
+        self.assertEqual(['RAMWeigher'], stats.keys())
+        self.assertEqual(2, stats['RAMWeigher']['calls'])
+        self.assertEqual(len(hostinfo_list) + 2, stats['RAMWeigher']['objs'])
+        self.assertEqual({}, self.weight_handler.pop_weigher_stats())
+
     def test_default_of_spreading_first(self):
         hostinfo_list = self._get_all_hosts()
 
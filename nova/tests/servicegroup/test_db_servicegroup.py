@@ -13,14 +13,17 @@
 #    under the License.
 
 import datetime
+import time
 
 import fixtures
+import mock
 
 from nova import context
 from nova import db
 from nova.openstack.common import timeutils
 from nova import service
 from nova import servicegroup
+from nova.servicegroup.drivers import db as db_driver
 from nova import test
 
 
@@ -142,3 +145,72 @@ class DBServiceGroupTestCase(test.TestCase):
         self.mox.ReplayAll()
         result = self.servicegroup_api.service_is_up(service)
         self.assertFalse(result)
+
+    def test_report_state_batched(self):
+        self.flags(servicegroup_batch_heartbeats=True)
+        serv = self.useFixture(
+            ServiceFixture(self._host, self._binary, self._topic)).serv
+        serv.start()
+        report_count = serv.service_ref['report_count']
+        self.useFixture(test.TimeOverride())
+        timeutils.advance_time_seconds(self.down_time + 1)
+        self.servicegroup_api._driver._report_state(serv)
+        service_ref = db.service_get_by_args(self._ctx,
+                                             self._host,
+                                             self._binary)
+        self.assertEqual(report_count + 1, service_ref['report_count'])
+        self.assertTrue(self.servicegroup_api.service_is_up(service_ref))
+
+    def test_report_state_batched_updates_service_ref(self):
+        self.flags(servicegroup_batch_heartbeats=True)
+        serv = self.useFixture(
+            ServiceFixture(self._host, self._binary, self._topic)).serv
+        serv.start()
+        driver = self.servicegroup_api._driver
+        service_ref = dict(serv.service_ref, report_count=10)
+        # The service is returned when it is updated right away, as done
+        # by older conductors, and not otherwise.
+        with mock.patch.object(driver.conductor_api, 'service_heartbeat',
+                               side_effect=[service_ref, None]) as heartbeat:
+            driver._report_state(serv)
+            self.assertEqual(service_ref, serv.service_ref)
+            driver._report_state(serv)
+            self.assertEqual(service_ref, serv.service_ref)
+            heartbeat.assert_called_with(mock.ANY, service_ref)
+
+    def test_get_all_cached(self):
+        self.flags(servicegroup_cache_time=10, service_down_time=60)
+        servicegroup.API._driver = None
+        self.servicegroup_api = servicegroup.API()
+        serv1 = self.useFixture(
+            ServiceFixture(self._host + '_1', self._binary,
+                           self._topic)).serv
+        serv1.start()
+        self.assertEqual([serv1.host],
+                         self.servicegroup_api.get_all(self._topic))
+
+        serv2 = self.useFixture(
+            ServiceFixture(self._host + '_2', self._binary,
+                           self._topic)).serv
+        serv2.start()
+        now = time.time()
+        with mock.patch('time.time') as mock_time:
+            mock_time.return_value = now + 9
+            self.assertEqual([serv1.host],
+                             self.servicegroup_api.get_all(self._topic))
+            mock_time.return_value += 1
+            self.assertEqual(sorted([serv1.host, serv2.host]),
+                             sorted(self.servicegroup_api.get_all(
+                                 self._topic)))
+
+    def test_cache_time_capped_below_service_down_time(self):
+        self.flags(servicegroup_cache_time=60, service_down_time=60,
+                   report_interval=10)
+        self.assertEqual(49, db_driver.DbDriver().cache_time)
+        self.flags(servicegroup_batch_heartbeats=True)
+        self.flags(heartbeat_flush_interval=10, group='conductor')
+        self.assertEqual(39, db_driver.DbDriver().cache_time)
+        self.flags(servicegroup_cache_time=30)
+        self.assertEqual(30, db_driver.DbDriver().cache_time)
+        self.flags(service_down_time=5)
+        self.assertEqual(0, db_driver.DbDriver().cache_time)
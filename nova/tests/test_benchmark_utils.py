@@ -0,0 +1,31 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the helpers of the benchmark harnesses.
+"""
+
+from nova import test
+from nova.tests import benchmark_utils
+
+
+class BenchmarkUtilsTestCase(test.NoDBTestCase):
+    """Test case for the helpers of the benchmark harnesses."""
+
+    def test_percentile(self):
+        values = range(1, 101)
+        self.assertEqual(50, benchmark_utils.percentile(values, 50))
+        self.assertEqual(99, benchmark_utils.percentile(values, 99))
+        self.assertEqual(100, benchmark_utils.percentile(values, 100))
+        self.assertIsNone(benchmark_utils.percentile([], 50))
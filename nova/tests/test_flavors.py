@@ -344,6 +344,81 @@ class InstanceTypeToolsTest(test.TestCase):
         flavors.delete_flavor_info(metadata, '', '_')
         self.assertEqual(metadata, {})
 
+    def test_extract_flavor_compact(self):
+        self.flags(compact_flavor_info=True)
+        self._test_extract_flavor('')
+
+    def test_extract_flavor_compact_prefix(self):
+        self.flags(compact_flavor_info=True)
+        self._test_extract_flavor('foo_')
+
+    def test_save_flavor_info_compact(self):
+        self.flags(compact_flavor_info=True)
+        instance_type = flavors.get_default_flavor()
+        metadata = {}
+        flavors.save_flavor_info(metadata, instance_type)
+        flavors.save_flavor_info(metadata, instance_type, 'old_')
+        self.assertEqual(['flavor_info', 'old_flavor_info'],
+                         sorted(metadata.keys()))
+
+    def test_save_flavor_info_compact_replaces_keys(self):
+        instance_type = flavors.get_default_flavor()
+        metadata = {'foo': 'bar'}
+        flavors.save_flavor_info(metadata, instance_type)
+        self.flags(compact_flavor_info=True)
+        flavors.save_flavor_info(metadata, instance_type)
+        self.assertEqual(['flavor_info', 'foo'], sorted(metadata.keys()))
+        self.flags(compact_flavor_info=False)
+        flavors.save_flavor_info(metadata, instance_type)
+        self.assertNotIn('flavor_info', metadata)
+        self.assertIn('instance_type_id', metadata)
+
+    def test_save_flavor_info_compact_too_long(self):
+        self.flags(compact_flavor_info=True)
+        instance_type = dict(flavors.get_default_flavor())
+        instance_type['name'] = 'x' * 255
+        metadata = {}
+        flavors.save_flavor_info(metadata, instance_type)
+        self.assertNotIn('flavor_info', metadata)
+        self.assertEqual('x' * 255, metadata['instance_type_name'])
+        self.assertEqual('x' * 255,
+                         flavors.extract_flavor(
+                             {'system_metadata': metadata})['name'])
+
+    def test_delete_flavor_info_compact(self):
+        instance_type = flavors.get_default_flavor()
+        metadata = {}
+        flavors.save_flavor_info(metadata, instance_type)
+        self.flags(compact_flavor_info=True)
+        flavors.save_flavor_info(metadata, instance_type, '_')
+        flavors.delete_flavor_info(metadata, '', '_')
+        self.assertEqual(metadata, {})
+
+    def test_extract_flavor_compact_returns_copy(self):
+        self.flags(compact_flavor_info=True)
+        metadata = {}
+        flavors.save_flavor_info(metadata, flavors.get_default_flavor())
+        instance = {'system_metadata': metadata}
+        flavors.extract_flavor(instance)['name'] = 'foo'
+        self.assertNotEqual('foo', flavors.extract_flavor(instance)['name'])
+
+    def test_migrate_flavor_info(self):
+        instance_type = flavors.get_default_flavor()
+        metadata = {'foo': 'bar'}
+        flavors.save_flavor_info(metadata, instance_type)
+        flavors.save_flavor_info(metadata, instance_type, 'new_')
+        expected = dict((prefix, flavors.extract_flavor(
+                             {'system_metadata': metadata}, prefix))
+                        for prefix in ('', 'new_'))
+
+        self.assertEqual(2, flavors.migrate_flavor_info(metadata))
+        self.assertEqual(['flavor_info', 'foo', 'new_flavor_info'],
+                         sorted(metadata.keys()))
+        for prefix in ('', 'new_'):
+            self.assertEqual(expected[prefix], flavors.extract_flavor(
+                {'system_metadata': metadata}, prefix))
+        self.assertEqual(0, flavors.migrate_flavor_info(metadata))
+
 
 class InstanceTypeFilteringTest(test.TestCase):
     """Test cases for the filter option available for instance_type_get_all."""
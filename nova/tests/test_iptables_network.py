@@ -15,7 +15,10 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import time
+
 from nova.network import linux_net
+from nova.openstack.common import processutils
 from nova import test
 
 
@@ -276,3 +279,124 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def _large_table(self, num_rules):
+        """Return the iptables-save lines and the table of a large table.
+
+        Both have num_rules rules in chains of this component.  They also
+        have num_rules / 10 shared rules, of which every other one is a top
+        rule with non-zero counts in the current lines, and the others are
+        to be removed.
+        """
+        table = self.manager.ipv4['filter']
+        current_lines = self.sample_filter[:12]
+        num_shared = num_rules / 10
+        for i in xrange(num_shared):
+            current_lines.append('[%d:%d] -A nova-filter-top -s 10.1.%d.%d '
+                                 '-j ACCEPT' % (i + 1, i + 1, i / 256,
+                                                i % 256))
+            rule = linux_net.IptablesRule('nova-filter-top',
+                                          '-s 10.1.%d.%d -j ACCEPT' %
+                                          (i / 256, i % 256),
+                                          wrap=False, top=True)
+            if i % 2:
+                table.remove_rules.append(rule)
+            else:
+                table.rules.append(rule)
+        for i in xrange(num_rules):
+            chain = 'inst-%d' % (i / 10)
+            rule = '-s 10.0.%d.%d -j ACCEPT' % (i / 256, i % 256)
+            if not i % 10:
+                current_lines.append(':%s-%s - [0:0]' % (self.binary_name,
+                                                         chain))
+                table.add_chain(chain)
+            current_lines.append('[0:0] -A %s-%s %s' % (self.binary_name,
+                                                        chain, rule))
+            # NOTE: add_rule() looks for duplicates in all rules, which
+            # is not what is measured here.
+            table.rules.append(linux_net.IptablesRule(chain, rule))
+        current_lines += self.sample_filter[12:]
+        return current_lines, table
+
+    def _test_modify_rules_large_table(self, num_rules):
+        current_lines, table = self._large_table(num_rules)
+        top_rules = [str(rule) for rule in table.rules if rule.top]
+        remove_rules = [str(rule) for rule in table.remove_rules]
+        start = time.time()
+        new_lines = self.manager._modify_rules(current_lines, table,
+                                               'filter')
+        elapsed = time.time() - start
+        self.assertEqual(len(current_lines) - len(remove_rules),
+                         len(new_lines))
+        self.assertEqual(len(new_lines), len(set(new_lines)))
+        self.assertEqual([], table.remove_rules)
+        lines = set(line.split(']', 1)[1] for line in new_lines
+                    if line.startswith('['))
+        for rule in top_rules:
+            self.assertIn(rule.split(']', 1)[1], lines)
+        for rule in remove_rules:
+            self.assertNotIn(rule.split(']', 1)[1], lines)
+        # Counts of the current top rules are kept
+        self.assertIn('[1:1] -A nova-filter-top -s 10.1.0.0 -j ACCEPT',
+                      new_lines)
+        return elapsed
+
+    def test_modify_rules_large_table(self):
+        self._test_modify_rules_large_table(5000)
+
+
+class IpsetManagerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(IpsetManagerTestCase, self).setUp()
+        self.calls = []
+        self.manager = linux_net.IpsetManager(execute=self._execute)
+
+    def _execute(self, *cmd, **kwargs):
+        self.calls.append((cmd, kwargs.get('process_input')))
+        return '', ''
+
+    def test_set_members_creates_set(self):
+        self.manager.set_members('nova-sg1-v4', 4, ['10.0.0.2', '10.0.0.1'])
+        self.assertEqual([(('ipset', '-exist', 'restore'),
+                           'create nova-sg1-v4 hash:ip family inet\n'
+                           'flush nova-sg1-v4\n'
+                           'add nova-sg1-v4 10.0.0.1\n'
+                           'add nova-sg1-v4 10.0.0.2\n')], self.calls)
+        self.assertEqual(set(['10.0.0.1', '10.0.0.2']),
+                         self.manager.sets['nova-sg1-v4'])
+
+    def test_set_members_ipv6(self):
+        self.manager.set_members('nova-sg1-v6', 6, [])
+        self.assertEqual([(('ipset', '-exist', 'restore'),
+                           'create nova-sg1-v6 hash:ip family inet6\n'
+                           'flush nova-sg1-v6\n')], self.calls)
+
+    def test_set_members_updates_changed_members(self):
+        self.manager.sets['nova-sg1-v4'] = set(['10.0.0.1', '10.0.0.2'])
+        self.manager.set_members('nova-sg1-v4', 4, ['10.0.0.2', '10.0.0.3'])
+        self.assertEqual([(('ipset', '-exist', 'restore'),
+                           'add nova-sg1-v4 10.0.0.3\n'
+                           'del nova-sg1-v4 10.0.0.1\n')], self.calls)
+
+    def test_set_members_unchanged(self):
+        self.manager.sets['nova-sg1-v4'] = set(['10.0.0.1'])
+        self.manager.set_members('nova-sg1-v4', 4, ['10.0.0.1'])
+        self.assertEqual([], self.calls)
+
+    def test_destroy(self):
+        self.manager.sets['nova-sg1-v4'] = set()
+        self.manager.destroy('nova-sg1-v4')
+        self.manager.destroy('nova-sg2-v4')
+        self.assertEqual([(('ipset', 'destroy', 'nova-sg1-v4'), None)],
+                         self.calls)
+        self.assertEqual({}, self.manager.sets)
+
+    def test_destroy_in_use(self):
+        def fake_execute(*cmd, **kwargs):
+            raise processutils.ProcessExecutionError()
+        self.manager.execute = fake_execute
+        self.manager.sets['nova-sg1-v4'] = set()
+        self.manager.destroy('nova-sg1-v4')
+        # The set is kept so that it is destroyed by a later call
+        self.assertIn('nova-sg1-v4', self.manager.sets)
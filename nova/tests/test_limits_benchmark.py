@@ -0,0 +1,34 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the rate limiter benchmark harness.
+"""
+
+from nova import test
+from nova.tests import limits_benchmark
+
+
+class LimitsBenchmarkTestCase(test.NoDBTestCase):
+    """Test case for the rate limiter benchmark harness."""
+
+    def test_run(self):
+        for limiter_name in sorted(limits_benchmark.LIMITERS):
+            harness = limits_benchmark.LimitsBenchmark(limiter_name,
+                                                       num_users=2)
+            report = harness.run(1000)
+            self.assertEqual(1000, report['requests'])
+            self.assertTrue(report['limited'])
+            self.assertIn(limiter_name,
+                          limits_benchmark.format_report(report))
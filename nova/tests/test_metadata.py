@@ -28,6 +28,7 @@ try:
 except ImportError:
     import pickle
 
+import eventlet
 from oslo.config import cfg
 import webob
 
@@ -494,6 +495,30 @@ class OpenStackMetadataTestCase(test.TestCase):
         mdjson = mdinst.lookup("/openstack/2012-08-10/meta_data.json")
         self.assertNotIn("random_seed", json.loads(mdjson))
 
+    def test_render(self):
+        inst = self.instance.obj_clone()
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+
+        self.mox.StubOutWithMock(mdinst, 'lookup')
+        mdinst.lookup('/2009-04-04/meta-data/hostname').AndReturn('foo')
+        self.mox.ReplayAll()
+        for i in range(2):
+            self.assertEqual(('foo', base.MIME_TYPE_TEXT_PLAIN),
+                             mdinst.render('/2009-04-04/meta-data/hostname'))
+
+    def test_render_random_seed(self):
+        inst = self.instance.obj_clone()
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+
+        # each request gets its own random seed
+        path = "/openstack/2013-04-04/meta_data.json"
+        body, mimetype = mdinst.render(path)
+        self.assertEqual(base.MIME_TYPE_APPLICATION_JSON, mimetype)
+        self.assertNotEqual(body, mdinst.render(path)[0])
+
+        path = "/openstack/2012-08-10/meta_data.json"
+        self.assertIs(mdinst.render(path), mdinst.render(path))
+
     def test_no_dashes_in_metadata(self):
         # top level entries in meta_data should not contain '-' in their name
         inst = self.instance.obj_clone()
@@ -566,7 +591,7 @@ class MetadataHandlerTestCase(test.TestCase):
             return "foo"
 
         class CallableMD(object):
-            def lookup(self, path_info):
+            def render(self, path_info):
                 return verify
 
         response = fake_request(self.stubs, CallableMD(), "/bar")
@@ -623,6 +648,42 @@ class MetadataHandlerTestCase(test.TestCase):
                                 relpath="/2009-04-04/user-data", address=None)
         self.assertEqual(response.status_int, 500)
 
+    def test_get_metadata_cached(self):
+        calls = []
+
+        def fake_get_metadata(conductor_api, address):
+            calls.append(address)
+            # let the other requests in while the metadata is built
+            eventlet.sleep(0)
+            return self.mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_address', fake_get_metadata)
+        app = handler.MetadataRequestHandler()
+        pool = eventlet.GreenPool()
+        results = [pool.spawn(app.get_metadata_by_remote_address,
+                              '192.168.1.1')
+                   for i in range(5)]
+        self.assertEqual([self.mdinst] * 5, [gt.wait() for gt in results])
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_remote_address('192.168.1.1'))
+        self.assertEqual(['192.168.1.1'], calls)
+
+    def test_get_metadata_not_cached(self):
+        self.flags(metadata_cache_expiration=0)
+        calls = []
+
+        def fake_get_metadata(conductor_api, address):
+            calls.append(address)
+            return self.mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_address', fake_get_metadata)
+        app = handler.MetadataRequestHandler()
+        for i in range(2):
+            self.assertEqual(self.mdinst,
+                             app.get_metadata_by_remote_address(
+                                 '192.168.1.1'))
+        self.assertEqual(['192.168.1.1'] * 2, calls)
+
     def test_invalid_path_is_404(self):
         response = fake_request(self.stubs, self.mdinst,
                                 relpath="/2009-04-04/user-data-invalid")
@@ -18,6 +18,7 @@ import StringIO
 import sys
 
 from nova.cmd import manage
+from nova.compute import flavors
 from nova import context
 from nova import db
 from nova import exception
@@ -415,6 +416,74 @@ class DBCommandsTestCase(test.TestCase):
     def test_archive_deleted_rows_negative(self):
         self.assertEqual(1, self.commands.archive_deleted_rows(-1))
 
+    def test_migrate_flavor_data_negative(self):
+        self.assertEqual(1, self.commands.migrate_flavor_data(-1))
+
+    def test_migrate_flavor_data(self):
+        ctxt = context.get_admin_context()
+        instance_type = flavors.get_default_flavor()
+        sys_meta = flavors.save_flavor_info({}, instance_type)
+        uuids = [db.instance_create(ctxt,
+                                    {'system_metadata': sys_meta})['uuid']
+                 for i in range(3)]
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+
+        self.commands.migrate_flavor_data(2)
+        self.assertEqual('2 of 2 instances migrated\n',
+                         sys.stdout.getvalue())
+        self.commands.migrate_flavor_data()
+
+        for instance_uuid in uuids:
+            migrated = db.instance_system_metadata_get(ctxt, instance_uuid)
+            self.assertNotIn('instance_type_id', migrated)
+            self.assertEqual(flavors.extract_flavor(
+                                 {'system_metadata': sys_meta}),
+                             flavors.extract_flavor(
+                                 {'system_metadata': migrated}))
+        self.assertEqual([], db.instance_system_metadata_get_instance_uuids(
+            ctxt, ['instance_type_id']))
+
+    def test_migrate_flavor_data_skips_unconvertible(self):
+        ctxt = context.get_admin_context()
+        instance_type = flavors.get_default_flavor()
+        long_sys_meta = flavors.save_flavor_info(
+            {}, dict(instance_type, name='x' * 255))
+        db.instance_create(ctxt, {'uuid': '00000000-0000-0000-0000-%012d' % 0,
+                                  'system_metadata': long_sys_meta})
+        sys_meta = flavors.save_flavor_info({}, instance_type)
+        for i in range(1, 3):
+            db.instance_create(ctxt,
+                               {'uuid': '00000000-0000-0000-0000-%012d' % i,
+                                'system_metadata': sys_meta})
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+
+        self.commands.migrate_flavor_data(1)
+        self.commands.migrate_flavor_data(1)
+        self.assertEqual('1 of 2 instances migrated\n'
+                         '1 of 2 instances migrated\n',
+                         sys.stdout.getvalue())
+        self.assertEqual(['00000000-0000-0000-0000-%012d' % 0],
+                         db.instance_system_metadata_get_instance_uuids(
+                             ctxt, ['instance_type_id']))
+
+    def test_migrate_flavor_data_skips_busy_instances(self):
+        ctxt = context.get_admin_context()
+        sys_meta = flavors.save_flavor_info({}, flavors.get_default_flavor())
+        instance_uuid = db.instance_create(
+            ctxt, {'task_state': 'resize_prep',
+                   'system_metadata': sys_meta})['uuid']
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout',
+                                             StringIO.StringIO()))
+
+        self.commands.migrate_flavor_data()
+        self.assertEqual('0 of 1 instances migrated\n',
+                         sys.stdout.getvalue())
+        self.assertEqual(sorted(sys_meta),
+                         sorted(db.instance_system_metadata_get(
+                             ctxt, instance_uuid)))
+
 
 class ServiceCommandsTestCase(test.TestCase):
     def setUp(self):
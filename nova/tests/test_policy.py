@@ -17,12 +17,14 @@
 
 import os.path
 import StringIO
+import time
 
 import six.moves.urllib.request as urlrequest
 
 from nova import context
 from nova import exception
 from nova.openstack.common import policy as common_policy
+from nova.openstack.common import timeutils
 from nova import policy
 from nova import test
 from nova.tests import policy_fixture
@@ -217,6 +219,115 @@ class IsAdminCheckTestCase(test.NoDBTestCase):
                                policy._ENFORCER), True)
 
 
+class CompiledPolicyTestMixin(object):
+    """Runs the tests with the rules compiled."""
+
+    def setUp(self):
+        super(CompiledPolicyTestMixin, self).setUp()
+        self.flags(compile_policy=True)
+        enforcer = policy._ENFORCER
+        if enforcer:
+            rules, default_rule = enforcer.rules, enforcer.rules.default_rule
+            use_conf = enforcer.use_conf
+            policy.reset()
+            policy.init(rules=rules, default_rule=default_rule,
+                        use_conf=use_conf)
+            self.assertIsInstance(policy._ENFORCER, policy.CompiledEnforcer)
+
+
+class CompiledPolicyFileTestCase(CompiledPolicyTestMixin, PolicyFileTestCase):
+
+    def test_check_interval(self):
+        self.flags(policy_check_interval=60)
+        with utils.tempdir() as tmpdir:
+            tmpfilename = os.path.join(tmpdir, 'policy')
+            self.flags(policy_file=tmpfilename)
+            policy.reset()
+
+            action = "example:test"
+            with open(tmpfilename, "w") as policyfile:
+                policyfile.write('{"example:test": ""}')
+            with test.TimeOverride():
+                self.stubs.Set(time, 'time', timeutils.utcnow_ts)
+                policy.enforce(self.context, action, self.target)
+                with open(tmpfilename, "w") as policyfile:
+                    policyfile.write('{"example:test": "!"}')
+                os.utime(tmpfilename, (0, os.path.getmtime(tmpfilename) + 1))
+                # The file is not checked again before the interval
+                policy.enforce(self.context, action, self.target)
+                timeutils.advance_time_seconds(60)
+                self.assertRaises(exception.PolicyNotAuthorized,
+                                  policy.enforce, self.context, action,
+                                  self.target)
+
+
+class CompiledPolicyTestCase(CompiledPolicyTestMixin, PolicyTestCase):
+
+    def setUp(self):
+        super(CompiledPolicyTestCase, self).setUp()
+        rules = {
+            "admin_or_owner": "is_admin:True or project_id:%(project_id)s",
+            "example:admin_or_owner": "rule:admin_or_owner",
+            "example:loop": "role:member or rule:example:loop",
+            "example:admin": "rule:context_is_admin",
+            "example:generic_literal": "'member':member",
+            "example:generic_creds": "user_id:%(user_id)s",
+        }
+        policy.set_rules(dict((k, common_policy.parse_rule(v))
+                              for k, v in rules.items()), overwrite=False)
+
+    def test_enforce_rule_check(self):
+        action = "example:admin_or_owner"
+        policy.enforce(self.context, action, {'project_id': 'fake'})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, {'project_id': 'other'})
+        policy.enforce(self.context.elevated(), action,
+                       {'project_id': 'other'})
+
+    def test_enforce_rule_loop(self):
+        policy.enforce(self.context, "example:loop", self.target)
+
+    def test_enforce_missing_rule(self):
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, "example:admin", self.target)
+
+    def test_enforce_generic(self):
+        policy.enforce(self.context, "example:generic_literal", self.target)
+        action = "example:generic_creds"
+        policy.enforce(self.context, action, {'user_id': 'fake'})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, {'user_id': 'other'})
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+    def test_enforce_memoized(self):
+        action = "example:lowercase_admin"
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+        admin_context = context.RequestContext('admin', 'fake',
+                                               roles=['admin'])
+        policy.enforce(admin_context, action, self.target)
+        self.assertEqual(2, len(policy._ENFORCER._memo))
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          self.context, action, self.target)
+
+        # Rules are compiled again once they change
+        policy.set_rules({action: common_policy.parse_rule('role:member')},
+                         overwrite=False)
+        self.assertEqual({}, policy._ENFORCER._memo)
+        policy.enforce(self.context, action, self.target)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.enforce,
+                          admin_context, action, self.target)
+
+
+class CompiledDefaultPolicyTestCase(CompiledPolicyTestMixin,
+                                    DefaultPolicyTestCase):
+
+    def _set_rules(self, default_rule):
+        self.flags(compile_policy=True)
+        super(CompiledDefaultPolicyTestCase, self)._set_rules(default_rule)
+
+
 class AdminRolePolicyTestCase(test.NoDBTestCase):
     def setUp(self):
         super(AdminRolePolicyTestCase, self).setUp()
@@ -0,0 +1,36 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the policy benchmark harness.
+"""
+
+from nova import test
+from nova.tests import policy_benchmark
+
+
+class PolicyBenchmarkTestCase(test.NoDBTestCase):
+    """Test case for the policy benchmark harness."""
+
+    def test_run(self):
+        reports = []
+        for enforcer_name in sorted(policy_benchmark.ENFORCERS):
+            harness = policy_benchmark.PolicyBenchmark(enforcer_name)
+            report = harness.run(1000)
+            self.assertEqual(1000, report['checks'])
+            self.assertIn(enforcer_name,
+                          policy_benchmark.format_report(report))
+            reports.append(report)
+        # Both enforcers take the same decisions
+        self.assertEqual(reports[0]['allowed'], reports[1]['allowed'])
@@ -228,6 +228,14 @@ class QuotaIntegrationTestCase(test.TestCase):
         assertInstancesReserved(0)
 
 
+class CasQuotaIntegrationTestCase(QuotaIntegrationTestCase):
+
+    def setUp(self):
+        super(CasQuotaIntegrationTestCase, self).setUp()
+        self.stubs.Set(quota.QUOTAS, '_QuotaEngine__driver',
+                       quota.CasQuotaDriver())
+
+
 class FakeContext(object):
     def __init__(self, project_id, quota_class):
         self.is_admin = False
@@ -2108,6 +2116,8 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
             return sync
         self.resources = {}
 
+        self.stubs.Set(sqa_api, 'QUOTA_SYNC_FUNCTIONS',
+                       dict(sqa_api.QUOTA_SYNC_FUNCTIONS))
         for res_name in ('instances', 'cores', 'ram', 'fixed_ips'):
             method_name = '_sync_%s' % res_name
             sqa_api.QUOTA_SYNC_FUNCTIONS[method_name] = make_sync(res_name)
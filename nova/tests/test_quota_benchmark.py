@@ -0,0 +1,48 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the quota benchmark harness.
+"""
+
+from nova import test
+from nova.tests import quota_benchmark
+
+
+class QuotaBenchmarkTestCase(test.TestCase):
+    """Test case for the quota benchmark harness."""
+
+    def test_run(self):
+        for driver_name in sorted(quota_benchmark.DRIVERS):
+            harness = quota_benchmark.QuotaBenchmark(driver_name,
+                                                     project_id=driver_name)
+            report = harness.run(4, 10)
+            self.assertEqual(40, report['requests'])
+            self.assertEqual(40, report['committed'] +
+                             report['rolled_back'] + report['over_quota'])
+            self.assertTrue(report['committed'])
+            self.assertTrue(report['consistent'])
+            self.assertIn(driver_name,
+                          quota_benchmark.format_report(report))
+
+    def test_run_over_quota(self):
+        self.flags(quota_instances=2)
+        for driver_name in sorted(quota_benchmark.DRIVERS):
+            harness = quota_benchmark.QuotaBenchmark(driver_name,
+                                                     project_id=driver_name,
+                                                     rollback_ratio=0)
+            report = harness.run(4, 1)
+            self.assertEqual(2, report['committed'])
+            self.assertEqual(2, report['over_quota'])
+            self.assertTrue(report['consistent'])
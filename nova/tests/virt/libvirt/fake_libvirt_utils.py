@@ -94,6 +94,14 @@ def get_disk_backing_file(path):
     return disk_backing_files.get(path, None)
 
 
+class DiskInfoCache(object):
+    def get_disk_info(self, path):
+        return disk_sizes.get(path, 0), disk_backing_files.get(path, None)
+
+    def prune(self, paths):
+        pass
+
+
 def get_disk_type(path):
     return disk_type
 
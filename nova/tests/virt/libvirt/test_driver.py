@@ -36,11 +36,13 @@ from nova.compute import flavors
 from nova.compute import manager
 from nova.compute import power_state
 from nova.compute import task_states
+from nova.compute import utils as compute_utils
 from nova.compute import vm_mode
 from nova.compute import vm_states
 from nova import context
 from nova import db
 from nova import exception
+from nova.network import linux_net
 from nova.network import model as network_model
 from nova.objects import flavor as flavor_obj
 from nova.objects import instance as instance_obj
@@ -4416,20 +4418,6 @@ class LibvirtConnTestCase(test.TestCase):
         os.path.getsize('/test/disk').AndReturn((10737418240))
         os.path.getsize('/test/disk.local').AndReturn((3328599655))
 
-        ret = ("image: /test/disk\n"
-               "file format: raw\n"
-               "virtual size: 20G (21474836480 bytes)\n"
-               "disk size: 3.1G\n"
-               "cluster_size: 2097152\n"
-               "backing file: /test/dummy (actual path: /backing/file)\n")
-
-        self.mox.StubOutWithMock(os.path, "exists")
-        os.path.exists('/test/disk.local').AndReturn(True)
-
-        self.mox.StubOutWithMock(utils, "execute")
-        utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info',
-                      '/test/disk.local').AndReturn((ret, ''))
-
         self.mox.ReplayAll()
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
         info = conn.get_instance_disk_info(instance_ref['name'])
@@ -4509,20 +4497,6 @@ class LibvirtConnTestCase(test.TestCase):
         os.path.getsize('/test/disk').AndReturn((10737418240))
         os.path.getsize('/test/disk.local').AndReturn((3328599655))
 
-        ret = ("image: /test/disk\n"
-               "file format: raw\n"
-               "virtual size: 20G (21474836480 bytes)\n"
-               "disk size: 3.1G\n"
-               "cluster_size: 2097152\n"
-               "backing file: /test/dummy (actual path: /backing/file)\n")
-
-        self.mox.StubOutWithMock(os.path, "exists")
-        os.path.exists('/test/disk.local').AndReturn(True)
-
-        self.mox.StubOutWithMock(utils, "execute")
-        utils.execute('env', 'LC_ALL=C', 'LANG=C', 'qemu-img', 'info',
-                      '/test/disk.local').AndReturn((ret, ''))
-
         self.mox.ReplayAll()
         conn_info = {'driver_volume_type': 'fake'}
         info = {'block_device_mapping': [
@@ -6410,30 +6384,57 @@ class LibvirtConnTestCase(test.TestCase):
                   }
         self.assertEqual(actual, expect)
 
-    def test_failing_vcpu_count(self):
-        """Domain can fail to return the vcpu description in case it's
-        just starting up or shutting down. Make sure None is handled
-        gracefully.
-        """
+    def _fake_stats_domain(self, dom_id, name, info, vcpus=None):
+        class StatsFakeDomain(object):
+            def ID(self):
+                return dom_id
+
+            def name(self):
+                return name
+
+            def UUIDString(self):
+                return 'uuid-%s' % name
 
-        class DiagFakeDomain(object):
-            def __init__(self, vcpus):
-                self._vcpus = vcpus
+            def info(self):
+                if info is None:
+                    raise libvirt.libvirtError("fake-error")
+                return info
 
             def vcpus(self):
-                if self._vcpus is None:
+                if vcpus is None:
                     raise libvirt.libvirtError("fake-error")
-                else:
-                    return ([1] * self._vcpus, [True] * self._vcpus)
+                return ([1] * vcpus, [True] * vcpus)
 
-        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+            def blockStats(self, disk):
+                return (1, 2, 3, 4, -1)
+
+        return StatsFakeDomain()
+
+    def _stub_domains(self, driver, active, defined):
         conn = driver._conn
         self.mox.StubOutWithMock(driver, 'list_instance_ids')
         conn.lookupByID = self.mox.CreateMockAnything()
+        conn.lookupByName = self.mox.CreateMockAnything()
+        conn.listDefinedDomains = self.mox.CreateMockAnything()
 
-        driver.list_instance_ids().AndReturn([1, 2])
-        conn.lookupByID(1).AndReturn(DiagFakeDomain(None))
-        conn.lookupByID(2).AndReturn(DiagFakeDomain(5))
+        driver.list_instance_ids().AndReturn([dom.ID() for dom in active])
+        for dom in active:
+            conn.lookupByID(dom.ID()).AndReturn(dom)
+        conn.listDefinedDomains().AndReturn([dom.name() for dom in defined])
+        for dom in defined:
+            conn.lookupByName(dom.name()).AndReturn(dom)
+
+    def test_failing_vcpu_count(self):
+        """Domain can fail to return the vcpu description in case it's
+        just starting up or shutting down. Make sure None is handled
+        gracefully.
+        """
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self._stub_domains(driver,
+                [self._fake_stats_domain(1, 'inst1', (1, 2048, 2048, 5, 0)),
+                 self._fake_stats_domain(2, 'inst2', (1, 2048, 2048, 5, 0),
+                                         vcpus=5)],
+                [])
 
         self.mox.ReplayAll()
         self.assertEqual(5, driver.get_vcpu_used())
@@ -6443,24 +6444,102 @@ class LibvirtConnTestCase(test.TestCase):
         is None. This is in case of VM state starting up or shutting
         down. None type returned is counted as zero.
         """
+        dom = self._fake_stats_domain(1, 'inst1', (1, 2048, 2048, 5, 0))
+        dom.vcpus = lambda: None
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self._stub_domains(driver, [dom], [])
 
-        class DiagFakeDomain(object):
-            def __init__(self):
-                pass
+        self.mox.ReplayAll()
+        self.assertEqual(0, driver.get_vcpu_used())
 
-            def vcpus(self):
-                return None
+    def test_vcpu_count_skips_domains_without_info(self):
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self._stub_domains(driver,
+                [self._fake_stats_domain(1, 'inst1', None),
+                 self._fake_stats_domain(2, 'inst2', (1, 2048, 2048, 5, 0),
+                                         vcpus=5)],
+                [])
+
+        self.mox.ReplayAll()
+        self.assertEqual(5, driver.get_vcpu_used())
+        # The power state sync looks the domain up on its own
+        self.assertEqual({'uuid-inst2': power_state.RUNNING},
+                         driver.get_power_states())
 
+    def test_vcpu_count_skips_inactive_domains(self):
         driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
-        conn = driver._conn
-        self.mox.StubOutWithMock(driver, 'list_instance_ids')
-        conn.lookupByID = self.mox.CreateMockAnything()
+        self._stub_domains(driver,
+                [self._fake_stats_domain(1, 'inst1', (1, 2048, 2048, 2, 0),
+                                         vcpus=2)],
+                [self._fake_stats_domain(-1, 'inst2', (5, 2048, 0, 4, 0))])
 
-        driver.list_instance_ids().AndReturn([1])
-        conn.lookupByID(1).AndReturn(DiagFakeDomain())
+        self.mox.ReplayAll()
+        self.assertEqual(2, driver.get_vcpu_used())
+
+    def test_domain_stats_snapshot_shared(self):
+        self.flags(domain_stats_snapshot_ttl=60, group='libvirt')
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self._stub_domains(driver,
+                [self._fake_stats_domain(1, 'inst1', (1, 2048, 2048, 2, 0),
+                                         vcpus=2)],
+                [self._fake_stats_domain(-1, 'inst2', (5, 2048, 0, 4, 0))])
 
         self.mox.ReplayAll()
-        self.assertEqual(0, driver.get_vcpu_used())
+        self.assertEqual(2, driver.get_vcpu_used())
+        # The power states come from the same snapshot
+        self.assertEqual({'uuid-inst1': power_state.RUNNING,
+                          'uuid-inst2': power_state.SHUTDOWN},
+                         driver.get_power_states())
+        dom_stats = driver._get_domain_stats()['inst1']
+        self.assertEqual((1, 2, 3, 4, -1), dom_stats.block_stats('vda'))
+
+    def test_domain_stats_snapshot_invalidated_by_events(self):
+        self.flags(domain_stats_snapshot_ttl=60, group='libvirt')
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        self.mox.StubOutWithMock(driver, '_get_domain_stats_by_domain')
+        driver._get_domain_stats_by_domain().AndReturn({})
+        driver._get_domain_stats_by_domain().AndReturn({})
+        self.mox.ReplayAll()
+
+        driver._get_domain_stats()
+        driver._get_domain_stats()
+
+        driver._init_events_pipe()
+        driver._queue_event(virtevent.LifecycleEvent(
+                'cef19ce0-0ca2-11df-855d-b19fbce37686',
+                virtevent.EVENT_LIFECYCLE_STOPPED))
+        with mock.patch.object(driver, 'emit_event'):
+            driver._dispatch_events()
+        driver._get_domain_stats()
+
+    def test_get_all_domain_stats(self):
+        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
+        dom = self._fake_stats_domain(3, 'inst3', None)
+        record = {'state.state': 3, 'balloon.maximum': 4096,
+                  'balloon.current': 2048, 'vcpu.current': 2,
+                  'cpu.time': 1000,
+                  'block.count': 1, 'block.0.name': 'vda',
+                  'block.0.rd.reqs': 1, 'block.0.rd.bytes': 2,
+                  'block.0.wr.reqs': 3, 'block.0.wr.bytes': 4,
+                  'net.count': 1, 'net.0.name': 'tap0',
+                  'net.0.rx.bytes': 1, 'net.0.rx.pkts': 2,
+                  'net.0.rx.errs': 3, 'net.0.rx.drop': 4,
+                  'net.0.tx.bytes': 5, 'net.0.tx.pkts': 6,
+                  'net.0.tx.errs': 7, 'net.0.tx.drop': 8}
+        driver._conn.getAllDomainStats = mock.Mock(
+                return_value=[(dom, record)])
+        with mock.patch.object(driver, 'has_min_version', return_value=True):
+            domain_stats = driver._get_domain_stats()
+
+        dom_stats = domain_stats['inst3']
+        self.assertEqual(power_state.PAUSED, dom_stats.power_state)
+        self.assertEqual(2048, dom_stats.mem)
+        self.assertEqual(2, dom_stats.num_cpu)
+        self.assertEqual(2, dom_stats.vcpus_used())
+        self.assertEqual((1, 2, 3, 4, -1), dom_stats.block_stats('vda'))
+        self.assertIsNone(dom_stats.block_stats('vdb'))
+        self.assertEqual((1, 2, 3, 4, 5, 6, 7, 8),
+                         dom_stats.interface_stats('tap0'))
 
     def test_get_instance_capabilities(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
@@ -7673,7 +7752,7 @@ class IptablesFirewallTestCase(test.TestCase):
         self.fw.add_filters_for_instance(instance_ref, mox.IgnoreArg(),
                                          mox.IgnoreArg())
         self.fw.instance_rules(instance_ref,
-                               mox.IgnoreArg()).AndReturn((None, None))
+                               mox.IgnoreArg()).AndReturn((['fake'], None))
         self.fw.add_filters_for_instance(instance_ref, mox.IgnoreArg(),
                                          mox.IgnoreArg())
         self.mox.ReplayAll()
@@ -7682,6 +7761,111 @@ class IptablesFirewallTestCase(test.TestCase):
         self.fw.instances[instance_ref['id']] = instance_ref
         self.fw.do_refresh_security_group_rules("fake")
 
+    def test_do_refresh_instance_rules_unchanged(self):
+        instance_ref = self._create_instance_ref()
+        self.mox.StubOutWithMock(self.fw, 'instance_rules')
+        self.mox.StubOutWithMock(self.fw, 'add_filters_for_instance',
+                                 use_mock_anything=True)
+        self.fw.instance_rules(instance_ref,
+                               mox.IgnoreArg()).AndReturn((['fake'], []))
+        self.fw.add_filters_for_instance(instance_ref, ['fake'], [])
+        self.fw.instance_rules(instance_ref,
+                               mox.IgnoreArg()).AndReturn((['fake'], []))
+        self.mox.ReplayAll()
+
+        self.fw.prepare_instance_filter(instance_ref, mox.IgnoreArg())
+        self.fw.iptables.ipv4['filter'].dirty = False
+        self.fw.iptables.ipv6['filter'].dirty = False
+        self.fw.do_refresh_instance_rules(instance_ref)
+        # The rules didn't change, so they don't need to be applied again
+        self.assertFalse(self.fw.iptables.dirty())
+
+    def _create_ipset_groups(self, instance_ref, src_instance_ref):
+        admin_ctxt = context.get_admin_context()
+        secgroup = db.security_group_create(admin_ctxt,
+                                            {'user_id': 'fake',
+                                             'project_id': 'fake',
+                                             'name': 'testgroup',
+                                             'description': 'test group'})
+        src_secgroup = db.security_group_create(admin_ctxt,
+                                                {'user_id': 'fake',
+                                                 'project_id': 'fake',
+                                                 'name': 'testsourcegroup',
+                                                 'description': 'src group'})
+        db.security_group_rule_create(admin_ctxt,
+                                      {'parent_group_id': secgroup['id'],
+                                       'protocol': 'tcp',
+                                       'from_port': 80,
+                                       'to_port': 81,
+                                       'group_id': src_secgroup['id']})
+        db.instance_add_security_group(admin_ctxt, instance_ref['uuid'],
+                                       secgroup['id'])
+        db.instance_add_security_group(admin_ctxt, src_instance_ref['uuid'],
+                                       src_secgroup['id'])
+        return src_secgroup
+
+    def test_instance_rules_ipset(self):
+        self.flags(firewall_use_ipset=True)
+        instance_ref = self._create_instance_ref()
+        src_instance_ref = self._create_instance_ref()
+        src_secgroup = self._create_ipset_groups(instance_ref,
+                                                 src_instance_ref)
+        network_info = _fake_network_info(self.stubs, 1)
+        self.stubs.Set(compute_utils, 'get_nw_info_for_instance',
+                       lambda instance: network_info)
+        ips = [ip['address'] for ip in network_info.fixed_ips()
+               if ip['version'] == 4]
+        ipset_name = 'nova-sg%s-v4' % src_secgroup['id']
+
+        with mock.patch.object(self.fw.ipsets, 'set_members') as members:
+            ipv4_rules, ipv6_rules = self.fw.instance_rules(instance_ref,
+                                                            network_info)
+            members.assert_called_once_with(ipset_name, 4, ips)
+        self.assertIn('-j ACCEPT -p tcp -m multiport --dports 80:81 '
+                      '-m set --match-set %s src' % ipset_name, ipv4_rules)
+        for ip in ips:
+            self.assertNotIn('-j ACCEPT -p tcp -m multiport --dports 80:81 '
+                             '-s %s' % ip, ipv4_rules)
+        self.assertEqual(set([ipset_name]),
+                         self.fw.instance_ipsets[instance_ref['id']])
+
+    def test_refresh_security_group_members_ipset(self):
+        self.flags(firewall_use_ipset=True)
+        self.fw.ipsets = linux_net.IpsetManager()
+        self.fw.ipsets.sets['nova-sg1-v4'] = set(['10.0.0.1'])
+        network_info = _fake_network_info(self.stubs, 1)
+        inst = {'info_cache': {'deleted': False}}
+        with contextlib.nested(
+            mock.patch.object(instance_obj.InstanceList,
+                              'get_by_security_group_id',
+                              return_value=[inst]),
+            mock.patch.object(compute_utils, 'get_nw_info_for_instance',
+                              return_value=network_info),
+            mock.patch.object(self.fw.ipsets, 'set_members'),
+            mock.patch.object(self.fw.iptables, 'apply')
+        ) as (get_instances, get_nw_info, set_members, apply):
+            self.fw.refresh_security_group_members(1)
+            # Groups not used by the rules of this host are ignored
+            self.fw.refresh_security_group_members(2)
+            get_instances.assert_called_once_with(mock.ANY, 1)
+            set_members.assert_called_once_with(
+                'nova-sg1-v4', 4, [ip['address'] for ip in
+                                   network_info.fixed_ips()
+                                   if ip['version'] == 4])
+            self.assertFalse(apply.called)
+
+    def test_destroy_unused_ipsets(self):
+        self.flags(firewall_use_ipset=True)
+        self.fw.ipsets = linux_net.IpsetManager()
+        self.fw.ipsets.sets = {'nova-sg1-v4': set(), 'nova-sg2-v4': set()}
+        self.fw.instances = {1: {'id': 1}}
+        self.fw.instance_ipsets = {1: set(['nova-sg1-v4']),
+                                   2: set(['nova-sg2-v4'])}
+        with mock.patch.object(self.fw.ipsets, 'destroy') as destroy:
+            self.fw.destroy_unused_ipsets()
+            destroy.assert_called_once_with('nova-sg2-v4')
+        self.assertEqual({1: set(['nova-sg1-v4'])}, self.fw.instance_ipsets)
+
     def test_unfilter_instance_undefines_nwfilter(self):
         admin_ctxt = context.get_admin_context()
 
@@ -8217,11 +8401,12 @@ disk size: 4.4M''', ''))
         user_id = 'fake'
         project_id = 'fake'
         images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                            max_size=0)
+                            max_size=0).AndReturn('sha1')
 
         self.mox.ReplayAll()
-        libvirt_utils.fetch_image(context, target, image_id,
-                                  user_id, project_id)
+        self.assertEqual('sha1',
+                         libvirt_utils.fetch_image(context, target, image_id,
+                                                   user_id, project_id))
 
     def test_fetch_raw_image(self):
 
@@ -8267,7 +8452,7 @@ disk size: 4.4M''', ''))
         self.stubs.Set(utils, 'execute', fake_execute)
         self.stubs.Set(os, 'rename', fake_rename)
         self.stubs.Set(os, 'unlink', fake_unlink)
-        self.stubs.Set(images, 'fetch', lambda *_, **__: None)
+        self.stubs.Set(images, 'fetch', lambda *_, **__: 'sha1')
         self.stubs.Set(images, 'qemu_img_info', fake_qemu_img_info)
         self.stubs.Set(fileutils, 'delete_if_exists', fake_rm_on_error)
 
@@ -8289,14 +8474,18 @@ disk size: 4.4M''', ''))
                               't.qcow2.part', 't.qcow2.converted'),
                              ('rm', 't.qcow2.part'),
                              ('mv', 't.qcow2.converted', 't.qcow2')]
-        images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                            max_size=1)
+        # The checksum of the download is not the one of the converted image
+        self.assertIsNone(images.fetch_to_raw(context, image_id, target,
+                                              user_id, project_id,
+                                              max_size=1))
         self.assertEqual(self.executes, expected_commands)
 
         target = 't.raw'
         self.executes = []
         expected_commands = [('mv', 't.raw.part', 't.raw')]
-        images.fetch_to_raw(context, image_id, target, user_id, project_id)
+        self.assertEqual('sha1', images.fetch_to_raw(context, image_id,
+                                                     target, user_id,
+                                                     project_id))
         self.assertEqual(self.executes, expected_commands)
 
         target = 'backing.qcow2'
@@ -85,6 +85,21 @@ class ImageCacheManagerTestCase(test.NoDBTestCase):
             self.assertEqual(csum_input.rstrip(),
                              '{"sha1": "%s"}' % csum_output)
 
+    def test_write_stored_checksum_given(self):
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'),
+                       group='libvirt')
+
+            fname = os.path.join(tmpdir, 'aaa')
+            self.stubs.Set(imagecache, '_hash_file', None)
+            imagecache.write_stored_checksum(fname,
+                                             'fdghkfhkgjjksfdgjksjkghsdf')
+            csum_output = imagecache.read_stored_checksum(fname,
+                                                          timestamped=False)
+            self.assertEqual('fdghkfhkgjjksfdgjksjkghsdf', csum_output)
+
     def test_read_stored_checksum_legacy_essex(self):
         with utils.tempdir() as tmpdir:
             self.flags(instances_path=tmpdir)
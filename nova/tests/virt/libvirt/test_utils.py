@@ -15,6 +15,7 @@
 
 import functools
 import os
+import tempfile
 
 import mock
 from oslo.config import cfg
@@ -121,6 +122,71 @@ blah BLAH: bb
         self.assertEqual(2, mock_execute.call_count)
 
 
+class DiskInfoCacheTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(DiskInfoCacheTestCase, self).setUp()
+        self.cache = libvirt_utils.DiskInfoCache()
+
+    def _write_image(self, header, backing_file=None):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            if backing_file:
+                f.write(backing_file)
+        return path
+
+    def _write_qcow2(self, size, backing_file=None):
+        if backing_file:
+            offset = libvirt_utils.QCOW2_HEADER.size
+            header = libvirt_utils.QCOW2_HEADER.pack(
+                    libvirt_utils.QCOW2_MAGIC, 2, offset, len(backing_file),
+                    16, size)
+        else:
+            header = libvirt_utils.QCOW2_HEADER.pack(
+                    libvirt_utils.QCOW2_MAGIC, 3, 0, 0, 16, size)
+        return self._write_image(header, backing_file)
+
+    def test_read_qcow2_header(self):
+        path = self._write_qcow2(10 * 1024 ** 3, '/base/dir/abcdef')
+        self.assertEqual((10 * 1024 ** 3, '/base/dir/abcdef'),
+                         libvirt_utils.read_qcow2_header(path))
+        path = self._write_qcow2(1024)
+        self.assertEqual((1024, None), libvirt_utils.read_qcow2_header(path))
+        path = self._write_image('not a qcow2 image, but a raw one' * 10)
+        self.assertIsNone(libvirt_utils.read_qcow2_header(path))
+
+    @mock.patch.object(images, 'qemu_img_info')
+    def test_get_disk_info(self, mock_qemu_img_info):
+        path = self._write_qcow2(4096, '/base/dir/abcdef')
+        self.assertEqual((4096, 'abcdef'), self.cache.get_disk_info(path))
+        self.assertFalse(mock_qemu_img_info.called)
+
+    @mock.patch.object(libvirt_utils, 'read_qcow2_header')
+    def test_get_disk_info_cached(self, mock_read_qcow2_header):
+        mock_read_qcow2_header.return_value = (4096, None)
+        path = self._write_qcow2(4096)
+        self.assertEqual((4096, None), self.cache.get_disk_info(path))
+        self.assertEqual((4096, None), self.cache.get_disk_info(path))
+        self.assertEqual(1, mock_read_qcow2_header.call_count)
+
+        # The entry is refreshed once the file changes
+        os.utime(path, (0, 0))
+        self.assertEqual((4096, None), self.cache.get_disk_info(path))
+        self.assertEqual(2, mock_read_qcow2_header.call_count)
+
+        self.cache.prune([])
+        self.assertEqual((4096, None), self.cache.get_disk_info(path))
+        self.assertEqual(3, mock_read_qcow2_header.call_count)
+
+    @mock.patch.object(images, 'qemu_img_info')
+    def test_get_disk_info_falls_back_to_qemu_img(self, mock_qemu_img_info):
+        mock_qemu_img_info.return_value = mock.Mock(
+                virtual_size='8192', backing_file='/base/dir/abcdef')
+        path = self._write_image('VMDK' * 20)
+        self.assertEqual((8192, 'abcdef'), self.cache.get_disk_info(path))
+        mock_qemu_img_info.assert_called_once_with(path)
+
+
 class ImageUtilsTestCase(test.NoDBTestCase):
     def test_disk_type(self):
         # Seems like lvm detection
@@ -0,0 +1,132 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from nova import test
+from nova.tests.virt.vmwareapi import stubs
+from nova.virt.vmwareapi import driver
+from nova.virt.vmwareapi import fake
+from nova.virt.vmwareapi import vim_util
+from nova.virt.vmwareapi import vm_util
+
+
+class VMwareInventoryCacheTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(VMwareInventoryCacheTestCase, self).setUp()
+        fake.reset(vc=True)
+        stubs.set_stubs(self.stubs)
+        self.flags(use_inventory_cache=True, group='vmware')
+        self.session = driver.VMwareAPISession()
+        self.vm = self._create_vm('vm-1')
+
+    def _create_vm(self, name):
+        vm = fake.VirtualMachine(name=name, instanceUuid=name)
+        fake._create_object('VirtualMachine', vm)
+        return vm
+
+    def _vm_names(self):
+        vms = self.session._call_method(vim_util, 'get_objects',
+                                        'VirtualMachine',
+                                        ['name', 'runtime.powerState'])
+        return sorted(vm_util.propset_dict(vm.propSet)['name']
+                      for vm in vms.objects)
+
+    def test_reads_served_from_cache(self):
+        self.assertEqual(['vm-1'], self._vm_names())
+        with mock.patch.object(fake.FakeVim, '_retrieve_properties') as rp:
+            self.assertEqual(['vm-1'], self._vm_names())
+            state = self.session._call_method(vim_util,
+                                              'get_dynamic_property',
+                                              self.vm.obj, 'VirtualMachine',
+                                              'runtime.powerState')
+            props = self.session._call_method(vim_util,
+                                              'get_object_properties', None,
+                                              self.vm.obj, 'VirtualMachine',
+                                              ['summary.config.numCpu'])
+        self.assertFalse(rp.called)
+        self.assertEqual('poweredOn', state)
+        self.assertEqual(1, props.objects[0].propSet[0].val)
+
+    def test_uncached_reads_go_to_server(self):
+        guest_id = self.session._call_method(vim_util, 'get_dynamic_property',
+                                             self.vm.obj, 'VirtualMachine',
+                                             'summary.config.guestId')
+        self.assertEqual('otherGuest', guest_id)
+        self.assertTrue(self.session.inventory._stale)
+
+    def test_changes_seen_after_call(self):
+        self.assertEqual(['vm-1'], self._vm_names())
+        vm2 = self._create_vm('vm-2')
+        # The change is not looked for until something went to the server
+        self.assertEqual(['vm-1'], self._vm_names())
+        self.session._call_method(self.session._get_vim(), 'PowerOffVM_Task',
+                                  self.vm.obj)
+        self.assertEqual(['vm-1', 'vm-2'], self._vm_names())
+        self.assertEqual('poweredOff',
+                         self.session._call_method(vim_util,
+                                                   'get_dynamic_property',
+                                                   self.vm.obj,
+                                                   'VirtualMachine',
+                                                   'runtime.powerState'))
+        self.session._call_method(self.session._get_vim(), 'UnregisterVM',
+                                  vm2.obj)
+        self.assertEqual(['vm-1'], self._vm_names())
+
+    @mock.patch('time.time')
+    def test_changes_seen_after_max_age(self, mock_time):
+        mock_time.return_value = 100
+        self.assertEqual(['vm-1'], self._vm_names())
+        self._create_vm('vm-2')
+        mock_time.return_value = 104
+        self.assertEqual(['vm-1'], self._vm_names())
+        mock_time.return_value = 105
+        self.assertEqual(['vm-1', 'vm-2'], self._vm_names())
+
+    def test_get_inner_objects(self):
+        res_pool = fake._get_objects('ResourcePool').objects[0]
+        res_pool.vm.ManagedObjectReference.append(self.vm.obj)
+        vms = self.session._call_method(vim_util, 'get_inner_objects',
+                                        res_pool.obj, 'vm', 'VirtualMachine',
+                                        ['name'])
+        self.assertEqual(['vm-1'],
+                         [vm.propSet[0].val for vm in vms.objects])
+
+    def test_unknown_object_goes_to_server(self):
+        self.assertEqual(['vm-1'], self._vm_names())
+        vm2 = self._create_vm('vm-2')
+        name = self.session._call_method(vim_util, 'get_dynamic_property',
+                                         vm2.obj, 'VirtualMachine', 'name')
+        self.assertEqual('vm-2', name)
+
+    def test_update_failure_falls_back_to_server(self):
+        self.assertEqual(['vm-1'], self._vm_names())
+        collector = self.session.inventory._collector
+        self.session.inventory._stale = True
+        with mock.patch.object(fake.FakeVim, '_wait_for_updates',
+                               side_effect=Exception('fake')):
+            self.assertEqual(['vm-1'], self._vm_names())
+        self.assertIsNone(self.session.inventory._collector)
+        self.assertNotIn(collector.value,
+                         self.session.vim._property_collectors)
+        # Until the next check the reads keep going to the server
+        with mock.patch.object(fake.FakeVim, '_wait_for_updates') as wfu:
+            self.assertEqual(['vm-1'], self._vm_names())
+        self.assertFalse(wfu.called)
+
+    def test_disabled_by_default(self):
+        self.flags(use_inventory_cache=False, group='vmware')
+        session = driver.VMwareAPISession()
+        self.assertIsNone(session.inventory)
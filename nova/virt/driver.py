@@ -171,6 +171,17 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return the power state of all the instances on the hypervisor.
+
+        Returns a dict of {instance uuid: power_state code}, or None if the
+        driver can only get the power state of one instance at a time with
+        get_info().  Instances missing from the dict are looked up with
+        get_info(), so a driver may leave out the instances whose power
+        state it failed to get.
+        """
+        return None
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -38,6 +38,13 @@ firewall_opts = [
     cfg.BoolOpt('allow_same_net_traffic',
                 default=True,
                 help='Whether to allow network traffic from same network'),
+    cfg.BoolOpt('firewall_use_ipset',
+                default=False,
+                help='Whether the iptables firewall driver matches the '
+                     'members of the security groups granted access by a '
+                     'rule with one ipset per group, rather than with one '
+                     'iptables rule per member. Requires ipset. Not '
+                     'supported by the XenAPI firewall driver'),
 ]
 
 CONF = cfg.CONF
@@ -142,8 +149,13 @@ class IptablesFirewallDriver(FirewallDriver):
     def __init__(self, virtapi, **kwargs):
         super(IptablesFirewallDriver, self).__init__(virtapi)
         self.iptables = linux_net.iptables_manager
+        # Set to None by drivers which can't use ipsets
+        self.ipsets = linux_net.ipset_manager
         self.instances = {}
         self.network_infos = {}
+        # The ipv4 and ipv6 rules of each instance, and the ipsets they use
+        self.instance_fw_rules = {}
+        self.instance_ipsets = {}
         self.basically_filtered = False
 
         # Flags for DHCP request rule
@@ -174,6 +186,7 @@ class IptablesFirewallDriver(FirewallDriver):
             self.network_infos.pop(instance['id'])
             self.remove_filters_for_instance(instance)
             self.iptables.apply()
+            self.destroy_unused_ipsets()
         else:
             LOG.info(_('Attempted to unfilter instance which is not '
                      'filtered'), instance=instance)
@@ -182,6 +195,7 @@ class IptablesFirewallDriver(FirewallDriver):
         self.instances[instance['id']] = instance
         self.network_infos[instance['id']] = network_info
         ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
+        self.instance_fw_rules[instance['id']] = (ipv4_rules, ipv6_rules)
         self.add_filters_for_instance(instance, ipv4_rules, ipv6_rules)
         LOG.debug('Filters added to instance', instance=instance)
         self.refresh_provider_fw_rules()
@@ -253,6 +267,7 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def remove_filters_for_instance(self, instance):
         chain_name = self._instance_chain_name(instance)
+        self.instance_fw_rules.pop(instance['id'], None)
 
         self.iptables.ipv4['filter'].remove_chain(chain_name)
         if CONF.use_ipv6:
@@ -323,6 +338,37 @@ class IptablesFirewallDriver(FirewallDriver):
         # return empty list if icmp_type == -1
         return []
 
+    def _use_ipset(self):
+        return CONF.firewall_use_ipset and self.ipsets is not None
+
+    def _ipset_name(self, security_group_id, version):
+        return 'nova-sg%s-v%d' % (security_group_id, version)
+
+    def _security_group_ips(self, instances, version):
+        """Return the fixed ips of a version of the members of a group."""
+        ips = []
+        for instance in instances:
+            if instance['info_cache']['deleted']:
+                LOG.debug('ignoring deleted cache')
+                continue
+            nw_info = compute_utils.get_nw_info_for_instance(instance)
+            ips += [ip['address'] for ip in nw_info.fixed_ips()
+                    if ip['version'] == version]
+        return ips
+
+    def destroy_unused_ipsets(self):
+        """Destroy the ipsets which no rule of a filtered instance uses."""
+        if not self._use_ipset():
+            return
+        used = set()
+        for instance_id in self.instance_ipsets.keys():
+            if instance_id in self.instances:
+                used.update(self.instance_ipsets[instance_id])
+            else:
+                del self.instance_ipsets[instance_id]
+        for name in set(self.ipsets.sets) - used:
+            self.ipsets.destroy(name)
+
     def _build_tcp_udp_rule(self, rule, version):
         if rule['from_port'] == rule['to_port']:
             return ['--dport', '%s' % (rule['from_port'],)]
@@ -339,8 +385,10 @@ class IptablesFirewallDriver(FirewallDriver):
             instance = instance_obj.Instance._from_db_object(
                 ctxt, instance_obj.Instance(), instance, [])
 
+        instance_id = instance['id']
         ipv4_rules = []
         ipv6_rules = []
+        ipsets = set()
 
         # Initialize with basic rules
         self._do_basic_rules(ipv4_rules, ipv6_rules, network_info)
@@ -400,6 +448,20 @@ class IptablesFirewallDriver(FirewallDriver):
                     LOG.debug('Using cidr %r', rule['cidr'], instance=instance)
                     args += ['-s', str(rule['cidr'])]
                     fw_rules += [' '.join(args)]
+                elif rule['grantee_group'] and self._use_ipset():
+                    # NOTE: members are matched with an ipset of the group,
+                    # updated in place when they change.
+                    insts = instance_obj.InstanceList.get_by_security_group(
+                        ctxt, rule['grantee_group'])
+                    ipset_name = self._ipset_name(rule['grantee_group'].id,
+                                                  version)
+                    self.ipsets.set_members(
+                        ipset_name, version,
+                        self._security_group_ips(insts, version))
+                    ipsets.add(ipset_name)
+                    subrule = args + ['-m set --match-set %s src' %
+                                      ipset_name]
+                    fw_rules += [' '.join(subrule)]
                 else:
                     if rule['grantee_group']:
                         insts = (
@@ -426,28 +488,60 @@ class IptablesFirewallDriver(FirewallDriver):
         ipv4_rules += ['-j $sg-fallback']
         ipv6_rules += ['-j $sg-fallback']
 
+        if ipsets:
+            self.instance_ipsets[instance_id] = ipsets
+        else:
+            self.instance_ipsets.pop(instance_id, None)
+
         return ipv4_rules, ipv6_rules
 
     def instance_filter_exists(self, instance, network_info):
         pass
 
     def refresh_security_group_members(self, security_group):
+        if self._use_ipset():
+            self.do_refresh_security_group_ipsets(security_group)
+            return
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
     def refresh_security_group_rules(self, security_group):
         self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
+        self.destroy_unused_ipsets()
 
     def refresh_instance_security_rules(self, instance):
         self.do_refresh_instance_rules(instance)
         self.iptables.apply()
+        self.destroy_unused_ipsets()
+
+    def do_refresh_security_group_ipsets(self, security_group):
+        """Update the members of the ipsets of a group in place."""
+        names = [(version, self._ipset_name(security_group, version))
+                 for version in (4, 6)]
+        names = [(version, name) for version, name in names
+                 if name in self.ipsets.sets]
+        if not names:
+            # No rule of the instances of this host grants access to it
+            return
+        ctxt = context.get_admin_context()
+        insts = instance_obj.InstanceList.get_by_security_group_id(
+            ctxt, security_group)
+        for version, name in names:
+            self.ipsets.set_members(name, version,
+                                    self._security_group_ips(insts, version))
 
     @utils.synchronized('iptables', external=True)
     def _inner_do_refresh_rules(self, instance, ipv4_rules,
                                                ipv6_rules):
+        # NOTE: members of ipsets change without changing the rules, which
+        # then don't need to be applied again.
+        if self.instance_fw_rules.get(instance['id']) == (ipv4_rules,
+                                                          ipv6_rules):
+            return
         self.remove_filters_for_instance(instance)
         self.add_filters_for_instance(instance, ipv4_rules, ipv6_rules)
+        self.instance_fw_rules[instance['id']] = (ipv4_rules, ipv6_rules)
 
     def do_refresh_security_group_rules(self, security_group):
         for instance in self.instances.values():
@@ -62,6 +62,11 @@ def convert_image(source, dest, out_format, run_as_root=False):
 
 
 def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
+    """Download the image to path.
+
+    :returns: the SHA1 of the image when the image service computed it
+              while downloading, None otherwise
+    """
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
@@ -69,13 +74,19 @@ def fetch(context, image_href, path, _user_id, _project_id, max_size=0):
     (image_service, image_id) = glance.get_remote_image_service(context,
                                                                 image_href)
     with fileutils.remove_path_on_error(path):
-        image_service.download(context, image_id, dst_path=path)
+        return image_service.download(context, image_id, dst_path=path)
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
+    """Download the image to path, converting it to raw if
+    CONF.force_raw_images is set.
+
+    :returns: the SHA1 of path when known, that is when the image was not
+              converted and the image service computed it
+    """
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, user_id, project_id,
-          max_size=max_size)
+    checksum = fetch(context, image_href, path_tmp, user_id, project_id,
+                     max_size=max_size)
 
     with fileutils.remove_path_on_error(path_tmp):
         data = qemu_img_info(path_tmp)
@@ -123,5 +134,8 @@ def fetch_to_raw(context, image_href, path, user_id, project_id, max_size=0):
                         data.file_format)
 
                 os.rename(staged, path)
+                checksum = None
         else:
             os.rename(path_tmp, path)
+
+    return checksum
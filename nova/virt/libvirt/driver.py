@@ -212,6 +212,13 @@ libvirt_opts = [
                 help='A path to a device that will be used as source of '
                      'entropy on the host. Permitted options are: '
                      '/dev/random or /dev/hwrng'),
+    cfg.IntOpt('domain_stats_snapshot_ttl',
+               default=10,
+               help='Number of seconds a snapshot of the power state, '
+                    'vcpus, memory, block and interface counters of all '
+                    'domains is shared between periodic tasks. The '
+                    'snapshot is also invalidated by domain lifecycle '
+                    'events. 0 takes a new snapshot for each task'),
     ]
 
 CONF = cfg.CONF
@@ -297,6 +304,15 @@ MIN_QEMU_LIVESNAPSHOT_VERSION = (1, 3, 0)
 MIN_LIBVIRT_BLOCKIO_VERSION = (0, 10, 2)
 # BlockJobInfo management requirement
 MIN_LIBVIRT_BLOCKJOBINFO_VERSION = (1, 1, 1)
+# Bulk domain stats requirement
+MIN_LIBVIRT_ALL_DOMAIN_STATS_VERSION = (1, 2, 8)
+# getAllDomainStats() flags
+VIR_DOMAIN_STATS_STATE = 1
+VIR_DOMAIN_STATS_CPU_TOTAL = 2
+VIR_DOMAIN_STATS_BALLOON = 4
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_DOMAIN_STATS_INTERFACE = 16
+VIR_DOMAIN_STATS_BLOCK = 32
 
 
 def libvirt_error_handler(context, err):
@@ -343,7 +359,10 @@ class LibvirtDriver(driver.ComputeDriver):
         self._event_queue = None
 
         self._disk_cachemode = None
+        self._domain_stats = None
+        self._domain_stats_time = None
         self.image_cache_manager = imagecache.ImageCacheManager()
+        self.disk_info_cache = libvirt_utils.DiskInfoCache()
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
 
         self.disk_cachemodes = {}
@@ -522,6 +541,7 @@ class LibvirtDriver(driver.ComputeDriver):
             try:
                 event = self._event_queue.get(block=False)
                 if isinstance(event, virtevent.LifecycleEvent):
+                    self._invalidate_domain_stats()
                     self.emit_event(event)
                 elif 'conn' in event and 'reason' in event:
                     last_close_event = event
@@ -3514,6 +3534,75 @@ class LibvirtDriver(driver.ComputeDriver):
                 'cpu_time': dom_info[4],
                 'id': virt_dom.ID()}
 
+    def _invalidate_domain_stats(self):
+        self._domain_stats = None
+
+    def _get_domain_stats(self):
+        """Return a DomainStats of every domain on the host, by name.
+
+        The snapshot is shared by all callers for domain_stats_snapshot_ttl
+        seconds, or until a domain lifecycle event is received.
+        """
+        if (self._domain_stats is not None and
+                time.time() - self._domain_stats_time <
+                CONF.libvirt.domain_stats_snapshot_ttl):
+            return self._domain_stats
+
+        if (self.has_min_version(MIN_LIBVIRT_ALL_DOMAIN_STATS_VERSION) and
+                hasattr(self._conn, 'getAllDomainStats')):
+            domain_stats = self._get_all_domain_stats()
+        else:
+            domain_stats = self._get_domain_stats_by_domain()
+        self._domain_stats = domain_stats
+        self._domain_stats_time = time.time()
+        return domain_stats
+
+    def _get_all_domain_stats(self):
+        """Take a snapshot of all domains with a single libvirt call."""
+        flags = (VIR_DOMAIN_STATS_STATE | VIR_DOMAIN_STATS_CPU_TOTAL |
+                 VIR_DOMAIN_STATS_BALLOON | VIR_DOMAIN_STATS_VCPU |
+                 VIR_DOMAIN_STATS_INTERFACE | VIR_DOMAIN_STATS_BLOCK)
+        domain_stats = {}
+        for dom, record in self._conn.getAllDomainStats(flags, 0):
+            dom_stats = DomainStats.from_record(dom, record)
+            domain_stats[dom_stats.name] = dom_stats
+        return domain_stats
+
+    def _get_domain_stats_by_domain(self):
+        """Take a snapshot of all domains, one domain at a time.
+
+        Block and interface counters are only fetched when asked for.
+        """
+        domain_stats = {}
+        domains = []
+        for dom_id in self.list_instance_ids():
+            try:
+                domains.append(self._lookup_by_id(dom_id))
+            except exception.InstanceNotFound:
+                LOG.info(_("libvirt can't find a domain with id: %s") % dom_id)
+        for name in self._conn.listDefinedDomains():
+            try:
+                domains.append(self._lookup_by_name(name))
+            except exception.InstanceNotFound:
+                LOG.info(_("libvirt can't find a domain with name: %s") %
+                         name)
+        for dom in domains:
+            try:
+                dom_stats = DomainStats(dom, dom.info())
+            except libvirt.libvirtError as e:
+                LOG.warn(_LW("Couldn't obtain the stats of domain "
+                             "%(name)s: %(ex)s"),
+                         {"name": dom.name(), "ex": e})
+                continue
+            domain_stats[dom_stats.name] = dom_stats
+            # NOTE(gtt116): give change to do other task.
+            greenthread.sleep(0)
+        return domain_stats
+
+    def get_power_states(self):
+        return dict((dom_stats.uuid, dom_stats.power_state)
+                    for dom_stats in self._get_domain_stats().itervalues())
+
     def _create_domain(self, xml=None, domain=None,
                        instance=None, launch_flags=0, power_on=True):
         """Create a domain.
@@ -3816,25 +3905,9 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt.virt_type == 'lxc':
             return total + 1
 
-        dom_ids = self.list_instance_ids()
-        for dom_id in dom_ids:
-            try:
-                dom = self._lookup_by_id(dom_id)
-                try:
-                    vcpus = dom.vcpus()
-                except libvirt.libvirtError as e:
-                    LOG.warn(_("couldn't obtain the vpu count from domain id:"
-                               " %(id)s, exception: %(ex)s") %
-                               {"id": dom_id, "ex": e})
-                else:
-                    if vcpus is not None and len(vcpus) > 1:
-                        total += len(vcpus[1])
-
-            except exception.InstanceNotFound:
-                LOG.info(_("libvirt can't find a domain with id: %s") % dom_id)
-                continue
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
+        for dom_stats in self._get_domain_stats().itervalues():
+            if dom_stats.is_active():
+                total += dom_stats.vcpus_used()
         return total
 
     def get_memory_mb_used(self):
@@ -3854,15 +3927,12 @@ class LibvirtDriver(driver.ComputeDriver):
         idx3 = m.index('Cached:')
         if CONF.libvirt.virt_type == 'xen':
             used = 0
-            for domain_id in self.list_instance_ids():
-                try:
-                    dom_mem = int(self._lookup_by_id(domain_id).info()[2])
-                except exception.InstanceNotFound:
-                    LOG.info(_("libvirt can't find a domain with id: %s")
-                             % domain_id)
+            for dom_stats in self._get_domain_stats().itervalues():
+                if not dom_stats.is_active():
                     continue
+                dom_mem = int(dom_stats.mem)
                 # skip dom0
-                if domain_id != 0:
+                if dom_stats.id != 0:
                     used += dom_mem
                 else:
                     # the mem reported by dom0 is be greater of what
@@ -4079,6 +4149,7 @@ class LibvirtDriver(driver.ComputeDriver):
            a given host.
         """
         vol_usage = []
+        domain_stats = self._get_domain_stats()
 
         for instance_bdms in compute_host_bdms:
             instance = instance_bdms['instance']
@@ -4092,7 +4163,13 @@ class LibvirtDriver(driver.ComputeDriver):
 
                 LOG.debug("Trying to get stats for the volume %s",
                           volume_id)
-                vol_stats = self.block_stats(instance['name'], mountpoint)
+                dom_stats = domain_stats.get(instance['name'])
+                if dom_stats is not None:
+                    vol_stats = self._snapshot_block_stats(dom_stats,
+                                                           mountpoint)
+                else:
+                    vol_stats = self.block_stats(instance['name'],
+                                                 mountpoint)
 
                 if vol_stats:
                     stats = dict(volume=volume_id,
@@ -4111,6 +4188,17 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return vol_usage
 
+    def _snapshot_block_stats(self, dom_stats, disk):
+        try:
+            return dom_stats.block_stats(disk)
+        except libvirt.libvirtError as e:
+            errcode = e.get_error_code()
+            LOG.info(_('Getting block stats failed, device might have '
+                       'been detached. Instance=%(instance_name)s '
+                       'Disk=%(disk)s Code=%(errcode)s Error=%(e)s'),
+                     {'instance_name': dom_stats.name, 'disk': disk,
+                      'errcode': errcode, 'e': e})
+
     def block_stats(self, instance_name, disk):
         """Note that this function takes an instance name."""
         try:
@@ -4785,8 +4873,8 @@ class LibvirtDriver(driver.ComputeDriver):
 
             disk_type = driver_nodes[cnt].get('type')
             if disk_type == "qcow2":
-                backing_file = libvirt_utils.get_disk_backing_file(path)
-                virt_size = disk.get_disk_size(path)
+                virt_size, backing_file = (
+                    self.disk_info_cache.get_disk_info(path))
                 over_commit_size = int(virt_size) - dk_size
             else:
                 backing_file = ""
@@ -4806,11 +4894,13 @@ class LibvirtDriver(driver.ComputeDriver):
         # Disk size that all instance uses : virtual_size - disk_size
         instances_name = self.list_instances()
         disk_over_committed_size = 0
+        disk_paths = []
         for i_name in instances_name:
             try:
                 disk_infos = jsonutils.loads(
                         self.get_instance_disk_info(i_name))
                 for info in disk_infos:
+                    disk_paths.append(info['path'])
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
             except OSError as e:
@@ -4827,6 +4917,8 @@ class LibvirtDriver(driver.ComputeDriver):
                 pass
             # NOTE(gtt116): give change to do other task.
             greenthread.sleep(0)
+        # Forget the disks of instances which are gone
+        self.disk_info_cache.prune(disk_paths)
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -5273,6 +5365,94 @@ class LibvirtDriver(driver.ComputeDriver):
                                        block_device_mapping)
 
 
+class DomainStats(object):
+    """Power state and resource usage of a domain, from a snapshot of all
+    the domains of the host.
+
+    Unless the snapshot was taken with getAllDomainStats(), the vcpus in
+    use and the block and interface counters are fetched from the domain
+    when first asked for.
+    """
+
+    def __init__(self, domain, info, block=None, interfaces=None):
+        self._domain = domain
+        self.name = domain.name()
+        self.uuid = domain.UUIDString()
+        self.id = domain.ID()
+        (self.state, self.max_mem, self.mem, self.num_cpu,
+         self.cpu_time) = info
+        self._complete = block is not None
+        self._vcpus_used = self.num_cpu if self._complete else None
+        self._block = block or {}
+        self._interfaces = interfaces or {}
+
+    @classmethod
+    def from_record(cls, domain, record):
+        """Create a DomainStats from a getAllDomainStats() record."""
+        info = (record.get('state.state', VIR_DOMAIN_NOSTATE),
+                record.get('balloon.maximum', 0),
+                record.get('balloon.current', 0),
+                record.get('vcpu.current', 0),
+                record.get('cpu.time', 0))
+        block = {}
+        for i in xrange(record.get('block.count', 0)):
+            prefix = 'block.%d.' % i
+            # NOTE: the last field of blockStats() is the number of
+            # errors, which getAllDomainStats() does not report.
+            block[record[prefix + 'name']] = tuple(
+                    record.get(prefix + key, -1)
+                    for key in ('rd.reqs', 'rd.bytes', 'wr.reqs',
+                                'wr.bytes')) + (-1,)
+        interfaces = {}
+        for i in xrange(record.get('net.count', 0)):
+            prefix = 'net.%d.' % i
+            interfaces[record[prefix + 'name']] = tuple(
+                    record.get(prefix + key, -1)
+                    for key in ('rx.bytes', 'rx.pkts', 'rx.errs', 'rx.drop',
+                                'tx.bytes', 'tx.pkts', 'tx.errs', 'tx.drop'))
+        return cls(domain, info, block, interfaces)
+
+    def is_active(self):
+        return self.id >= 0
+
+    @property
+    def power_state(self):
+        return LIBVIRT_POWER_STATE[self.state]
+
+    def vcpus_used(self):
+        """Return the number of vcpus currently used by the domain."""
+        if self._vcpus_used is None:
+            # NOTE: the domain can fail to return its vcpus while it is
+            # starting up or shutting down, which is retried on next call.
+            try:
+                vcpus = self._domain.vcpus()
+            except libvirt.libvirtError as e:
+                LOG.warn(_("couldn't obtain the vpu count from domain id:"
+                           " %(id)s, exception: %(ex)s") %
+                           {"id": self.id, "ex": e})
+                return 0
+            if vcpus is not None and len(vcpus) > 1:
+                self._vcpus_used = len(vcpus[1])
+            else:
+                self._vcpus_used = 0
+        return self._vcpus_used
+
+    def block_stats(self, disk):
+        """Return the counters of a disk, as virDomain.blockStats()."""
+        if disk not in self._block and not self._complete:
+            self._block[disk] = self._domain.blockStats(disk)
+        return self._block.get(disk)
+
+    def interface_stats(self, interface):
+        """Return the counters of an interface, as
+        virDomain.interfaceStats().
+        """
+        if interface not in self._interfaces and not self._complete:
+            self._interfaces[interface] = self._domain.interfaceStats(
+                    interface)
+        return self._interfaces.get(interface)
+
+
 class HostState(object):
     """Manages information about the compute node through libvirt."""
     def __init__(self, driver):
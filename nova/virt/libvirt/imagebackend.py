@@ -32,6 +32,7 @@ from nova import utils
 from nova.virt.disk import api as disk
 from nova.virt import images
 from nova.virt.libvirt import config as vconfig
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import lvm
 from nova.virt.libvirt import utils as libvirt_utils
 
@@ -170,7 +171,15 @@ class Image(object):
         """
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
         def fetch_func_sync(target, *args, **kwargs):
-            fetch_func(target=target, *args, **kwargs)
+            # NOTE: instances booting concurrently from the same image wait
+            # here for the first one to fetch it, rather than fetching it
+            # again.
+            if target == base and os.path.exists(base):
+                return
+            checksum = fetch_func(target=target, *args, **kwargs)
+            if (target == base and checksum and
+                    CONF.libvirt.checksum_base_images):
+                imagecache.write_stored_checksum(base, checksum)
 
         base_dir = os.path.join(CONF.instances_path,
                                 CONF.image_cache_subdirectory_name)
@@ -228,9 +228,13 @@ def read_stored_checksum(target, timestamped=True):
     return read_stored_info(target, field='sha1', timestamped=timestamped)
 
 
-def write_stored_checksum(target):
-    """Write a checksum to disk for a file in _base."""
-    write_stored_info(target, field='sha1', value=_hash_file(target))
+def write_stored_checksum(target, checksum=None):
+    """Write a checksum to disk for a file in _base.
+
+    The file is hashed unless its checksum is given.
+    """
+    write_stored_info(target, field='sha1',
+                      value=checksum or _hash_file(target))
 
 
 class ImageCacheManager(imagecache.ImageCacheManager):
@@ -404,8 +408,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                           'base_file': base_file})
 
                 # NOTE(mikal): If the checksum file is missing, then we should
-                # create one. We don't create checksums when we download images
-                # from glance because that would delay VM startup.
+                # create one. Checksums of images downloaded from glance are
+                # written as they are downloaded, this covers the images
+                # converted to raw and those downloaded by earlier versions.
                 if CONF.libvirt.checksum_base_images and create_if_missing:
                     LOG.info(_LI('%(id)s (%(base_file)s): generating '
                                  'checksum'),
@@ -21,6 +21,7 @@
 import errno
 import os
 import platform
+import struct
 
 from lxml import etree
 from oslo.config import cfg
@@ -297,6 +298,92 @@ def get_disk_backing_file(path, basename=True):
     return backing_file
 
 
+# Magic, version, backing_file_offset, backing_file_size, cluster_bits and
+# size fields at the start of the header of qcow2 images
+QCOW2_MAGIC = 'QFI\xfb'
+QCOW2_HEADER = struct.Struct('>4sIQIIQ')
+# Longest backing file name accepted by qemu
+QCOW2_MAX_BACKING_FILE_SIZE = 1023
+
+
+def read_qcow2_header(path):
+    """Read the virtual size and backing file from a qcow2 image header.
+
+    :param path: Path to the disk image
+    :returns: a (virtual size in bytes, backing file path) tuple, with
+              None as backing file if the image has none, or None if
+              the file is not a qcow2 image this parser understands.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(QCOW2_HEADER.size)
+        if len(header) < QCOW2_HEADER.size:
+            return None
+        (magic, version, backing_file_offset, backing_file_size,
+         cluster_bits, size) = QCOW2_HEADER.unpack(header)
+        if magic != QCOW2_MAGIC or version not in (2, 3):
+            return None
+        backing_file = None
+        if backing_file_offset:
+            if backing_file_size > QCOW2_MAX_BACKING_FILE_SIZE:
+                return None
+            f.seek(backing_file_offset)
+            backing_file = f.read(backing_file_size)
+            if len(backing_file) != backing_file_size:
+                return None
+    return size, backing_file
+
+
+class DiskInfoCache(object):
+    """Cache of the virtual size and backing file of disk images.
+
+    Entries are keyed by path and are only used while the inode and mtime
+    of the file are unchanged.  qcow2 headers are read directly; qemu-img
+    is only run for images the header parser does not understand.
+    """
+
+    def __init__(self):
+        # { path : ((st_ino, st_mtime), (virtual size, backing file)) }
+        self._cache = {}
+
+    def get_disk_info(self, path):
+        """Get the virtual size and backing file of a disk image
+
+        :param path: Path to the disk image
+        :returns: a (virtual size in bytes, backing file) tuple, where the
+                  backing file is the base name of the image's backing
+                  store, as returned by get_disk_backing_file()
+        """
+        st = os.stat(path)
+        key = (st.st_ino, st.st_mtime)
+        entry = self._cache.get(path)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        try:
+            info = read_qcow2_header(path)
+        except IOError:
+            info = None
+        if info is None:
+            LOG.debug('Could not parse the header of %s, running qemu-img',
+                      path)
+            qemu_img_info = images.qemu_img_info(path)
+            info = (int(qemu_img_info.virtual_size),
+                    qemu_img_info.backing_file)
+        virtual_size, backing_file = info
+        if backing_file:
+            backing_file = os.path.basename(backing_file)
+        info = (virtual_size, backing_file)
+        self._cache[path] = (key, info)
+        return info
+
+    def prune(self, paths):
+        """Forget the images which are not in paths."""
+        paths = set(paths)
+        for path in self._cache.keys():
+            if path not in paths:
+                del self._cache[path]
+
+
 def copy_image(src, dest, host=None):
     """Copy a disk image to an existing directory
 
@@ -464,9 +551,9 @@ def get_fs_info(path):
 
 
 def fetch_image(context, target, image_id, user_id, project_id, max_size=0):
-    """Grab image."""
-    images.fetch_to_raw(context, image_id, target, user_id, project_id,
-                        max_size=max_size)
+    """Grab image and return its SHA1, or None when unknown."""
+    return images.fetch_to_raw(context, image_id, target, user_id,
+                               project_id, max_size=max_size)
 
 
 def get_instance_path(instance, forceold=False, relative=False):
@@ -35,6 +35,7 @@ from nova.openstack.common import uuidutils
 from nova.virt import driver
 from nova.virt.vmwareapi import error_util
 from nova.virt.vmwareapi import host
+from nova.virt.vmwareapi import inventory
 from nova.virt.vmwareapi import vim
 from nova.virt.vmwareapi import vim_util
 from nova.virt.vmwareapi import vm_util
@@ -77,6 +78,18 @@ vmwareapi_opts = [
     cfg.BoolOpt('use_linked_clone',
                 default=True,
                 help='Whether to use linked clone'),
+    cfg.BoolOpt('use_inventory_cache',
+                default=False,
+                help='Whether to keep a local copy of the properties of the '
+                     'virtual machines, hosts, clusters and datastores read '
+                     'by the driver, updated through the property collector '
+                     'instead of being retrieved on every read'),
+    cfg.IntOpt('inventory_cache_max_age',
+               default=5,
+               help='The number of seconds the inventory cache is used '
+                    'without asking the server for updates. Any call made '
+                    'to the server in the meantime causes the updates to be '
+                    'fetched before the next read.'),
     ]
 
 CONF = cfg.CONF
@@ -803,6 +816,10 @@ class VMwareAPISession(object):
         self._scheme = scheme
         self._session = None
         self.vim = None
+        self.inventory = None
+        if CONF.vmware.use_inventory_cache:
+            self.inventory = inventory.InventoryCache(
+                    self, CONF.vmware.inventory_cache_max_age)
         self._create_session()
 
     def _get_vim_object(self):
@@ -871,6 +888,11 @@ class VMwareAPISession(object):
         """Calls a method within the module specified with
         args provided.
         """
+        if self.inventory is not None:
+            served, result = self.inventory.call(module, method,
+                                                 *args, **kwargs)
+            if served:
+                return result
         args = list(args)
         retry_count = 0
         while True:
@@ -20,6 +20,7 @@ A fake VMware VI API implementation.
 """
 
 import collections
+import pickle
 import pprint
 
 from nova import exception
@@ -1000,6 +1001,7 @@ class FakeVim(object):
         contents and the cookies for the session.
         """
         self._session = None
+        self._property_collectors = {}
         self.client = DataObject()
         self.client.factory = FakeFactory()
 
@@ -1350,6 +1352,101 @@ class FakeVim(object):
                 continue
         return lst_ret_objs
 
+    def _create_property_collector(self, method, *args, **kwargs):
+        """Creates a property collector private to the session."""
+        collector = ManagedObjectReference("PropertyCollector",
+                                           uuidutils.generate_uuid())
+        self._property_collectors[collector.value] = {'specs': [],
+                                                      'version': 0,
+                                                      'objects': {}}
+        return collector
+
+    def _get_property_collector(self, collector):
+        state = self._property_collectors.get(getattr(collector, 'value',
+                                                      None))
+        if state is None:
+            raise exception.NotFound(_("Property collector %s is not "
+                                       "there") % collector)
+        return state
+
+    def _destroy_property_collector(self, method, *args, **kwargs):
+        """Destroys a property collector along with its filters."""
+        self._get_property_collector(args[0])
+        del self._property_collectors[args[0].value]
+
+    def _create_filter(self, method, *args, **kwargs):
+        """Adds a filter spec to a property collector."""
+        state = self._get_property_collector(args[0])
+        state['specs'].append(kwargs.get("spec"))
+        filter_ref = ManagedObjectReference("PropertyFilter",
+                                            uuidutils.generate_uuid())
+        return filter_ref
+
+    def _wait_for_updates(self, method, *args, **kwargs):
+        """Reports the changes to the filtered properties since the last
+        call, as if every object was reachable from the root folder.
+        The collector remembers what it last reported and the changes are
+        found by comparing against that. maxWaitSeconds is ignored; when
+        nothing changed None is returned.
+        """
+        state = self._get_property_collector(args[0])
+        if not kwargs.get("version"):
+            state['objects'] = {}
+        reported = state['objects']
+        object_updates = []
+        seen = set()
+        for spec in state['specs']:
+            for prop_spec in spec.propSet:
+                for mdo in _db_content.get(prop_spec.type, {}).values():
+                    seen.add(mdo.obj)
+                    values = {}
+                    for prop_name in prop_spec.pathSet:
+                        try:
+                            val = mdo.get(prop_name)
+                        except exception.NovaException:
+                            # Unset properties are not reported
+                            continue
+                        values[prop_name] = (val, pickle.dumps(val))
+                    old_values = reported.get(mdo.obj)
+                    changes = []
+                    for prop_name, (val, dump) in values.items():
+                        if (old_values is None or prop_name not in old_values
+                                or old_values[prop_name][1] != dump):
+                            change = DataObject()
+                            change.name = prop_name
+                            change.op = 'assign'
+                            change.val = val
+                            changes.append(change)
+                    for prop_name in set(old_values or []) - set(values):
+                        change = DataObject()
+                        change.name = prop_name
+                        change.op = 'remove'
+                        changes.append(change)
+                    reported[mdo.obj] = values
+                    if old_values is None or changes:
+                        object_update = DataObject()
+                        object_update.kind = ('enter' if old_values is None
+                                              else 'modify')
+                        object_update.obj = mdo.obj
+                        object_update.changeSet = changes
+                        object_updates.append(object_update)
+        for obj in set(reported) - seen:
+            del reported[obj]
+            object_update = DataObject()
+            object_update.kind = 'leave'
+            object_update.obj = obj
+            object_updates.append(object_update)
+        if not object_updates:
+            return None
+        state['version'] += 1
+        filter_update = DataObject()
+        filter_update.objectSet = object_updates
+        update_set = DataObject()
+        update_set.version = str(state['version'])
+        update_set.filterSet = [filter_update]
+        update_set.truncated = False
+        return update_set
+
     def _add_port_group(self, method, *args, **kwargs):
         """Adds a port group to the host system."""
         _host_sk = _db_content["HostSystem"].keys()[0]
@@ -1450,6 +1547,18 @@ class FakeVim(object):
         elif attr_name == "CancelRetrievePropertiesEx":
             return lambda *args, **kwargs: self._retrieve_properties_cancel(
                                                 attr_name, *args, **kwargs)
+        elif attr_name == "CreatePropertyCollector":
+            return lambda *args, **kwargs: self._create_property_collector(
+                                                attr_name, *args, **kwargs)
+        elif attr_name == "DestroyPropertyCollector":
+            return lambda *args, **kwargs: self._destroy_property_collector(
+                                                attr_name, *args, **kwargs)
+        elif attr_name == "CreateFilter":
+            return lambda *args, **kwargs: self._create_filter(attr_name,
+                                                *args, **kwargs)
+        elif attr_name == "WaitForUpdatesEx":
+            return lambda *args, **kwargs: self._wait_for_updates(attr_name,
+                                                *args, **kwargs)
         elif attr_name == "AcquireCloneTicket":
             return lambda *args, **kwargs: self._just_return()
         elif attr_name == "AddPortGroup":
@@ -0,0 +1,297 @@
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A local copy of the VC/ESX inventory properties read by the driver.
+
+The cache owns a property collector with a single filter covering the
+virtual machines, hosts, clusters, resource pools and datastores below the
+root folder. The first WaitForUpdatesEx call returns all of them and the
+following ones only what changed since, so reads of the cached properties
+are answered without a RetrievePropertiesEx round trip per object.
+"""
+
+import collections
+import time
+
+from oslo.config import cfg
+
+from nova.openstack.common.gettextutils import _
+from nova.openstack.common import log as logging
+from nova import utils
+from nova.virt.vmwareapi import vim_util
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+# The properties kept for each managed object type. Reads asking for
+# anything else go to the server.
+CACHED_PROPERTIES = {
+    'VirtualMachine': ['name', 'runtime.connectionState',
+                       'runtime.powerState', 'runtime.host',
+                       'summary.config.instanceUuid',
+                       'summary.config.numCpu',
+                       'summary.config.memorySizeMB'],
+    'HostSystem': ['name', 'datastore', 'summary.hardware',
+                   'summary.runtime'],
+    'ClusterComputeResource': ['name', 'host', 'resourcePool', 'datastore'],
+    'ResourcePool': ['name', 'vm', 'summary.runtime.memory'],
+    'Datastore': ['summary.type', 'summary.name', 'summary.capacity',
+                  'summary.freeSpace', 'summary.accessible'],
+}
+
+# Returned by the readers when a call can not be answered from the cache
+_MISS = object()
+
+
+class _Property(object):
+    """A DynamicProperty of a cached object."""
+
+    def __init__(self, name, val):
+        self.name = name
+        self.val = val
+
+
+class _ObjectContent(object):
+    """The ObjectContent of a cached object."""
+
+    def __init__(self, obj, prop_set):
+        self.obj = obj
+        # NOTE: like the server, leave out propSet when none of the
+        # requested properties is set
+        if prop_set:
+            self.propSet = prop_set
+
+
+class _RetrieveResult(object):
+    """A RetrieveResult built from the cache. It never has a token."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+
+class InventoryCache(object):
+    """Serves vim_util reads of the cached properties locally.
+
+    The cache checks for updates before a read when a call that was not
+    answered from it went through the session since the last check (it
+    may have changed the inventory or waited for a task that did) or
+    when the last check is older than max_age seconds.
+    """
+
+    def __init__(self, session, max_age):
+        self._session = session
+        self._max_age = max_age
+        self._collector = None
+        self._version = None
+        self._objects = {}
+        self._stale = True
+        self._checked_at = None
+
+    def call(self, module, method, *args, **kwargs):
+        """Answers a VMwareAPISession._call_method call from the cache.
+
+        Returns a (served, result) tuple. When served is False the call
+        has to be made against the server.
+        """
+        reader = None
+        if module is vim_util:
+            reader = getattr(self, '_read_%s' % method, None)
+        result = _MISS
+        if reader is not None:
+            result = reader(*args, **kwargs)
+        if result is _MISS:
+            self._stale = True
+            return False, None
+        return True, result
+
+    def _covers(self, type, properties):
+        cached = CACHED_PROPERTIES.get(type)
+        return bool(cached and properties and
+                    set(properties).issubset(cached))
+
+    def _find(self, type, mobj):
+        return self._objects[type].get(getattr(mobj, 'value', None))
+
+    def _result(self, entries, properties):
+        objects = []
+        for obj, values in entries:
+            prop_set = [_Property(name, values[name])
+                        for name in properties if name in values]
+            objects.append(_ObjectContent(obj, prop_set))
+        return _RetrieveResult(objects)
+
+    def _read_get_objects(self, type, properties_to_collect=None, all=False):
+        properties = properties_to_collect or ['name']
+        if all or not self._covers(type, properties) or not self._refresh():
+            return _MISS
+        return self._result(self._objects[type].values(), properties)
+
+    def _read_get_inner_objects(self, base_obj, path, inner_type,
+                                properties_to_collect=None, all=False):
+        properties = properties_to_collect or ['name']
+        if (all or not self._covers(base_obj._type, [path]) or
+                not self._covers(inner_type, properties) or
+                not self._refresh()):
+            return _MISS
+        base = self._find(base_obj._type, base_obj)
+        if base is None:
+            return _MISS
+        entries = []
+        inner_objs = base[1].get(path)
+        for obj in getattr(inner_objs, 'ManagedObjectReference', []):
+            entry = self._find(inner_type, obj)
+            if entry is None:
+                return _MISS
+            entries.append(entry)
+        return self._result(entries, properties)
+
+    def _read_get_object_properties(self, collector, mobj, type, properties):
+        if (collector is not None or mobj is None or
+                not self._covers(type, properties) or not self._refresh()):
+            return _MISS
+        entry = self._find(type, mobj)
+        if entry is None:
+            return _MISS
+        return self._result([entry], properties)
+
+    def _read_get_dynamic_properties(self, mobj, type, property_names):
+        if not self._covers(type, property_names) or not self._refresh():
+            return _MISS
+        entry = self._find(type, mobj)
+        if entry is None:
+            return _MISS
+        return dict((name, entry[1][name])
+                    for name in property_names if name in entry[1])
+
+    def _read_get_dynamic_property(self, mobj, type, property_name):
+        property_dict = self._read_get_dynamic_properties(mobj, type,
+                                                          [property_name])
+        if property_dict is _MISS:
+            return _MISS
+        return property_dict.get(property_name)
+
+    def _read_get_properties_for_a_collection_of_objects(self, type,
+                                                         obj_list,
+                                                         properties):
+        if (not obj_list or not self._covers(type, properties) or
+                not self._refresh()):
+            return _MISS
+        entries = []
+        for obj in obj_list:
+            entry = self._find(type, obj)
+            if entry is None:
+                return _MISS
+            entries.append(entry)
+        return self._result(entries, properties)
+
+    @utils.synchronized('vmware.inventory')
+    def _refresh(self):
+        """Brings the cache up to date if needed.
+
+        Returns False when the cache can not be used, in which case reads
+        go to the server until it is time to try again.
+        """
+        now = time.time()
+        if (self._checked_at is not None and
+                now - self._checked_at < self._max_age):
+            if self._collector is None:
+                return False
+            if not self._stale:
+                return True
+        # NOTE: clear the flag before asking for the updates so
+        # that calls made meanwhile by other threads are not lost
+        self._stale = False
+        self._checked_at = now
+        try:
+            if self._collector is None:
+                self._create_filter()
+            self._wait_for_updates()
+        except Exception as excep:
+            LOG.warning(_("Unable to update the inventory cache, reading "
+                          "from the server instead: %s"), excep)
+            self._reset()
+            return False
+        return True
+
+    def _create_filter(self):
+        vim = self._session._get_vim()
+        client_factory = vim.client.factory
+        service_content = vim.get_service_content()
+        collector = vim.CreatePropertyCollector(
+                service_content.propertyCollector)
+        self._collector = collector
+        self._version = ''
+        self._objects = dict((type, collections.OrderedDict())
+                             for type in CACHED_PROPERTIES)
+        object_spec = vim_util.build_object_spec(client_factory,
+                service_content.rootFolder,
+                [vim_util.build_recursive_traversal_spec(client_factory)])
+        property_specs = [vim_util.build_property_spec(client_factory,
+                                type=type, properties_to_collect=properties)
+                          for type, properties in CACHED_PROPERTIES.items()]
+        property_filter_spec = vim_util.build_property_filter_spec(
+                client_factory, property_specs, [object_spec])
+        # NOTE: without partial updates a change reports the whole
+        # value of the property, so every change is an assign or a remove
+        vim.CreateFilter(collector, spec=property_filter_spec,
+                         partialUpdates=False)
+
+    def _wait_for_updates(self):
+        vim = self._session._get_vim()
+        options = vim.client.factory.create('ns0:WaitOptions')
+        options.maxWaitSeconds = 0
+        options.maxObjectUpdates = CONF.vmware.maximum_objects
+        while True:
+            update_set = vim.WaitForUpdatesEx(self._collector,
+                                              version=self._version,
+                                              options=options)
+            if not update_set:
+                return
+            for filter_update in getattr(update_set, 'filterSet', []):
+                for object_update in getattr(filter_update, 'objectSet', []):
+                    self._apply(object_update)
+            self._version = update_set.version
+            if not getattr(update_set, 'truncated', False):
+                return
+
+    def _apply(self, object_update):
+        obj = object_update.obj
+        objects = self._objects.get(obj._type)
+        if objects is None:
+            return
+        if object_update.kind == 'leave':
+            objects.pop(obj.value, None)
+            return
+        if object_update.kind == 'enter' or obj.value not in objects:
+            objects[obj.value] = (obj, {})
+        values = objects[obj.value][1]
+        for change in getattr(object_update, 'changeSet', None) or []:
+            if change.op in ('assign', 'add'):
+                values[change.name] = getattr(change, 'val', None)
+            else:
+                values.pop(change.name, None)
+
+    def _reset(self):
+        collector = self._collector
+        self._collector = None
+        self._version = None
+        self._objects = {}
+        if collector is not None:
+            try:
+                self._session._get_vim().DestroyPropertyCollector(collector)
+            except Exception as excep:
+                # The collector goes away with the session anyway
+                LOG.debug("Unable to destroy the property collector: %s",
+                          excep)
@@ -18,6 +18,7 @@ Pluggable Weighing support
 """
 
 import abc
+import time
 
 import six
 
@@ -89,6 +90,28 @@ class BaseWeigher(object):
     def _weigh_object(self, obj, weight_properties):
         """Weigh an specific object."""
 
+    def _weigh_batch(self, table, weight_properties):
+        """Weigh all objects of a columnar table in one pass.
+
+        Override in a subclass to return an array of weights, one for each
+        row of the table.  Returning None falls back to weigh_objects().
+        """
+        return None
+
+    def weigh_batch(self, table, weight_properties):
+        """Weigh all objects of a columnar table, or return None."""
+        weights = self._weigh_batch(table, weight_properties)
+        if weights is None or not len(weights):
+            return weights
+
+        # Record the min and max values, as weigh_objects() does
+        if self.minval is None or weights.min() < self.minval:
+            self.minval = weights.min()
+        if self.maxval is None or weights.max() > self.maxval:
+            self.maxval = weights.max()
+
+        return weights
+
     def weigh_objects(self, weighed_obj_list, weight_properties):
         """Weigh multiple objects.
 
@@ -121,6 +144,35 @@ class BaseWeigher(object):
 class BaseWeightHandler(loadables.BaseLoader):
     object_class = WeighedObject
 
+    def __init__(self, loadable_cls_type):
+        super(BaseWeightHandler, self).__init__(loadable_cls_type)
+        # { weigher class name : {'calls', 'seconds', 'objs'} }
+        self.weigher_stats = {}
+
+    def _record_stats(self, cls_name, start, objs):
+        stats = self.weigher_stats.get(cls_name)
+        if stats is None:
+            stats = self.weigher_stats[cls_name] = dict(
+                    calls=0, seconds=0.0, objs=0)
+        stats['calls'] += 1
+        stats['seconds'] += time.time() - start
+        stats['objs'] += objs
+
+    def pop_weigher_stats(self):
+        """Return the time spent in each weigher and the objects it
+        weighed since the previous call, and reset them.
+        """
+        weigher_stats = self.weigher_stats
+        self.weigher_stats = {}
+        return weigher_stats
+
+    def _get_batch_table(self, objs):
+        """Return a columnar table of objs for weigh_batch(), or None.
+
+        Override this in a subclass to enable batch weighing.
+        """
+        return None
+
     def get_weighed_objects(self, weigher_classes, obj_list,
             weighing_properties):
         """Return a sorted (descending), normalized list of WeighedObjects."""
@@ -129,8 +181,24 @@ class BaseWeightHandler(loadables.BaseLoader):
             return []
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
+        table = self._get_batch_table(obj_list)
         for weigher_cls in weigher_classes:
+            start = time.time()
             weigher = weigher_cls()
+
+            if table is not None:
+                weights = weigher.weigh_batch(table, weighing_properties)
+                if weights is not None:
+                    weights = table.normalize(weights,
+                                              minval=weigher.minval,
+                                              maxval=weigher.maxval)
+                    weights *= weigher.weight_multiplier()
+                    for obj, weight in zip(weighed_objs, weights.tolist()):
+                        obj.weight += weight
+                    self._record_stats(weigher_cls.__name__, start,
+                                       len(weighed_objs))
+                    continue
+
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -141,5 +209,6 @@ class BaseWeightHandler(loadables.BaseLoader):
             for i, weight in enumerate(weights):
                 obj = weighed_objs[i]
                 obj.weight += weigher.weight_multiplier() * weight
+            self._record_stats(weigher_cls.__name__, start, len(weighed_objs))
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)